@@ -2,12 +2,21 @@
 # -*- coding: utf-8 -*-
 """Agent Discovery - Dynamic agent detection system"""
 
+import ctypes
+import ctypes.util
+import hashlib
 import os
 import json
+import select
+import struct
+import threading
+from collections import defaultdict
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass
 
+INDEX_VERSION = 1
+
 @dataclass
 class AgentInfo:
     id: str
@@ -31,29 +40,240 @@ class AgentInfo:
             "metadata": self.metadata or {}
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> "AgentInfo":
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            type=data["type"],
+            status=data.get("status", "stopped"),
+            capabilities=list(data.get("capabilities", [])),
+            endpoint=data.get("endpoint"),
+            last_seen=datetime.fromisoformat(data["last_seen"]) if data.get("last_seen") else None,
+            metadata=data.get("metadata") or {}
+        )
+
+
+class _Inotify:
+    """Minimal inotify binding via ctypes (Linux only)"""
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buf = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events, pos = [], 0
+        while pos < len(buf):
+            wd, mask, _cookie, length = self._EVENT.unpack_from(buf, pos)
+            pos += self._EVENT.size
+            name = buf[pos:pos + length].rstrip(b"\0").decode(errors="replace")
+            pos += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+def default_index_path(workspace: str) -> str:
+    """Per-workspace index file under the user cache dir, outside the agents tree."""
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    digest = hashlib.sha1(os.path.abspath(workspace).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, "agent_discovery", f"index-{digest}.json")
+
+
 class AgentDiscovery:
-    def __init__(self, workspace="/workspace/agents"):
+    """Agent registry backed by a persistent, incrementally refreshed index.
+
+    Each agent's README is parsed once and cached in ``index_path`` (by
+    default under the user cache dir) together with its (mtime, size) signature; later loads only stat the READMEs and
+    re-parse the ones whose signature changed. ``watch()`` keeps the index
+    live with inotify, falling back to polling where inotify is unavailable.
+    Lookups by id, type and capability are dictionary hits.
+    """
+
+    def __init__(self, workspace="/workspace/agents", index_path: Optional[str] = None,
+                 poll_interval: float = 5.0):
         self.workspace = workspace
+        self.index_path = index_path or default_index_path(workspace)
+        self.poll_interval = poll_interval
         self.agents: Dict[str, AgentInfo] = {}
+        self.by_type: Dict[str, Set[str]] = defaultdict(set)
+        self.by_capability: Dict[str, Set[str]] = defaultdict(set)
+        self.version = 0  # bumped on every change, for caches keyed on the index
+        self.listeners: List[Callable[[Set[str]], None]] = []
+        self._signatures: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.RLock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.watch_mode: Optional[str] = None
         self.load_agents()
 
+    # ---- index maintenance -------------------------------------------------
+
     def load_agents(self):
         if not os.path.exists(self.workspace):
             return
+        self._load_index()
+        self.refresh()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get("version") != INDEX_VERSION or index.get("workspace") != self.workspace:
+            return
+        with self._lock:
+            for entry in index.get("agents", []):
+                self._signatures[entry["info"]["id"]] = tuple(entry["signature"])
+                self._add(AgentInfo.from_dict(entry["info"]))
+
+    def save_index(self):
+        """Write the index atomically; a read-only workspace just skips it."""
+        with self._lock:
+            index = {
+                "version": INDEX_VERSION,
+                "workspace": self.workspace,
+                "agents": [
+                    {"signature": self._signatures[agent_id],
+                     "info": {k: v for k, v in info.to_dict().items()
+                              if k not in ("status", "last_seen", "endpoint")}}
+                    for agent_id, info in self.agents.items() if agent_id in self._signatures
+                ]
+            }
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"[Discovery] Index not saved: {e}")
+
+    @staticmethod
+    def _signature(readme_path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(readme_path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
 
-        for agent_dir in os.listdir(self.workspace):
-            agent_path = os.path.join(self.workspace, agent_dir)
-            if os.path.isdir(agent_path):
-                agent_info = self._load_agent_info(agent_path, agent_dir)
-                if agent_info:
-                    self.agents[agent_info.id] = agent_info
+    def refresh(self) -> Set[str]:
+        """Stat every README and re-parse only new or changed ones.
+
+        Returns:
+            IDs of agents that were added, changed or removed
+        """
+        if not os.path.exists(self.workspace):
+            return set()
+        seen = set()
+        changed = set()
+        with os.scandir(self.workspace) as entries:
+            for entry in entries:
+                if not entry.is_dir() or entry.name.startswith("."):
+                    continue
+                seen.add(entry.name)
+                if self._reload_agent(entry.name):
+                    changed.add(entry.name)
+        with self._lock:
+            for agent_id in list(self._signatures):
+                if agent_id not in seen:
+                    self._remove(agent_id)
+                    changed.add(agent_id)
+        if changed:
+            self._changed(changed)
+        return changed
+
+    def _reload_agent(self, agent_name: str) -> bool:
+        """Re-parse one agent if its README signature changed."""
+        agent_path = os.path.join(self.workspace, agent_name)
+        signature = self._signature(os.path.join(agent_path, "README.md"))
+        with self._lock:
+            if signature == self._signatures.get(agent_name):
+                return False
+            if signature is None:
+                self._remove(agent_name)
+                return True
+        agent_info = self._load_agent_info(agent_path, agent_name)
+        with self._lock:
+            if agent_info:
+                self._signatures[agent_name] = signature
+                self._add(agent_info)
+            else:
+                self._remove(agent_name)
+        return True
+
+    def _add(self, agent_info: AgentInfo):
+        previous = self.agents.get(agent_info.id)
+        if previous:
+            # Keep runtime state across re-parses
+            agent_info.status, agent_info.last_seen = previous.status, previous.last_seen
+            agent_info.endpoint = agent_info.endpoint or previous.endpoint
+            self._unindex(previous)
+        self.agents[agent_info.id] = agent_info
+        self.by_type[agent_info.type].add(agent_info.id)
+        for capability in agent_info.capabilities:
+            self.by_capability[capability].add(agent_info.id)
+
+    def _unindex(self, agent_info: AgentInfo):
+        self.by_type[agent_info.type].discard(agent_info.id)
+        for capability in agent_info.capabilities:
+            self.by_capability[capability].discard(agent_info.id)
+
+    def _remove(self, agent_id: str):
+        self._signatures.pop(agent_id, None)
+        agent_info = self.agents.pop(agent_id, None)
+        if agent_info:
+            self._unindex(agent_info)
+
+    def _changed(self, agent_ids: Set[str]):
+        with self._lock:
+            self.version += 1
+        self.save_index()
+        for listener in list(self.listeners):
+            try:
+                listener(agent_ids)
+            except Exception as e:
+                print(f"[Discovery] Listener error: {e}")
+
+    # ---- README parsing ----------------------------------------------------
 
     def _load_agent_info(self, agent_path: str, agent_name: str) -> Optional[AgentInfo]:
         readme_path = os.path.join(agent_path, "README.md")
         if not os.path.exists(readme_path):
             return None
 
-        with open(readme_path, "r") as f:
+        with open(readme_path, "r", encoding="utf-8", errors="replace") as f:
             readme = f.read()
 
         capabilities = []
@@ -64,6 +284,13 @@ class AgentDiscovery:
         if "通知" in readme:
             capabilities.append("notification")
 
+        description = None
+        for line in readme.split("\n"):
+            line = line.strip()
+            if line and not line.startswith("#"):
+                description = line
+                break
+
         return AgentInfo(
             id=agent_name,
             name=agent_name.replace("-", " ").title(),
@@ -72,7 +299,7 @@ class AgentDiscovery:
             capabilities=capabilities,
             endpoint=None,
             last_seen=None,
-            metadata={"path": agent_path}
+            metadata={"path": agent_path, "description": description}
         )
 
     def _infer_agent_type(self, readme: str) -> str:
@@ -85,14 +312,106 @@ class AgentDiscovery:
         else:
             return "general"
 
+    # ---- live updates ------------------------------------------------------
+
+    def watch(self) -> str:
+        """Start a background watcher; returns "inotify" or "polling"."""
+        if self._watcher is not None:
+            return self.watch_mode
+        self._stop.clear()
+        try:
+            setup = self._setup_inotify()
+            target, args, self.watch_mode = self._inotify_loop, (setup,), "inotify"
+        except (OSError, AttributeError) as e:
+            print(f"[Discovery] inotify unavailable ({e}), polling every {self.poll_interval}s")
+            target, args, self.watch_mode = self._poll_loop, (), "polling"
+        self._watcher = threading.Thread(target=target, args=args,
+                                         name="agent-discovery-watch", daemon=True)
+        self._watcher.start()
+        return self.watch_mode
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _setup_inotify(self) -> Tuple[_Inotify, Dict[int, Optional[str]]]:
+        inotify = _Inotify()
+        watches: Dict[int, Optional[str]] = {}
+        try:
+            root_mask = (_Inotify.IN_CREATE | _Inotify.IN_DELETE |
+                         _Inotify.IN_MOVED_FROM | _Inotify.IN_MOVED_TO)
+            watches[inotify.add_watch(self.workspace, root_mask)] = None
+            for agent_id in list(self.agents):
+                self._watch_agent(inotify, watches, agent_id)
+        except OSError:
+            inotify.close()  # e.g. fs.inotify.max_user_watches exhausted
+            raise
+        return inotify, watches
+
+    def _watch_agent(self, inotify: _Inotify, watches: Dict[int, Optional[str]], agent_id: str):
+        mask = (_Inotify.IN_CLOSE_WRITE | _Inotify.IN_MODIFY | _Inotify.IN_CREATE |
+                _Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM | _Inotify.IN_MOVED_TO)
+        watches[inotify.add_watch(os.path.join(self.workspace, agent_id), mask)] = agent_id
+
+    def _inotify_loop(self, setup):
+        inotify, watches = setup
+        try:
+            while not self._stop.is_set():
+                events = inotify.read(0.5)
+                if not events:
+                    continue
+                dirty, removed, full = set(), set(), False
+                for wd, mask, name in events:
+                    if mask & _Inotify.IN_Q_OVERFLOW:
+                        full = True
+                    elif watches.get(wd) is None:
+                        if not mask & _Inotify.IN_ISDIR or name.startswith("."):
+                            continue
+                        if mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO):
+                            try:
+                                self._watch_agent(inotify, watches, name)
+                            except OSError:
+                                pass
+                            dirty.add(name)
+                        else:
+                            removed.add(name)
+                    elif name == "README.md":
+                        dirty.add(watches[wd])
+                if full:
+                    self.refresh()
+                    continue
+                changed = {name for name in dirty if self._reload_agent(name)}
+                with self._lock:
+                    for name in removed:
+                        if name in self.agents or name in self._signatures:
+                            self._remove(name)
+                            changed.add(name)
+                if changed:
+                    self._changed(changed)
+        finally:
+            inotify.close()
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            self.refresh()
+
+    # ---- registry API ------------------------------------------------------
+
     def register_agent(self, agent_info: AgentInfo):
-        self.agents[agent_info.id] = agent_info
+        with self._lock:
+            self._add(agent_info)
         print(f"[Discovery] Registered: {agent_info.name}")
+        self._changed({agent_info.id})
 
     def unregister_agent(self, agent_id: str):
-        if agent_id in self.agents:
-            del self.agents[agent_id]
-            print(f"[Discovery] Unregistered: {agent_id}")
+        with self._lock:
+            if agent_id not in self.agents:
+                return
+            self._remove(agent_id)
+        print(f"[Discovery] Unregistered: {agent_id}")
+        self._changed({agent_id})
 
     def get_agent(self, agent_id: str) -> Optional[AgentInfo]:
         return self.agents.get(agent_id)
@@ -101,10 +420,12 @@ class AgentDiscovery:
         return list(self.agents.values())
 
     def find_by_capability(self, capability: str) -> List[AgentInfo]:
-        return [
-            agent for agent in self.agents.values()
-            if capability in agent.capabilities
-        ]
+        with self._lock:
+            return [self.agents[agent_id] for agent_id in self.by_capability.get(capability, ())]
+
+    def find_by_type(self, agent_type: str) -> List[AgentInfo]:
+        with self._lock:
+            return [self.agents[agent_id] for agent_id in self.by_type.get(agent_type, ())]
 
     def update_status(self, agent_id: str, status: str):
         if agent_id in self.agents:
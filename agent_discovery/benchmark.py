@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Agent Discovery benchmark - full README walk vs the persistent (mtime, size) index"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from agent_discovery import AgentDiscovery
+
+DEFAULT_WORKSPACE = Path(__file__).resolve().parents[1] / "agents"
+
+
+def legacy_load(workspace: str) -> int:
+    """The previous load_agents: read every README on every construction."""
+    count = 0
+    for agent_dir in os.listdir(workspace):
+        readme_path = os.path.join(workspace, agent_dir, "README.md")
+        if os.path.isdir(os.path.join(workspace, agent_dir)) and os.path.exists(readme_path):
+            with open(readme_path, "r") as f:
+                f.read()
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgentDiscovery load benchmark")
+    parser.add_argument("--workspace", default=str(DEFAULT_WORKSPACE))
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "index.json")
+
+        start = time.perf_counter()
+        count = legacy_load(args.workspace)
+        print(f"{count} agents")
+        print(f"  legacy walk:           {(time.perf_counter() - start) * 1000:8.1f}ms")
+
+        start = time.perf_counter()
+        AgentDiscovery(args.workspace, index_path=index_path)
+        print(f"  cold index build:      {(time.perf_counter() - start) * 1000:8.1f}ms")
+
+        start = time.perf_counter()
+        discovery = AgentDiscovery(args.workspace, index_path=index_path)
+        print(f"  warm load (stat only): {(time.perf_counter() - start) * 1000:8.1f}ms")
+
+        start = time.perf_counter()
+        discovery.refresh()
+        print(f"  refresh, no changes:   {(time.perf_counter() - start) * 1000:8.1f}ms")
+
+        ids = list(discovery.agents)
+        start = time.perf_counter()
+        for i in range(args.lookups):
+            discovery.get_agent(ids[i % len(ids)])
+            discovery.find_by_type("monitoring")
+        per_lookup = (time.perf_counter() - start) / args.lookups * 1_000_000
+        print(f"  id + type lookup:      {per_lookup:8.2f}us")
+
+
+if __name__ == "__main__":
+    main()
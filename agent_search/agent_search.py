@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Agent Search - BM25 ranked search over agent READMEs, requirements and Discord intents"""
+
+import heapq
+import math
+import os
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Latin words/numbers, or runs of CJK ideographs, hiragana, katakana (incl. ー)
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ]+")
+_CJK_RE = re.compile(r"[^a-z0-9]")
+_KEYWORDS_RE = re.compile(r"""["']?\w*keywords["']?\s*[:=]\s*[\[(]([^\])]*)[\])]""", re.IGNORECASE)
+_COMMAND_RE = re.compile(r"""commands\.command\(\s*name\s*=\s*["']([^"']+)["']""")
+_STRING_RE = re.compile(r""""([^"\\]*)"|'([^'\\]*)'""")
+_REQUIREMENT_RE = re.compile(r"^\s*([A-Za-z0-9_.\-]+)", re.MULTILINE)
+
+# Field weights: a hit in the agent name or an intent keyword says more than one in prose
+FIELD_WEIGHTS = {"name": 3.0, "keywords": 2.0, "readme": 1.0, "requirements": 1.0}
+MIN_IDF = 0.1  # terms in more than ~90% of documents are skipped at query time
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased Latin words plus overlapping bigrams of Japanese runs.
+
+    Japanese has no spaces, so each CJK/kana run is indexed as character
+    bigrams (a single character stays a unigram); this matches any substring
+    of two or more characters without a morphological analyser.
+    """
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _deletes(term: str) -> Set[str]:
+    """All strings one deletion away from ``term`` (SymSpell-style fuzzy keys)."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+@dataclass
+class SearchHit:
+    agent_id: str
+    score: float
+    matched: List[str]
+
+    def to_dict(self):
+        return {"agent_id": self.agent_id, "score": round(self.score, 4), "matched": self.matched}
+
+
+class AgentSearchIndex:
+    """Inverted index with BM25 ranking, prefix expansion and fuzzy matching.
+
+    Postings map term -> {agent_id: weighted term frequency}. Documents can
+    be added or removed one at a time; corpus statistics (idf, length norms)
+    are recomputed lazily on the next query after a change. Fuzzy matching
+    uses a deletion index so a one-edit typo is a dictionary lookup.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.doc_terms: Dict[str, Counter] = {}
+        self.doc_len: Dict[str, float] = {}
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        self._sorted_terms: Optional[List[str]] = None
+        self._idf: Dict[str, float] = {}
+        self._norm: Dict[str, float] = {}
+        self._impacts: Dict[str, Dict[str, float]] = {}
+        self._dirty = True
+        # Discovery listeners re-index from a watcher thread while queries run
+        self._lock = threading.RLock()
+
+    # ---- indexing ----------------------------------------------------------
+
+    def add_document(self, agent_id: str, fields: Dict[str, str]):
+        """Index (or re-index) one agent from its text fields."""
+        terms: Counter = Counter()
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for token in tokenize(text or ""):
+                terms[token] += weight
+        with self._lock:
+            self._add(agent_id, terms)
+
+    def _add(self, agent_id: str, terms: Counter):
+        self._remove(agent_id)
+        self.doc_terms[agent_id] = terms
+        self.doc_len[agent_id] = sum(terms.values())
+        for term, tf in terms.items():
+            if term not in self.postings:
+                self._sorted_terms = None
+                if term.isascii():
+                    for key in _deletes(term):
+                        self._deletes[key].add(term)
+            self.postings[term][agent_id] = tf
+        self._dirty = True
+
+    def remove_document(self, agent_id: str):
+        with self._lock:
+            self._remove(agent_id)
+
+    def _remove(self, agent_id: str):
+        terms = self.doc_terms.pop(agent_id, None)
+        if terms is None:
+            return
+        self.doc_len.pop(agent_id, None)
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            docs.pop(agent_id, None)
+            if not docs:
+                del self.postings[term]
+                self._sorted_terms = None
+                if term.isascii():
+                    for key in _deletes(term):
+                        self._deletes[key].discard(term)
+        self._dirty = True
+
+    def index_agent_dir(self, agent_id: str, agent_path: str):
+        """Index an agent directory's README.md, requirements.txt and discord.py."""
+        fields = {"name": agent_id.replace("-", " ")}
+
+        def read(name):
+            try:
+                with open(os.path.join(agent_path, name), "r", encoding="utf-8", errors="replace") as f:
+                    return f.read()
+            except OSError:
+                return ""
+
+        fields["readme"] = read("README.md")
+        requirements = read("requirements.txt").replace("\\n", "\n")
+        fields["requirements"] = " ".join(_REQUIREMENT_RE.findall(requirements))
+        fields["keywords"] = " ".join(self.extract_intent_keywords(read("discord.py")))
+        if not any((fields["readme"], fields["requirements"], fields["keywords"])):
+            self.remove_document(agent_id)
+            return
+        self.add_document(agent_id, fields)
+
+    @staticmethod
+    def extract_intent_keywords(source: str) -> List[str]:
+        """Keywords from ``"keywords": [...]`` / ``*_KEYWORDS = [...]`` tables and command names."""
+        keywords = []
+        for body in _KEYWORDS_RE.findall(source):
+            keywords.extend(a or b for a, b in _STRING_RE.findall(body))
+        keywords.extend(name.replace("_", " ") for name in _COMMAND_RE.findall(source))
+        return keywords
+
+    def attach(self, discovery) -> "AgentSearchIndex":
+        """Index every agent known to an AgentDiscovery and follow its changes."""
+        for info in discovery.get_all_agents():
+            path = (info.metadata or {}).get("path")
+            if path:
+                self.index_agent_dir(info.id, path)
+
+        def on_change(agent_ids: Iterable[str]):
+            for agent_id in agent_ids:
+                info = discovery.get_agent(agent_id)
+                path = (info.metadata or {}).get("path") if info else None
+                if path:
+                    self.index_agent_dir(agent_id, path)
+                else:
+                    self.remove_document(agent_id)
+
+        discovery.listeners.append(on_change)
+        return self
+
+    # ---- querying ----------------------------------------------------------
+
+    def _refresh_stats(self):
+        if not self._dirty:
+            return
+        n = len(self.doc_terms)
+        avgdl = (sum(self.doc_len.values()) / n) if n else 1.0
+        self._idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        self._norm = {
+            agent_id: self.k1 * (1 - self.b + self.b * length / avgdl)
+            for agent_id, length in self.doc_len.items()
+        }
+        self._impacts = {}
+        self._dirty = False
+
+    def _impact(self, term: str) -> Dict[str, float]:
+        """Per-document BM25 contribution of ``term``, cached until the corpus changes."""
+        impact = self._impacts.get(term)
+        if impact is None:
+            idf, norm, k1 = self._idf[term], self._norm, self.k1
+            impact = {
+                agent_id: idf * tf * (k1 + 1) / (tf + norm[agent_id])
+                for agent_id, tf in self.postings[term].items()
+            }
+            self._impacts[term] = impact
+        return impact
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Indexed terms starting with ``prefix``, most frequent first."""
+        with self._lock:
+            if self._sorted_terms is None:
+                self._sorted_terms = sorted(self.postings)
+            terms = self._sorted_terms
+            matches = []
+            i = bisect_left(terms, prefix)
+            while i < len(terms) and terms[i].startswith(prefix):
+                matches.append(terms[i])
+                i += 1
+            matches.sort(key=lambda t: -len(self.postings[t]))
+            return matches[:limit]
+
+    def fuzzy(self, term: str) -> List[str]:
+        """Indexed terms within one edit (insert/delete/substitute) of ``term``."""
+        if not term.isascii() or len(term) < 4:
+            return []
+        with self._lock:
+            candidates = set(self._deletes.get(term, ()))  # query is missing one char
+            for key in _deletes(term):
+                if key in self.postings:
+                    candidates.add(key)  # query has one extra char
+                candidates.update(self._deletes.get(key, ()))  # one char substituted
+            candidates.discard(term)
+            return [c for c in candidates if c in self.postings]
+
+    def _expand(self, token: str, prefix: bool, fuzzy: bool) -> List[Tuple[str, float]]:
+        """Terms to score for one query token, with a discount for inexact matches."""
+        expanded = [(token, 1.0)] if token in self.postings else []
+        if prefix and token.isascii() and len(token) >= 2:
+            expanded += [(t, 0.8) for t in self.complete(token, limit=20) if t != token]
+        if fuzzy and not expanded:
+            expanded += [(t, 0.6) for t in self.fuzzy(token)]
+        return expanded
+
+    def search(self, query: str, limit: int = 20, prefix: bool = True,
+               fuzzy: bool = True) -> List[SearchHit]:
+        """
+        Rank agents for a free-text query (Japanese and/or English)
+
+        Args:
+            query: Search text
+            limit: Max hits
+            prefix: Expand Latin tokens to indexed terms they prefix
+            fuzzy: Fall back to one-edit matches for unknown Latin tokens
+
+        Returns:
+            Hits ordered by BM25 score
+        """
+        scores: Dict[str, float] = {}
+        terms: List[str] = []
+        with self._lock:
+            self._refresh_stats()
+            weighted = []
+            for token in dict.fromkeys(tokenize(query)):
+                for term, boost in self._expand(token, prefix, fuzzy):
+                    # Terms in nearly every document (template boilerplate) carry no signal
+                    if self._idf[term] >= MIN_IDF:
+                        terms.append(term)
+                        weighted.append((self._impact(term), boost))
+            # Seed with the longest exact-match posting list (a C-level dict copy)
+            exact = [i for i, (_, boost) in enumerate(weighted) if boost == 1.0]
+            if exact:
+                seed = max(exact, key=lambda i: len(weighted[i][0]))
+                scores = dict(weighted.pop(seed)[0])
+            for impact, boost in weighted:
+                get = scores.get
+                for agent_id, weight in impact.items():
+                    scores[agent_id] = get(agent_id, 0.0) + weight * boost
+            if not scores:
+                return []
+            if len(scores) > limit:
+                top = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            else:
+                top = sorted(scores.items(), key=lambda item: -item[1])
+            postings = self.postings
+            return [
+                SearchHit(agent_id, score, [t for t in terms if agent_id in postings[t]])
+                for agent_id, score in top
+            ]
+
+    def stats(self) -> Dict[str, int]:
+        return {"documents": len(self.doc_terms), "terms": len(self.postings)}
+
+
+agent_search = AgentSearchIndex()
+
+
+def main():
+    from pathlib import Path
+    agents_dir = Path(__file__).resolve().parents[1] / "agents"
+    for agent_dir in sorted(agents_dir.iterdir())[:200]:
+        if agent_dir.is_dir():
+            agent_search.index_agent_dir(agent_dir.name, str(agent_dir))
+    print(f"Index: {agent_search.stats()}")
+    for query in ["アクセス管理", "access contrl", "discord", "予約"]:
+        hits = agent_search.search(query, limit=3)
+        print(f"  {query!r}: {[(h.agent_id, round(h.score, 2)) for h in hits]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Agent Search benchmark - index build time and query latency over the agents tree"""
+
+import argparse
+import time
+from pathlib import Path
+
+from agent_search import AgentSearchIndex
+
+DEFAULT_WORKSPACE = Path(__file__).resolve().parents[1] / "agents"
+
+QUERIES = [
+    "アクセス管理", "予約 通知", "野球 データ分析", "セキュリティ監査ログ",
+    "access control", "kubernetes deploy", "fuel history", "calendar",
+    "acces contrl",  # typos -> fuzzy
+    "notif", "base",  # prefixes
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AgentSearchIndex benchmark")
+    parser.add_argument("--workspace", default=str(DEFAULT_WORKSPACE))
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    index = AgentSearchIndex()
+    start = time.perf_counter()
+    for agent_dir in Path(args.workspace).iterdir():
+        if agent_dir.is_dir():
+            index.index_agent_dir(agent_dir.name, str(agent_dir))
+    index.search("warmup")
+    print(f"Indexed {index.stats()} in {time.perf_counter() - start:.2f}s")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            hits = index.search(query, limit=10)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[int(len(timings) * 0.99)] * 1000
+        top = hits[0].agent_id if hits else "-"
+        print(f"  {query:<24} p50 {p50:6.3f}ms  p99 {p99:6.3f}ms  top: {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,12 +5,39 @@ Metrics and alerts management
 """
 
 import sqlite3
+import importlib.util
+import math
+import sys
+import time
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
 import json
 
+sys.path.insert(0, str(Path(__file__).parent))
+from sketches import DDSketch
+
 DB_PATH = Path(__file__).parent / "monitor.db"
 
+# Per-minute rollups: percentile estimates are within 1% of the true value
+SKETCH_RELATIVE_ACCURACY = 0.01
+AGGREGATION_TYPES = ('avg', 'sum', 'min', 'max', 'count', 'p50', 'p75', 'p90', 'p95', 'p99')
+
+# Shared alert engine (realtime_analytics/alert-engine). Loaded by path because
+# every realtime_analytics module is named implementation.py.
+ALERT_ENGINE_PATH = Path(__file__).resolve().parents[2] / "realtime_analytics" / "alert-engine" / "implementation.py"
+
+
+def _load_alert_engine():
+    spec = importlib.util.spec_from_file_location("alert_engine", ALERT_ENGINE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+alert_engine = sys.modules.get("alert_engine") or _load_alert_engine()
+_engine = None
+
 def init_db():
     """Initialize database"""
     conn = sqlite3.connect(DB_PATH)
@@ -71,7 +98,7 @@ def init_db():
         threshold REAL NOT NULL,
         comparison_operator TEXT DEFAULT '>' CHECK(comparison_operator IN ('>','<','>=','<=','==','!=')),
         time_window INTEGER DEFAULT 300,
-        aggregation_method TEXT DEFAULT 'avg' CHECK(aggregation_method IN ('avg','sum','min','max','count')),
+        aggregation_method TEXT DEFAULT 'avg' CHECK(aggregation_method IN ('last','avg','sum','min','max','count','p50','p90','p95','p99')),
         severity TEXT DEFAULT 'warning' CHECK(severity IN ('info','warning','error','critical')),
         enabled BOOLEAN DEFAULT 1,
         notification_channels TEXT,
@@ -98,9 +125,14 @@ def init_db():
         notes TEXT,
         resolved BOOLEAN DEFAULT 0,
         resolved_at TIMESTAMP,
+        labels TEXT,
         FOREIGN KEY (alert_id) REFERENCES alerts(id)
     )
     ''')
+    # Databases created before triggers were tracked per label set
+    trigger_columns = {row[1] for row in cursor.execute('PRAGMA table_info(alert_triggers)')}
+    if 'labels' not in trigger_columns:
+        cursor.execute('ALTER TABLE alert_triggers ADD COLUMN labels TEXT')
 
     # Health checks table
     cursor.execute('''
@@ -184,9 +216,24 @@ def init_db():
     )
     ''')
 
+    # Per-minute metric rollups (count/sum/min/max plus a DDSketch for percentiles)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS metric_sketches (
+        metric_name TEXT NOT NULL,
+        minute INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        min REAL NOT NULL,
+        max REAL NOT NULL,
+        sketch TEXT NOT NULL,
+        PRIMARY KEY (metric_name, minute)
+    ) WITHOUT ROWID
+    ''')
+
     # Indexes
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_name ON metrics(metric_name)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON metrics(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_name_timestamp ON metrics(metric_name, timestamp)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_services_name ON services(name)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_name ON alerts(name)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_alert_triggers_alert ON alert_triggers(alert_id)')
@@ -196,7 +243,12 @@ def init_db():
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_widgets_dashboard ON widgets(dashboard_id)')
 
     conn.commit()
+    # Databases created before rollups existed: build them from the raw rows once
+    needs_rollups = (cursor.execute('SELECT 1 FROM metrics LIMIT 1').fetchone() and
+                     not cursor.execute('SELECT 1 FROM metric_sketches LIMIT 1').fetchone())
     conn.close()
+    if needs_rollups:
+        rebuild_metric_rollups()
     print("✅ Database initialized")
 
 def create_service(name, service_type, endpoint=None, environment=None, health_check_interval=60):
@@ -229,19 +281,82 @@ def get_services(enabled_only=True):
     conn.close()
     return services
 
-def record_metric(metric_name, value, metric_type='gauge', unit=None, labels=None, source=None):
-    """Record a metric"""
+def _epoch_seconds(value=None):
+    """Epoch seconds (int, UTC) from None (now), epoch number, datetime or timestamp string"""
+    if value is None:
+        return int(time.time())
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # SQLite CURRENT_TIMESTAMP is UTC
+    return int(value.timestamp())
+
+def _sql_timestamp(epoch):
+    """Same text format as SQLite CURRENT_TIMESTAMP"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _update_rollups(cursor, groups):
+    """Merge {(metric_name, minute): [values]} into the per-minute sketches"""
+    for (metric_name, minute), values in groups.items():
+        row = cursor.execute('SELECT sketch FROM metric_sketches WHERE metric_name = ? AND minute = ?',
+                             (metric_name, minute)).fetchone()
+        sketch = DDSketch.from_json(row[0]) if row else DDSketch(SKETCH_RELATIVE_ACCURACY)
+        sketch.add_many(values)
+        cursor.execute('''
+        INSERT OR REPLACE INTO metric_sketches (metric_name, minute, count, sum, min, max, sketch)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (metric_name, minute, sketch.count, sketch.sum, sketch.min, sketch.max, sketch.to_json()))
+
+def record_metric(metric_name, value, metric_type='gauge', unit=None, labels=None, source=None,
+                  evaluate=True, timestamp=None):
+    """Record a metric, update its minute rollup (and evaluate the alerts watching it)"""
+    return record_metrics([{'metric': metric_name, 'value': value, 'metric_type': metric_type, 'unit': unit,
+                            'labels': labels, 'source': source, 'timestamp': timestamp}], evaluate=evaluate)
+
+def record_metrics(samples, evaluate=True):
+    """Record many metrics in one transaction
+
+    samples: dicts with metric/value and optional metric_type, unit, labels, source
+    and timestamp (epoch seconds, datetime or 'YYYY-MM-DD HH:MM:SS' UTC; default now).
+    Rollups are updated once per (metric, minute) in the same transaction.
+    """
+    rows, groups, alert_samples = [], {}, []
+    for sample in samples:
+        epoch = _epoch_seconds(sample.get('timestamp'))
+        metric_name, value, labels = sample['metric'], float(sample['value']), sample.get('labels')
+        rows.append((metric_name, sample.get('metric_type', 'gauge'), value, sample.get('unit'),
+                     json.dumps(labels) if labels else None, sample.get('source'), _sql_timestamp(epoch)))
+        groups.setdefault((metric_name, epoch // 60), []).append(value)
+        alert_samples.append((metric_name, value, labels, epoch))
+
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
+    cursor.executemany('''
+    INSERT INTO metrics (metric_name, metric_type, value, unit, labels, source, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    _update_rollups(cursor, groups)
+    conn.commit()
+    conn.close()
+    if evaluate:
+        return evaluate_alerts(alert_samples)
+    return []
 
-    labels_json = json.dumps(labels) if labels else None
-    cursor.execute('''
-    INSERT INTO metrics (metric_name, metric_type, value, unit, labels, source)
-    VALUES (?, ?, ?, ?, ?, ?)
-    ''', (metric_name, metric_type, value, unit, labels_json, source))
-
+def rebuild_metric_rollups():
+    """Rebuild every per-minute rollup from the raw metrics table"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM metric_sketches')
+    groups = {}
+    for metric_name, epoch, value in conn.execute(
+            "SELECT metric_name, CAST(strftime('%s', timestamp) AS INTEGER), value FROM metrics"):
+        groups.setdefault((metric_name, epoch // 60), []).append(value)
+    _update_rollups(cursor, groups)
     conn.commit()
     conn.close()
+    return len(groups)
 
 def get_metrics(metric_name=None, start_time=None, end_time=None, labels=None, limit=1000):
     """Get metrics with optional filters"""
@@ -271,20 +386,32 @@ def get_metrics(metric_name=None, start_time=None, end_time=None, labels=None, l
     return metrics
 
 def create_alert(name, metric_name, threshold, condition='>', time_window=300, severity='warning',
-                aggregation_method='avg', notification_channels=None):
-    """Create an alert"""
+                aggregation_method='avg', notification_channels=None, cooldown_minutes=10):
+    """Create an alert
+
+    The rule is validated by the shared alert engine (comparison operator and
+    aggregation) before it is stored, and added to the engine if it is loaded.
+    """
+    rule = alert_engine.AlertRule(None, name, metric_name, condition, threshold,
+                                  aggregation=aggregation_method, time_window=time_window,
+                                  severity=severity, cooldown=cooldown_minutes * 60,
+                                  channels=notification_channels or [])
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
     channels_json = json.dumps(notification_channels) if notification_channels else None
+    expression = f"{aggregation_method}({metric_name}) {condition} {threshold}"
     cursor.execute('''
-    INSERT INTO alerts (name, metric_name, threshold, comparison_operator, time_window, aggregation_method, severity, notification_channels)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (name, metric_name, threshold, condition, time_window, aggregation_method, severity, channels_json))
+    INSERT INTO alerts (name, metric_name, condition, threshold, comparison_operator, time_window, aggregation_method, severity, notification_channels, cooldown_minutes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (name, metric_name, expression, threshold, condition, time_window, aggregation_method, severity, channels_json, cooldown_minutes))
 
     conn.commit()
     alert_id = cursor.lastrowid
     conn.close()
+    if _engine is not None:
+        rule.id = alert_id
+        _engine.add_rule(rule)
     return alert_id
 
 def get_alerts(enabled_only=True):
@@ -302,13 +429,32 @@ def get_alerts(enabled_only=True):
     conn.close()
     return alerts
 
-def trigger_alert(alert_id, actual_value):
-    """Trigger an alert"""
+def delete_alert(alert_id):
+    """Delete an alert and its trigger history"""
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    cursor.execute('DELETE FROM alert_triggers WHERE alert_id = ?', (alert_id,))
+    cursor.execute('DELETE FROM alerts WHERE id = ?', (alert_id,))
+    deleted = cursor.rowcount > 0
+
+    conn.commit()
+    conn.close()
+    if _engine is not None:
+        _engine.remove_rule(alert_id)
+    return deleted
+
+def _labels_key(labels):
+    return json.dumps({k: str(v) for k, v in (labels or {}).items()}, sort_keys=True)
+
+def trigger_alert(alert_id, actual_value, labels=None):
+    """Trigger an alert (labels identify the series that fired)"""
     conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
     # Get alert details
-    cursor.execute('SELECT * FROM alerts WHERE id = ?', (alert_id,))
+    cursor.execute('SELECT threshold, severity FROM alerts WHERE id = ?', (alert_id,))
     alert = cursor.fetchone()
 
     if not alert:
@@ -317,9 +463,10 @@ def trigger_alert(alert_id, actual_value):
 
     # Create trigger record
     cursor.execute('''
-    INSERT INTO alert_triggers (alert_id, actual_value, threshold, severity)
-    VALUES (?, ?, ?, ?)
-    ''', (alert_id, actual_value, alert[4], alert[9]))
+    INSERT INTO alert_triggers (alert_id, actual_value, threshold, severity, labels)
+    VALUES (?, ?, ?, ?, ?)
+    ''', (alert_id, actual_value, alert['threshold'], alert['severity'], _labels_key(labels)))
+    trigger_id = cursor.lastrowid
 
     # Update alert
     cursor.execute('''
@@ -329,10 +476,70 @@ def trigger_alert(alert_id, actual_value):
     ''', (alert_id,))
 
     conn.commit()
-    trigger_id = cursor.lastrowid
     conn.close()
     return trigger_id
 
+def resolve_alert_triggers(alert_id, labels=None):
+    """Mark open triggers of an alert as resolved
+
+    With labels, only the triggers of that series are closed (plus legacy
+    triggers recorded without labels); otherwise every open trigger is.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    query = '''
+    UPDATE alert_triggers SET resolved = 1, resolved_at = CURRENT_TIMESTAMP
+    WHERE alert_id = ? AND resolved = 0
+    '''
+    params = [alert_id]
+    if labels is not None:
+        query += ' AND (labels = ? OR labels IS NULL)'
+        params.append(_labels_key(labels))
+    cursor.execute(query, params)
+    resolved = cursor.rowcount
+
+    conn.commit()
+    conn.close()
+    return resolved
+
+def _rule_from_row(row):
+    channels = json.loads(row['notification_channels']) if row['notification_channels'] else []
+    return alert_engine.AlertRule(
+        row['id'], row['name'], row['metric_name'], row['comparison_operator'], row['threshold'],
+        aggregation=row['aggregation_method'], time_window=row['time_window'] or 0,
+        severity=row['severity'], cooldown=(row['cooldown_minutes'] or 0) * 60, channels=channels,
+    )
+
+def get_alert_engine(reload=False):
+    """Shared AlertEngine loaded with the enabled alerts (cached per process)"""
+    global _engine
+    if _engine is None or reload:
+        engine = alert_engine.AlertEngine({'rate_limit': None})
+        engine.add_state_listener(_record_transition)
+        for row in get_alerts():
+            engine.add_rule(_rule_from_row(row))
+        _engine = engine
+    return _engine
+
+def _record_transition(status, rule, alert):
+    # Trigger history follows state changes; cooldown and dedup only shape notifications
+    if status == 'firing':
+        trigger_alert(rule.id, alert['value'], alert['labels'])
+    else:
+        resolve_alert_triggers(rule.id, alert['labels'])
+
+def evaluate_alerts(samples, now=None):
+    """Evaluate metric samples against the alerts and return the notifications to send
+
+    samples: (metric_name, value[, labels[, timestamp]]) tuples or
+    {"metric", "value", "labels", "timestamp"} dicts, timestamps in epoch seconds.
+    Every series that starts firing is recorded with trigger_alert() and every
+    one that clears closes its own triggers, whether or not a notification
+    went out for it.
+    """
+    return get_alert_engine().evaluate(samples, now)
+
 def get_alert_triggers(alert_id=None, acknowledged=False, limit=50):
     """Get alert triggers"""
     conn = sqlite3.connect(DB_PATH)
@@ -409,39 +616,58 @@ def get_health_checks(service_id=None, status=None, limit=50):
     return checks
 
 def aggregate_metrics(metric_name, aggregation_type, window_start, window_end):
-    """Aggregate metrics over a time window"""
+    """Aggregate metrics over a time window (inclusive on both ends)
+
+    Whole minutes are answered from the per-minute rollups: SQL sums of
+    count/sum/min/max, or merged DDSketches for percentiles (within
+    SKETCH_RELATIVE_ACCURACY of the exact value). Only the seconds at
+    unaligned window edges are read from the raw metrics table.
+    """
+    if aggregation_type not in AGGREGATION_TYPES:
+        raise ValueError(f"unsupported aggregation: {aggregation_type!r} (expected one of {', '.join(AGGREGATION_TYPES)})")
+    start, end = _epoch_seconds(window_start), _epoch_seconds(window_end)
+    first_minute = math.ceil(start / 60)
+    last_minute = (end + 1) // 60 - 1  # last minute whose 60 seconds are all inside the window
+
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
 
-    agg_func = {
-        'avg': 'AVG(value)',
-        'sum': 'SUM(value)',
-        'min': 'MIN(value)',
-        'max': 'MAX(value)',
-        'count': 'COUNT(*)',
-        'p50': 'percentile_50',
-        'p90': 'percentile_90',
-        'p95': 'percentile_95',
-        'p99': 'percentile_99'
-    }.get(aggregation_type, 'AVG(value)')
+    edges = [(start, end)] if first_minute > last_minute else [
+        (start, first_minute * 60 - 1), ((last_minute + 1) * 60, end)]
+    raw = []
+    for edge_start, edge_end in edges:
+        if edge_start <= edge_end:
+            raw.extend(row[0] for row in cursor.execute(
+                'SELECT value FROM metrics WHERE metric_name = ? AND timestamp >= ? AND timestamp <= ?',
+                (metric_name, _sql_timestamp(edge_start), _sql_timestamp(edge_end))))
 
     if aggregation_type.startswith('p'):
-        # For percentiles, we'd need a more complex query
-        # Simplified version using simple aggregation
-        cursor.execute(f'SELECT {agg_func} as value FROM metrics WHERE metric_name = ? AND timestamp >= ? AND timestamp <= ?',
-                      (metric_name, window_start, window_end))
+        sketch = DDSketch(SKETCH_RELATIVE_ACCURACY)
+        if first_minute <= last_minute:
+            for (data,) in cursor.execute(
+                    'SELECT sketch FROM metric_sketches WHERE metric_name = ? AND minute BETWEEN ? AND ?',
+                    (metric_name, first_minute, last_minute)):
+                sketch.merge(DDSketch.from_json(data))
+        sketch.add_many(raw)
+        value = sketch.quantile(int(aggregation_type[1:]) / 100)
     else:
-        cursor.execute(f'SELECT {agg_func} as value FROM metrics WHERE metric_name = ? AND timestamp >= ? AND timestamp <= ?',
-                      (metric_name, window_start, window_end))
-
-    result = cursor.fetchone()
-    value = result[0] if result and result[0] is not None else 0
+        count, total, low, high = cursor.execute('''
+        SELECT COALESCE(SUM(count), 0), COALESCE(SUM(sum), 0), MIN(min), MAX(max)
+        FROM metric_sketches WHERE metric_name = ? AND minute BETWEEN ? AND ?
+        ''', (metric_name, first_minute, last_minute)).fetchone()
+        count += len(raw)
+        total += sum(raw)
+        low = min([v for v in (low, *raw) if v is not None], default=None)
+        high = max([v for v in (high, *raw) if v is not None], default=None)
+        value = {'avg': total / count if count else None, 'sum': total, 'min': low, 'max': high,
+                 'count': count}[aggregation_type]
+    value = value if value is not None else 0
 
     # Store aggregation
     cursor.execute('''
     INSERT INTO metric_aggregations (metric_name, aggregation_type, window_start, window_end, value)
     VALUES (?, ?, ?, ?, ?)
-    ''', (metric_name, aggregation_type, window_start, window_end, value))
+    ''', (metric_name, aggregation_type, _sql_timestamp(start), _sql_timestamp(end), value))
 
     conn.commit()
     conn.close()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Monitor Agent - Quantile Sketches
+Mergeable DDSketch used for per-minute metric rollups
+"""
+
+import json
+import math
+
+
+class DDSketch:
+    """Mergeable quantile sketch with a relative-error guarantee (DDSketch)
+
+    Values are counted in logarithmic buckets (gamma^(i-1), gamma^i] with
+    gamma = (1 + a) / (1 - a). Every quantile estimate x' of the true value x
+    satisfies |x' - x| <= a * |x| for a = relative_accuracy, as long as no
+    buckets were collapsed. Only the smallest-magnitude buckets are collapsed
+    when a store grows past max_bins, so upper quantiles keep the guarantee.
+    Values with |x| < min_value are counted as zero.
+
+    Merging two sketches with the same accuracy gives exactly the sketch of
+    the combined data, so per-minute sketches can be merged into any window.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048, min_value=1e-9):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        if max_bins < 2:
+            raise ValueError("max_bins must be >= 2")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, magnitude):
+        return math.ceil(math.log(magnitude) / self._log_gamma)
+
+    def _bucket_value(self, index):
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        """Add a value (count times)"""
+        value = float(value)
+        if math.isnan(value):
+            raise ValueError("cannot add NaN to a sketch")
+        if value > self.min_value:
+            store = self.positive
+        elif value < -self.min_value:
+            store = self.negative
+        else:
+            store = None
+            self.zero_count += count
+        if store is not None:
+            index = self._index(abs(value))
+            store[index] = store.get(index, 0) + count
+            if len(store) > self.max_bins:
+                self._collapse(store)
+        self.count += count
+        self.sum += value * count
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_many(self, values):
+        for value in values:
+            self.add(value)
+        return self
+
+    def _collapse(self, store):
+        """Fold the smallest-magnitude buckets into one so the store keeps max_bins"""
+        indexes = sorted(store)
+        excess = len(indexes) - self.max_bins + 1
+        target = indexes[excess]
+        store[target] += sum(store.pop(i) for i in indexes[:excess])
+
+    def merge(self, other):
+        """Merge another sketch into this one"""
+        if not math.isclose(other.gamma, self.gamma):
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for index, count in theirs.items():
+                mine[index] = mine.get(index, 0) + count
+            if len(mine) > self.max_bins:
+                self._collapse(mine)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        """Estimate the q-quantile (0 <= q <= 1); the value at rank floor(q * (count - 1))"""
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be in [0, 1]")
+        if self.count == 0:
+            return None
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+        rank = int(q * (self.count - 1))
+        seen = 0
+        for index in sorted(self.negative, reverse=True):
+            seen += self.negative[index]
+            if seen > rank:
+                return max(-self._bucket_value(index), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.positive):
+            seen += self.positive[index]
+            if seen > rank:
+                return min(self._bucket_value(index), self.max)
+        return self.max
+
+    @property
+    def avg(self):
+        return self.sum / self.count if self.count else None
+
+    def to_json(self):
+        return json.dumps({
+            'alpha': self.relative_accuracy, 'max_bins': self.max_bins, 'min_value': self.min_value,
+            'pos': sorted(self.positive.items()), 'neg': sorted(self.negative.items()),
+            'zero': self.zero_count, 'count': self.count, 'sum': self.sum,
+            'min': self.min if self.count else None, 'max': self.max if self.count else None,
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data):
+        state = json.loads(data)
+        sketch = cls(state['alpha'], state['max_bins'], state['min_value'])
+        sketch.positive = {index: count for index, count in state['pos']}
+        sketch.negative = {index: count for index, count in state['neg']}
+        sketch.zero_count = state['zero']
+        sketch.count = state['count']
+        sketch.sum = state['sum']
+        if sketch.count:
+            sketch.min, sketch.max = state['min'], state['max']
+        return sketch
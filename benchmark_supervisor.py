@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+GenericSupervisor benchmark
+
+- heartbeat: N workers heartbeating at 1 Hz, comparing the SQLite
+  write-behind store and heartbeat heap against the previous behaviour
+  (rewrite the whole JSON state on every heartbeat and scan every worker
+  on each monitor pass)
+- recover: spawn N real processes with ProcessSupervisor, kill them all
+  and measure time-to-recover
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+
+from generic_supervisor import GenericSupervisor, WorkerStatus
+from process_supervisor import BackoffPolicy, ProcessSpec, ProcessSupervisor
+
+
+def legacy_heartbeat(supervisor: GenericSupervisor, state_file: Path, worker_id: str):
+    """Previous update_heartbeat(): mutate, then rewrite the full state file"""
+    now = datetime.now().isoformat()
+    supervisor.workers[worker_id].heartbeat = now
+    supervisor.workers[worker_id].last_heartbeat = now
+    state = {
+        'last_updated': now,
+        'workers': [asdict(w) for w in supervisor.workers.values()]
+    }
+    with open(state_file, 'w') as f:
+        json.dump(state, f, indent=2)
+
+
+def legacy_scan(supervisor: GenericSupervisor) -> int:
+    """Previous check_all_workers(): parse every heartbeat string"""
+    dead = 0
+    for worker in supervisor.workers.values():
+        if worker.status in (WorkerStatus.IDLE.value, WorkerStatus.BUSY.value):
+            age = (datetime.now() - datetime.fromisoformat(worker.heartbeat)).total_seconds()
+            if age >= supervisor.config.heartbeat_timeout:
+                dead += 1
+    return dead
+
+
+def bench_heartbeats(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        supervisor = GenericSupervisor(str(Path(tmp) / "supervisor_config.json"))
+        supervisor.config.heartbeat_timeout = 3600
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(args.workers):
+                supervisor.register_worker(f"w{i}", f"worker {i}", "bench")
+        supervisor.flush()
+        print(f"Registered {args.workers} workers in {time.perf_counter() - start:.2f}s")
+
+        beats = args.workers * args.seconds
+        check_times = []
+        start = time.perf_counter()
+        for _ in range(args.seconds):
+            for i in range(args.workers):
+                supervisor.update_heartbeat(f"w{i}", current_task="t")
+            # One monitor pass per simulated second
+            check_start = time.perf_counter()
+            supervisor.check_all_workers()
+            check_times.append(time.perf_counter() - check_start)
+        supervisor.flush()
+        elapsed = time.perf_counter() - start
+        rate = beats / elapsed
+        print(f"  sqlite + heap:  {rate:10,.0f} heartbeats/s "
+              f"({rate / args.workers:.1f}x the 1 Hz load), "
+              f"monitor pass {max(check_times) * 1000:.3f}ms")
+        print(f"  heap size {len(supervisor._heartbeat_heap)}, "
+              f"db {supervisor.db_file.stat().st_size / 1024:.0f}KiB")
+
+        state_file = Path(tmp) / "legacy_state.json"
+        start = time.perf_counter()
+        for i in range(args.legacy_sample):
+            legacy_heartbeat(supervisor, state_file, f"w{i}")
+        per_beat = (time.perf_counter() - start) / args.legacy_sample
+        start = time.perf_counter()
+        legacy_scan(supervisor)
+        scan = time.perf_counter() - start
+        print(f"  legacy json:    {1 / per_beat:10,.0f} heartbeats/s "
+              f"({1 / per_beat / args.workers:.3f}x the 1 Hz load), "
+              f"monitor pass {scan * 1000:.3f}ms")
+        supervisor.close()
+
+
+
+async def bench_recovery(args):
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        supervisor = ProcessSupervisor(str(Path(tmp) / "supervisor_config.json"),
+                                       backoff=BackoffPolicy(base=args.backoff_base),
+                                       spawn_concurrency=args.spawn_concurrency)
+        command = [sys.executable, "-c", "import time; time.sleep(3600)"]
+        for i in range(args.processes):
+            supervisor.add_process(ProcessSpec(f"p{i}", command, max_memory_mb=512))
+
+        start = time.perf_counter()
+        running = await supervisor.start_all()
+        spawn = time.perf_counter() - start
+
+        first = dict(supervisor.processes)
+        start = time.perf_counter()
+        for proc in first.values():
+            proc.kill()
+        while sum(1 for wid, proc in supervisor.processes.items()
+                  if proc is not first[wid] and proc.returncode is None) < running:
+            await asyncio.sleep(0.005)
+        recover_all = time.perf_counter() - start
+        stats = supervisor.recovery_stats()
+        await supervisor.shutdown()
+
+    print(f"{args.processes} processes (spawn concurrency {args.spawn_concurrency}, "
+          f"backoff base {args.backoff_base}s)")
+    print(f"  spawn all:          {spawn:.2f}s ({running / spawn:.0f} processes/s)")
+    print(f"  kill all -> all up: {recover_all:.2f}s")
+    print(f"  per-worker recover: p50 {stats['p50'] * 1000:.0f}ms, "
+          f"p99 {stats['p99'] * 1000:.0f}ms, max {stats['max'] * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GenericSupervisor benchmark")
+    parser.add_argument("--mode", choices=["heartbeat", "recover"], default="heartbeat")
+    parser.add_argument("--workers", type=int, default=10_000)
+    parser.add_argument("--seconds", type=int, default=5,
+                        help="simulated seconds of 1 Hz heartbeats")
+    parser.add_argument("--legacy-sample", type=int, default=50,
+                        help="heartbeats to time with the legacy JSON rewrite")
+    parser.add_argument("--processes", type=int, default=200)
+    parser.add_argument("--spawn-concurrency", type=int, default=64)
+    parser.add_argument("--backoff-base", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.mode == "recover":
+        asyncio.run(bench_recovery(args))
+    else:
+        bench_heartbeats(args)
+
+
+if __name__ == '__main__':
+    main()
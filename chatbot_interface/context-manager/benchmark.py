@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""ContextManager benchmark - user lookup latency from 10k to 1M sessions
+
+Usage:
+    python benchmark.py --sessions 10000 100000 1000000 --lookups 200000
+    python benchmark.py --sessions 200000 --budget-mb 64 --spill-path /tmp/contexts.db
+"""
+
+import argparse
+import os
+import random
+import time
+
+from implementation import ContextManager
+
+
+def legacy_get_user_context(contexts, user_id):
+    """Previous ContextManager.get_user_context(): scan and sort every context."""
+    user_contexts = [ctx for ctx in contexts.values() if ctx.user_id == user_id]
+    if user_contexts:
+        return sorted(user_contexts, key=lambda c: c.updated_at, reverse=True)[0]
+    return None
+
+
+def per_call_us(func, keys):
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ContextManager lookup benchmark")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--legacy-lookups", type=int, default=20, help="lookups for the full-scan baseline")
+    parser.add_argument("--budget-mb", type=float, default=None, help="memory budget (default: unlimited)")
+    parser.add_argument("--spill-path", default=None, help="SQLite file for evicted contexts")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    print(f"{'sessions':>10} {'create':>10} {'get_user_context':>17} {'get_context':>12} {'add_message':>12} "
+          f"{'legacy scan':>12} {'in memory':>10} {'spilled':>8}")
+    for sessions in args.sessions:
+        if args.spill_path and os.path.exists(args.spill_path):
+            os.remove(args.spill_path)
+        manager = ContextManager({'memory_budget_mb': args.budget_mb, 'spill_path': args.spill_path})
+        start = time.perf_counter()
+        ids = [manager.create_context(f"user{i}").context_id for i in range(sessions)]
+        create_us = (time.perf_counter() - start) / sessions * 1e6
+
+        # 最近のユーザーほど多く参照される (spill 時にメモリ上のものがヒットしやすい)
+        users = [f"user{sessions - 1 - min(int(rng.expovariate(1 / (sessions / 20))), sessions - 1)}"
+                 for _ in range(args.lookups)]
+        contexts = [ids[int(u[4:])] for u in users]
+        user_us = per_call_us(manager.get_user_context, users)
+        context_us = per_call_us(manager.get_context, contexts)
+        message_us = per_call_us(lambda u: manager.get_user_context(u).add_message("user", "こんにちは"),
+                                 users[:args.lookups // 4])
+        legacy_us = per_call_us(lambda u: legacy_get_user_context(manager.contexts, u),
+                                users[:args.legacy_lookups])
+        stats = manager.stats()
+        print(f"{sessions:>10} {create_us:>8.2f}µs {user_us:>15.2f}µs {context_us:>10.2f}µs {message_us:>10.2f}µs "
+              f"{legacy_us / 1000:>10.2f}ms {stats['contexts']:>10} {stats['spilled_contexts']:>8}")
+        manager.close()
+        del manager, ids, contexts
+
+
+if __name__ == "__main__":
+    main()
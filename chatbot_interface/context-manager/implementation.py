@@ -2,17 +2,38 @@
 """
 Context Manager Module
 コンテキストマネージャー - 会話履歴・コンテキスト管理
+
+コンテキストは最終アクセス順の LRU (OrderedDict) で保持し、ユーザー → コンテキストの
+索引で最新コンテキストを O(1) で引く。max_context_age 秒アクセスの無いものと、
+メモリ予算 (memory_budget_mb) を超えた分は LRU の先頭から追い出す。spill_path を
+指定すると、追い出したコンテキストは SQLite に退避し、次のアクセスで読み戻す。
+外したあとも呼び出し側が持っている Context に書き込むと、そのコンテキストはメモリに戻る。
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Iterable
 from datetime import datetime, timedelta
-from collections import deque
+from collections import deque, OrderedDict
+import itertools
 import json
+import sqlite3
+import time
+import weakref
+
+# Context 1 件あたりの固定コスト (deque・dict・datetime など) の概算バイト数
+CONTEXT_OVERHEAD = 1024
+
+
+def _estimate_size(value: Any) -> int:
+    """JSON 表現の長さによるメモリ使用量の概算"""
+    return len(json.dumps(value, ensure_ascii=False, default=str))
 
 
 class Context:
     """コンテキストクラス"""
 
+    __slots__ = ('context_id', 'user_id', 'max_messages', 'messages', 'variables',
+                 'created_at', 'updated_at', 'last_access', 'size', '_on_change', '__weakref__')
+
     def __init__(self, context_id: str, user_id: str, max_messages: int = 10):
         self.context_id = context_id
         self.user_id = user_id
@@ -20,22 +41,38 @@ class Context:
         self.messages = deque(maxlen=max_messages)
         self.variables = {}
         self.created_at = datetime.now()
+        self.updated_at = self.created_at
+        self.last_access = 0.0
+        self.size = CONTEXT_OVERHEAD
+        self._on_change: Optional[Callable[['Context', int], None]] = None
+
+    def _changed(self, delta: int):
         self.updated_at = datetime.now()
+        self.size += delta
+        if self._on_change:
+            self._on_change(self, delta)
 
     def add_message(self, role: str, content: str, metadata: Dict[str, Any] = None):
         """メッセージを追加"""
-        self.messages.append({
+        message = {
             'role': role,
             'content': content,
             'timestamp': datetime.now().isoformat(),
             'metadata': metadata or {}
-        })
-        self.updated_at = datetime.now()
+        }
+        delta = _estimate_size(message)
+        if len(self.messages) == self.max_messages:
+            delta -= _estimate_size(self.messages[0])
+        self.messages.append(message)
+        self._changed(delta)
 
     def set_variable(self, key: str, value: Any):
         """変数を設定"""
+        delta = _estimate_size({key: value})
+        if key in self.variables:
+            delta -= _estimate_size({key: self.variables[key]})
         self.variables[key] = value
-        self.updated_at = datetime.now()
+        self._changed(delta)
 
     def get_variable(self, key: str, default: Any = None) -> Any:
         """変数を取得"""
@@ -52,51 +89,295 @@ class Context:
         return {
             'context_id': self.context_id,
             'user_id': self.user_id,
+            'max_messages': self.max_messages,
             'messages': list(self.messages),
             'variables': self.variables,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Context':
+        """to_dict() の結果から復元"""
+        context = cls(data['context_id'], data['user_id'], data.get('max_messages', 10))
+        context.messages.extend(data['messages'])
+        context.variables = data['variables']
+        context.created_at = datetime.fromisoformat(data['created_at'])
+        context.updated_at = datetime.fromisoformat(data['updated_at'])
+        context.size = CONTEXT_OVERHEAD + sum(_estimate_size(m) for m in context.messages) + \
+            sum(_estimate_size({k: v}) for k, v in context.variables.items())
+        return context
+
+
+class ContextStore:
+    """追い出したコンテキストの SQLite 退避先"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS contexts (
+                context_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_contexts_user ON contexts(user_id, updated_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_contexts_updated ON contexts(updated_at)")
+        self.conn.commit()
+
+    def put_many(self, contexts: Iterable[Context]):
+        """コンテキストをまとめて書き込む (同じ ID は上書き)"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO contexts (context_id, user_id, updated_at, data) VALUES (?, ?, ?, ?)",
+                [(c.context_id, c.user_id, c.updated_at.timestamp(), json.dumps(c.to_dict(), ensure_ascii=False,
+                                                                                 default=str))
+                 for c in contexts])
+
+    def take(self, context_id: str) -> Optional[Context]:
+        """コンテキストを読み出して退避先から削除"""
+        row = self.conn.execute("SELECT data FROM contexts WHERE context_id = ?", (context_id,)).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute("DELETE FROM contexts WHERE context_id = ?", (context_id,))
+        return Context.from_dict(json.loads(row[0]))
+
+    def discard(self, context_id: str):
+        """退避先から削除 (メモリ上のものが正となったとき)"""
+        with self.conn:
+            self.conn.execute("DELETE FROM contexts WHERE context_id = ?", (context_id,))
+
+    def user_context_ids(self, user_id: str) -> List[str]:
+        """ユーザーの退避済みコンテキスト ID (更新の古い順)"""
+        return [context_id for (context_id,) in self.conn.execute(
+            "SELECT context_id FROM contexts WHERE user_id = ? ORDER BY updated_at", (user_id,))]
+
+    def purge(self, before: float) -> List[tuple]:
+        """updated_at (epoch 秒) が before より古いものを削除し、(context_id, user_id) を返す"""
+        with self.conn:
+            removed = self.conn.execute(
+                "SELECT context_id, user_id FROM contexts WHERE updated_at < ?", (before,)).fetchall()
+            self.conn.execute("DELETE FROM contexts WHERE updated_at < ?", (before,))
+        return removed
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
 
 class ContextManager:
-    """コンテキストマネージャー"""
+    """コンテキストマネージャー
+
+    設定:
+        max_context_age: この秒数アクセスの無いコンテキストをメモリから外す (既定 3600)
+        memory_budget_mb: メモリ上のコンテキストの概算サイズ上限 (None で無制限、既定 256)
+        spill_path: 指定すると外したコンテキストを SQLite に退避して読み戻す
+        spill_max_age: 退避先で updated_at からこの秒数を過ぎたものを削除 (既定 7 日)
+    """
 
-    def __init__(self, config: Dict[str, Any] = None):
+    def __init__(self, config: Dict[str, Any] = None, clock: Callable[[], float] = time.monotonic):
         self.config = config or {}
-        self.contexts: Dict[str, Context] = {}
+        self.clock = clock
+        # 最終アクセスの古い順。先頭から期限切れ・予算超過分を追い出す
+        self.contexts: 'OrderedDict[str, Context]' = OrderedDict()
+        # user_id -> {context_id: None} (updated_at の古い順、退避済みも含む)
+        self._by_user: Dict[str, Dict[str, None]] = {}
         self.max_context_age = self.config.get('max_context_age', 3600)  # seconds
+        budget = self.config.get('memory_budget_mb', 256)
+        self.memory_budget = int(budget * 1024 * 1024) if budget is not None else None
+        self.memory_used = 0
+        self.spill_max_age = self.config.get('spill_max_age', 7 * 86400)
+        spill_path = self.config.get('spill_path')
+        self.store = ContextStore(spill_path) if spill_path else None
+        # 退避したが呼び出し側がまだ持っている Context (読み戻すときは同じオブジェクトを返す)
+        self._released: 'weakref.WeakValueDictionary[str, Context]' = weakref.WeakValueDictionary()
+        self.counters = {'expired': 0, 'evicted': 0, 'spilled': 0, 'loaded': 0}
+        self._sequence = itertools.count(1)
+
+    # -- LRU / 索引 -----------------------------------------------------
+
+    def _admit(self, context: Context):
+        context.last_access = self.clock()
+        context._on_change = self._on_context_change
+        self.contexts[context.context_id] = context
+        self._by_user.setdefault(context.user_id, {})[context.context_id] = None
+        self.memory_used += context.size
+        self._enforce_budget(context)
+
+    def _on_context_change(self, context: Context, delta: int):
+        context.last_access = self.clock()
+        self.contexts.move_to_end(context.context_id)
+        ids = self._by_user[context.user_id]
+        del ids[context.context_id]
+        ids[context.context_id] = None  # 最新へ並べ替え
+        self.memory_used += delta
+        if delta > 0:
+            self._enforce_budget(context)
+
+    def _on_released_change(self, context: Context, delta: int):
+        """外したコンテキストへの書き込み: 退避先の古い内容を捨ててメモリに戻す"""
+        self._released.pop(context.context_id, None)
+        if self.store is not None:
+            self.store.discard(context.context_id)
+        self._admit(context)
+        ids = self._by_user[context.user_id]
+        del ids[context.context_id]
+        ids[context.context_id] = None  # 最新へ並べ替え
+
+    def _touch(self, context: Context):
+        context.last_access = self.clock()
+        self.contexts.move_to_end(context.context_id)
+
+    def _release(self, victims: List[Context]):
+        """メモリから外す。退避先があれば書き込み、無ければ索引からも消す"""
+        for context in victims:
+            context._on_change = self._on_released_change
+            self.memory_used -= context.size
+        if self.store is not None:
+            self.store.put_many(victims)
+            for context in victims:
+                self._released[context.context_id] = context
+            self.counters['spilled'] += len(victims)
+        else:
+            for context in victims:
+                self._unindex(context.context_id, context.user_id)
+
+    def _unindex(self, context_id: str, user_id: str):
+        ids = self._by_user.get(user_id)
+        if ids is not None:
+            ids.pop(context_id, None)
+            if not ids:
+                del self._by_user[user_id]
+
+    def _expire(self):
+        """最終アクセスが max_context_age より古いものを先頭から外す (外す件数に比例)"""
+        cutoff = self.clock() - self.max_context_age
+        victims = []
+        while self.contexts:
+            context = next(iter(self.contexts.values()))
+            if context.last_access > cutoff:
+                break
+            del self.contexts[context.context_id]
+            victims.append(context)
+        if victims:
+            self.counters['expired'] += len(victims)
+            self._release(victims)
+        return len(victims)
+
+    def _enforce_budget(self, keep: Context):
+        """メモリ予算を超えていれば、直前に触れたもの以外を LRU 順に予算の 90% まで外す
+
+        少し多めに外すことで、退避先への書き込みを 1 件ずつではなくまとめて行う。
+        """
+        if self.memory_budget is None or self.memory_used <= self.memory_budget:
+            return
+        target = self.memory_budget * 0.9
+        victims = []
+        freed = 0
+        for context in self.contexts.values():
+            if self.memory_used - freed <= target:
+                break
+            if context is keep:
+                continue
+            victims.append(context)
+            freed += context.size
+        for context in victims:
+            del self.contexts[context.context_id]
+        if victims:
+            self.counters['evicted'] += len(victims)
+            self._release(victims)
+
+    def _load(self, context_id: str) -> Optional[Context]:
+        if self.store is None:
+            return None
+        context = self._released.pop(context_id, None)
+        if context is not None:
+            self.store.discard(context_id)
+        else:
+            context = self.store.take(context_id)
+        if context is not None:
+            self.counters['loaded'] += 1
+            self._admit(context)
+        return context
+
+    # -- API ------------------------------------------------------------
 
     def create_context(self, user_id: str) -> Context:
         """新しいコンテキストを作成"""
+        self._expire()
         context_id = f"ctx_{datetime.now().timestamp()}_{user_id}"
+        if context_id in self.contexts:
+            context_id = f"{context_id}_{next(self._sequence)}"
         context = Context(context_id, user_id)
-        self.contexts[context_id] = context
+        self._admit(context)
         return context
 
     def get_context(self, context_id: str) -> Optional[Context]:
         """コンテキストを取得"""
-        return self.contexts.get(context_id)
+        self._expire()
+        context = self.contexts.get(context_id)
+        if context is not None:
+            self._touch(context)
+            return context
+        return self._load(context_id)
 
     def get_user_context(self, user_id: str) -> Optional[Context]:
         """ユーザーの最新コンテキストを取得"""
-        user_contexts = [
-            ctx for ctx in self.contexts.values()
-            if ctx.user_id == user_id
-        ]
-        if user_contexts:
-            return sorted(user_contexts, key=lambda c: c.updated_at, reverse=True)[0]
+        self._expire()
+        ids = self._by_user.get(user_id)
+        if ids is None and self.store is not None:
+            # 以前のプロセスが退避したものは索引に無いので退避先から索引を作る
+            stored = self.store.user_context_ids(user_id)
+            if stored:
+                ids = self._by_user[user_id] = dict.fromkeys(stored)
+        while ids:
+            context_id = next(reversed(ids))
+            context = self.contexts.get(context_id)
+            if context is not None:
+                self._touch(context)
+                return context
+            context = self._load(context_id)
+            if context is not None:
+                return context
+            self._unindex(context_id, user_id)  # 退避先から消えていた
         return None
 
-    def cleanup_old_contexts(self):
-        """古いコンテキストを削除"""
-        cutoff = datetime.now() - timedelta(seconds=self.max_context_age)
-        to_remove = [
-            ctx_id for ctx_id, ctx in self.contexts.items()
-            if ctx.updated_at < cutoff
-        ]
-        for ctx_id in to_remove:
-            del self.contexts[ctx_id]
+    def cleanup_old_contexts(self) -> int:
+        """古いコンテキストを削除 (退避先では spill_max_age を過ぎたもの)。外した件数を返す"""
+        removed = self._expire()
+        if self.store is not None:
+            cutoff = (datetime.now() - timedelta(seconds=self.spill_max_age)).timestamp()
+            purged = self.store.purge(cutoff)
+            for context_id, user_id in purged:
+                self._released.pop(context_id, None)
+                self._unindex(context_id, user_id)
+            removed += len(purged)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """件数・メモリ使用量の統計"""
+        return {
+            'contexts': len(self.contexts),
+            'users': len(self._by_user),
+            'memory_used_bytes': self.memory_used,
+            'memory_budget_bytes': self.memory_budget,
+            'spilled_contexts': len(self.store) if self.store is not None else 0,
+            **self.counters,
+        }
+
+    def close(self):
+        """メモリ上のコンテキストを退避して退避先を閉じる"""
+        if self.store is not None:
+            self.store.put_many(self.contexts.values())
+            self.store.close()
+            self.store = None
 
 
 if __name__ == '__main__':
@@ -5,20 +5,38 @@ Dashboard API - Webダッシュボード用のバックエンドAPI
 FastAPIを使って、エージェントのステータス管理と操作を提供します。
 """
 
+import asyncio
+import contextlib
 import json
 import os
+import sys
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "agent_discovery"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "agent_search"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "event_bus"))
+from process_supervisor import ProcessSpec, ProcessSupervisor  # noqa: E402
+from agent_discovery import AgentDiscovery  # noqa: E402
+from agent_search import AgentSearchIndex  # noqa: E402
+from response_cache import ResponseCache, query_items  # noqa: E402
+from live_updates import LiveStatusHub  # noqa: E402
+from event_bus import event_bus  # noqa: E402
+
 # 設定
-AGENTS_DIR = "/workspace/agents"
+AGENTS_DIR = os.environ.get("DASHBOARD_AGENTS_DIR", "/workspace/agents")
+MAX_PAGE_SIZE = 500
 PROGRESS_FILE = "/workspace/dashboard_progress.json"
+# プロセススーパーバイザーの設定・状態 DB (supervisor_state.db) の置き場所
+STATE_DIR = os.environ.get("DASHBOARD_STATE_DIR", str(Path.home() / ".ai-agents-dashboard"))
 
 app = FastAPI(title="AI Agents Dashboard API", version="1.0.0")
 
@@ -43,48 +61,59 @@ class AgentResponse(BaseModel):
 
 
 # エージェント情報のロード
-def load_agents() -> List[Agent]:
-    """エージェント情報をロード"""
-    agents = []
+# ディスカバリインデックスが README を (mtime, size) でキャッシュし、inotify で更新を反映する
+discovery = AgentDiscovery(AGENTS_DIR)
+# README / requirements.txt / discord.py の全文検索インデックス (BM25)
+search_index = AgentSearchIndex().attach(discovery)
+# レスポンスキャッシュ: インデックスの version と TTL で失効し、変更通知で即時破棄
+response_cache = ResponseCache(ttl=30.0).attach(discovery)
+if os.path.exists(AGENTS_DIR):
+    discovery.watch()
+
+_agents_cache = {"version": None, "list": [], "by_name": {}, "rows": [], "built_at": None}
+
+
+def _to_agent(info) -> Agent:
+    """ディスカバリ情報を API モデルに変換"""
+    # 表示名を作成
+    display_name = info.id.replace('-agent', '').replace('-', ' ').title()
+    display_name = display_name.replace(' ', '')  # 英語風に
+    display_name = display_name[0].lower() + display_name[1:]  # 小文字開始
+    now = datetime.now().isoformat()
+    return Agent(
+        name=info.id,
+        displayName=display_name,
+        description=(info.metadata or {}).get("description"),
+        status="active",  # デフォルトは稼働中と仮定
+        createdAt=now,
+        updatedAt=now
+    )
 
-    if not os.path.exists(AGENTS_DIR):
-        return agents
 
-    for agent_dir in sorted(Path(AGENTS_DIR).iterdir()):
-        if not agent_dir.is_dir():
-            continue
-
-        name = agent_dir.name
-
-        # README.mdから情報を取得
-        readme_path = agent_dir / "README.md"
-        description = None
-        if readme_path.exists():
-            with open(readme_path, 'r', encoding='utf-8') as f:
-                readme_content = f.read()
-                # 最初の段落を説明として使用
-                lines = readme_content.split('\n')
-                for line in lines:
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        description = line
-                        break
-
-        # 表示名を作成
-        display_name = name.replace('-agent', '').replace('-', ' ').title()
-        display_name = display_name.replace(' ', '')  # 英語風に
-        display_name = display_name[0].lower() + display_name[1:]  # 小文字開始
-
-        agents.append(Agent(
-            name=name,
-            displayName=display_name,
-            description=description,
-            status="active",  # デフォルトは稼働中と仮定
-            createdAt=datetime.now().isoformat(),
-            updatedAt=datetime.now().isoformat()
-        ))
-
-    return agents
+def _agents_snapshot():
+    """インデックスのバージョンが変わったときだけモデルを作り直す"""
+    if _agents_cache["version"] != discovery.version:
+        agents = [_to_agent(info) for info in sorted(discovery.get_all_agents(), key=lambda a: a.id)]
+        _agents_cache.update(version=discovery.version, list=agents,
+                             by_name={agent.name: agent for agent in agents},
+                             rows=[agent.model_dump() for agent in agents],
+                             built_at=datetime.now().isoformat())
+    return _agents_cache
+
+
+def _cached_json(request: Request, build) -> Response:
+    """キャッシュ済み JSON を ETag / If-None-Match / gzip・brotli 付きで返す"""
+    key = f"{request.url.path}?{request.url.query}"
+    cached = response_cache.get_or_build(key, discovery.version, build)
+    status_code, headers, body = cached.render(request.headers.get("if-none-match"),
+                                               request.headers.get("accept-encoding"))
+    return Response(content=body, status_code=status_code, headers=headers,
+                    media_type="application/json")
+
+
+def load_agents() -> List[Agent]:
+    """エージェント情報をロード"""
+    return list(_agents_snapshot()["list"])
 
 
 # エンドポイント
@@ -99,54 +128,96 @@ async def index():
 
 
 @app.get("/api/agents", response_model=List[Agent])
-async def get_agents():
-    """全エージェントのリスト"""
-    return load_agents()
+async def get_agents(request: Request, status: Optional[str] = None, q: Optional[str] = None,
+                     sort: str = "name", fields: Optional[str] = None,
+                     cursor: Optional[str] = None, limit: Optional[int] = None):
+    """
+    エージェントのリスト
+
+    status で絞り込み、q で部分一致検索、sort でソート ("-" 付きで降順)、
+    fields (カンマ区切り) で返すフィールドを指定できます。limit を指定すると
+    カーソルページネーションになり、次ページは X-Next-Cursor / Link ヘッダーで返します。
+    """
+    if sort.lstrip("-") not in Agent.model_fields:
+        raise HTTPException(status_code=400, detail=f"Unknown sort field: {sort}")
+    field_list = [f for f in fields.split(",") if f] if fields else None
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    def build():
+        try:
+            page, next_cursor, total = query_items(
+                _agents_snapshot()["rows"], filters={"status": status} if status else None,
+                text=q, sort=sort, cursor=cursor, limit=limit, fields=field_list)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"X-Total-Count": str(total)}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+            next_url = request.url.include_query_params(cursor=next_cursor)
+            headers["Link"] = f'<{next_url.path}?{next_url.query}>; rel="next"'
+        return page, headers
+
+    return _cached_json(request, build)
+
+
+@app.get("/api/search")
+async def search_agents(q: str, limit: int = 20, fuzzy: bool = True):
+    """エージェント検索 (日本語/英語, 前方一致・あいまい検索対応)"""
+    snapshot = _agents_snapshot()["by_name"]
+    hits = search_index.search(q, limit=min(max(limit, 1), 100), fuzzy=fuzzy)
+    return {
+        "query": q,
+        "results": [
+            {**hit.to_dict(), "description": snapshot[hit.agent_id].description
+             if hit.agent_id in snapshot else None}
+            for hit in hits
+        ]
+    }
 
 
 @app.get("/api/agents/{agent_name}", response_model=Agent)
-async def get_agent(agent_name: str):
+async def get_agent(request: Request, agent_name: str):
     """特定のエージェントの情報"""
-    agents = load_agents()
-    for agent in agents:
-        if agent.name == agent_name:
-            return agent
-    raise HTTPException(status_code=404, detail="Agent not found")
+    agent = _agents_snapshot()["by_name"].get(agent_name)
+    if agent is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return _cached_json(request, lambda: (agent.model_dump(), {}))
 
 
 @app.post("/api/agents/{agent_name}/start", response_model=AgentResponse)
 async def start_agent(agent_name: str):
     """エージェントを起動"""
-    # 実際のエージェント起動ロジックはここに実装
-    # とりあえずステータス更新のみ
+    result = await agent_manager.start_agent(agent_name)
     return AgentResponse(
-        success=True,
-        message=f"Agent {agent_name} started"
+        success=result["status"] == "success",
+        message=result["message"]
     )
 
 
 @app.post("/api/agents/{agent_name}/stop", response_model=AgentResponse)
 async def stop_agent(agent_name: str):
     """エージェントを停止"""
-    # 実際のエージェント停止ロジックはここに実装
-    # とりあえずステータス更新のみ
+    result = await agent_manager.stop_agent(agent_name)
     return AgentResponse(
-        success=True,
-        message=f"Agent {agent_name} stopped"
+        success=result["status"] == "success",
+        message=result["message"]
     )
 
 
 @app.get("/api/stats")
-async def get_stats():
-    """統計情報"""
-    agents = load_agents()
-    return {
-        "total": len(agents),
-        "active": len([a for a in agents if a.status == "active"]),
-        "inactive": len([a for a in agents if a.status == "inactive"]),
-        "error": len([a for a in agents if a.status == "error"]),
-        "last_updated": datetime.now().isoformat()
-    }
+async def get_stats(request: Request):
+    """統計情報 (インデックスが変わるまでキャッシュ)"""
+    def build():
+        snapshot = _agents_snapshot()
+        counts = {"active": 0, "inactive": 0, "error": 0}
+        for agent in snapshot["list"]:
+            if agent.status in counts:
+                counts[agent.status] += 1
+        return {"total": len(snapshot["list"]), **counts,
+                "last_updated": snapshot["built_at"]}, {}
+
+    return _cached_json(request, build)
 
 
 if __name__ == "__main__":
@@ -158,9 +229,33 @@ if __name__ == "__main__":
 # ============================================
 
 class AgentManager:
-    def __init__(self):
-        self.agents_dir = "/workspace/agents"
-        self.active_agents = {}
+    def __init__(self, agents_dir: str = AGENTS_DIR, state_dir: str = STATE_DIR):
+        self.agents_dir = agents_dir
+        self.state_dir = Path(state_dir)
+        self._supervisor: Optional[ProcessSupervisor] = None
+
+    @property
+    def supervisor(self) -> ProcessSupervisor:
+        """初回アクセス時 (通常は startup フック) に作成。import 時には DB を開かない"""
+        if self._supervisor is None:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            self._supervisor = ProcessSupervisor(str(self.state_dir / "dashboard_supervisor_config.json"))
+        return self._supervisor
+
+    async def shutdown(self):
+        if self._supervisor is not None:
+            await self._supervisor.shutdown()
+            self._supervisor = None
+
+    @property
+    def active_agents(self):
+        return {
+            name: {
+                "started_at": self.supervisor.workers[name].metadata.get("started_at"),
+                "pid": self.supervisor.processes[name].pid
+            }
+            for name in self.supervisor.specs if self.supervisor.is_running(name)
+        }
 
     def list_agents(self):
         agents = []
@@ -172,47 +267,124 @@ class AgentManager:
                     if agent_file.exists():
                         agents.append({
                             "name": agent_dir.name,
-                            "status": "running" if agent_dir.name in self.active_agents else "stopped",
+                            "status": "running" if self.supervisor.is_running(agent_dir.name) else "stopped",
                             "path": str(agent_dir)
                         })
         return agents
 
-    def start_agent(self, agent_name):
-        if agent_name in self.active_agents:
+    async def start_agent(self, agent_name):
+        if self.supervisor.is_running(agent_name):
             return {"status": "error", "message": f"{agent_name} is already running"}
 
-        agent_file = Path(self.agents_dir) / agent_name / "agent.py"
-        if not agent_file.exists():
+        agent_dir = Path(self.agents_dir) / agent_name
+        if not (agent_dir / "agent.py").exists():
             return {"status": "error", "message": f"Agent {agent_name} not found"}
 
-        self.active_agents[agent_name] = {
-            "started_at": datetime.now().isoformat(),
-            "pid": len(self.active_agents) + 1000
-        }
+        if agent_name not in self.supervisor.specs:
+            # agent.py は report_heartbeat() を呼ばないので、既定どおりプロセスの生存をハートビートとみなす
+            self.supervisor.add_process(ProcessSpec.for_agent(str(agent_dir), worker_id=agent_name))
+        if not await self.supervisor.start(agent_name):
+            return {"status": "error", "message": f"{agent_name} failed to start"}
 
-        return {"status": "success", "message": f"{agent_name} started"}
+        pid = self.supervisor.processes[agent_name].pid
+        return {"status": "success", "message": f"{agent_name} started", "pid": pid}
 
-    def stop_agent(self, agent_name):
-        if agent_name not in self.active_agents:
+    async def stop_agent(self, agent_name):
+        if not self.supervisor.is_running(agent_name):
             return {"status": "error", "message": f"{agent_name} is not running"}
 
-        del self.active_agents[agent_name]
+        await self.supervisor.stop(agent_name)
 
         return {"status": "success", "message": f"{agent_name} stopped"}
 
 agent_manager = AgentManager()
 
+# ============================================
+# ライブ更新エンドポイント (WebSocket / SSE)
+# ============================================
+
+# スーパーバイザー・EventBus・ディスカバリの変更を 100ms ごとの差分フレームにまとめて配信
+live_hub = LiveStatusHub(frame_interval=0.1)
+live_hub.attach_discovery(discovery).attach_event_bus(event_bus)
+
+
+@app.on_event("startup")
+async def start_supervisor():
+    """スーパーバイザーを作成してライブ更新に接続"""
+    live_hub.attach_supervisor(agent_manager.supervisor)
+
+
+@app.on_event("shutdown")
+async def stop_supervisor():
+    await agent_manager.shutdown()
+
+
+@app.websocket("/ws/status")
+async def status_websocket(websocket: WebSocket):
+    """ステータス差分の WebSocket 配信 (最初のフレームはスナップショット)"""
+    try:
+        connection = live_hub.connect()
+    except ValueError:
+        await websocket.close(code=1013)  # Try Again Later
+        return
+    await websocket.accept()
+
+    async def send(frame):
+        await websocket.send_text(frame.text)
+
+    async def wait_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    pump = asyncio.create_task(connection.pump(send))
+    receiver = asyncio.create_task(wait_disconnect())
+    try:
+        await asyncio.wait({pump, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        if not receiver.done():
+            # 送信タイムアウト (遅すぎるクライアント) は切断する
+            with contextlib.suppress(RuntimeError):
+                await websocket.close(code=1008)
+    finally:
+        pump.cancel()
+        receiver.cancel()
+        connection.close()
+
+
+@app.get("/api/status/stream")
+async def status_stream():
+    """ステータス差分の Server-Sent Events 配信"""
+    try:
+        connection = live_hub.connect()
+    except ValueError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        try:
+            async for frame in connection:
+                yield frame.sse if frame is not None else ": keepalive\n\n"
+        finally:
+            connection.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/api/status/live")
+async def live_stats():
+    """ライブ配信の接続数・フレーム統計"""
+    return live_hub.stats()
+
 @app.get("/api/agents/list")
 async def list_agents():
     return agent_manager.list_agents()
 
 @app.post("/api/agents/{agent_name}/start")
 async def start_agent(agent_name: str):
-    return agent_manager.start_agent(agent_name)
+    return await agent_manager.start_agent(agent_name)
 
 @app.post("/api/agents/{agent_name}/stop")
 async def stop_agent(agent_name: str):
-    return agent_manager.stop_agent(agent_name)
+    return await agent_manager.stop_agent(agent_name)
 
 # ============================================
 # ログ管理エンドポイント
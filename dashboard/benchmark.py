@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Dashboard API load test - drives the ASGI app in-process (no server, no network)
+
+Usage:
+    DASHBOARD_AGENTS_DIR=../agents python benchmark.py --requests 2000 --concurrency 50
+    DASHBOARD_AGENTS_DIR=../agents python benchmark.py --mode live --connections 5000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault("DASHBOARD_AGENTS_DIR", str(Path(__file__).resolve().parents[1] / "agents"))
+os.chdir(Path(__file__).resolve().parent)  # StaticFiles(directory="static") is cwd-relative
+
+from api import app, live_hub, response_cache  # noqa: E402
+
+
+async def asgi_request(app, method: str, path: str, headers=None):
+    """Minimal ASGI test client: one HTTP request, returns (status, headers, body)."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": query.encode(), "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    received = False
+    response = {"status": None, "headers": {}, "body": bytearray()}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode().lower(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], bytes(response["body"])
+
+
+async def asgi_websocket(app, path: str, on_text, stop: asyncio.Event, delay: float = 0.0):
+    """Minimal ASGI WebSocket client: delivers each text message to on_text until stop is set."""
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "scheme": "ws", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "subprotocols": [],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    connected = False
+
+    async def receive():
+        nonlocal connected
+        if not connected:
+            connected = True
+            return {"type": "websocket.connect"}
+        await stop.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def send(message):
+        if message["type"] == "websocket.send":
+            if delay:
+                await asyncio.sleep(delay)  # slow client: the server must not buffer for it
+            on_text(message["text"])
+
+    await app(scope, receive, send)
+
+
+async def run_live(args):
+    """N WebSocket dashboards; agent statuses churn while we measure fan-out latency."""
+    agent_ids = list(live_hub.state) or [f"agent-{i}" for i in range(2000)]
+    sent_at = {}
+    original_flush = live_hub.flush
+
+    def timed_flush():
+        frame = original_flush()
+        if frame is not None:
+            sent_at[frame.seq] = time.perf_counter()
+        return frame
+
+    live_hub.flush = timed_flush
+    latencies = []
+    received = {"snapshot": 0, "delta": 0, "slow": 0}
+    stop = asyncio.Event()
+
+    def on_fast(text):
+        if text.startswith('{"type":"delta"'):
+            seq = int(text.split(",", 2)[1].split(":")[1])
+            latencies.append(time.perf_counter() - sent_at[seq])
+            received["delta"] += 1
+        else:
+            received["snapshot"] += 1
+
+    def on_slow(text):
+        received["slow"] += 1
+
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    slow_count = int(args.connections * args.slow_fraction)
+    clients = [
+        asyncio.create_task(asgi_websocket(app, "/ws/status", on_slow if i < slow_count else on_fast,
+                                           stop, delay=0.5 if i < slow_count else 0.0))
+        for i in range(args.connections)
+    ]
+    while received["snapshot"] < args.connections - slow_count:
+        await asyncio.sleep(0.05)
+    per_connection = (tracemalloc.get_traced_memory()[0] - base) / args.connections
+    tracemalloc.stop()
+    print(f"{args.connections} connections ({slow_count} slow), "
+          f"{per_connection / 1024:.1f}KiB per connection incl. first snapshot send")
+
+    statuses = ["idle", "busy", "error", "restarting", "stopped"]
+    updates = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        for _ in range(args.updates_per_tick):
+            live_hub.update(random.choice(agent_ids), process_status=random.choice(statuses))
+            updates += 1
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(live_hub.frame_interval * 3)
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await asyncio.gather(*clients, return_exceptions=True)
+    latencies.sort()
+    stats = live_hub.stats()
+    print(f"  {updates} updates in {elapsed:.1f}s coalesced into {stats['frames_sent']} frames")
+    print(f"  delivered {received['delta']} delta frames to fast clients, "
+          f"{received['slow']} messages to slow clients")
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000
+        print(f"  fan-out latency p50 {p50:.1f}ms  p99 {p99:.1f}ms")
+
+
+async def run_scenario(name, path, headers, total, concurrency):
+    latencies = []
+    statuses = {}
+    sizes = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            status, _, body = await asgi_request(app, "GET", path, headers)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            sizes.append(len(body))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"  {name:<28} {total / elapsed:9.0f} req/s  p50 {p50:6.2f}ms  p99 {p99:6.2f}ms  "
+          f"{sizes[-1]:>7}B  {statuses}")
+
+
+async def main_async(args):
+    _, headers, _ = await asgi_request(app, "GET", "/api/agents")
+    etag = headers.get("etag", "")
+    print(f"{headers.get('x-total-count')} agents, ETag {etag}")
+
+    scenarios = [
+        ("full list", "/api/agents", {}),
+        ("full list gzip/br", "/api/agents", {"Accept-Encoding": "gzip, br"}),
+        ("page of 50", "/api/agents?limit=50", {}),
+        ("page 50 name only", "/api/agents?limit=50&fields=name", {}),
+        ("filter + sort desc", "/api/agents?q=monitor&sort=-name&limit=20", {}),
+        ("If-None-Match (304)", "/api/agents", {"If-None-Match": etag}),
+        ("single agent", "/api/agents/monitor-agent", {}),
+        ("stats", "/api/stats", {}),
+    ]
+    for name, path, headers in scenarios:
+        await run_scenario(name, path, headers, args.requests, args.concurrency)
+    print(f"cache: {response_cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard API load test")
+    parser.add_argument("--mode", choices=["http", "live"], default="http")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--updates-per-tick", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run_live(args) if args.mode == "live" else main_async(args))
+
+
+if __name__ == "__main__":
+    main()
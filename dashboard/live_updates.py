@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Live Updates - ダッシュボード向けステータス差分のプッシュ配信
+
+スーパーバイザー / EventBus / ディスカバリの変更をフレーム間隔ごとに
+1 つの差分フレームへまとめ (同じエージェントへの複数更新は最後の値に集約)、
+全接続で同じシリアライズ済みフレームを共有して配信します。
+
+接続ごとのキューは max_queue フレームまで。遅いクライアントが溢れた場合は
+キューを捨てて次回スナップショットを送り直すため、接続あたりのメモリは
+状態の大きさに依存せず一定です。
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+
+class Frame:
+    """シリアライズ済みのフレーム (全接続で共有)"""
+
+    __slots__ = ("seq", "kind", "text", "_sse")
+
+    def __init__(self, seq: int, kind: str, payload: Dict[str, Any]):
+        self.seq = seq
+        self.kind = kind
+        self.text = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+        self._sse: Optional[str] = None
+
+    @property
+    def sse(self) -> str:
+        """Server-Sent Events 形式"""
+        if self._sse is None:
+            self._sse = f"id: {self.seq}\nevent: {self.kind}\ndata: {self.text}\n\n"
+        return self._sse
+
+
+class LiveConnection:
+    """1 クライアント分の配信キュー"""
+
+    def __init__(self, hub: "LiveStatusHub"):
+        self.hub = hub
+        self.queue: Deque[Frame] = deque()
+        self.resync = True  # 最初のフレームはスナップショット
+        self.closed = False
+        self.dropped = 0
+        self.stalled = False
+        self.sending_since: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+        self._ready.set()
+
+    def offer(self, frame: Frame):
+        """差分フレームを積む (溢れたらスナップショット送り直しに切り替え)"""
+        if not self.resync:
+            if len(self.queue) >= self.hub.max_queue:
+                self.queue.clear()
+                self.resync = True
+                self.dropped += 1
+            else:
+                self.queue.append(frame)
+        self._ready.set()
+
+    async def next_frames(self, timeout: Optional[float] = None) -> List[Frame]:
+        """送信すべきフレームを待つ (timeout 経過時は空リスト)"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._ready.clear()
+        if self.resync:
+            self.resync = False
+            self.queue.clear()
+            return [self.hub.snapshot_frame()]
+        frames = list(self.queue)
+        self.queue.clear()
+        return frames
+
+    async def pump(self, send: Callable[[Frame], Awaitable[Any]]):
+        """send が完了するまで次を送らない (送信待ちの間はキューで合流)"""
+        self._task = asyncio.current_task()
+        try:
+            while not self.closed:
+                for frame in await self.next_frames():
+                    self.sending_since = time.monotonic()
+                    await send(frame)
+                    self.sending_since = None
+        except asyncio.CancelledError:
+            if not self.stalled:
+                raise
+            print("[LiveStatusHub] Connection dropped: send timed out")
+        except Exception as e:
+            # 送信失敗は切断として扱う
+            print(f"[LiveStatusHub] Connection dropped: {type(e).__name__}")
+        finally:
+            self.close()
+
+    def check_stalled(self, now: float) -> bool:
+        """send_timeout を超えて送信が終わらない接続を打ち切る"""
+        if self.sending_since is not None and now - self.sending_since > self.hub.send_timeout:
+            self.stalled = True
+            if self._task is not None:
+                self._task.cancel()
+            return True
+        return False
+
+    async def __aiter__(self):
+        while not self.closed:
+            frames = await self.next_frames(self.hub.keepalive)
+            if not frames:
+                yield None  # keepalive
+            for frame in frames:
+                yield frame
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub.disconnect(self)
+
+
+class LiveStatusHub:
+    """
+    ステータス差分のハブ
+
+    update()/remove() はどのスレッドからでも呼べます。差分は frame_interval
+    ごとにイベントループ上で 1 フレームにまとめられます。
+    """
+
+    def __init__(self, frame_interval: float = 0.1, max_queue: int = 16,
+                 send_timeout: float = 10.0, keepalive: float = 15.0,
+                 max_connections: int = 10000):
+        self.frame_interval = frame_interval
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.keepalive = keepalive
+        self.max_connections = max_connections
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self.connections: set = set()
+        self.seq = 0
+        self.frames_sent = 0
+        self._pending: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._snapshot: Optional[Frame] = None
+        self._lock = threading.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+
+    # ---- 変更の受け付け ----------------------------------------------------
+
+    def update(self, agent_id: str, **fields):
+        """エージェントのフィールドを更新 (値が変わったものだけ配信)"""
+        with self._lock:
+            current = self.state.get(agent_id)
+            if current is None:
+                current = self.state[agent_id] = {}
+            changed = {k: v for k, v in fields.items() if current.get(k, ...) != v}
+            if not changed:
+                return
+            current.update(changed)
+            delta = self._pending.get(agent_id)
+            if delta is None:
+                self._pending[agent_id] = dict(changed)
+            else:
+                delta.update(changed)
+
+    def remove(self, agent_id: str):
+        with self._lock:
+            if self.state.pop(agent_id, None) is not None:
+                self._pending[agent_id] = None
+
+    # ---- フレーム生成 --------------------------------------------------------
+
+    def snapshot_frame(self) -> Frame:
+        """現在の全状態 (seq ごとにキャッシュし、再同期する接続間で共有)"""
+        with self._lock:
+            if self._snapshot is None or self._snapshot.seq != self.seq:
+                self._snapshot = Frame(self.seq, "snapshot",
+                                       {"type": "snapshot", "seq": self.seq, "agents": self.state})
+            return self._snapshot
+
+    def flush(self) -> Optional[Frame]:
+        """保留中の差分を 1 フレームにして全接続へ配る"""
+        with self._lock:
+            if not self._pending:
+                return None
+            pending, self._pending = self._pending, {}
+            self.seq += 1
+            frame = Frame(self.seq, "delta", {
+                "type": "delta",
+                "seq": self.seq,
+                "agents": {k: v for k, v in pending.items() if v is not None},
+                "removed": [k for k, v in pending.items() if v is None],
+            })
+        for connection in list(self.connections):
+            connection.offer(frame)
+        self.frames_sent += 1
+        return frame
+
+    def reap_stalled(self) -> int:
+        """送信が send_timeout を超えた接続を切断 (送信ごとにタイマーを作らない)"""
+        now = time.monotonic()
+        return sum(1 for connection in list(self.connections) if connection.check_stalled(now))
+
+    async def _run_flusher(self):
+        while self.connections:
+            await asyncio.sleep(self.frame_interval)
+            self.flush()
+            self.reap_stalled()
+        self._flusher = None
+
+    # ---- 接続管理 ------------------------------------------------------------
+
+    def connect(self) -> LiveConnection:
+        """新しい接続を登録 (イベントループ上で呼ぶこと)"""
+        if len(self.connections) >= self.max_connections:
+            raise ValueError(f"Too many live connections ({self.max_connections})")
+        connection = LiveConnection(self)
+        self.connections.add(connection)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._run_flusher())
+        return connection
+
+    def disconnect(self, connection: LiveConnection):
+        self.connections.discard(connection)
+
+    # ---- ソースの接続 --------------------------------------------------------
+
+    def attach_supervisor(self, supervisor) -> "LiveStatusHub":
+        """GenericSupervisor のワーカー変更を購読"""
+        def on_change(worker_id: str, worker):
+            if worker is None:
+                self.update(worker_id, process_status="removed")
+                return
+            self.update(worker_id, process_status=worker.status,
+                        restart_count=worker.restart_count,
+                        last_error=worker.last_error,
+                        pid=(worker.metadata or {}).get("pid"))
+
+        for worker_id, worker in supervisor.workers.items():
+            on_change(worker_id, worker)
+        previous = supervisor.on_worker_change
+
+        def chained(worker_id, worker):
+            if previous:
+                previous(worker_id, worker)
+            on_change(worker_id, worker)
+
+        supervisor.on_worker_change = chained
+        return self
+
+    def attach_event_bus(self, bus) -> "LiveStatusHub":
+        """EventBus のエージェント開始/停止/エラーイベントを購読"""
+        from event_bus import EventType
+        statuses = {EventType.AGENT_START: "running", EventType.AGENT_STOP: "stopped",
+                    EventType.AGENT_ERROR: "error"}
+
+        def on_agent_event(event):
+            agent_id = (event.data or {}).get("agent") or event.source
+            self.update(agent_id, process_status=statuses[event.type],
+                        last_event_at=event.timestamp.isoformat())
+
+        for event_type in statuses:
+            bus.subscribe(event_type, on_agent_event)
+        return self
+
+    def attach_discovery(self, discovery) -> "LiveStatusHub":
+        """ディスカバリインデックスの追加/削除/ステータスを購読"""
+        def on_change(agent_ids):
+            for agent_id in agent_ids:
+                info = discovery.get_agent(agent_id)
+                if info is None:
+                    self.remove(agent_id)
+                else:
+                    self.update(agent_id, status=info.status)
+
+        on_change([info.id for info in discovery.get_all_agents()])
+        discovery.listeners.append(on_change)
+        return self
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.connections),
+            "agents": len(self.state),
+            "seq": self.seq,
+            "frames_sent": self.frames_sent,
+            "resyncs": sum(c.dropped for c in self.connections),
+            "timestamp": time.time(),
+        }
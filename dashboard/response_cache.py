@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Response Cache - ダッシュボード API 用のレスポンスキャッシュとクエリヘルパー
+
+カーソルページネーション、フィールド射影、フィルタ/ソート、
+TTL + ディスカバリ連動の無効化、ETag と gzip/brotli 圧縮を提供します。
+フレームワーク非依存なので FastAPI なしでテストできます。
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+MIN_COMPRESS_SIZE = 512  # 小さいボディは圧縮しても得にならない
+
+
+# ============================================
+# クエリ: フィルタ / ソート / カーソル / 射影
+# ============================================
+
+def encode_cursor(values: List[Any]) -> str:
+    """最終行のソートキーを不透明なカーソル文字列に変換"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """カーソル文字列をソートキーに戻す (不正な値は ValueError)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if (not isinstance(values, list) or len(values) != 2
+            or not all(isinstance(value, str) for value in values)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def project(item: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """指定フィールドだけを残す (fields が空なら全フィールド)"""
+    if not fields:
+        return item
+    return {name: item[name] for name in fields if name in item}
+
+
+def query_items(items: Iterable[Dict[str, Any]], filters: Optional[Dict[str, str]] = None,
+                text: Optional[str] = None, sort: str = "name", cursor: Optional[str] = None,
+                limit: Optional[int] = None, fields: Optional[List[str]] = None,
+                id_field: str = "name") -> Tuple[List[Dict[str, Any]], Optional[str], int]:
+    """
+    フィルタ・ソート・キーセットページネーション・射影を適用
+
+    Args:
+        items: 辞書のリスト
+        filters: フィールド完全一致フィルタ
+        text: 部分一致検索 (文字列フィールドのいずれか)
+        sort: ソートフィールド (先頭 "-" で降順)
+        cursor: 前ページの next_cursor
+        limit: ページサイズ (None なら全件)
+        fields: 返すフィールド
+        id_field: 同値ソート時のタイブレーカー
+
+    Returns:
+        (ページ, 次ページのカーソル, フィルタ後の総件数)
+    """
+    descending = sort.startswith("-")
+    sort_field = sort.lstrip("-")
+    needle = text.lower() if text else None
+
+    def matches(item):
+        if filters and any(str(item.get(k)) != v for k, v in filters.items()):
+            return False
+        if needle:
+            return any(isinstance(v, str) and needle in v.lower() for v in item.values())
+        return True
+
+    def sort_key(item):
+        value = item.get(sort_field)
+        return ("" if value is None else str(value), str(item.get(id_field)))
+
+    rows = sorted((item for item in items if matches(item)), key=sort_key)
+    keys = [sort_key(item) for item in rows]
+    total = len(rows)
+    size = total if limit is None else max(limit, 0)
+    position = tuple(decode_cursor(cursor)) if cursor else None
+
+    # キーセット方式: 挿入や削除があってもページ境界がずれない
+    if not descending:
+        start = bisect_right(keys, position) if position else 0
+        page = rows[start:start + size]
+        has_more = start + size < total
+    else:
+        end = bisect_left(keys, position) if position else total
+        page = rows[max(end - size, 0):end][::-1]
+        has_more = end - size > 0
+
+    next_cursor = encode_cursor(list(sort_key(page[-1]))) if page and has_more else None
+    return [project(item, fields) for item in page], next_cursor, total
+
+
+# ============================================
+# キャッシュ: ETag / 圧縮済みボディ / TTL
+# ============================================
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Accept-Encoding から使用する圧縮方式を選ぶ (br > gzip)"""
+    if not accept_encoding:
+        return None
+    offered = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        offered.add(name.strip().lower())
+    if BROTLI_AVAILABLE and ("br" in offered or "*" in offered):
+        return "br"
+    if "gzip" in offered or "*" in offered:
+        return "gzip"
+    return None
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match ヘッダーが ETag に一致するか (弱い比較)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+@dataclass
+class CachedResponse:
+    """JSON ボディと ETag、圧縮済みバリアントを保持"""
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    _encoded: Dict[str, bytes] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_payload(cls, payload: Any, headers: Optional[Dict[str, str]] = None) -> "CachedResponse":
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        return cls(body=body, etag=etag, headers=dict(headers or {}))
+
+    def encoded(self, encoding: Optional[str]) -> bytes:
+        """圧縮済みボディ (エンコーディングごとに一度だけ圧縮)"""
+        if encoding is None or len(self.body) < MIN_COMPRESS_SIZE:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(self.body, quality=5)
+            else:
+                data = gzip.compress(self.body, compresslevel=6, mtime=0)
+            self._encoded[encoding] = data
+        return data
+
+    def render(self, if_none_match: Optional[str] = None,
+               accept_encoding: Optional[str] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """条件付きリクエストと圧縮を解決して (status, headers, body) を返す"""
+        headers = {"ETag": self.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        headers.update(self.headers)
+        if etag_matches(if_none_match, self.etag):
+            return 304, headers, b""
+        encoding = negotiate_encoding(accept_encoding)
+        body = self.encoded(encoding)
+        if body is not self.body:
+            headers["Content-Encoding"] = encoding
+        return 200, headers, body
+
+
+class ResponseCache:
+    """
+    インプロセスのレスポンスキャッシュ
+
+    エントリはデータのバージョン (ディスカバリインデックスの version) と
+    TTL の両方で失効します。attach() でディスカバリの変更通知を受けると
+    即座に全エントリを破棄します。
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float, CachedResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str, version: Any = None) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: str, version: Any, payload: Any,
+            headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+        response = CachedResponse.from_payload(payload, headers)
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response
+
+    def get_or_build(self, key: str, version: Any, build) -> CachedResponse:
+        """キャッシュになければ build() -> (payload, headers) で作成"""
+        response = self.get(key, version)
+        if response is None:
+            payload, headers = build()
+            response = self.put(key, version, payload, headers)
+        return response
+
+    def invalidate(self, prefix: str = ""):
+        with self._lock:
+            if not prefix:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def attach(self, discovery) -> "ResponseCache":
+        """ディスカバリインデックスの変更で無効化する"""
+        discovery.listeners.append(lambda changed: self.invalidate())
+        return self
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
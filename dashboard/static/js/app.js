@@ -25,6 +25,7 @@ class Dashboard {
         this.renderSettings();
         this.setupEventListeners();
         this.startAutoRefresh();
+        this.connectLive();
     }
 
     async loadAgents() {
@@ -309,12 +310,65 @@ class Dashboard {
         document.getElementById('save-settings').addEventListener('click', () => this.saveSettings());
     }
 
+    // ライブ更新: ステータス差分を WebSocket で受信 (接続中はエージェント一覧のポーリングを止める)
+    connectLive() {
+        if (!('WebSocket' in window)) {
+            return;
+        }
+        const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${location.host}/ws/status`);
+        socket.onopen = () => {
+            this.liveConnected = true;
+            this.liveRetryDelay = 1000;
+        };
+        socket.onmessage = (message) => this.applyLiveFrame(JSON.parse(message.data));
+        socket.onclose = () => {
+            this.liveConnected = false;
+            const delay = this.liveRetryDelay || 1000;
+            this.liveRetryDelay = Math.min(delay * 2, 30000);
+            setTimeout(() => this.connectLive(), delay);
+        };
+    }
+
+    applyLiveFrame(frame) {
+        const byName = new Map(this.agents.map(agent => [agent.name, agent]));
+        if (frame.type === 'snapshot') {
+            this.liveState = {};
+        }
+        this.liveState = this.liveState || {};
+        for (const [name, fields] of Object.entries(frame.agents || {})) {
+            this.liveState[name] = Object.assign(this.liveState[name] || {}, fields);
+            const agent = byName.get(name);
+            if (agent) {
+                agent.status = this.liveStatus(this.liveState[name], agent.status);
+            }
+        }
+        const removed = new Set(frame.removed || []);
+        if (removed.size > 0) {
+            this.agents = this.agents.filter(agent => !removed.has(agent.name));
+        }
+        this.renderStats();
+        this.renderAgentCards();
+        if (this.selectedAgent && byName.has(this.selectedAgent.name)) {
+            this.selectAgent(byName.get(this.selectedAgent.name));
+        }
+    }
+
+    liveStatus(state, fallback) {
+        const processStatus = {
+            idle: 'active', busy: 'active', running: 'active', initializing: 'active',
+            error: 'error', terminated: 'error', restarting: 'error',
+            stopped: 'inactive', removed: 'inactive'
+        };
+        return processStatus[state.process_status] || fallback;
+    }
+
     startAutoRefresh() {
         const refreshInterval = (parseInt(this.settings.refresh_interval) || 30) * 1000;
 
         setInterval(async () => {
             await Promise.all([
-                this.loadAgents(),
+                this.liveConnected ? Promise.resolve() : this.loadAgents(),
                 this.loadLogs()
             ]);
             this.renderStats();
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Durable Log benchmark - append, group commit and replay throughput"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from durable_log import SegmentedLog
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "message_bus"))
+
+from message_bus import MessageBus  # noqa: E402
+
+
+def bench_append(directory: str, count: int, sync_every: int, payload_size: int):
+    payload = json.dumps({"agent": "bench-agent", "blob": "x" * payload_size}).encode()
+    log = SegmentedLog(directory, segment_bytes=16 * 1024 * 1024, sync_every=sync_every)
+    start = time.perf_counter()
+    for _ in range(count):
+        log.append(payload)
+    log.sync()
+    elapsed = time.perf_counter() - start
+    segments = len(log.segments)
+    log.close()
+    return count / elapsed, segments
+
+
+def bench_replay(directory: str):
+    log = SegmentedLog(directory)
+    start = time.perf_counter()
+    count = sum(1 for _ in log.read_from(0))
+    elapsed = time.perf_counter() - start
+    log.close()
+    return count / elapsed
+
+
+async def bench_bus(directory, count: int):
+    log = SegmentedLog(directory) if directory else None
+    bus = MessageBus(durable_log=log)
+    done = asyncio.Event()
+    received = 0
+
+    def handler(message):
+        nonlocal received
+        received += 1
+        if received == count:
+            done.set()
+
+    bus.subscribe("bench.durable", handler)
+    await bus.start()
+    start = time.perf_counter()
+    for i in range(count):
+        await bus.publish("bench.durable", {"n": i}, sender="benchmark")
+        if i % 1000 == 0:
+            await asyncio.sleep(0)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    await bus.stop()
+    if log:
+        log.close()
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Durable log throughput benchmark")
+    parser.add_argument("--count", type=int, default=500_000)
+    parser.add_argument("--payload", type=int, default=128)
+    parser.add_argument("--bus-count", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"SegmentedLog.append, {args.count} records of ~{args.payload + 30} bytes")
+    for sync_every in (1, 100, 1000, 10_000):
+        count = min(args.count, 5_000) if sync_every == 1 else args.count
+        with tempfile.TemporaryDirectory() as tmp:
+            rate, segments = bench_append(tmp, count, sync_every, args.payload)
+            if sync_every == 1000:
+                replay_rate = bench_replay(tmp)
+        print(f"  fsync every {sync_every:>6}: {rate:12.0f} msgs/s ({segments} segments)")
+    print(f"  replay:                {replay_rate:12.0f} msgs/s")
+
+    print(f"MessageBus publish+dispatch, {args.bus_count} messages")
+    memory_rate = asyncio.run(bench_bus(None, args.bus_count))
+    with tempfile.TemporaryDirectory() as tmp:
+        durable_rate = asyncio.run(bench_bus(tmp, args.bus_count))
+    print(f"  in-memory: {memory_rate:10.0f} msgs/s")
+    print(f"  durable:   {durable_rate:10.0f} msgs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Durable Log - Segmented append-only write-ahead log for the buses"""
+
+import json
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+# Record layout: <payload length:u32><crc32(payload):u32><payload>
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_SUFFIX = ".log"
+OFFSETS_FILE = "offsets.json"
+
+
+class Segment:
+    def __init__(self, path: Path, base_offset: int):
+        self.path = path
+        self.base_offset = base_offset
+        self.next_offset = base_offset
+        self.size = 0
+
+    @property
+    def last_offset(self) -> int:
+        return self.next_offset - 1
+
+
+class SegmentedLog:
+    """Append-only log split into fixed-size segment files.
+
+    Every record gets a monotonically increasing offset. fsync is batched:
+    appends only reach the disk once ``sync_every`` records are pending or
+    ``sync_interval`` seconds have passed since the last sync (group commit),
+    or when ``sync()`` is called explicitly. Consumers record progress with
+    ``commit_offset``; ``compact()`` deletes segments every consumer is done
+    with. Cursors compact the log whenever they commit.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 64 * 1024 * 1024,
+                 sync_every: int = 1000, sync_interval: float = 0.05):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.segments: List[Segment] = []
+        self.offsets: Dict[str, int] = {}
+        self.consumers: set = set()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._open()
+
+    # -- startup / recovery -------------------------------------------------
+
+    def _open(self):
+        offsets_path = self.directory / OFFSETS_FILE
+        if offsets_path.exists():
+            with open(offsets_path, "r") as f:
+                self.offsets = {k: int(v) for k, v in json.load(f).items()}
+
+        for path in sorted(self.directory.glob(f"*{SEGMENT_SUFFIX}")):
+            self.segments.append(Segment(path, int(path.stem)))
+
+        if not self.segments:
+            self._roll(0)
+            return
+
+        for segment in self.segments[:-1]:
+            segment.size = segment.path.stat().st_size
+            segment.next_offset = segment.base_offset + sum(1 for _ in self._scan(segment))
+        tail = self.segments[-1]
+        valid_bytes = 0
+        for _, end in self._scan(tail, with_position=True):
+            tail.next_offset += 1
+            valid_bytes = end
+        # Drop a torn record left behind by a crash mid-write.
+        if tail.path.stat().st_size != valid_bytes:
+            os.truncate(tail.path, valid_bytes)
+        tail.size = valid_bytes
+        self._file = open(tail.path, "ab")
+
+    def _scan(self, segment: Segment, with_position: bool = False) -> Iterator:
+        with open(segment.path, "rb") as f:
+            data = f.read()
+        pos = 0
+        header_size = RECORD_HEADER.size
+        while pos + header_size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, pos)
+            start = pos + header_size
+            end = start + length
+            if end > len(data):
+                break
+            payload = data[start:end]
+            if zlib.crc32(payload) != crc:
+                break
+            pos = end
+            yield (payload, end) if with_position else payload
+
+    def _roll(self, base_offset: int):
+        if self._file is not None:
+            self._sync_file()
+            self._file.close()
+        path = self.directory / f"{base_offset:020d}{SEGMENT_SUFFIX}"
+        self.segments.append(Segment(path, base_offset))
+        self._file = open(path, "ab")
+
+    # -- writes -------------------------------------------------------------
+
+    @property
+    def next_offset(self) -> int:
+        return self.segments[-1].next_offset
+
+    def append(self, payload: bytes) -> int:
+        tail = self.segments[-1]
+        if tail.size >= self.segment_bytes:
+            self._roll(tail.next_offset)
+            tail = self.segments[-1]
+
+        self._file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        offset = tail.next_offset
+        tail.next_offset += 1
+        tail.size += RECORD_HEADER.size + len(payload)
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or \
+                time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        return offset
+
+    def append_batch(self, payloads: List[bytes]) -> List[int]:
+        return [self.append(payload) for payload in payloads]
+
+    @property
+    def unsynced(self) -> int:
+        return self._unsynced
+
+    def sync(self):
+        if self._unsynced:
+            self._sync_file()
+        self._last_sync = time.monotonic()
+
+    def _sync_file(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if self._file is not None:
+            self._sync_file()
+            self._file.close()
+            self._file = None
+
+    # -- reads / consumer offsets --------------------------------------------
+
+    def read_from(self, offset: int) -> Iterator[Tuple[int, bytes]]:
+        """Yield ``(offset, payload)`` for every record at or after ``offset``."""
+        if self._file is not None:
+            self._file.flush()
+        # Snapshot: cursors may compact away finished segments mid-replay.
+        for segment in list(self.segments):
+            if segment.last_offset < offset:
+                continue
+            for i, payload in enumerate(self._scan(segment)):
+                record_offset = segment.base_offset + i
+                if record_offset >= offset:
+                    yield record_offset, payload
+
+    def committed(self, consumer: str) -> int:
+        """Offset of the next record ``consumer`` still has to process."""
+        return self.offsets.get(consumer, self.segments[0].base_offset)
+
+    def commit_offset(self, consumer: str, next_offset: int):
+        self.offsets[consumer] = next_offset
+        self._save_offsets()
+
+    def drop_consumer(self, name: str) -> int:
+        """Forget a consumer that will not come back and compact without it.
+
+        Its persisted offset would otherwise hold every later segment forever.
+        Returns the number of segments removed.
+        """
+        self.consumers.discard(name)
+        if self.offsets.pop(name, None) is not None:
+            self._save_offsets()
+        return self.compact()
+
+    def _save_offsets(self):
+        tmp_path = self.directory / f"{OFFSETS_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.offsets, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.directory / OFFSETS_FILE)
+
+    def consumer(self, name: str, commit_every: int = 1000) -> "ConsumerCursor":
+        self.consumers.add(name)
+        return ConsumerCursor(self, name, commit_every)
+
+    def compact(self) -> int:
+        """Delete whole segments below every consumer's committed offset.
+
+        Consumers registered through ``consumer()`` that have not committed
+        yet still hold the log at its first segment, and so does every
+        persisted offset until ``drop_consumer()`` removes it.
+        """
+        names = self.consumers | set(self.offsets)
+        if not names:
+            return 0
+        low_watermark = min(self.committed(name) for name in names)
+        removed = 0
+        while len(self.segments) > 1 and self.segments[0].last_offset < low_watermark:
+            self.segments.pop(0).path.unlink()
+            removed += 1
+        return removed
+
+
+class ConsumerCursor:
+    """Per-consumer progress over a ``SegmentedLog``.
+
+    Records can finish out of order (priority lanes, parallel consumers), so
+    the committed offset is the first one still outstanding. It is persisted
+    every ``commit_every`` completions and on ``commit()``.
+    """
+
+    def __init__(self, log: SegmentedLog, name: str, commit_every: int = 1000):
+        self.log = log
+        self.name = name
+        self.commit_every = commit_every
+        self.start = log.committed(name)
+        self.low_watermark = self.start
+        self._done: set = set()
+        self._since_commit = 0
+
+    def replay(self) -> Iterator[Tuple[int, bytes]]:
+        return self.log.read_from(self.start)
+
+    def done(self, offset: int):
+        self._done.add(offset)
+        while self.low_watermark in self._done:
+            self._done.remove(self.low_watermark)
+            self.low_watermark += 1
+        self._since_commit += 1
+        if self._since_commit >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self._since_commit = 0
+        if self.log.offsets.get(self.name) != self.low_watermark:
+            self.log.commit_offset(self.name, self.low_watermark)
+            self.log.compact()
+
+
+def main():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = SegmentedLog(tmp, segment_bytes=1024)
+        for i in range(100):
+            log.append(json.dumps({"n": i}).encode())
+        log.commit_offset("demo", 80)
+        print(f"Segments: {len(log.segments)}, compacted: {log.compact()}")
+        log.close()
+
+        reopened = SegmentedLog(tmp)
+        replay = list(reopened.read_from(reopened.committed("demo")))
+        print(f"Replayed {len(replay)} records starting at offset {replay[0][0]}")
+        reopened.close()
+
+
+if __name__ == "__main__":
+    main()
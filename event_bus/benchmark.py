@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Event Bus benchmark - sequential vs high-throughput publish latency"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+from event_bus import Event, EventBus, EventType
+
+
+def make_event(event_type: EventType = EventType.DATA_UPDATE) -> Event:
+    return Event(
+        id=str(uuid.uuid4()),
+        type=event_type,
+        source="benchmark",
+        timestamp=datetime.now(),
+        data={"agent": "bench-agent", "status": "running"}
+    )
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def bench_publish(high_throughput: bool, subscribers: int, events: int,
+                        handler_delay: float):
+    bus = EventBus(high_throughput=high_throughput)
+
+    for i in range(subscribers):
+        if i % 2 == 0:
+            async def async_handler(event, _delay=handler_delay):
+                await asyncio.sleep(_delay)
+            async_handler.__name__ = f"async_handler_{i}"
+            bus.subscribe(EventType.DATA_UPDATE, async_handler)
+        else:
+            def sync_handler(event, _delay=handler_delay):
+                time.sleep(_delay)
+            sync_handler.__name__ = f"sync_handler_{i}"
+            bus.subscribe(EventType.DATA_UPDATE, sync_handler)
+
+    latencies = []
+    for _ in range(events):
+        start = time.perf_counter()
+        await bus.publish(make_event())
+        latencies.append((time.perf_counter() - start) * 1000)
+    bus.close()
+    return latencies
+
+
+def bench_history(high_throughput: bool, history: int, queries: int):
+    bus = EventBus(high_throughput=high_throughput, max_history=history)
+    types = list(EventType)
+
+    async def fill():
+        for i in range(history * 2):
+            await bus.publish(make_event(types[i % len(types)]))
+
+    asyncio.run(fill())
+    start = time.perf_counter()
+    for _ in range(queries):
+        bus.get_history(EventType.AGENT_ERROR, limit=10)
+    return (time.perf_counter() - start) / queries * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EventBus publish-latency benchmark")
+    parser.add_argument("--subscribers", type=int, default=20)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--handler-delay", type=float, default=0.002)
+    parser.add_argument("--history", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"Publish latency ({args.subscribers} subscribers, "
+          f"{args.handler_delay * 1000:.1f}ms handlers, {args.events} events)")
+    for high_throughput in (False, True):
+        mode = "high-throughput" if high_throughput else "sequential"
+        latencies = asyncio.run(bench_publish(high_throughput, args.subscribers,
+                                              args.events, args.handler_delay))
+        print(f"  {mode:<16} p50={statistics.median(latencies):8.2f}ms "
+              f"p99={percentile(latencies, 99):8.2f}ms")
+
+    print(f"get_history(event_type, limit=10) over {args.history} events")
+    for high_throughput in (False, True):
+        mode = "high-throughput" if high_throughput else "sequential"
+        per_query = bench_history(high_throughput, args.history, args.queries)
+        print(f"  {mode:<16} {per_query:10.1f}us/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,11 @@
 
 import asyncio
 import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Callable, Dict, List, Optional, Any
+from itertools import islice
+from typing import Callable, Deque, Dict, List, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
 
@@ -35,11 +38,49 @@ class Event:
             "data": self.data
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Event":
+        return cls(
+            id=data["id"],
+            type=EventType(data["type"]),
+            source=data["source"],
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            data=data["data"]
+        )
+
 class EventBus:
-    def __init__(self):
+    """Pub/Sub event bus.
+
+    The default mode awaits subscribers one after another. With
+    ``high_throughput=True`` history is kept in fixed-capacity ring buffers
+    per event type and handlers are fanned out concurrently, each bounded by
+    ``handler_timeout``; sync handlers run on a thread pool so they cannot
+    block the event loop.
+
+    With a ``durable_log`` each event is appended before dispatch and
+    ``replay()`` re-delivers events whose handlers never completed.
+    """
+
+    def __init__(self, high_throughput: bool = False, max_history: int = 1000,
+                 handler_timeout: Optional[float] = 5.0, max_workers: int = 8,
+                 durable_log=None, consumer_name: str = "event_bus"):
         self.subscribers: Dict[str, List[Callable]] = {}
-        self.event_history: List[Event] = []
-        self.max_history = 1000
+        self.max_history = max_history
+        self.high_throughput = high_throughput
+        self.handler_timeout = handler_timeout
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._history_by_type: Dict[str, Deque[Event]] = {}
+        if high_throughput:
+            self.event_history: Deque[Event] = deque(maxlen=max_history)
+        else:
+            self.event_history: List[Event] = []
+        self.durable_log = durable_log
+        self._cursor = durable_log.consumer(consumer_name) if durable_log else None
+        # Only records logged by an earlier run are replayed; later ones are
+        # delivered by publish() itself.
+        self._replay_end = durable_log.next_offset if durable_log else 0
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
 
     def subscribe(self, event_type: EventType, handler: Callable):
         type_key = event_type.value
@@ -54,6 +95,47 @@ class EventBus:
             self.subscribers[type_key].remove(handler)
 
     async def publish(self, event: Event):
+        offset = None
+        if self.durable_log is not None:
+            offset = self.durable_log.append(json.dumps(event.to_dict()).encode())
+            self._schedule_sync()
+        await self._deliver(event, offset)
+
+    async def replay(self) -> int:
+        """Re-deliver events logged but not fully handled before a restart."""
+        if self._cursor is None:
+            return 0
+        replayed = 0
+        for offset, record in self._cursor.replay():
+            if offset >= self._replay_end:
+                break
+            await self._deliver(Event.from_dict(json.loads(record)), offset)
+            replayed += 1
+        return replayed
+
+    async def _deliver(self, event: Event, offset: Optional[int]):
+        try:
+            if self.high_throughput:
+                await self._publish_concurrent(event)
+            else:
+                await self._publish_sequential(event)
+        except asyncio.CancelledError:
+            offset = None  # interrupted: leave it for replay
+            raise
+        finally:
+            if offset is not None:
+                self._cursor.done(offset)
+
+    def _schedule_sync(self):
+        if self._sync_handle is None and self.durable_log.unsynced:
+            loop = asyncio.get_running_loop()
+            self._sync_handle = loop.call_later(self.durable_log.sync_interval, self._sync_log)
+
+    def _sync_log(self):
+        self._sync_handle = None
+        self.durable_log.sync()
+
+    async def _publish_sequential(self, event: Event):
         self.event_history.append(event)
         if len(self.event_history) > self.max_history:
             self.event_history = self.event_history[-self.max_history:]
@@ -69,7 +151,57 @@ class EventBus:
                 except Exception as e:
                     print(f"[EventBus] Error in handler {handler.__name__}: {e}")
 
+    async def _publish_concurrent(self, event: Event):
+        type_key = event.type.value
+        self.event_history.append(event)
+        ring = self._history_by_type.get(type_key)
+        if ring is None:
+            ring = self._history_by_type[type_key] = deque(maxlen=self.max_history)
+        ring.append(event)
+
+        handlers = self.subscribers.get(type_key)
+        if not handlers:
+            return
+        # Snapshot so handlers may (un)subscribe while we fan out.
+        await asyncio.gather(*[self._run_handler(h, event) for h in list(handlers)])
+
+    async def _run_handler(self, handler: Callable, event: Event):
+        try:
+            if asyncio.iscoroutinefunction(handler):
+                call = handler(event)
+            else:
+                loop = asyncio.get_running_loop()
+                call = loop.run_in_executor(self._get_executor(), handler, event)
+            await asyncio.wait_for(call, timeout=self.handler_timeout)
+        except asyncio.TimeoutError:
+            print(f"[EventBus] Handler {handler.__name__} timed out after {self.handler_timeout}s")
+        except Exception as e:
+            print(f"[EventBus] Error in handler {handler.__name__}: {e}")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="eventbus")
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._cursor is not None:
+            if self._sync_handle is not None:
+                self._sync_handle.cancel()
+            self._sync_log()
+            self._cursor.commit()
+
     def get_history(self, event_type: Optional[EventType] = None, limit: int = 100) -> List[Event]:
+        if self.high_throughput:
+            ring = self.event_history if event_type is None \
+                else self._history_by_type.get(event_type.value, ())
+            latest = list(islice(reversed(ring), limit))
+            latest.reverse()
+            return latest
+
         if event_type:
             filtered = [e for e in self.event_history if e.type == event_type]
             return filtered[-limit:]
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Event Logger benchmark - write throughput and stats/range query cost as the log grows"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from event_logger import EventLogger
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS event_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        source TEXT NOT NULL,
+        target TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_timestamp ON event_logs(timestamp);
+    CREATE INDEX IF NOT EXISTS idx_event_type ON event_logs(event_type);
+'''
+
+
+def legacy_log(db_path: str, event_type: str, source: str, data: dict) -> int:
+    """The original EventLogger.log: connect, insert one row, commit, close."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO event_logs (timestamp, event_type, source, target, data)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (datetime.now().isoformat(), event_type, source, None, json.dumps(data)))
+    event_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return event_id
+
+
+def legacy_stats(conn: sqlite3.Connection):
+    """The original get_stats: full COUNT(*) and GROUP BY over every row."""
+    total = conn.execute('SELECT COUNT(*) FROM event_logs').fetchone()[0]
+    by_type = dict(conn.execute(
+        'SELECT event_type, COUNT(*) FROM event_logs GROUP BY event_type').fetchall())
+    return total, by_type
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_write(args):
+    payload = {"message": "benchmark", "value": 42}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "legacy.db")
+        conn = sqlite3.connect(db_path)
+        conn.executescript(LEGACY_SCHEMA)
+        conn.close()
+        start = time.perf_counter()
+        for i in range(args.legacy_events):
+            legacy_log(db_path, "bench", "legacy", payload)
+        elapsed = time.perf_counter() - start
+        print(f"  per-call connection: {args.legacy_events / elapsed:10,.0f} events/s")
+
+        for batch_size in args.batch_size:
+            logger = EventLogger(os.path.join(tmp, f"buffered-{batch_size}.db"),
+                                 batch_size=batch_size)
+            start = time.perf_counter()
+            for i in range(args.events):
+                logger.log("bench", "buffered", payload)
+            logger.close()
+            elapsed = time.perf_counter() - start
+            print(f"  buffered batch={batch_size:<6} {args.events / elapsed:10,.0f} events/s "
+                  f"(including final flush)")
+
+
+def bench_query(args):
+    """Stats and last-hour range query cost at growing log sizes."""
+    rng = random.Random(1)
+    types = [f"type{i}" for i in range(20)]
+    sources = [f"agent{i}" for i in range(50)]
+    now = datetime.now()
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = sqlite3.connect(os.path.join(tmp, "legacy.db"))
+        legacy.executescript(LEGACY_SCHEMA)
+        logger = EventLogger(os.path.join(tmp, "partitioned.db"), batch_size=50_000,
+                             background=False)
+        size = 0
+        for target in args.sizes:
+            rows = []
+            for i in range(size, target):
+                # Spread events over `days`, oldest first
+                ts = now - timedelta(seconds=(target - i) * args.days * 86400 / target)
+                event_type, source = rng.choice(types), rng.choice(sources)
+                rows.append((ts.isoformat(), event_type, source, None, "{}"))
+                logger.log(event_type, source, {}, timestamp=ts)
+            with legacy:
+                legacy.executemany('INSERT INTO event_logs (timestamp, event_type, source, target, data) '
+                                   'VALUES (?, ?, ?, ?, ?)', rows)
+            logger.flush()
+            size = target
+
+            hour_ago = now - timedelta(hours=1)
+            legacy_range = timed(lambda: legacy.execute(
+                'SELECT * FROM event_logs WHERE timestamp >= ? AND event_type = ? '
+                'ORDER BY timestamp DESC LIMIT 100', (hour_ago.isoformat(), "type3")).fetchall())
+            partition_range = timed(lambda: logger.get_range(hour_ago, event_type="type3", limit=100))
+            rollup = timed(lambda: logger.get_rollup("hour", start=now - timedelta(days=1),
+                                                     event_type="type3", source="agent7"))
+            print(f"{size:>11,} events:"
+                  f"  stats legacy {timed(lambda: legacy_stats(legacy)):8.2f}ms"
+                  f" / rollups {timed(logger.get_stats):6.2f}ms"
+                  f" | last-hour by type legacy {legacy_range:6.2f}ms"
+                  f" / partitions {partition_range:6.2f}ms"
+                  f" | 24h hourly rollup {rollup:6.2f}ms")
+        logger.close()
+        legacy.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EventLogger benchmark")
+    parser.add_argument("--mode", choices=["write", "query"], default="write")
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--legacy-events", type=int, default=2_000,
+                        help="events to time with the per-call connection")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 500_000, 2_000_000])
+    parser.add_argument("--days", type=int, default=30, help="days the query dataset spans")
+    args = parser.parse_args()
+
+    if args.mode == "query":
+        bench_query(args)
+    else:
+        bench_write(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,19 @@
 # -*- coding: utf-8 -*-
 """Event Logger - Event history system"""
 
+import atexit
 import json
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 
+DAY_MS = 86_400_000
+BUCKET_MS = {"minute": 60_000, "hour": 3_600_000, "day": DAY_MS}
+
 @dataclass
 class EventLog:
     id: int
@@ -27,93 +34,394 @@ class EventLog:
             "data": self.data
         }
 
+def _to_ms(ts: datetime) -> int:
+    return int(ts.timestamp() * 1000)
+
+def _from_ms(ts_ms: int) -> datetime:
+    return datetime.fromtimestamp(ts_ms / 1000)
+
+def _partition_name(day: int) -> str:
+    """Table for UTC day number ``day`` (epoch ms // DAY_MS)."""
+    date = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(days=day)
+    return f"event_logs_{date:%Y%m%d}"
+
 class EventLogger:
-    def __init__(self, db_path="/workspace/event_logger/event_log.db"):
+    """Buffered, time-partitioned event log.
+
+    ``log`` only appends to an in-memory buffer; a background thread writes
+    the buffer to a long-lived WAL-mode connection in ``executemany``
+    transactions once ``batch_size`` rows are pending or ``flush_interval``
+    seconds have passed. Reads flush first, and ``close`` (also run at exit)
+    flushes whatever is left. Event ids are assigned in-process, so a
+    database should have a single writing EventLogger.
+
+    Events live in one table per UTC day (``event_logs_YYYYMMDD``) with
+    epoch-ms timestamps, listed in ``event_partitions``. Each flush also
+    bumps per-minute/hour/day counts in ``event_rollups`` and running totals
+    in ``event_totals``, so stats and rollup queries never scan raw events.
+    Retention drops whole partitions along with their minute/hour rollups;
+    day rollups are kept as long-term history.
+    """
+
+    def __init__(self, db_path="/workspace/event_logger/event_log.db",
+                 batch_size: int = 1000, flush_interval: float = 0.2,
+                 background: bool = True, retention_days: Optional[int] = None):
         self.db_path = db_path
-        self._init_db()
-
-    def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS event_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self.retention_days = retention_days
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.RLock()
+        self._buffer_lock = threading.Lock()
+        # Held from taking the buffer until the rows are committed, so a
+        # reader's flush() waits for a write the writer thread has in progress
+        self._flush_lock = threading.Lock()
+        self._buffer: List[tuple] = []
+        self._next_id = 0
+        self._partitions: Dict[int, str] = {}
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer: Optional[threading.Thread] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use so importing the module has no side effects
+        if self._conn is None:
+            with self._db_lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute('PRAGMA synchronous=NORMAL')
+                    self._init_db(conn)
+                    self._partitions = dict(conn.execute(
+                        'SELECT day, table_name FROM event_partitions'))
+                    self._next_id = conn.execute(
+                        'SELECT COALESCE(MAX(max_id), 0) FROM event_partitions').fetchone()[0] + 1
+                    self._conn = conn
+                    self._migrate_legacy(conn)
+                    atexit.register(self.close)
+        return self._conn
+
+    def _init_db(self, conn: sqlite3.Connection):
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS event_partitions (
+                day INTEGER PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                min_ts INTEGER NOT NULL,
+                max_ts INTEGER NOT NULL,
+                max_id INTEGER NOT NULL,
+                row_count INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS event_rollups (
+                bucket TEXT NOT NULL,
+                bucket_start INTEGER NOT NULL,
                 event_type TEXT NOT NULL,
                 source TEXT NOT NULL,
-                target TEXT,
-                data TEXT NOT NULL
-            )
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_timestamp
-            ON event_logs(timestamp)
-        ''')
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_event_type
-            ON event_logs(event_type)
+                count INTEGER NOT NULL,
+                PRIMARY KEY (bucket, bucket_start, event_type, source)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS event_totals (
+                event_type TEXT NOT NULL,
+                source TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (event_type, source)
+            ) WITHOUT ROWID;
         ''')
         conn.commit()
-        conn.close()
+
+    def _migrate_legacy(self, conn: sqlite3.Connection):
+        """Move rows from the old single ``event_logs`` table into partitions."""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_logs'").fetchone()
+        if not exists:
+            return
+        cursor = conn.execute(
+            'SELECT id, timestamp, event_type, source, target, data FROM event_logs ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(10_000)
+            if not rows:
+                break
+            rows = [(r[0], _to_ms(datetime.fromisoformat(r[1])), *r[2:]) for r in rows]
+            self._next_id = max(self._next_id, rows[-1][0] + 1)
+            self._write(rows)
+        with conn:
+            conn.execute('DROP TABLE event_logs')
+
+    def _partition(self, conn: sqlite3.Connection, day: int) -> str:
+        table = self._partitions.get(day)
+        if table is None:
+            table = _partition_name(day)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    ts INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    target TEXT,
+                    data TEXT NOT NULL
+                )
+            ''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table}(ts)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_type_ts ON {table}(event_type, ts)')
+            self._partitions[day] = table
+        return table
+
+    def _start_writer(self):
+        if self.background and self._writer is None and not self._closed:
+            self._writer = threading.Thread(target=self._writer_loop,
+                                            name="event-logger-writer", daemon=True)
+            self._writer.start()
+
+    def _writer_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # The rows are back in the buffer; retry on the next wakeup
+                print(f"[EventLogger] Flush failed, will retry: {e}")
 
     def log(self, event_type: str, source: str, data: Dict[str, Any],
-            target: Optional[str] = None) -> int:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO event_logs (timestamp, event_type, source, target, data)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            event_type,
-            source,
-            target,
-            json.dumps(data, ensure_ascii=False)
-        ))
-        event_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            target: Optional[str] = None, timestamp: Optional[datetime] = None) -> int:
+        if self._closed:
+            raise ValueError("EventLogger is closed")
+        self._connect()
+        self._start_writer()
+        ts = _to_ms(timestamp) if timestamp else int(time.time() * 1000)
+        with self._buffer_lock:
+            event_id = self._next_id
+            self._next_id += 1
+            self._buffer.append((
+                event_id,
+                ts,
+                event_type,
+                source,
+                target,
+                json.dumps(data, ensure_ascii=False)
+            ))
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            if self.background:
+                self._wakeup.set()
+            else:
+                self.flush()
         return event_id
 
+    def flush(self) -> int:
+        """Write all buffered events in one transaction, returns rows written.
+
+        If the write fails the rows go back to the front of the buffer.
+        """
+        with self._flush_lock:
+            with self._buffer_lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            try:
+                self._connect()
+                self._write(rows)
+            except Exception:
+                with self._buffer_lock:
+                    self._buffer[:0] = rows
+                raise
+            return len(rows)
+
+    def _write(self, rows: List[tuple]):
+        by_day: Dict[int, List[tuple]] = defaultdict(list)
+        rollups: Counter = Counter()
+        totals: Counter = Counter()
+        for row in rows:
+            ts, event_type, source = row[1], row[2], row[3]
+            by_day[ts // DAY_MS].append(row)
+            for bucket, size in BUCKET_MS.items():
+                rollups[(bucket, ts - ts % size, event_type, source)] += 1
+            totals[(event_type, source)] += 1
+
+        conn = self._conn
+        new_days = [day for day in by_day if day not in self._partitions]
+        with self._db_lock:
+            try:
+                self._insert(conn, by_day, rollups, totals)
+            except Exception:
+                for day in new_days:
+                    self._partitions.pop(day, None)
+                raise
+        if new_days and self.retention_days is not None:
+            try:
+                self.apply_retention()
+            except sqlite3.Error as e:
+                # The rows are committed; retention runs again with the next new partition
+                print(f"[EventLogger] Retention failed: {e}")
+
+    def _insert(self, conn: sqlite3.Connection, by_day: Dict[int, List[tuple]],
+                rollups: Counter, totals: Counter):
+        with conn:
+            for day, day_rows in by_day.items():
+                table = self._partition(conn, day)
+                conn.executemany(f'''
+                    INSERT INTO {table} (id, ts, event_type, source, target, data)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', day_rows)
+                conn.execute('''
+                    INSERT INTO event_partitions (day, table_name, min_ts, max_ts, max_id, row_count)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(day) DO UPDATE SET
+                        min_ts = MIN(min_ts, excluded.min_ts),
+                        max_ts = MAX(max_ts, excluded.max_ts),
+                        max_id = MAX(max_id, excluded.max_id),
+                        row_count = row_count + excluded.row_count
+                ''', (day, table, min(r[1] for r in day_rows), max(r[1] for r in day_rows),
+                      max(r[0] for r in day_rows), len(day_rows)))
+            conn.executemany('''
+                INSERT INTO event_rollups (bucket, bucket_start, event_type, source, count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(bucket, bucket_start, event_type, source)
+                DO UPDATE SET count = count + excluded.count
+            ''', [(*key, count) for key, count in rollups.items()])
+            conn.executemany('''
+                INSERT INTO event_totals (event_type, source, count) VALUES (?, ?, ?)
+                ON CONFLICT(event_type, source) DO UPDATE SET count = count + excluded.count
+            ''', [(*key, count) for key, count in totals.items()])
+
+    def apply_retention(self, days: Optional[int] = None) -> List[str]:
+        """Drop partitions older than ``days`` (default: retention_days), returns dropped tables."""
+        days = self.retention_days if days is None else days
+        if days is None:
+            return []
+        conn = self._connect()
+        cutoff_day = int(time.time() * 1000) // DAY_MS - days
+        dropped = []
+        with self._db_lock:
+            with conn:
+                for day in sorted(d for d in self._partitions if d < cutoff_day):
+                    start, end = day * DAY_MS, (day + 1) * DAY_MS
+                    # Events leaving the log no longer count towards the totals
+                    for event_type, source, count in conn.execute('''
+                        SELECT event_type, source, count FROM event_rollups
+                        WHERE bucket = 'day' AND bucket_start = ?
+                    ''', (start,)).fetchall():
+                        conn.execute('''
+                            UPDATE event_totals SET count = count - ?
+                            WHERE event_type = ? AND source = ?
+                        ''', (count, event_type, source))
+                    conn.execute("DELETE FROM event_totals WHERE count <= 0")
+                    conn.execute('''
+                        DELETE FROM event_rollups
+                        WHERE bucket IN ('minute', 'hour') AND bucket_start >= ? AND bucket_start < ?
+                    ''', (start, end))
+                    table = self._partitions.pop(day)
+                    conn.execute(f'DROP TABLE IF EXISTS {table}')
+                    conn.execute('DELETE FROM event_partitions WHERE day = ?', (day,))
+                    dropped.append(table)
+        return dropped
+
+    def close(self):
+        """Stop the writer thread and flush everything still buffered."""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._writer is not None:
+            self._writer.join()
+        if self._conn is not None:
+            self.flush()
+            with self._db_lock:
+                self._conn.close()
+            self._conn = None
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        self.flush()
+        conn = self._connect()
+        with self._db_lock:
+            return conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _to_event(row: tuple) -> EventLog:
+        return EventLog(
+            id=row[0],
+            timestamp=_from_ms(row[1]),
+            event_type=row[2],
+            source=row[3],
+            target=row[4],
+            data=json.loads(row[5])
+        )
+
     def get_recent(self, limit: int = 100) -> List[EventLog]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, timestamp, event_type, source, target, data
-            FROM event_logs
-            ORDER BY timestamp DESC
-            LIMIT ?
-        ''', (limit,))
-        rows = cursor.fetchall()
-        conn.close()
+        return self.get_range(limit=limit)
+
+    def get_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  event_type: Optional[str] = None, limit: Optional[int] = 1000) -> List[EventLog]:
+        """Events with start <= timestamp < end, newest first.
+
+        Only partitions overlapping the range are read, each through its
+        ``ts`` or ``(event_type, ts)`` index.
+        """
+        self.flush()
+        start_ms = _to_ms(start) if start else 0
+        end_ms = _to_ms(end) if end else 2 ** 62
+        conn = self._connect()
+        events = []
+        with self._db_lock:
+            partitions = conn.execute('''
+                SELECT table_name FROM event_partitions
+                WHERE max_ts >= ? AND min_ts < ?
+                ORDER BY day DESC
+            ''', (start_ms, end_ms)).fetchall()
+            for (table,) in partitions:
+                remaining = -1 if limit is None else limit - len(events)
+                sql = f'''
+                    SELECT id, ts, event_type, source, target, data FROM {table}
+                    WHERE ts >= ? AND ts < ? {"AND event_type = ?" if event_type else ""}
+                    ORDER BY ts DESC, id DESC LIMIT ?
+                '''
+                params = (start_ms, end_ms) + ((event_type,) if event_type else ()) + (remaining,)
+                events.extend(self._to_event(row) for row in conn.execute(sql, params))
+                if limit is not None and len(events) >= limit:
+                    break
+        return events
+
+    def get_rollup(self, bucket: str = "hour", start: Optional[datetime] = None,
+                   end: Optional[datetime] = None, event_type: Optional[str] = None,
+                   source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Event counts per bucket ("minute", "hour" or "day"), oldest first."""
+        if bucket not in BUCKET_MS:
+            raise ValueError(f"Unknown bucket: {bucket}")
+        sql = '''
+            SELECT bucket_start, event_type, source, count FROM event_rollups
+            WHERE bucket = ? AND bucket_start >= ? AND bucket_start < ?
+        '''
+        params = [bucket, _to_ms(start) if start else 0, _to_ms(end) if end else 2 ** 62]
+        if event_type:
+            sql += ' AND event_type = ?'
+            params.append(event_type)
+        if source:
+            sql += ' AND source = ?'
+            params.append(source)
+        rows = self._query(sql + ' ORDER BY bucket_start', tuple(params))
         return [
-            EventLog(
-                id=row[0],
-                timestamp=datetime.fromisoformat(row[1]),
-                event_type=row[2],
-                source=row[3],
-                target=row[4],
-                data=json.loads(row[5])
-            )
-            for row in rows
+            {"start": _from_ms(ts).isoformat(), "event_type": et, "source": src, "count": count}
+            for ts, et, src, count in rows
         ]
 
     def get_stats(self) -> Dict[str, Any]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM event_logs')
-        total = cursor.fetchone()[0]
-        cursor.execute('''
-            SELECT event_type, COUNT(*) as count
-            FROM event_logs
-            GROUP BY event_type
-            ORDER BY count DESC
-        ''')
-        by_type = dict(cursor.fetchall())
-        conn.close()
+        rows = self._query('SELECT event_type, source, count FROM event_totals')
+        by_type: Counter = Counter()
+        by_source: Counter = Counter()
+        for event_type, source, count in rows:
+            by_type[event_type] += count
+            by_source[source] += count
         return {
-            "total_events": total,
-            "by_type": by_type
+            "total_events": sum(by_type.values()),
+            "by_type": dict(by_type.most_common()),
+            "by_source": dict(by_source.most_common())
         }
 
 event_logger = EventLogger()
@@ -129,6 +437,8 @@ def main():
 
     stats = event_logger.get_stats()
     print(f"Stats: {stats}")
+    print(f"Hourly: {event_logger.get_rollup('hour')}")
+    event_logger.close()
 
 if __name__ == "__main__":
     main()
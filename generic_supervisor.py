@@ -6,10 +6,14 @@ Generic Worker Supervisor
 - Implements automatic recovery mechanisms
 - Tracks resource usage (optional)
 - Provides monitoring loop
+- Persists state to SQLite with batched, debounced flushes
+- Detects heartbeat timeouts with a min-heap instead of scanning every worker
 - Generic and reusable across projects
 """
 
+import heapq
 import json
+import sqlite3
 import time
 import signal
 import sys
@@ -67,8 +71,15 @@ class SupervisorConfig:
     restart_delay: int = 5  # seconds before restart
     monitor_interval: int = 60  # seconds between monitoring checks
     log_retention_days: int = 30
+    max_log_entries: int = 1000  # events kept regardless of age
     auto_restart: bool = True
     resource_monitoring: bool = False
+    # A change flushes the buffer once this many seconds have passed since the last
+    # flush. Nothing flushes on a timer: the last change before a quiet period waits
+    # for the next change, a monitor pass (monitor_loop / monitor) or close()
+    flush_interval: float = 1.0
+    flush_batch_size: int = 500  # flush early once this many changes are pending
+    prune_interval: float = 60.0  # min seconds between retention/cap passes on flush
 
 
 class GenericSupervisor:
@@ -82,6 +93,8 @@ class GenericSupervisor:
             config_file: Path to configuration file (optional)
         """
         self.config_file = config_file or Path(__file__).parent / "supervisor_config.json"
+        self.db_file = Path(self.config_file).parent / "supervisor_state.db"
+        # Legacy JSON files, only read once to migrate into the database
         self.state_file = Path(self.config_file).parent / "supervisor_state.json"
         self.log_file = Path(self.config_file).parent / "supervisor_log.json"
         self.metrics_file = Path(self.config_file).parent / "supervisor_metrics.json"
@@ -91,13 +104,29 @@ class GenericSupervisor:
         self.running = False
         self._stop_event = False
 
+        # Heartbeat tracking: epoch seconds per worker plus a lazy-deletion
+        # min-heap of (heartbeat_at, worker_id) for O(log N) timeout checks
+        self._heartbeat_at: Dict[str, float] = {}
+        self._heartbeat_heap: List[tuple] = []
+        self._errored: set = set()
+
+        # Write-behind buffers
+        self._dirty_workers: set = set()
+        self._removed_workers: set = set()
+        self._pending_events: List[tuple] = []
+        self._last_flush = time.monotonic()
+        self._last_prune = float('-inf')
+
         # Callbacks
         self.on_worker_error: Optional[Callable[[str, str], None]] = None
         self.on_worker_restart: Optional[Callable[[str], None]] = None
         self.on_worker_timeout: Optional[Callable[[str], None]] = None
         self.on_task_failure: Optional[Callable[[str, str], None]] = None
+        # Called with (worker_id, WorkerInfo) on every change, (worker_id, None) on removal
+        self.on_worker_change: Optional[Callable[[str, Optional[WorkerInfo]], None]] = None
 
         self.load_config()
+        self._init_db()
         self.load_state()
 
     def load_config(self):
@@ -114,26 +143,154 @@ class GenericSupervisor:
         with open(self.config_file, 'w') as f:
             json.dump(asdict(self.config), f, indent=2)
 
+    def _init_db(self):
+        """Open the state database (WAL mode) and create tables"""
+        self.conn = sqlite3.connect(str(self.db_file))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                worker_id TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp);
+        ''')
+        self.conn.commit()
+
     def load_state(self):
-        """Load state from file"""
-        if self.state_file.exists():
+        """Load state from the database, migrating legacy JSON state once"""
+        rows = self.conn.execute('SELECT data FROM workers').fetchall()
+        if rows:
+            workers = [json.loads(row[0]) for row in rows]
+        elif self.state_file.exists():
             with open(self.state_file, 'r') as f:
-                state = json.load(f)
+                workers = json.load(f).get('workers', [])
+            self._dirty_workers.update(w['worker_id'] for w in workers)
+        else:
+            workers = []
+
+        # Restore workers
+        for worker_data in workers:
+            worker = WorkerInfo(**worker_data)
+            self.workers[worker.worker_id] = worker
+            self._track_heartbeat(worker.worker_id, worker.heartbeat)
+            if worker.status == WorkerStatus.ERROR.value:
+                self._errored.add(worker.worker_id)
 
-                # Restore workers
-                for worker_data in state.get('workers', []):
-                    worker = WorkerInfo(**worker_data)
-                    self.workers[worker.worker_id] = worker
+        if self._dirty_workers:
+            self.flush()
 
     def save_state(self):
-        """Save state to file"""
-        state = {
-            'last_updated': datetime.now().isoformat(),
-            'workers': [asdict(w) for w in self.workers.values()]
-        }
+        """Persist every worker now (normally writes are batched, see flush())"""
+        self._dirty_workers.update(self.workers)
+        self.flush()
+
+    def _mark_dirty(self, worker_id: str):
+        """Queue a worker for the next batched write"""
+        self._dirty_workers.add(worker_id)
+        self._notify_change(worker_id)
+        self._maybe_flush()
+
+    def _notify_change(self, worker_id: str):
+        if self.on_worker_change:
+            try:
+                self.on_worker_change(worker_id, self.workers.get(worker_id))
+            except Exception as e:
+                print(f"⚠️ Error in on_worker_change callback: {e}")
+
+    def _maybe_flush(self):
+        pending = len(self._dirty_workers) + len(self._removed_workers) + len(self._pending_events)
+        if pending >= self.config.flush_batch_size or \
+                time.monotonic() - self._last_flush >= self.config.flush_interval:
+            self.flush()
+
+    def flush(self, prune: bool = False):
+        """Write all pending worker changes and events in one transaction
+
+        Events are pruned at most once per prune_interval, or always with prune=True.
+        """
+        with self.conn:
+            if self._dirty_workers:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO workers (worker_id, data) VALUES (?, ?)',
+                    # vars() instead of asdict(): no deep copy, json walks metadata itself
+                    [(wid, json.dumps(vars(self.workers[wid])))
+                     for wid in self._dirty_workers if wid in self.workers]
+                )
+            if self._removed_workers:
+                self.conn.executemany('DELETE FROM workers WHERE worker_id = ?',
+                                      [(wid,) for wid in self._removed_workers])
+            if self._pending_events:
+                self.conn.executemany(
+                    'INSERT INTO events (timestamp, event_type, worker_id, data) VALUES (?, ?, ?, ?)',
+                    self._pending_events
+                )
+            if prune or (self._pending_events and
+                         time.monotonic() - self._last_prune >= self.config.prune_interval):
+                self._prune_events()
+        self._dirty_workers.clear()
+        self._removed_workers.clear()
+        self._pending_events = []
+        self._last_flush = time.monotonic()
+
+    def _prune_events(self):
+        """Apply log_retention_days and max_log_entries"""
+        self._last_prune = time.monotonic()
+        cutoff_date = datetime.now() - timedelta(days=self.config.log_retention_days)
+        self.conn.execute('DELETE FROM events WHERE timestamp <= ?', (cutoff_date.isoformat(),))
+        self.conn.execute(
+            'DELETE FROM events WHERE id <= (SELECT id FROM events ORDER BY id DESC LIMIT 1 OFFSET ?)',
+            (self.config.max_log_entries,)
+        )
+
+    def close(self):
+        """Flush pending writes and close the database"""
+        self.flush(prune=True)
+        self.conn.close()
+
+    def _track_heartbeat(self, worker_id: str, heartbeat: Optional[str], at: Optional[float] = None):
+        if at is None:
+            at = datetime.fromisoformat(heartbeat).timestamp() if heartbeat else 0.0
+        self._heartbeat_at[worker_id] = at
+        heapq.heappush(self._heartbeat_heap, (at, worker_id))
+        # Stale entries are dropped lazily; rebuild before they dominate the heap
+        if len(self._heartbeat_heap) > 2 * len(self._heartbeat_at) + 1024:
+            self._heartbeat_heap = [(t, wid) for wid, t in self._heartbeat_at.items()]
+            heapq.heapify(self._heartbeat_heap)
+
+    def expired_workers(self, now: Optional[float] = None) -> List[str]:
+        """
+        Pop workers whose heartbeat timed out since the last check
 
-        with open(self.state_file, 'w') as f:
-            json.dump(state, f, indent=2)
+        Each worker is reported once per timeout; it is tracked again after
+        its next heartbeat.
+
+        Args:
+            now: Current epoch seconds (defaults to time.time())
+
+        Returns:
+            IDs of idle/busy workers whose heartbeat is older than the timeout
+        """
+        cutoff = (now or time.time()) - self.config.heartbeat_timeout
+        expired = []
+        seen = set()
+        heap = self._heartbeat_heap
+        while heap and heap[0][0] < cutoff:
+            at, worker_id = heapq.heappop(heap)
+            if self._heartbeat_at.get(worker_id) != at or worker_id in seen:
+                continue  # superseded by a newer heartbeat, or a re-armed duplicate
+            seen.add(worker_id)
+            worker = self.workers.get(worker_id)
+            if worker and worker.status in (WorkerStatus.IDLE.value, WorkerStatus.BUSY.value):
+                expired.append(worker_id)
+        return expired
 
     def register_worker(self, worker_id: str, name: str, worker_type: str, metadata: Dict[str, Any] = None) -> bool:
         """
@@ -164,19 +321,22 @@ class GenericSupervisor:
             heartbeat=datetime.now().isoformat(),
             metadata=metadata or {}
         )
+        self._track_heartbeat(worker_id, None, at=time.time())
 
-        self.save_state()
+        self._mark_dirty(worker_id)
         self.log_event('worker_registered', worker_id, {'name': name, 'type': worker_type})
         print(f"✅ Worker '{name}' ({worker_id}) registered")
         return True
 
-    def update_heartbeat(self, worker_id: str, current_task: Optional[str] = None) -> bool:
+    def update_heartbeat(self, worker_id: str, current_task: Optional[str] = None,
+                         at: Optional[float] = None) -> bool:
         """
         Update worker heartbeat
 
         Args:
             worker_id: Worker ID
             current_task: Current task ID being processed (optional)
+            at: Epoch seconds the heartbeat was sent (defaults to now)
 
         Returns:
             True if updated successfully
@@ -184,9 +344,11 @@ class GenericSupervisor:
         if worker_id not in self.workers:
             return False
 
-        now = datetime.now().isoformat()
+        at = time.time() if at is None else at
+        now = datetime.fromtimestamp(at).isoformat()
         self.workers[worker_id].heartbeat = now
         self.workers[worker_id].last_heartbeat = now
+        self._track_heartbeat(worker_id, None, at=at)
 
         if current_task is not None:
             self.workers[worker_id].current_task = current_task
@@ -197,7 +359,7 @@ class GenericSupervisor:
         elif current_task and self.workers[worker_id].status != WorkerStatus.BUSY.value:
             self.workers[worker_id].status = WorkerStatus.BUSY.value
 
-        self.save_state()
+        self._mark_dirty(worker_id)
         return True
 
     def check_heartbeat(self, worker_id: str) -> bool:
@@ -213,14 +375,11 @@ class GenericSupervisor:
         if worker_id not in self.workers:
             return False
 
-        worker = self.workers[worker_id]
-        if not worker.heartbeat:
+        heartbeat_at = self._heartbeat_at.get(worker_id)
+        if not heartbeat_at:
             return False
 
-        heartbeat_time = datetime.fromisoformat(worker.heartbeat)
-        age_seconds = (datetime.now() - heartbeat_time).total_seconds()
-
-        return age_seconds < self.config.heartbeat_timeout
+        return time.time() - heartbeat_at < self.config.heartbeat_timeout
 
     def get_worker_status(self, worker_id: str) -> Optional[WorkerInfo]:
         """Get worker information"""
@@ -242,12 +401,19 @@ class GenericSupervisor:
             return False
 
         self.workers[worker_id].status = status
+        if status == WorkerStatus.ERROR.value:
+            self._errored.add(worker_id)
+        else:
+            self._errored.discard(worker_id)
+        if status in (WorkerStatus.IDLE.value, WorkerStatus.BUSY.value):
+            # expired_workers() drops entries of inactive workers; re-arm the timeout
+            self._track_heartbeat(worker_id, None, at=self._heartbeat_at.get(worker_id, 0.0))
 
         if error_message:
             self.workers[worker_id].last_error = error_message
             self.log_event('worker_error', worker_id, {'error': error_message})
 
-        self.save_state()
+        self._mark_dirty(worker_id)
         return True
 
     def report_task_failure(self, worker_id: str, task_id: str, error: str) -> bool:
@@ -302,6 +468,7 @@ class GenericSupervisor:
         # Update status
         worker.status = WorkerStatus.RESTARTING.value
         worker.restart_count += 1
+        self._errored.discard(worker_id)
 
         restart_delay = delay or self.config.restart_delay
 
@@ -320,7 +487,7 @@ class GenericSupervisor:
 
         # Note: Actual restart logic should be implemented in subclass or via callback
         # This is a placeholder for the restart mechanism
-        self.save_state()
+        self._mark_dirty(worker_id)
         return True
 
     def stop_worker(self, worker_id: str) -> bool:
@@ -338,16 +505,21 @@ class GenericSupervisor:
 
         worker = self.workers[worker_id]
         worker.status = WorkerStatus.STOPPED.value
+        self._errored.discard(worker_id)
 
         self.log_event('worker_stopped', worker_id)
-        self.save_state()
+        self._mark_dirty(worker_id)
         return True
 
     def remove_worker(self, worker_id: str) -> bool:
         """Remove a worker from supervision"""
         if worker_id in self.workers:
             del self.workers[worker_id]
-            self.save_state()
+            self._heartbeat_at.pop(worker_id, None)
+            self._errored.discard(worker_id)
+            self._dirty_workers.discard(worker_id)
+            self._removed_workers.add(worker_id)
+            self._notify_change(worker_id)
             self.log_event('worker_removed', worker_id)
             return True
         return False
@@ -355,19 +527,21 @@ class GenericSupervisor:
     def get_status(self) -> Dict[str, Any]:
         """Get overall supervisor status"""
         total = len(self.workers)
-        idle = sum(1 for w in self.workers.values() if w.status == WorkerStatus.IDLE.value)
-        busy = sum(1 for w in self.workers.values() if w.status == WorkerStatus.BUSY.value)
-        error = sum(1 for w in self.workers.values() if w.status == WorkerStatus.ERROR.value)
-        restarting = sum(1 for w in self.workers.values() if w.status == WorkerStatus.RESTARTING.value)
-        stopped = sum(1 for w in self.workers.values() if w.status == WorkerStatus.STOPPED.value)
-        terminated = sum(1 for w in self.workers.values() if w.status == WorkerStatus.TERMINATED.value)
-
-        # Check for dead workers (timeout but not marked as dead)
+        counts = {status.value: 0 for status in WorkerStatus}
         dead = 0
+        cutoff = time.time() - self.config.heartbeat_timeout
         for worker_id, worker in self.workers.items():
-            if worker.status in [WorkerStatus.IDLE.value, WorkerStatus.BUSY.value]:
-                if not self.check_heartbeat(worker_id):
+            counts[worker.status] = counts.get(worker.status, 0) + 1
+            # Check for dead workers (timeout but not marked as dead)
+            if worker.status in (WorkerStatus.IDLE.value, WorkerStatus.BUSY.value):
+                if self._heartbeat_at.get(worker_id, 0) <= cutoff:
                     dead += 1
+        idle = counts[WorkerStatus.IDLE.value]
+        busy = counts[WorkerStatus.BUSY.value]
+        error = counts[WorkerStatus.ERROR.value]
+        restarting = counts[WorkerStatus.RESTARTING.value]
+        stopped = counts[WorkerStatus.STOPPED.value]
+        terminated = counts[WorkerStatus.TERMINATED.value]
 
         return {
             'total_workers': total,
@@ -460,37 +634,38 @@ class GenericSupervisor:
                 print(f"❌ Error in monitor loop: {e}")
                 self.log_event('monitor_error', 'supervisor', {'error': str(e)})
 
+            # Persist anything still buffered before sleeping
+            self.flush()
+
             # Wait for next iteration
             time.sleep(self.config.monitor_interval)
 
+        self.flush()
         self.running = False
         print("\n✅ Supervisor monitoring loop stopped")
 
     def check_all_workers(self):
-        """Check all workers and handle issues"""
-        for worker_id, worker in self.workers.items():
-            # Skip workers in stopped/terminated state
-            if worker.status in [WorkerStatus.STOPPED.value, WorkerStatus.TERMINATED.value]:
-                continue
-
-            # Check heartbeat
-            if worker.status in [WorkerStatus.IDLE.value, WorkerStatus.BUSY.value]:
-                if not self.check_heartbeat(worker_id):
-                    print(f"⚠️ Worker '{worker_id}' heartbeat timeout")
-                    self.log_event('heartbeat_timeout', worker_id, {
-                        'last_heartbeat': worker.last_heartbeat
-                    })
-
-                    if self.on_worker_timeout:
-                        try:
-                            self.on_worker_timeout(worker_id)
-                        except Exception as e:
-                            print(f"⚠️ Error in on_worker_timeout callback: {e}")
-
-                    if self.config.auto_restart:
-                        self.restart_worker(worker_id)
-
-            # Check for errors
+        """Check workers with expired heartbeats or errors and handle issues"""
+        # Check heartbeat (only workers at the top of the heap are touched)
+        for worker_id in self.expired_workers():
+            worker = self.workers[worker_id]
+            print(f"⚠️ Worker '{worker_id}' heartbeat timeout")
+            self.log_event('heartbeat_timeout', worker_id, {
+                'last_heartbeat': worker.last_heartbeat
+            })
+
+            if self.on_worker_timeout:
+                try:
+                    self.on_worker_timeout(worker_id)
+                except Exception as e:
+                    print(f"⚠️ Error in on_worker_timeout callback: {e}")
+
+            if self.config.auto_restart:
+                self.restart_worker(worker_id)
+
+        # Check for errors
+        for worker_id in list(self._errored):
+            worker = self.workers[worker_id]
             if worker.status == WorkerStatus.ERROR.value:
                 print(f"⚠️ Worker '{worker_id}' is in ERROR state")
 
@@ -512,25 +687,24 @@ class GenericSupervisor:
             'data': data or {}
         }
 
-        logs = []
-
-        if self.log_file.exists():
-            with open(self.log_file, 'r') as f:
-                logs = json.load(f)
-
-        logs.append(log_entry)
-
-        # Clean old logs based on retention policy
-        cutoff_date = datetime.now() - timedelta(days=self.config.log_retention_days)
-        logs = [log for log in logs
-                if datetime.fromisoformat(log['timestamp']) > cutoff_date]
-
-        # Keep at most 1000 entries regardless of date
-        if len(logs) > 1000:
-            logs = logs[-1000:]
-
-        with open(self.log_file, 'w') as f:
-            json.dump(logs, f, indent=2)
+        self._pending_events.append((
+            log_entry['timestamp'], event_type, worker_id, json.dumps(log_entry['data'])
+        ))
+        self._maybe_flush()
+
+    def get_events(self, limit: int = 1000, worker_id: Optional[str] = None) -> List[Dict]:
+        """Get the most recent events, newest last"""
+        self.flush()
+        query = 'SELECT timestamp, event_type, worker_id, data FROM events'
+        params: tuple = ()
+        if worker_id:
+            query += ' WHERE worker_id = ?'
+            params = (worker_id,)
+        rows = self.conn.execute(query + ' ORDER BY id DESC LIMIT ?', params + (limit,)).fetchall()
+        return [
+            {'timestamp': ts, 'event_type': et, 'worker_id': wid, 'data': json.loads(data)}
+            for ts, et, wid, data in reversed(rows)
+        ]
 
     def display_status(self):
         """Display current status"""
@@ -575,19 +749,8 @@ class GenericSupervisor:
         print("="*50)
 
     def cleanup_old_logs(self):
-        """Clean old log files"""
-        cutoff_date = datetime.now() - timedelta(days=self.config.log_retention_days)
-
-        # Clean supervisor logs
-        if self.log_file.exists():
-            with open(self.log_file, 'r') as f:
-                logs = json.load(f)
-
-            logs = [log for log in logs
-                    if datetime.fromisoformat(log['timestamp']) > cutoff_date]
-
-            with open(self.log_file, 'w') as f:
-                json.dump(logs, f, indent=2)
+        """Delete events older than the retention period or beyond max_log_entries"""
+        self.flush(prune=True)
 
 
 if __name__ == '__main__':
@@ -608,8 +771,7 @@ if __name__ == '__main__':
     # Display status
     supervisor.display_status()
 
-    # Simulate worker timeout (set old heartbeat)
-    # supervisor.workers['worker1'].heartbeat = '2024-01-01T00:00:00'
-    # supervisor.check_all_workers()
+    # Simulate worker timeout (check as if the timeout had already elapsed)
+    # print(supervisor.expired_workers(time.time() + supervisor.config.heartbeat_timeout + 1))
 
     # supervisor.display_status()
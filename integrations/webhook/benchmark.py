@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Webhook delivery benchmark - serial blocking sends vs the async delivery engine
+
+A local stub HTTP/1.1 server (keep-alive) serves fast, slow and flaky endpoints
+with injected latency, and counts the TCP connections it accepts.
+
+Usage:
+    python benchmark.py --endpoints 50 --slow 3 --slow-latency 2.0 --rounds 5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from client import AsyncWebhookDelivery, RetryPolicy, Webhook, WebhookManager
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    latencies = {}
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StubHandler.lock:
+            StubHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        kind = self.path.strip("/").split("/")[0]
+        time.sleep(self.latencies.get(kind, 0.0))
+        status = 503 if kind == "flaky" and random.random() < 0.5 else 200
+        body = json.dumps({"ok": status == 200}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(fast_latency, slow_latency):
+    StubHandler.latencies = {"fast": fast_latency, "slow": slow_latency, "flaky": fast_latency}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serial_send_all(manager, data, timeout):
+    """The previous send_to_all: one blocking request after another, no connection reuse."""
+    payload = json.dumps(data).encode()
+    for webhook in manager.list_webhooks(enabled_only=True):
+        request = urllib.request.Request(webhook.url, data=payload, method="POST",
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Webhook delivery benchmark")
+    parser.add_argument("--endpoints", type=int, default=50)
+    parser.add_argument("--slow", type=int, default=3)
+    parser.add_argument("--flaky", type=int, default=2)
+    parser.add_argument("--fast-latency", type=float, default=0.005)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--rounds", type=int, default=5)
+    # Every stub endpoint shares one host here; real webhooks are spread across hosts
+    parser.add_argument("--limit-per-host", type=int, default=32)
+    args = parser.parse_args()
+
+    server = start_server(args.fast_latency, args.slow_latency)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = WebhookManager(db_path=f"{tmp}/webhooks.json")
+        kinds = ["slow"] * args.slow + ["flaky"] * args.flaky
+        kinds += ["fast"] * (args.endpoints - len(kinds))
+        for i, kind in enumerate(kinds):
+            manager.webhooks[f"hook-{i}"] = Webhook(id=f"hook-{i}", name=f"{kind}-{i}",
+                                                     url=f"{base}/{kind}/{i}")
+        data = {"event": "benchmark", "payload": "x" * 256}
+        print(f"{args.endpoints} endpoints ({args.slow} slow @ {args.slow_latency}s, {args.flaky} flaky 50% 503)")
+
+        StubHandler.connections = 0
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            serial_send_all(manager, data, timeout=30)
+        serial = time.perf_counter() - start
+        print(f"  serial blocking: {serial / args.rounds * 1000:8.1f}ms per broadcast, "
+              f"{StubHandler.connections} connections")
+
+        async def run_async():
+            delivery = AsyncWebhookDelivery(manager, outbox_path=f"{tmp}/outbox.db",
+                                            limit_per_host=args.limit_per_host,
+                                            retry=RetryPolicy(max_attempts=3, base_delay=0.05))
+            fast_latencies = []
+
+            async def timed(webhook):
+                start = time.perf_counter()
+                result = await delivery.deliver(webhook, data)
+                if webhook.name.startswith("fast"):
+                    fast_latencies.append(time.perf_counter() - start)
+                return result
+
+            StubHandler.connections = 0
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                await asyncio.gather(*(timed(w) for w in manager.list_webhooks(enabled_only=True)))
+            elapsed = time.perf_counter() - start
+            await delivery.close()
+            fast_latencies.sort()
+            p99 = fast_latencies[int(len(fast_latencies) * 0.99)] * 1000
+            print(f"  async engine:    {elapsed / args.rounds * 1000:8.1f}ms per broadcast, "
+                  f"{StubHandler.connections} connections, fast-endpoint p99 {p99:.1f}ms")
+            print(f"  stats: {delivery.stats}, outbox pending {delivery.outbox.count()}")
+
+        asyncio.run(run_async())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,19 @@ Usage:
     manager = WebhookManager()
     manager.register_webhook("github", "https://example.com/webhook")
     manager.send_webhook("github", data={"event": "push"})
+
+    # 非同期配信 (接続プール・並列・リトライ・サーキットブレーカー・送信箱)
+    results = await manager.delivery.send_to_all({"event": "push"})
 """
 
 import os
 import json
+import time
+import random
+import asyncio
 import logging
+import sqlite3
+import threading
 from typing import List, Dict, Optional, Any, Callable
 from dataclasses import dataclass, asdict
 from datetime import datetime
@@ -26,6 +34,12 @@ try:
 except ImportError:
     REQUESTS_AVAILABLE = False
 
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -57,14 +71,17 @@ class WebhookManager:
 
     環境変数:
         WEBHOOKS_DB_PATH: Webhookデータベースファイルのパス
+        WEBHOOKS_OUTBOX_PATH: 未配信ペイロードの送信箱 (SQLite) のパス
     """
 
-    def __init__(self, db_path: Optional[str] = None):
+    def __init__(self, db_path: Optional[str] = None, outbox_path: Optional[str] = None):
         self.db_path = Path(db_path or os.getenv('WEBHOOKS_DB_PATH', '/workspace/integrations/webhook/webhooks.json'))
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.outbox_path = outbox_path or os.getenv('WEBHOOKS_OUTBOX_PATH')
 
         self.webhooks: Dict[str, Webhook] = {}
         self.load_webhooks()
+        self._delivery: Optional["AsyncWebhookDelivery"] = None
 
         logger.info("Webhookマネージャー初期化完了")
 
@@ -210,6 +227,20 @@ class WebhookManager:
             return True
         return False
 
+    @property
+    def delivery(self) -> "AsyncWebhookDelivery":
+        """非同期配信エンジン (初回アクセス時に作成)"""
+        if self._delivery is None:
+            self._delivery = AsyncWebhookDelivery(self, outbox_path=self.outbox_path)
+        return self._delivery
+
+    def close(self):
+        """send_to_all が起動したバックグラウンド配信を止めて送信箱を閉じる"""
+        if self._delivery is not None:
+            self._delivery.close_sync()
+            self._delivery.outbox.close()
+            self._delivery = None
+
     def send_webhook(
         self,
         webhook_id: str,
@@ -259,7 +290,14 @@ class WebhookManager:
 
         Returns:
             レスポンスリスト
+
+        aiohttp があればバックグラウンドループで並列配信し、失敗分はそのループが
+        送信箱から再送し続けます (止めるときは close())。
         """
+        if AIOHTTP_AVAILABLE and not _in_event_loop():
+            # 並列配信: 遅いエンドポイントが他の配信を待たせない
+            return self.delivery.run_sync(self.delivery.send_to_all(data, timeout=timeout))
+
         results = []
 
         for webhook in self.list_webhooks(enabled_only=True):
@@ -366,6 +404,409 @@ class WebhookManager:
         )
 
 
+# ============================================
+# 非同期配信エンジン
+# ============================================
+
+# 一時的な失敗とみなしてリトライ/送信箱に回すステータス
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class RetryPolicy:
+    """指数バックオフ + フルジッターのリトライ設定"""
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 60.0
+    jitter: bool = True
+
+    def delay(self, attempt: int) -> float:
+        """attempt 回目 (1 始まり) の失敗後の待ち時間"""
+        delay = min(self.max_delay, self.base_delay * (2 ** max(attempt - 1, 0)))
+        return random.uniform(0, delay) if self.jitter else delay
+
+
+@dataclass
+class CircuitBreaker:
+    """
+    エンドポイント単位のサーキットブレーカー
+
+    連続 failure_threshold 回失敗すると open になり、reset_timeout 秒間は
+    送信せずに送信箱へ回します。その後 half_open で 1 件だけ試し、
+    成功すれば closed に戻ります。
+    """
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    state: str = "closed"
+    failures: int = 0
+    opened_at: float = 0.0
+    probing: bool = False
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.state == "open":
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+            self.probing = False
+        if self.state == "half_open":
+            if self.probing:
+                return False
+            self.probing = True
+        return True
+
+    def retry_in(self, now: Optional[float] = None) -> float:
+        """open 状態が解けるまでの秒数"""
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.opened_at + self.reset_timeout - now) if self.state == "open" else 0.0
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probing = False
+
+    def record_failure(self, now: Optional[float] = None):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"サーキットブレーカーが open になりました ({self.failures}回失敗)")
+            self.state = "open"
+            self.opened_at = time.monotonic() if now is None else now
+
+
+class WebhookOutbox:
+    """
+    未配信ペイロードの永続送信箱 (SQLite)
+
+    next_attempt_at (epoch 秒) が NULL の行は再試行上限に達したデッドレターです。
+    """
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                webhook_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL,
+                last_error TEXT,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(next_attempt_at)')
+        self.conn.commit()
+
+    def add(self, webhook_id: str, data: Dict[str, Any], attempts: int,
+            next_attempt_at: float, error: Optional[str] = None) -> int:
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT INTO outbox (webhook_id, payload, attempts, next_attempt_at, last_error, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (webhook_id, json.dumps(data, ensure_ascii=False), attempts, next_attempt_at,
+                 error, datetime.now().isoformat())
+            )
+            return cursor.lastrowid
+
+    def due(self, now: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """再送時刻を過ぎたエントリ (古い順)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT id, webhook_id, payload, attempts FROM outbox '
+                'WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?',
+                (now, limit)
+            ).fetchall()
+        return [
+            {'id': row[0], 'webhook_id': row[1], 'data': json.loads(row[2]), 'attempts': row[3]}
+            for row in rows
+        ]
+
+    def reschedule(self, entry_id: int, attempts: int, next_attempt_at: Optional[float],
+                   error: Optional[str] = None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                'UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                (attempts, next_attempt_at, error, entry_id)
+            )
+
+    def remove(self, entry_id: int):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM outbox WHERE id = ?', (entry_id,))
+
+    def count(self, dead: bool = False) -> int:
+        condition = 'next_attempt_at IS NULL' if dead else 'next_attempt_at IS NOT NULL'
+        with self._lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM outbox WHERE {condition}').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class AsyncWebhookDelivery:
+    """
+    非同期Webhook配信エンジン
+
+    - ホストごとの keep-alive 接続プール (aiohttp TCPConnector)
+    - 全体 max_concurrency / ホストごと limit_per_host の同時接続上限
+    - エンドポイントごとのサーキットブレーカー
+    - 指数バックオフ + ジッターのリトライ (429 の Retry-After を尊重)
+    - リトライし尽くした/ブレーカーで止めたペイロードは永続送信箱へ
+
+    1 つの遅いエンドポイントは自分の接続枠だけを使うので、他の配信は待たされません。
+    """
+
+    def __init__(
+        self,
+        manager: "WebhookManager",
+        outbox_path: Optional[str] = None,
+        max_concurrency: int = 100,
+        limit_per_host: int = 10,
+        timeout: float = 10.0,
+        retry: Optional[RetryPolicy] = None,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        max_outbox_attempts: int = 10
+    ):
+        self.manager = manager
+        self.outbox = WebhookOutbox(outbox_path or str(manager.db_path.parent / 'webhook_outbox.db'))
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.retry = retry or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_outbox_attempts = max_outbox_attempts
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.stats = {'sent': 0, 'failed': 0, 'retried': 0, 'queued': 0, 'short_circuited': 0}
+        self._session = None
+        # 同期呼び出し用のバックグラウンドループ (run_sync の初回に起動)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+        self._drain_stop: Optional[asyncio.Event] = None
+        self._drainer = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            if not AIOHTTP_AVAILABLE:
+                raise ImportError("aiohttpライブラリがインストールされていません")
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=30,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    def breaker(self, webhook_id: str) -> CircuitBreaker:
+        breaker = self.breakers.get(webhook_id)
+        if breaker is None:
+            breaker = self.breakers[webhook_id] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return breaker
+
+    async def _attempt(self, webhook: Webhook, data: Dict[str, Any],
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """1 回分の HTTP リクエスト (結果の形式は WebhookManager._send_request と同じ)"""
+        method = webhook.method.upper()
+        body = {'params': data} if method == 'GET' else {'json': data}
+        if timeout is not None:
+            body['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        try:
+            async with self._get_session().request(method, webhook.url, headers=webhook.headers,
+                                                   **body) as response:
+                content = await response.read()
+                result = {
+                    'status_code': response.status,
+                    'success': 200 <= response.status < 300,
+                    'data': _decode_body(content)
+                }
+                retry_after = response.headers.get('Retry-After')
+                if retry_after and retry_after.isdigit():
+                    result['retry_after'] = float(retry_after)
+                return result
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {'status_code': None, 'success': False, 'error': str(e) or type(e).__name__}
+
+    async def deliver(
+        self,
+        webhook: Webhook,
+        data: Dict[str, Any],
+        timeout: Optional[float] = None,
+        outbox_entry: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Webhookを配信 (リトライ・ブレーカー・送信箱つき)
+
+        Args:
+            webhook: 送信先
+            data: 送信データ
+            timeout: リクエストタイムアウト（秒）
+            outbox_entry: 送信箱からの再送ならそのエントリ
+
+        Returns:
+            レスポンス (送信箱に入れた場合は queued=True)
+        """
+        breaker = self.breaker(webhook.id)
+        # 送信箱からの再送は送信箱自体がリトライを担う
+        attempts = 1 if outbox_entry else self.retry.max_attempts
+        result: Dict[str, Any] = {}
+
+        for attempt in range(1, attempts + 1):
+            if not breaker.allow():
+                self.stats['short_circuited'] += 1
+                result = {'status_code': None, 'success': False, 'error': 'circuit open'}
+                break
+
+            result = await self._attempt(webhook, data, timeout)
+            if result['success'] or result['status_code'] not in (None, *RETRYABLE_STATUS):
+                # 4xx はエンドポイントが生きている証拠なのでブレーカーは閉じる
+                breaker.record_success()
+                if outbox_entry:
+                    self.outbox.remove(outbox_entry['id'])
+                if result['success']:
+                    self.stats['sent'] += 1
+                else:
+                    self.stats['failed'] += 1
+                    logger.warning(f"Webhook送信失敗: {webhook.url} - {result['status_code']}")
+                return result
+
+            breaker.record_failure()
+            if attempt < attempts and breaker.state != "open":
+                self.stats['retried'] += 1
+                await asyncio.sleep(result.get('retry_after') or self.retry.delay(attempt))
+
+        self._enqueue(webhook, data, result, breaker, outbox_entry)
+        result['queued'] = True
+        return result
+
+    def _enqueue(self, webhook: Webhook, data: Dict[str, Any], result: Dict[str, Any],
+                 breaker: CircuitBreaker, outbox_entry: Optional[Dict[str, Any]]):
+        error = result.get('error') or f"HTTP {result.get('status_code')}"
+        attempts = (outbox_entry['attempts'] if outbox_entry else 0) + 1
+        wait = max(self.retry.delay(attempts), breaker.retry_in(), result.get('retry_after') or 0.0)
+        next_attempt_at = time.time() + wait
+
+        if attempts >= self.max_outbox_attempts:
+            next_attempt_at = None
+            logger.error(f"Webhook配信を断念 (デッドレター): {webhook.name} - {error}")
+        self.stats['queued'] += 1
+        if outbox_entry:
+            self.outbox.reschedule(outbox_entry['id'], attempts, next_attempt_at, error)
+        else:
+            self.outbox.add(webhook.id, data, attempts, next_attempt_at, error)
+
+    async def send_to_all(self, data: Dict[str, Any],
+                          timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """全ての有効なWebhookへ並列に配信"""
+        webhooks = self.manager.list_webhooks(enabled_only=True)
+        results = await asyncio.gather(*(self.deliver(w, data, timeout) for w in webhooks))
+        return [
+            {'webhook_id': webhook.id, 'webhook_name': webhook.name, 'result': result}
+            for webhook, result in zip(webhooks, results)
+        ]
+
+    async def drain_outbox(self, limit: int = 500) -> int:
+        """再送時刻を過ぎた送信箱エントリを再送し、成功件数を返す"""
+        async def redeliver(entry):
+            webhook = self.manager.get_webhook(entry['webhook_id'])
+            if webhook is None:
+                self.outbox.remove(entry['id'])
+                return False
+            if not webhook.enabled:
+                self.outbox.reschedule(entry['id'], entry['attempts'], time.time() + self.reset_timeout)
+                return False
+            result = await self.deliver(webhook, entry['data'], outbox_entry=entry)
+            return result['success']
+
+        results = await asyncio.gather(*(redeliver(e) for e in self.outbox.due(limit=limit)))
+        return sum(results)
+
+    async def run(self, stop_event: Optional[asyncio.Event] = None, interval: float = 1.0):
+        """送信箱を定期的に再送するバックグラウンドループ"""
+        stop_event = stop_event or asyncio.Event()
+        while not stop_event.is_set():
+            try:
+                await self.drain_outbox()
+            except Exception as e:
+                logger.error(f"送信箱の再送エラー: {e}")
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        """同期呼び出し用のループを起動 (接続プールと送信箱の再送ループを保持し続ける)"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='webhook-delivery', daemon=True)
+                thread.start()
+                self._drain_stop = asyncio.Event()
+                self._drainer = asyncio.run_coroutine_threadsafe(self.run(self._drain_stop), loop)
+                self._loop, self._loop_thread = loop, thread
+            return self._loop
+
+    def run_sync(self, coro):
+        """
+        イベントループ外から実行
+
+        初回呼び出しでバックグラウンドループを起動し、以降の呼び出しは同じループと
+        接続プールを使います。送信箱もそのループで定期的に再送されます。
+        使い終わったら close_sync() で止めます。
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._background_loop()).result()
+
+    def close_sync(self, timeout: float = 5.0):
+        """バックグラウンドループの再送を止め、接続プールを閉じてループを終了"""
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(self._drain_stop.set)
+        try:
+            self._drainer.result(timeout)
+            asyncio.run_coroutine_threadsafe(self.close(), loop).result(timeout)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+            loop.close()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def _decode_body(content: bytes) -> Any:
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode('utf-8', errors='replace')
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
 # CLIツールとして使用する場合
 def main():
     import argparse
@@ -443,6 +884,7 @@ def main():
 
             data = json.loads(args.data)
             results = manager.send_to_all(data)
+            manager.close()
 
             print(f"\n📤 {len(results)}個のWebhookに送信しました:")
             for result in results:
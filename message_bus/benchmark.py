@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Message Bus benchmark - throughput, per-priority latency and RPC round trips"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+
+from message_bus import Message, MessageBus, MessagePriority
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(count: int, consumers: int, max_pending: int, topics: int,
+              handler_cost: float, yield_every: int):
+    bus = MessageBus(consumers_per_topic=consumers, max_pending=max_pending)
+    latencies: Dict[MessagePriority, List[float]] = {p: [] for p in MessagePriority}
+    done = asyncio.Event()
+    received = 0
+
+    def handler(message: Message):
+        nonlocal received
+        deadline = time.perf_counter() + handler_cost
+        while time.perf_counter() < deadline:
+            pass
+        latencies[message.priority].append(time.perf_counter() - message.payload["sent"])
+        received += 1
+        if received == count:
+            done.set()
+
+    for t in range(topics):
+        bus.subscribe(f"bench.topic{t}", handler)
+    await bus.start()
+
+    priorities = list(MessagePriority)
+    rng = random.Random(42)
+    start = time.perf_counter()
+    for i in range(count):
+        await bus.publish(f"bench.topic{i % topics}", {"sent": time.perf_counter()},
+                          priority=rng.choice(priorities), sender="benchmark")
+        if i % yield_every == 0:
+            await asyncio.sleep(0)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    await bus.stop()
+    return elapsed, latencies
+
+
+async def run_rpc(callers: int, requests_per_caller: int, consumers: int):
+    bus = MessageBus(consumers_per_topic=consumers)
+    bus.serve("bench.rpc", lambda message: {"echo": message.payload["n"]})
+    await bus.start()
+
+    latencies: List[float] = []
+
+    async def caller(cid: int):
+        for n in range(requests_per_caller):
+            start = time.perf_counter()
+            reply = await bus.request("bench.rpc", {"n": n}, timeout=30, sender=f"caller{cid}")
+            latencies.append(time.perf_counter() - start)
+            assert reply["echo"] == n
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller(c) for c in range(callers)))
+    elapsed = time.perf_counter() - start
+    await bus.stop()
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MessageBus throughput/latency benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--consumers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=10_000)
+    parser.add_argument("--topics", type=int, default=8)
+    parser.add_argument("--handler-us", type=float, default=5.0,
+                        help="busy-wait per handler call, so a backlog builds up")
+    parser.add_argument("--yield-every", type=int, default=1000)
+    parser.add_argument("--mode", choices=["throughput", "rpc"], default="throughput")
+    parser.add_argument("--callers", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--requests", type=int, default=20_000,
+                        help="total RPC requests per caller-count run")
+    args = parser.parse_args()
+
+    if args.mode == "rpc":
+        for callers in args.callers:
+            per_caller = max(1, args.requests // callers)
+            elapsed, latencies = asyncio.run(run_rpc(callers, per_caller, args.consumers))
+            print(f"{callers:>5} callers: {len(latencies) / elapsed:10.0f} req/s "
+                  f"p50={percentile(latencies, 50) * 1000:8.3f}ms "
+                  f"p99={percentile(latencies, 99) * 1000:8.3f}ms")
+        return
+
+    for count in args.sizes:
+        elapsed, latencies = asyncio.run(run(count, args.consumers, args.max_pending, args.topics,
+                                          args.handler_us / 1_000_000, args.yield_every))
+        print(f"{count:>9} messages: {count / elapsed:10.0f} msg/s ({elapsed:.2f}s)")
+        for priority in sorted(MessagePriority, key=lambda p: -p.value):
+            samples = latencies[priority]
+            print(f"    {priority.name:<8} n={len(samples):>8} "
+                  f"p50={percentile(samples, 50) * 1000:9.2f}ms "
+                  f"p99={percentile(samples, 99) * 1000:9.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
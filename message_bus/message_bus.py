@@ -3,10 +3,12 @@
 """Message Bus - Async messaging system"""
 
 import asyncio
+import itertools
 import json
+import time
 import uuid
 from datetime import datetime
-from typing import Callable, Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass
 from enum import Enum
 
@@ -25,6 +27,7 @@ class Message:
     timestamp: datetime
     sender: str
     reply_to: Optional[str] = None
+    correlation_id: Optional[str] = None
 
     def to_dict(self):
         return {
@@ -34,63 +37,410 @@ class Message:
             "priority": self.priority.value,
             "timestamp": self.timestamp.isoformat(),
             "sender": self.sender,
-            "reply_to": self.reply_to
+            "reply_to": self.reply_to,
+            "correlation_id": self.correlation_id
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Message":
+        return cls(
+            id=data["id"],
+            topic=data["topic"],
+            payload=data["payload"],
+            priority=MessagePriority(data["priority"]),
+            timestamp=datetime.fromisoformat(data["timestamp"]),
+            sender=data["sender"],
+            reply_to=data.get("reply_to"),
+            correlation_id=data.get("correlation_id")
+        )
+
+class RequestError(Exception):
+    """Raised by ``MessageBus.request`` when the responder reports a failure."""
+
+class TopicTrie:
+    """Subscription trie over dot-separated topic levels.
+
+    ``+`` (or ``*``) matches exactly one level and ``#`` matches any number
+    of trailing levels, including none. Resolved handler lists are cached per
+    concrete topic; any subscribe/unsubscribe invalidates the cache.
+    """
+
+    SINGLE = "+"
+    MULTI = "#"
+
+    def __init__(self, cache_size: int = 65536):
+        self.root: Dict[str, Any] = {}
+        self.cache_size = cache_size
+        self._cache: Dict[str, List[Callable]] = {}
+
+    @classmethod
+    def split(cls, pattern: str) -> List[str]:
+        levels = [cls.SINGLE if level == "*" else level for level in pattern.split(".")]
+        if cls.MULTI in levels[:-1]:
+            raise ValueError(f"'#' must be the last level in topic pattern: {pattern}")
+        return levels
+
+    def insert(self, pattern: str, handler: Callable):
+        node = self.root
+        for level in self.split(pattern):
+            node = node.setdefault(level, {})
+        node.setdefault(None, []).append(handler)
+        self._cache.clear()
+
+    def remove(self, pattern: str, handler: Callable) -> bool:
+        path = [self.root]
+        for level in self.split(pattern):
+            child = path[-1].get(level)
+            if child is None:
+                return False
+            path.append(child)
+        handlers = path[-1].get(None)
+        if not handlers or handler not in handlers:
+            return False
+        handlers.remove(handler)
+        if not handlers:
+            del path[-1][None]
+        # Prune now-empty branches so lookups do not walk dead nodes.
+        for parent, level in zip(reversed(path[:-1]), reversed(self.split(pattern))):
+            if parent[level]:
+                break
+            del parent[level]
+        self._cache.clear()
+        return True
+
+    def match(self, topic: str) -> List[Callable]:
+        cached = self._cache.get(topic)
+        if cached is not None:
+            return cached
+
+        levels = topic.split(".")
+        found: List[Callable] = []
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            multi = node.get(self.MULTI)
+            if multi is not None:
+                found.extend(multi.get(None, ()))
+            if depth == len(levels):
+                found.extend(node.get(None, ()))
+                continue
+            for key in (levels[depth], self.SINGLE):
+                child = node.get(key)
+                if child is not None:
+                    stack.append((child, depth + 1))
+
+        handlers = list(dict.fromkeys(found))
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[topic] = handlers
+        return handlers
+
+
+class TopicLane:
+    """Per-topic priority queue drained by a fixed pool of consumer tasks.
+
+    Ordering key is ``enqueued_at - priority * aging_interval``: a message
+    outranks anything one priority level higher that arrived more than
+    ``aging_interval`` seconds after it, so LOW traffic cannot starve.
+    """
+
+    def __init__(self, topic: str, max_pending: int):
+        self.topic = topic
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=max_pending)
+        self.consumers: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.last_active = time.monotonic()
+
+    def idle_since(self, cutoff: float) -> bool:
+        return self.queue.empty() and not self.in_flight and self.last_active < cutoff
+
+
 class MessageBus:
-    def __init__(self):
+    """Async pub/sub bus.
+
+    Pass a ``durable_log`` (``durable_log.SegmentedLog``) to write every
+    published message ahead of dispatch; ``start()`` then replays whatever
+    this bus's consumer had not finished before the last shutdown or crash.
+    Payloads must be JSON-serialisable in durable mode.
+
+    Lanes are only created for topics that currently have subscribers;
+    messages to other topics are dropped (and marked done in the log).
+    Replayed messages are the exception: they are held, uncommitted, until a
+    matching subscription appears, so starting before subscribing loses
+    nothing. A
+    running bus retires lanes that stay empty for ``lane_idle_timeout``
+    seconds, so one-shot topics do not leave queues and tasks behind.
+    """
+
+    def __init__(self, consumers_per_topic: int = 4, max_pending: int = 10000,
+                 aging_interval: float = 1.0, max_inflight_requests: int = 1000,
+                 durable_log=None, consumer_name: str = "message_bus",
+                 lane_idle_timeout: float = 60.0):
         self.topics: Dict[str, List[Callable]] = {}
-        self.message_queue: asyncio.Queue = asyncio.Queue()
+        self.trie = TopicTrie()
+        self.lanes: Dict[str, TopicLane] = {}
+        self.consumers_per_topic = consumers_per_topic
+        self.max_pending = max_pending
+        self.aging_interval = aging_interval
+        self.lane_idle_timeout = lane_idle_timeout
+        self._reaper: Optional[asyncio.Task] = None
         self.running = False
+        self._sequence = itertools.count()
+        self.inbox = f"_inbox.{uuid.uuid4().hex}"
+        self.max_inflight_requests = max_inflight_requests
+        self._pending_requests: Dict[str, asyncio.Future] = {}
+        self._request_slots: Optional[asyncio.Semaphore] = None
+        self.trie.insert(self.inbox, self._on_reply)
+        self.durable_log = durable_log
+        self._cursor = durable_log.consumer(consumer_name) if durable_log else None
+        # Records appended from here on are enqueued by this instance itself,
+        # so replay must stop short of them.
+        self._replay_end = durable_log.next_offset if durable_log else 0
+        self._sync_handle: Optional[asyncio.TimerHandle] = None
+        self._replayed = False
+        # Replayed records nobody has subscribed to yet
+        self._held: List[Tuple[Message, int]] = []
+        self._held_task: Optional[asyncio.Task] = None
 
     async def start(self):
         self.running = True
-        asyncio.create_task(self._process_messages())
+        for lane in self.lanes.values():
+            self._spawn_consumers(lane)
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle_lanes())
+        if self._cursor is not None and not self._replayed:
+            self._replayed = True
+            await self._replay()
 
     async def stop(self):
         self.running = False
+        tasks = [task for lane in self.lanes.values() for task in lane.consumers]
+        if self._reaper is not None:
+            tasks.append(self._reaper)
+            self._reaper = None
+        if self._held_task is not None:
+            tasks.append(self._held_task)
+            self._held_task = None
+        for lane in self.lanes.values():
+            lane.consumers = []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._cursor is not None:
+            if self._sync_handle is not None:
+                self._sync_handle.cancel()
+            self._sync_log()
+            self._cursor.commit()
+
+    async def _replay(self):
+        replayed = 0
+        for offset, record in self._cursor.replay():
+            if offset >= self._replay_end:
+                break
+            message = Message.from_dict(json.loads(record))
+            await self._enqueue(message, offset=offset)
+            replayed += 1
+        if replayed:
+            print(f"[MessageBus] Replayed {replayed} messages from durable log")
+
+    async def join(self):
+        """Wait until every queued message has been dispatched."""
+        if self._held_task is not None:
+            await self._held_task
+        for lane in list(self.lanes.values()):
+            await lane.queue.join()
 
     def subscribe(self, topic: str, handler: Callable):
+        self.trie.insert(topic, handler)
         if topic not in self.topics:
             self.topics[topic] = []
         self.topics[topic].append(handler)
         print(f"[MessageBus] Subscribed to topic: {topic}")
+        if self._held and self.running:
+            self._held_task = asyncio.get_running_loop().create_task(self._enqueue_held())
+
+    async def _enqueue_held(self):
+        held, self._held = self._held, []
+        for message, offset in held:
+            await self._enqueue(message, offset=offset)  # still unmatched ones are held again
 
     def unsubscribe(self, topic: str, handler: Callable):
         if topic in self.topics and handler in self.topics[topic]:
             self.topics[topic].remove(handler)
+            if not self.topics[topic]:
+                del self.topics[topic]
+            self.trie.remove(topic, handler)
+
+    def pending(self) -> Dict[str, int]:
+        return {topic: lane.queue.qsize() for topic, lane in self.lanes.items()}
 
     async def publish(self, topic: str, payload: Dict[str, Any],
                      priority: MessagePriority = MessagePriority.NORMAL,
-                     sender: str = "unknown") -> str:
+                     sender: str = "unknown", reply_to: Optional[str] = None,
+                     correlation_id: Optional[str] = None) -> str:
         message = Message(
             id=str(uuid.uuid4()),
             topic=topic,
             payload=payload,
             priority=priority,
             timestamp=datetime.now(),
-            sender=sender
+            sender=sender,
+            reply_to=reply_to,
+            correlation_id=correlation_id
         )
-        await self.message_queue.put(message)
+        await self._enqueue(message)
         return message.id
 
-    async def _process_messages(self):
-        while self.running:
+    async def request(self, topic: str, payload: Dict[str, Any], timeout: float = 5.0,
+                      priority: MessagePriority = MessagePriority.NORMAL,
+                      sender: str = "unknown") -> Dict[str, Any]:
+        """Publish to ``topic`` and wait for the matching reply payload.
+
+        At most ``max_inflight_requests`` calls are outstanding at once;
+        further callers wait for a slot. Raises ``asyncio.TimeoutError`` if no
+        reply arrives in ``timeout`` seconds and ``RequestError`` if the
+        responder failed or nobody is subscribed.
+        """
+        if not self.trie.match(topic):
+            raise RequestError(f"No subscribers for topic: {topic}")
+        if self._request_slots is None:
+            self._request_slots = asyncio.Semaphore(self.max_inflight_requests)
+
+        async with self._request_slots:
+            correlation_id = uuid.uuid4().hex
+            future = asyncio.get_running_loop().create_future()
+            self._pending_requests[correlation_id] = future
             try:
-                message = await asyncio.wait_for(self.message_queue.get(), timeout=0.1)
-                if message.topic in self.topics:
-                    for handler in self.topics[message.topic]:
-                        try:
-                            if asyncio.iscoroutinefunction(handler):
-                                await handler(message)
-                            else:
-                                handler(message)
-                        except Exception as e:
-                            print(f"[MessageBus] Error in handler: {e}")
-            except asyncio.TimeoutError:
-                continue
+                await self.publish(topic, payload, priority=priority, sender=sender,
+                                   reply_to=self.inbox, correlation_id=correlation_id)
+                reply = await asyncio.wait_for(future, timeout=timeout)
+            finally:
+                # Late replies for an expired correlation id are dropped.
+                self._pending_requests.pop(correlation_id, None)
+
+        if reply.payload.get("ok") is False:
+            raise RequestError(reply.payload.get("error", "request failed"))
+        return reply.payload
+
+    async def reply(self, request: Message, payload: Dict[str, Any],
+                    sender: str = "unknown"):
+        if not request.reply_to:
+            return
+        if request.reply_to == self.inbox:
+            # In-process caller: resolve directly instead of a queue round trip.
+            self._on_reply(Message(
+                id=str(uuid.uuid4()),
+                topic=request.reply_to,
+                payload=payload,
+                priority=request.priority,
+                timestamp=datetime.now(),
+                sender=sender,
+                correlation_id=request.correlation_id
+            ))
+            return
+        await self.publish(request.reply_to, payload, priority=request.priority,
+                           sender=sender, correlation_id=request.correlation_id)
+
+    def serve(self, topic: str, handler: Callable):
+        """Subscribe ``handler`` and send its return value back as the reply."""
+        async def responder(message: Message):
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    result = await handler(message)
+                else:
+                    result = handler(message)
+                payload = result if isinstance(result, dict) else {"result": result}
+            except Exception as e:
+                payload = {"ok": False, "error": str(e)}
+            await self.reply(message, payload, sender=topic)
+
+        responder.__name__ = getattr(handler, "__name__", "responder")
+        self.subscribe(topic, responder)
+        return responder
+
+    def _on_reply(self, message: Message):
+        future = self._pending_requests.get(message.correlation_id)
+        if future is not None and not future.done():
+            future.set_result(message)
+
+    async def _enqueue(self, message: Message, offset: Optional[int] = None):
+        replayed = offset is not None
+        # Replies to an in-process inbox are useless after a restart.
+        if offset is None and self.durable_log is not None \
+                and not message.topic.startswith("_inbox."):
+            offset = self.durable_log.append(json.dumps(message.to_dict()).encode())
+            self._schedule_sync()
+
+        lane = self.lanes.get(message.topic)
+        if lane is None:
+            if not self.trie.match(message.topic):
+                # Nobody would receive it; don't keep a lane for the topic.
+                if replayed:
+                    self._held.append((message, offset))
+                elif offset is not None:
+                    self._cursor.done(offset)
+                return
+            lane = self.lanes[message.topic] = TopicLane(message.topic, self.max_pending)
+            if self.running:
+                self._spawn_consumers(lane)
+        lane.last_active = time.monotonic()
+        sort_key = time.monotonic() - message.priority.value * self.aging_interval
+        # Blocks the publisher while the lane is full (backpressure).
+        await lane.queue.put((sort_key, next(self._sequence), message, offset))
+
+    def _schedule_sync(self):
+        # Bounds how long an idle bus leaves appended records unsynced.
+        if self._sync_handle is None and self.durable_log.unsynced:
+            loop = asyncio.get_running_loop()
+            self._sync_handle = loop.call_later(self.durable_log.sync_interval, self._sync_log)
+
+    def _sync_log(self):
+        self._sync_handle = None
+        self.durable_log.sync()
+
+    def _spawn_consumers(self, lane: TopicLane):
+        while len(lane.consumers) < self.consumers_per_topic:
+            lane.consumers.append(asyncio.create_task(self._consume(lane)))
+
+    async def _consume(self, lane: TopicLane):
+        while True:
+            _, _, message, offset = await lane.queue.get()
+            lane.in_flight += 1
+            try:
+                await self._dispatch(message)
+            except asyncio.CancelledError:
+                offset = None  # interrupted by stop(): leave it for replay
+                raise
             except Exception as e:
                 print(f"[MessageBus] Error: {e}")
+            finally:
+                if offset is not None:
+                    self._cursor.done(offset)
+                lane.in_flight -= 1
+                lane.last_active = time.monotonic()
+                lane.queue.task_done()
+
+    async def _reap_idle_lanes(self):
+        interval = max(self.lane_idle_timeout / 2, 0.001)
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.monotonic() - self.lane_idle_timeout
+            for topic, lane in list(self.lanes.items()):
+                if lane.idle_since(cutoff):
+                    # Consumers are parked on an empty queue, so nothing is lost.
+                    del self.lanes[topic]
+                    for task in lane.consumers:
+                        task.cancel()
+
+    async def _dispatch(self, message: Message):
+        for handler in self.trie.match(message.topic):
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(message)
+                else:
+                    handler(message)
+            except Exception as e:
+                print(f"[MessageBus] Error in handler: {e}")
 
 message_bus = MessageBus()
 
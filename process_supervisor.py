@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Process Supervisor
+- Asyncio-based supervisor that actually launches worker processes
+  (agent.py / discord.py) on top of GenericSupervisor's state and events
+- Collects exit codes from the event loop's child watcher
+- Restarts crashed workers with exponential backoff and jitter
+- Applies per-worker CPU/memory limits via resource rlimits, and via
+  cgroups v2 when a writable cgroup root is available
+- Spawns hundreds of workers concurrently and records time-to-recover
+- Kills and restarts hung workers whose reported heartbeat timed out, for
+  specs that opt in with reports_heartbeat=True (those workers call
+  report_heartbeat(), which touches $SUPERVISOR_HEARTBEAT_FILE)
+"""
+
+import asyncio
+import os
+import random
+import signal
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from generic_supervisor import GenericSupervisor, WorkerStatus
+
+HEARTBEAT_ENV = "SUPERVISOR_HEARTBEAT_FILE"
+
+
+def report_heartbeat():
+    """Called from inside a supervised worker process to report that it is alive"""
+    path = os.environ.get(HEARTBEAT_ENV)
+    if path:
+        Path(path).touch()
+
+
+@dataclass
+class BackoffPolicy:
+    """Exponential restart backoff with jitter"""
+    base: float = 0.5  # seconds before the first restart
+    factor: float = 2.0
+    max_delay: float = 60.0
+    jitter: float = 0.5  # fraction of the delay that is randomised
+    stable_after: float = 30.0  # uptime after which the attempt counter resets
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base * self.factor ** attempt)
+        return delay * (1 - self.jitter * random.random())
+
+
+@dataclass
+class ProcessSpec:
+    """How to launch and constrain one worker process"""
+    worker_id: str
+    command: List[str]
+    name: Optional[str] = None
+    worker_type: str = "process"
+    cwd: Optional[str] = None
+    env: Dict[str, str] = field(default_factory=dict)
+    cpu_seconds: Optional[int] = None  # RLIMIT_CPU
+    max_memory_mb: Optional[int] = None  # RLIMIT_AS, and memory.max under cgroups v2
+    cpu_quota: Optional[float] = None  # CPUs, cgroups v2 cpu.max only
+    # False: a live process counts as a heartbeat (exit-only supervision). True: only
+    # heartbeats the worker reports count, so a hung process times out and is killed.
+    # Opt in only for workers that call report_heartbeat(); others would be restarted
+    # every heartbeat_timeout
+    reports_heartbeat: bool = False
+
+    @classmethod
+    def for_agent(cls, agent_dir: str, entry: str = "agent.py", **kwargs) -> "ProcessSpec":
+        """Spec for an agent directory's agent.py or discord.py"""
+        agent_dir = Path(agent_dir)
+        suffix = "" if entry == "agent.py" else f":{Path(entry).stem}"
+        return cls(
+            worker_id=kwargs.pop("worker_id", f"{agent_dir.name}{suffix}"),
+            command=[sys.executable, entry],
+            name=kwargs.pop("name", agent_dir.name),
+            worker_type=kwargs.pop("worker_type", "agent"),
+            cwd=str(agent_dir),
+            **kwargs
+        )
+
+
+def cgroup_v2_root() -> Optional[Path]:
+    """Writable cgroup v2 directory for our children, if the host allows it"""
+    root = Path("/sys/fs/cgroup")
+    if not (root / "cgroup.controllers").exists():
+        return None
+    own = Path("/proc/self/cgroup")
+    if own.exists():
+        # "0::/some/path" on a unified hierarchy
+        rel = own.read_text().strip().split("::", 1)[-1].lstrip("/")
+        parent = root / rel
+        if os.access(parent, os.W_OK):
+            return parent
+    return root if os.access(root, os.W_OK) else None
+
+
+class ProcessSupervisor(GenericSupervisor):
+    """Supervisor that owns real child processes"""
+
+    def __init__(self, config_file: Optional[str] = None,
+                 backoff: Optional[BackoffPolicy] = None,
+                 spawn_concurrency: int = 64,
+                 cgroup_root: Optional[str] = "auto"):
+        """
+        Initialize the process supervisor
+
+        Args:
+            config_file: Path to configuration file (optional)
+            backoff: Restart backoff policy
+            spawn_concurrency: Max processes being spawned at the same time
+            cgroup_root: cgroup v2 directory for per-worker groups; "auto" detects
+                a writable one, None disables cgroups (rlimits still apply)
+        """
+        super().__init__(config_file)
+        self.backoff = backoff or BackoffPolicy()
+        self.spawn_concurrency = spawn_concurrency
+        self.cgroup_root = cgroup_v2_root() if cgroup_root == "auto" else \
+            (Path(cgroup_root) if cgroup_root else None)
+
+        self.specs: Dict[str, ProcessSpec] = {}
+        self.processes: Dict[str, asyncio.subprocess.Process] = {}
+        self.exit_codes: Dict[str, int] = {}
+        self.recovery_times: deque = deque(maxlen=1000)
+        self._watchers: Dict[str, asyncio.Task] = {}
+        self._restarts: Dict[str, asyncio.Task] = {}
+        self._started_at: Dict[str, float] = {}
+        self._crashed_at: Dict[str, float] = {}
+        self._stopping: set = set()
+        self._spawn_slots: Optional[asyncio.Semaphore] = None
+        self.heartbeat_dir = Path(self.config_file).parent / "heartbeats"
+        self._heartbeat_mtime: Dict[str, float] = {}
+
+    def add_process(self, spec: ProcessSpec) -> bool:
+        """Register a process worker (does not start it)"""
+        self.specs[spec.worker_id] = spec
+        return self.register_worker(spec.worker_id, spec.name or spec.worker_id, spec.worker_type,
+                                    metadata={'command': spec.command, 'cwd': spec.cwd})
+
+    def is_running(self, worker_id: str) -> bool:
+        proc = self.processes.get(worker_id)
+        return proc is not None and proc.returncode is None
+
+    def _cgroup_for(self, spec: ProcessSpec) -> Optional[Path]:
+        if not self.cgroup_root or not (spec.max_memory_mb or spec.cpu_quota):
+            return None
+        group = self.cgroup_root / f"supervisor-{spec.worker_id.replace('/', '_')}"
+        try:
+            group.mkdir(exist_ok=True)
+            if spec.max_memory_mb:
+                (group / "memory.max").write_text(str(spec.max_memory_mb * 1024 * 1024))
+            if spec.cpu_quota:
+                period = 100_000
+                (group / "cpu.max").write_text(f"{int(spec.cpu_quota * period)} {period}")
+        except OSError as e:
+            print(f"⚠️ cgroup setup failed for '{spec.worker_id}', using rlimits only: {e}")
+            return None
+        return group
+
+    @staticmethod
+    def _preexec(spec: ProcessSpec, cgroup: Optional[Path]):
+        """Build the function run in the child between fork and exec"""
+        def limit():
+            if cgroup is not None:
+                (cgroup / "cgroup.procs").write_text(str(os.getpid()))
+            if resource is not None:
+                if spec.cpu_seconds:
+                    resource.setrlimit(resource.RLIMIT_CPU, (spec.cpu_seconds, spec.cpu_seconds + 5))
+                if spec.max_memory_mb:
+                    limit_bytes = spec.max_memory_mb * 1024 * 1024
+                    resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+        return limit
+
+    async def start(self, worker_id: str) -> bool:
+        """
+        Launch a registered process worker
+
+        Args:
+            worker_id: Worker ID
+
+        Returns:
+            True if the process was started
+        """
+        if worker_id not in self.specs:
+            print(f"❌ Worker '{worker_id}' not found")
+            return False
+        if self.is_running(worker_id):
+            return True
+
+        spec = self.specs[worker_id]
+        if self._spawn_slots is None:
+            self._spawn_slots = asyncio.Semaphore(self.spawn_concurrency)
+        self._stopping.discard(worker_id)
+
+        env = {**os.environ, **spec.env}
+        if spec.reports_heartbeat:
+            self.heartbeat_dir.mkdir(parents=True, exist_ok=True)
+            heartbeat_file = self.heartbeat_dir / worker_id
+            heartbeat_file.unlink(missing_ok=True)
+            self._heartbeat_mtime.pop(worker_id, None)
+            env[HEARTBEAT_ENV] = str(heartbeat_file)
+
+        async with self._spawn_slots:
+            cgroup = self._cgroup_for(spec)
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *spec.command,
+                    cwd=spec.cwd,
+                    env=env,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    start_new_session=True,
+                    preexec_fn=self._preexec(spec, cgroup)
+                )
+            except OSError as e:
+                self.update_worker_status(worker_id, WorkerStatus.ERROR.value, f"spawn failed: {e}")
+                return False
+
+        now = time.monotonic()
+        self.processes[worker_id] = proc
+        self._started_at[worker_id] = now
+        self.workers[worker_id].metadata['pid'] = proc.pid
+        self.workers[worker_id].metadata['started_at'] = datetime.now().isoformat()
+        self.update_worker_status(worker_id, WorkerStatus.IDLE.value)
+        self.update_heartbeat(worker_id)
+
+        crashed_at = self._crashed_at.pop(worker_id, None)
+        if crashed_at is not None:
+            recovered = now - crashed_at
+            self.recovery_times.append(recovered)
+            self.log_event('worker_recovered', worker_id, {'seconds': round(recovered, 4)})
+
+        self.log_event('worker_started', worker_id, {'pid': proc.pid})
+        self._watchers[worker_id] = asyncio.create_task(self._watch(worker_id, proc))
+        return True
+
+    async def start_all(self, worker_ids: Optional[List[str]] = None) -> int:
+        """Start many workers concurrently, returns how many are running"""
+        ids = list(worker_ids or self.specs)
+        results = await asyncio.gather(*(self.start(worker_id) for worker_id in ids))
+        return sum(1 for ok in results if ok)
+
+    async def _watch(self, worker_id: str, proc: asyncio.subprocess.Process):
+        """Wait for the process to exit and decide what happens next"""
+        code = await proc.wait()
+        self.exit_codes[worker_id] = code
+        uptime = time.monotonic() - self._started_at.get(worker_id, time.monotonic())
+        self.workers[worker_id].metadata['pid'] = None
+        self.log_event('worker_exited', worker_id, {'code': code, 'uptime': round(uptime, 3)})
+
+        if worker_id in self._stopping:
+            return
+
+        if uptime >= self.backoff.stable_after:
+            self.workers[worker_id].restart_count = 0
+
+        self._crashed_at[worker_id] = time.monotonic()
+        reason = f"killed by signal {-code}" if code < 0 else f"exited with code {code}"
+        self.update_worker_status(worker_id, WorkerStatus.ERROR.value, reason)
+        if self.config.auto_restart:
+            self.restart_worker(worker_id)
+
+    def restart_worker(self, worker_id: str, delay: Optional[float] = None) -> bool:
+        """
+        Restart a worker process after a backoff delay
+
+        A hung process (e.g. heartbeat timeout) is killed first.
+
+        Args:
+            worker_id: Worker ID
+            delay: Delay before restart (seconds), uses the backoff policy if None
+
+        Returns:
+            True if restart was scheduled
+        """
+        if worker_id not in self.specs:
+            return super().restart_worker(worker_id, delay)
+        if worker_id in self._restarts and not self._restarts[worker_id].done():
+            return True
+
+        worker = self.workers[worker_id]
+        if delay is None:
+            delay = self.backoff.delay(worker.restart_count)
+        if not super().restart_worker(worker_id, delay):
+            return False
+
+        self._restarts[worker_id] = asyncio.get_running_loop().create_task(
+            self._respawn(worker_id, delay))
+        return True
+
+    async def _respawn(self, worker_id: str, delay: float):
+        if self.is_running(worker_id):
+            await self._terminate(worker_id)
+            self._crashed_at[worker_id] = time.monotonic()
+        await asyncio.sleep(delay)
+        if worker_id not in self._stopping:
+            await self.start(worker_id)
+
+    async def _terminate(self, worker_id: str, timeout: float = 5.0):
+        proc = self.processes.get(worker_id)
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+            await asyncio.wait_for(proc.wait(), timeout)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            os.killpg(proc.pid, signal.SIGKILL)
+            await proc.wait()
+
+    async def stop(self, worker_id: str, timeout: float = 5.0) -> bool:
+        """Stop a worker process without restarting it"""
+        if worker_id not in self.specs:
+            print(f"❌ Worker '{worker_id}' not found")
+            return False
+        self._stopping.add(worker_id)
+        restart = self._restarts.pop(worker_id, None)
+        if restart:
+            restart.cancel()
+        await self._terminate(worker_id, timeout)
+        watcher = self._watchers.pop(worker_id, None)
+        if watcher:
+            await watcher
+        return self.stop_worker(worker_id)
+
+    async def monitor(self, stop_event: Optional[asyncio.Event] = None):
+        """Non-blocking monitoring loop (asyncio counterpart of monitor_loop)"""
+        self.running = True
+        stop_event = stop_event or asyncio.Event()
+        print(f"👁️ Process supervisor started (interval: {self.config.monitor_interval}s)")
+        while not stop_event.is_set():
+            self.collect_heartbeats()
+            self.check_all_workers()
+            self.flush()
+            try:
+                await asyncio.wait_for(stop_event.wait(), self.config.monitor_interval)
+            except asyncio.TimeoutError:
+                pass
+        self.running = False
+
+    def collect_heartbeats(self):
+        """Record heartbeats reported by running workers since the last pass"""
+        for worker_id in list(self.processes):
+            if not self.is_running(worker_id):
+                continue
+            if not self.specs[worker_id].reports_heartbeat:
+                self.update_heartbeat(worker_id)
+                continue
+            try:
+                mtime = (self.heartbeat_dir / worker_id).stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime != self._heartbeat_mtime.get(worker_id):
+                self._heartbeat_mtime[worker_id] = mtime
+                self.update_heartbeat(worker_id, at=mtime)
+
+    async def shutdown(self, timeout: float = 5.0):
+        """Stop every process and close the state store"""
+        await asyncio.gather(*(self.stop(worker_id, timeout) for worker_id in list(self.specs)))
+        self.close()
+
+    def recovery_stats(self) -> Dict[str, float]:
+        """Time from crash to replacement process start"""
+        times = sorted(self.recovery_times)
+        if not times:
+            return {'count': 0}
+        return {
+            'count': len(times),
+            'p50': times[len(times) // 2],
+            'p99': times[min(len(times) - 1, int(len(times) * 0.99))],
+            'max': times[-1]
+        }
+
+
+async def main():
+    """Demo: a worker that crashes twice, then stays up"""
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp:
+        marker = Path(tmp) / "runs"
+        script = (
+            "import pathlib, sys, time\n"
+            f"p = pathlib.Path({str(marker)!r})\n"
+            "n = int(p.read_text()) if p.exists() else 0\n"
+            "p.write_text(str(n + 1))\n"
+            "sys.exit(1) if n < 2 else time.sleep(60)\n"
+        )
+        supervisor = ProcessSupervisor(str(Path(tmp) / "supervisor_config.json"),
+                                       backoff=BackoffPolicy(base=0.1))
+        supervisor.add_process(ProcessSpec("flaky", [sys.executable, "-c", script], max_memory_mb=512))
+        await supervisor.start_all()
+        await asyncio.sleep(1.5)
+        print(f"exit codes: {supervisor.exit_codes}, running: {supervisor.is_running('flaky')}")
+        print(f"recovery: {supervisor.recovery_stats()}")
+        await supervisor.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
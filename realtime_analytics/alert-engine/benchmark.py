@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""AlertEngine benchmark - 100k indexed rules against metric batches
+
+Usage:
+    python benchmark.py --rules 100000 --metrics 10000 --batch-metrics 200
+"""
+
+import argparse
+import random
+import time
+
+from implementation import AlertEngine, AlertRule
+
+def build_rules(count: int, metrics: int, hosts: int):
+    """Mixed rules, thresholds set so that only a small fraction fire (latency ~ Exp(mean 400))."""
+    rng = random.Random(7)
+    rules = []
+    for i in range(count):
+        metric = f"svc{i % metrics}.latency_ms"
+        kind = (i // metrics) % 4
+        if kind == 0:
+            rule = AlertRule(i, f"rule-{i}", metric, '>', rng.uniform(1500, 3000))
+        elif kind == 1:
+            rule = AlertRule(i, f"rule-{i}", metric, '>', rng.uniform(700, 900), aggregation='avg',
+                             time_window=300, for_duration=60, clear_threshold=500)
+        elif kind == 2:
+            rule = AlertRule(i, f"rule-{i}", metric, '>=', rng.uniform(2000, 3000), aggregation='p95',
+                             time_window=300, group_by=('region',))
+        else:
+            rule = AlertRule(i, f"rule-{i}", metric, '<', rng.uniform(0.05, 1.0),
+                             labels={'host': f"h{rng.randrange(hosts)}"})
+        rules.append(rule)
+    return rules
+
+
+def legacy_evaluate(alerts, metrics):
+    """Previous AlertEngine.evaluate(): every alert is checked against every snapshot."""
+    triggered = []
+    for alert in alerts.values():
+        metric_name = alert['condition'].get('metric')
+        threshold = alert['condition'].get('threshold')
+        if metric_name in metrics:
+            if metrics[metric_name] > threshold:
+                triggered.append(alert)
+    return triggered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AlertEngine rule-index benchmark")
+    parser.add_argument("--rules", type=int, default=100_000)
+    parser.add_argument("--metrics", type=int, default=10_000)
+    parser.add_argument("--hosts", type=int, default=10)
+    parser.add_argument("--batch-metrics", type=int, default=200, help="metrics present in each batch")
+    parser.add_argument("--batches", type=int, default=30, help="batches, one per 10 s of event time")
+    args = parser.parse_args()
+
+    rules = build_rules(args.rules, args.metrics, args.hosts)
+    engine = AlertEngine({'rate_limit': None})
+    start = time.perf_counter()
+    for rule in rules:
+        engine.add_rule(rule)
+    print(f"indexed {len(rules)} rules over {args.metrics} metrics in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(1)
+    t0 = 1_760_000_000.0
+    batches = []
+    for b in range(args.batches):
+        picked = rng.sample(range(args.metrics), args.batch_metrics)
+        batches.append([(f"svc{m}.latency_ms", rng.expovariate(1 / 400),
+                         {'host': f"h{h}", 'region': f"r{h % 3}"}, t0 + b * 10)
+                        for m in picked for h in range(args.hosts)])
+
+    def run(label, offset):
+        engine.rule_evaluations = 0
+        begin = time.perf_counter()
+        notifications = 0
+        for b, batch in enumerate(batches):
+            shifted = [(metric, value, labels, ts + offset) for metric, value, labels, ts in batch]
+            notifications += len(engine.evaluate(shifted, now=t0 + offset + b * 10))
+        elapsed = time.perf_counter() - begin
+        samples = sum(len(batch) for batch in batches)
+        print(f"  {label:<24} {elapsed / len(batches) * 1000:8.2f} ms/batch  {samples / elapsed / 1e3:5.0f}k samples/s  "
+              f"{engine.rule_evaluations // len(batches):>6} of {args.rules} rules evaluated/batch  "
+              f"{notifications} notifications")
+
+    print(f"{args.batches} batches of {args.batch_metrics} metrics x {args.hosts} hosts:")
+    run("first pass (new series)", 0)
+    run("steady state", 300)
+    one = [batches[0][0]]
+    begin = time.perf_counter()
+    for i in range(1000):
+        engine.evaluate(one, now=t0 + 600 + i)
+    print(f"  {'single-sample batch':<24} {(time.perf_counter() - begin):8.3f} ms/batch  "
+          f"{engine.last_batch_evaluations} rules evaluated")
+
+    legacy = {i: {'id': i, 'condition': {'metric': r.metric, 'threshold': r.threshold}, 'triggered_count': 0}
+              for i, r in enumerate(rules)}
+    start = time.perf_counter()
+    for batch in batches:
+        snapshot = {metric: value for metric, value, _, _ in batch}
+        legacy_evaluate(legacy, snapshot)
+    elapsed = time.perf_counter() - start
+    print(f"legacy loop over every rule ('>' only, no labels/windows/state):")
+    print(f"  {'per batch':<24} {elapsed / len(batches) * 1000:8.2f} ms/batch  {args.rules} rules evaluated")
+
+
+if __name__ == "__main__":
+    main()
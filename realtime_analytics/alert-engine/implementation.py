@@ -2,11 +2,215 @@
 """
 Alert Engine Module
 アラートエンジン
+
+ルールはメトリクス名 (と先頭のラベル条件) で索引し、メトリクスのバッチに
+含まれるシリーズに関係するルールだけを評価する。ルールの状態遷移は
+inactive -> pending (for) -> firing -> resolved。通知はルールとグループ単位で
+まとめ、クールダウンと全体のレート制限をかけてから送る。
 """
 
-from typing import Dict, Any, List
-from datetime import datetime
-import asyncio
+import heapq
+import math
+import operator
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+OPERATORS: Dict[str, Callable[[float, float], bool]] = {
+    '>': operator.gt, '<': operator.lt, '>=': operator.ge,
+    '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+}
+AGGREGATIONS = ('last', 'avg', 'sum', 'min', 'max', 'count')
+_PERCENTILE = re.compile(r'^p(\d{1,2}(?:\.\d+)?)$')
+
+LabelKey = Tuple[Tuple[str, str], ...]
+_MISSING = object()
+
+
+def parse_aggregation(aggregation: str) -> Tuple[str, Optional[float]]:
+    """'avg' -> ('avg', None)、'p95' -> ('percentile', 95.0)"""
+    if aggregation in AGGREGATIONS:
+        return aggregation, None
+    match = _PERCENTILE.match(aggregation or '')
+    if not match or not 0 < float(match.group(1)) < 100:
+        raise ValueError(f"unsupported aggregation: {aggregation!r} "
+                         f"(expected one of {', '.join(AGGREGATIONS)} or p1..p99.9)")
+    return 'percentile', float(match.group(1))
+
+
+def percentile(values: List[float], q: float) -> float:
+    """線形補間のパーセンタイル (q は 0..100)"""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _aggregate(kind: str, q: Optional[float], values: List[float]) -> float:
+    if kind == 'avg':
+        return sum(values) / len(values)
+    if kind == 'sum':
+        return sum(values)
+    if kind == 'min':
+        return min(values)
+    if kind == 'max':
+        return max(values)
+    if kind == 'count':
+        return float(len(values))
+    return percentile(values, q)
+
+
+@dataclass
+class AlertRule:
+    """アラートルール
+
+    time_window 秒 (0 なら最新値) の aggregation 値を threshold と比較する。
+    条件が for_duration 秒続くと firing になり、clear_threshold (既定は threshold)
+    を越えて戻るまで firing のまま (ヒステリシス)。
+    """
+    id: Any
+    name: str
+    metric: str
+    operator: str = '>'
+    threshold: float = 0.0
+    aggregation: str = 'last'
+    time_window: float = 0.0
+    for_duration: float = 0.0
+    clear_threshold: Optional[float] = None
+    labels: Dict[str, str] = field(default_factory=dict)
+    group_by: Tuple[str, ...] = ()
+    severity: str = 'warning'
+    cooldown: float = 0.0
+    repeat_interval: Optional[float] = None
+    channels: List[str] = field(default_factory=list)
+    enabled: bool = True
+    triggered_count: int = 0
+
+    def __post_init__(self):
+        if self.operator not in OPERATORS:
+            raise ValueError(f"unsupported operator: {self.operator!r}")
+        self._kind, self._q = parse_aggregation(self.aggregation)
+        if self.time_window < 0 or self.for_duration < 0 or self.cooldown < 0:
+            raise ValueError("time_window, for_duration and cooldown must be >= 0")
+        if self._kind != 'last' and self.time_window == 0:
+            raise ValueError(f"aggregation {self.aggregation!r} requires a time_window")
+        self.threshold = float(self.threshold)
+        if self.clear_threshold is None:
+            self.clear_threshold = self.threshold
+        self.clear_threshold = float(self.clear_threshold)
+        if ((self.operator in ('>', '>=') and self.clear_threshold > self.threshold) or
+                (self.operator in ('<', '<=') and self.clear_threshold < self.threshold)):
+            raise ValueError("clear_threshold must be on the non-alerting side of threshold")
+        self.group_by = tuple(self.group_by)
+        self.labels = {k: str(v) for k, v in self.labels.items()}
+        self._compare = OPERATORS[self.operator]
+        self._window_key = (self._kind, self._q, self.time_window)
+
+    def matches(self, labels: Dict[str, str]) -> bool:
+        return all(labels.get(k) == v for k, v in self.labels.items())
+
+    def is_active(self, value: float) -> bool:
+        return self._compare(value, self.threshold)
+
+    def is_cleared(self, value: float) -> bool:
+        """firing 中のアラートを解消してよいか"""
+        op = self.operator
+        if op == '>':
+            return value <= self.clear_threshold
+        if op == '>=':
+            return value < self.clear_threshold
+        if op == '<':
+            return value >= self.clear_threshold
+        if op == '<=':
+            return value > self.clear_threshold
+        return not self._compare(value, self.threshold)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id, 'name': self.name, 'metric': self.metric, 'operator': self.operator,
+            'threshold': self.threshold, 'aggregation': self.aggregation, 'time_window': self.time_window,
+            'for_duration': self.for_duration, 'clear_threshold': self.clear_threshold,
+            'labels': dict(self.labels), 'group_by': list(self.group_by), 'severity': self.severity,
+            'cooldown': self.cooldown, 'repeat_interval': self.repeat_interval,
+            'channels': list(self.channels), 'enabled': self.enabled,
+            'triggered_count': self.triggered_count,
+        }
+
+
+@dataclass
+class Notification:
+    """グループ単位の通知 (同じルール・グループ・状態のアラートをまとめる)"""
+    rule_id: Any
+    rule_name: str
+    severity: str
+    status: str  # firing | resolved
+    group: Dict[str, Optional[str]]
+    alerts: List[Dict[str, Any]]
+    channels: List[str]
+    timestamp: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'rule_id': self.rule_id, 'rule_name': self.rule_name, 'severity': self.severity,
+            'status': self.status, 'group': self.group, 'alerts': self.alerts,
+            'channels': self.channels, 'timestamp': self.timestamp,
+        }
+
+
+class _MetricRules:
+    """1 メトリクス分のルール索引"""
+    __slots__ = ('wildcard', 'anchored', 'window', 'version')
+
+    def __init__(self):
+        self.wildcard: List[AlertRule] = []
+        self.anchored: Dict[Tuple[str, str], List[AlertRule]] = {}
+        self.window = 0.0
+        self.version = 0
+
+    def bucket(self, rule: AlertRule) -> List[AlertRule]:
+        if not rule.labels:
+            return self.wildcard
+        return self.anchored.setdefault(min(rule.labels.items()), [])
+
+    def candidates(self, labels: Dict[str, str]) -> List[AlertRule]:
+        rules = list(self.wildcard)
+        anchored = self.anchored
+        if anchored:
+            for pair in labels.items():
+                for rule in anchored.get(pair, ()):
+                    if rule.matches(labels):
+                        rules.append(rule)
+        return rules
+
+
+class _Series:
+    __slots__ = ('metric', 'labels', 'key', 'times', 'values', 'rules', 'version')
+
+    def __init__(self, metric: str, labels: Dict[str, str], key: LabelKey):
+        self.metric = metric
+        self.labels = labels
+        self.key = key
+        self.times: Deque[float] = deque()
+        self.values: Deque[float] = deque()
+        self.rules: List[AlertRule] = []
+        self.version = -1
+
+
+class _Instance:
+    """(ルール, シリーズ) ごとのアラート状態"""
+    __slots__ = ('state', 'since', 'fired_at', 'value', 'labels', 'notified_at', 'seq')
+
+    def __init__(self, since: float, labels: Dict[str, str]):
+        self.state = 'pending'
+        self.since = since
+        self.fired_at: Optional[float] = None
+        self.value = 0.0
+        self.labels = labels
+        self.notified_at: Optional[float] = None
+        self.seq = 0
 
 
 class AlertEngine:
@@ -14,33 +218,388 @@ class AlertEngine:
 
     def __init__(self, config: Dict[str, Any] = None):
         self.config = config or {}
-        self.alerts = {}
-
-    def add_alert(self, alert_id: str, name: str, condition: Dict[str, Any]):
-        """アラートを追加"""
-        self.alerts[alert_id] = {
-            'id': alert_id,
-            'name': name,
-            'condition': condition,
-            'triggered_count': 0
-        }
+        self.rules: Dict[Any, AlertRule] = {}
+        self.rate_limit = self.config.get('rate_limit', 10.0)  # 通知/秒 (None で無制限)
+        self.burst = self.config.get('burst', 50)
+        self.max_samples_per_series = self.config.get('max_samples_per_series', 10_000)
+        # この秒数サンプルが来ず、アラート状態も無いシリーズは捨てる
+        self.series_idle_timeout = self.config.get('series_idle_timeout', 3600.0)
+        self._swept_at: Optional[float] = None
+
+        self._index: Dict[str, _MetricRules] = {}
+        self._series: Dict[Tuple[str, LabelKey], _Series] = {}
+        self._instances: Dict[Tuple[Any, Tuple[str, LabelKey]], _Instance] = {}
+        self._pending: List[Tuple[float, int, Any, Tuple[str, LabelKey]]] = []
+        self._group_sent: Dict[Tuple[Any, tuple], float] = {}
+        self._deferred: List[Tuple[AlertRule, str, _Instance]] = []  # レート制限で見送った通知
+        self._notifiers: List[Callable[[Notification], Any]] = []
+        self._state_listeners: List[Callable[[str, AlertRule, Dict[str, Any]], Any]] = []
+        self._seq = 0
+        self._tokens = float(self.burst)
+        self._refilled_at: Optional[float] = None
+
+        self.samples = 0
+        self.rule_evaluations = 0
+        self.last_batch_evaluations = 0
+        self.notifications_sent = 0
+        self.suppressed = 0
+        self.rate_limited = 0
+
+    # --- ルール管理 -------------------------------------------------------
+
+    def add_rule(self, rule: AlertRule) -> AlertRule:
+        """ルールを追加 (同じ ID は置き換え)"""
+        if rule.id in self.rules:
+            self.remove_rule(rule.id)
+        self.rules[rule.id] = rule
+        entry = self._index.get(rule.metric)
+        if entry is None:
+            entry = self._index[rule.metric] = _MetricRules()
+        entry.bucket(rule).append(rule)
+        entry.window = max(entry.window, rule.time_window)
+        entry.version += 1
+        return rule
+
+    def add_alert(self, alert_id: str, name: str, condition: Dict[str, Any]) -> AlertRule:
+        """アラートを追加 (condition: metric/operator/threshold と任意の AlertRule 項目、for は for_duration)"""
+        options = dict(condition)
+        if 'for' in options:
+            options['for_duration'] = options.pop('for')
+        return self.add_rule(AlertRule(id=alert_id, name=name, **options))
+
+    def remove_rule(self, rule_id: Any) -> bool:
+        """ルールと、そのアクティブなアラート状態を削除"""
+        rule = self.rules.pop(rule_id, None)
+        if rule is None:
+            return False
+        entry = self._index[rule.metric]
+        bucket = entry.bucket(rule)
+        bucket.remove(rule)
+        if not bucket and rule.labels:
+            del entry.anchored[min(rule.labels.items())]
+        remaining = entry.wildcard + [r for rules in entry.anchored.values() for r in rules]
+        entry.window = max((r.time_window for r in remaining), default=0.0)
+        entry.version += 1
+        if not remaining:
+            # このメトリクスを見るルールが無くなった: サンプルも保持しない
+            del self._index[rule.metric]
+            for key in [k for k in self._series if k[0] == rule.metric]:
+                del self._series[key]
+        for key in [k for k in self._instances if k[0] == rule_id]:
+            del self._instances[key]
+        self._deferred = [t for t in self._deferred if t[0] is not rule]
+        return True
+
+    def add_notifier(self, notifier: Callable[[Notification], Any]):
+        """送信する通知を受け取る関数を登録"""
+        self._notifiers.append(notifier)
+
+    def add_state_listener(self, listener: Callable[[str, AlertRule, Dict[str, Any]], Any]):
+        """firing / resolved への状態遷移ごとに (status, rule, alert) で呼ぶ関数を登録
+
+        通知と違い、グループ化・クールダウン・レート制限に左右されない (履歴の記録用)。
+        """
+        self._state_listeners.append(listener)
+
+    def _state_changed(self, status: str, rule: AlertRule, instance: '_Instance'):
+        alert = {'labels': dict(instance.labels), 'value': instance.value, 'since': instance.since,
+                 'fired_at': instance.fired_at}
+        for listener in self._state_listeners:
+            try:
+                listener(status, rule, alert)
+            except Exception as e:
+                print(f"[AlertEngine] state listener error: {e}")
+
+    # --- 評価 -------------------------------------------------------------
+
+    def evaluate(self, metrics, now: Optional[float] = None) -> List[Notification]:
+        """メトリクスのバッチを評価し、送信した通知を返す
+
+        metrics は {metric: value} のスナップショット、または
+        {"metric", "value", "labels", "timestamp"} の dict / (metric, value[, labels[, timestamp]])
+        のタプルの列。時刻は epoch 秒 (省略時は now)。
+        """
+        now = time.time() if now is None else now
+        touched: Dict[Tuple[str, LabelKey], _Series] = {}
+        index = self._index
+        cap = self.max_samples_per_series
+        for metric, value, labels, ts in self._samples(metrics):
+            entry = index.get(metric)
+            if entry is None:
+                continue  # このメトリクスを見るルールが無い
+            key = (metric, tuple(sorted(labels.items())) if labels else ())
+            series = self._series.get(key)
+            if series is None:
+                series_labels = dict(key[1])
+                rules = entry.candidates(series_labels)
+                if not rules:
+                    continue  # どのルールのラベル条件にも合わない
+                series = self._series[key] = _Series(metric, series_labels, key[1])
+                series.rules, series.version = rules, entry.version
+            self.samples += 1
+            series.times.append(now if ts is None else ts)
+            series.values.append(float(value))
+            if len(series.values) > cap:
+                series.times.popleft()
+                series.values.popleft()
+            touched[key] = series
+
+        transitions: List[Tuple[AlertRule, str, _Instance]] = []
+        instances = self._instances
+        evaluations = 0
+        for key, series in touched.items():
+            entry = index[series.metric]
+            if series.version != entry.version:
+                series.rules = entry.candidates(series.labels)
+                series.version = entry.version
+                if not series.rules:
+                    del self._series[key]  # ルール変更で対象外になった (状態も残っていない)
+                    continue
+            self._trim(series, now, entry.window)
+            if not series.values:
+                continue
+            cache: Dict[Tuple[str, Optional[float], float], Optional[float]] = {}
+            last = series.values[-1]
+            for rule in series.rules:
+                if not rule.enabled:
+                    continue
+                if rule._kind == 'last':
+                    value = last
+                else:
+                    value = cache.get(rule._window_key, _MISSING)
+                    if value is _MISSING:
+                        value = cache[rule._window_key] = self._window_value(rule, series, now)
+                if value is None:
+                    continue
+                # 大半のルールは非アクティブのまま: 状態が無く条件も満たさなければ何もしない
+                if not rule._compare(value, rule.threshold) and (rule.id, key) not in instances:
+                    continue
+                self._step(rule, key, series, value, now, transitions)
+            evaluations += len(series.rules)
+        self.rule_evaluations += evaluations
+        self.last_batch_evaluations = evaluations
+        self._promote_due(now, transitions)
+        if self._swept_at is None:
+            self._swept_at = now
+        elif now - self._swept_at >= self.series_idle_timeout:
+            self._evict_idle_series(now)
+        return self._notify(transitions, now)
 
-    def evaluate(self, metrics: Dict[str, Any]) -> List:
-        """アラートを評価"""
-        triggered = []
-        for alert in self.alerts.values():
-            metric_name = alert['condition'].get('metric')
-            operator = alert['condition'].get('operator', '>')
-            threshold = alert['condition'].get('threshold')
+    def _evict_idle_series(self, now: float):
+        """series_idle_timeout の間サンプルが無く、pending / firing も無いシリーズを捨てる"""
+        self._swept_at = now
+        cutoff = now - self.series_idle_timeout
+        active = {series_key for _, series_key in self._instances}
+        for key in [k for k, s in self._series.items()
+                    if k not in active and (not s.times or s.times[-1] < cutoff)]:
+            del self._series[key]
 
-            if metric_name in metrics:
-                value = metrics[metric_name]
-                if operator == '>' and value > threshold:
-                    alert['triggered_count'] += 1
-                    triggered.append(alert)
-        return triggered
+    def tick(self, now: Optional[float] = None) -> List[Notification]:
+        """新しいサンプルが無くても for_duration を満了した pending を firing にし、
+        レート制限で見送った通知をトークンの範囲で送る"""
+        now = time.time() if now is None else now
+        transitions: List[Tuple[AlertRule, str, _Instance]] = []
+        self._promote_due(now, transitions)
+        return self._notify(transitions, now)
+
+    @staticmethod
+    def _samples(metrics) -> Iterable[Tuple[str, float, Optional[Dict[str, str]], Optional[float]]]:
+        if isinstance(metrics, dict) and 'metric' not in metrics:
+            for metric, value in metrics.items():
+                if isinstance(value, (int, float)):
+                    yield metric, value, None, None
+            return
+        if isinstance(metrics, dict):
+            metrics = (metrics,)
+        for sample in metrics:
+            if isinstance(sample, dict):
+                labels = sample.get('labels')
+                yield (sample['metric'], sample['value'],
+                       {k: str(v) for k, v in labels.items()} if labels else None, sample.get('timestamp'))
+            else:
+                metric, value, *rest = sample
+                labels = rest[0] if rest else None
+                yield (metric, value, {k: str(v) for k, v in labels.items()} if labels else None,
+                       rest[1] if len(rest) > 1 else None)
+
+    @staticmethod
+    def _trim(series: _Series, now: float, window: float):
+        times, values = series.times, series.values
+        if window <= 0:
+            while len(values) > 1:
+                times.popleft()
+                values.popleft()
+            return
+        cutoff = now - window
+        while times and times[0] <= cutoff and len(times) > 1:
+            times.popleft()
+            values.popleft()
+
+    @staticmethod
+    def _window_value(rule: AlertRule, series: _Series, now: float) -> Optional[float]:
+        cutoff = now - rule.time_window
+        window = []
+        times, values = series.times, series.values
+        for i in range(len(times) - 1, -1, -1):
+            if times[i] <= cutoff:
+                break
+            window.append(values[i])
+        return _aggregate(rule._kind, rule._q, window) if window else None
+
+    def _step(self, rule: AlertRule, series_key, series: _Series, value: float, now: float,
+              transitions: List[Tuple[AlertRule, str, '_Instance']]):
+        key = (rule.id, series_key)
+        instance = self._instances.get(key)
+        if instance is None:
+            if not rule.is_active(value):
+                return
+            instance = self._instances[key] = _Instance(now, series.labels)
+            instance.value = value
+            if rule.for_duration <= 0:
+                self._fire(rule, instance, now, transitions)
+            else:
+                self._seq += 1
+                instance.seq = self._seq
+                heapq.heappush(self._pending, (now + rule.for_duration, self._seq, rule.id, series_key))
+            return
+        instance.value = value
+        if instance.state == 'pending':
+            if not rule.is_active(value):
+                del self._instances[key]
+            elif now - instance.since >= rule.for_duration:
+                self._fire(rule, instance, now, transitions)
+        elif rule.is_cleared(value):
+            del self._instances[key]
+            instance.state = 'resolved'
+            self._state_changed('resolved', rule, instance)
+            transitions.append((rule, 'resolved', instance))
+        elif self._renotify_due(rule, instance, now):
+            transitions.append((rule, 'firing', instance))
+
+    def _renotify_due(self, rule: AlertRule, instance: _Instance, now: float) -> bool:
+        """firing 継続中のアラートを再度通知に含めるか
+
+        未通知 (クールダウンやレート制限で見送られた) ものはクールダウン明けに、
+        通知済みのものは repeat_interval ごとに含める。
+        """
+        if instance.notified_at is None:
+            last = self._group_sent.get((rule.id, tuple(instance.labels.get(k) for k in rule.group_by)))
+            return last is None or now - last >= rule.cooldown
+        return rule.repeat_interval is not None and now - instance.notified_at >= rule.repeat_interval
+
+    def _fire(self, rule: AlertRule, instance: _Instance, now: float, transitions):
+        instance.state = 'firing'
+        instance.fired_at = now
+        rule.triggered_count += 1
+        self._state_changed('firing', rule, instance)
+        transitions.append((rule, 'firing', instance))
+
+    def _promote_due(self, now: float, transitions):
+        pending = self._pending
+        while pending and pending[0][0] <= now:
+            _, seq, rule_id, series_key = heapq.heappop(pending)
+            instance = self._instances.get((rule_id, series_key))
+            if instance is not None and instance.state == 'pending' and instance.seq == seq:
+                self._fire(self.rules[rule_id], instance, now, transitions)
+
+    # --- 通知 -------------------------------------------------------------
+
+    def _take_token(self, now: float) -> bool:
+        if self.rate_limit is None:
+            return True
+        if self._refilled_at is not None:
+            self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate_limit)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _notify(self, transitions, now: float) -> List[Notification]:
+        if self._deferred:
+            # 見送った通知を先に (同じアラートの新しい遷移とは 1 件にまとめる)
+            transitions = self._deferred + transitions
+            self._deferred = []
+        groups: Dict[Tuple[Any, tuple, str], Dict[int, _Instance]] = {}
+        for rule, status, instance in transitions:
+            if status == 'resolved' and instance.notified_at is None:
+                continue  # 通知していない firing の解消は知らせない
+            if status == 'firing' and instance.state != 'firing':
+                continue  # 見送っている間に解消した
+            group = tuple(instance.labels.get(k) for k in rule.group_by)
+            groups.setdefault((rule.id, group, status), {})[id(instance)] = instance
+
+        sent = []
+        for (rule_id, group, status), members in groups.items():
+            rule = self.rules.get(rule_id)
+            if rule is None:
+                continue
+            instances = list(members.values())
+            group_key = (rule_id, group)
+            if status == 'firing':
+                last = self._group_sent.get(group_key)
+                new = [i for i in instances if i.notified_at is None]
+                if new and len(new) == len(instances) and last is not None and now - last < rule.cooldown:
+                    self.suppressed += 1
+                    continue
+            if not self._take_token(now):
+                self.rate_limited += 1
+                self._deferred.extend((rule, status, instance) for instance in instances)
+                continue
+            notification = Notification(
+                rule_id=rule_id, rule_name=rule.name, severity=rule.severity, status=status,
+                group=dict(zip(rule.group_by, group)),
+                alerts=[{'labels': dict(i.labels), 'value': i.value, 'since': i.since, 'fired_at': i.fired_at}
+                        for i in instances],
+                channels=list(rule.channels), timestamp=now,
+            )
+            if status == 'firing':
+                self._group_sent[group_key] = now
+                for instance in instances:
+                    instance.notified_at = now
+            sent.append(notification)
+            self.notifications_sent += 1
+            for notifier in self._notifiers:
+                try:
+                    notifier(notification)
+                except Exception as e:
+                    print(f"[AlertEngine] notifier error: {e}")
+        return sent
+
+    # --- 参照 -------------------------------------------------------------
+
+    def active_alerts(self) -> List[Dict[str, Any]]:
+        """pending / firing 中のアラート"""
+        return [{'rule_id': rule_id, 'metric': series_key[0], 'labels': dict(instance.labels),
+                 'state': instance.state, 'value': instance.value, 'since': instance.since}
+                for (rule_id, series_key), instance in self._instances.items()]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rules': len(self.rules),
+            'metrics_indexed': len(self._index),
+            'series': len(self._series),
+            'pending': sum(1 for i in self._instances.values() if i.state == 'pending'),
+            'firing': sum(1 for i in self._instances.values() if i.state == 'firing'),
+            'samples': self.samples,
+            'rule_evaluations': self.rule_evaluations,
+            'last_batch_evaluations': self.last_batch_evaluations,
+            'notifications_sent': self.notifications_sent,
+            'suppressed': self.suppressed,
+            'rate_limited': self.rate_limited,
+            'deferred': len(self._deferred),
+        }
 
 
 if __name__ == '__main__':
     engine = AlertEngine()
+    engine.add_rule(AlertRule('cpu-high', 'CPU high', 'cpu_usage', '>', 90, aggregation='avg',
+                              time_window=120, for_duration=60, clear_threshold=80, group_by=('cluster',)))
+    engine.add_notifier(lambda n: print(f"[AlertEngine] {n.status}: {n.rule_name} {n.group} "
+                                        f"({len(n.alerts)} alerts)"))
+    t0 = time.time()
+    for step, value in enumerate([50, 95, 97, 96, 85, 70]):
+        engine.evaluate([('cpu_usage', value, {'host': f'web-{h}', 'cluster': 'a'}, t0 + step * 60)
+                         for h in range(3)], now=t0 + step * 60)
+    print(f"[AlertEngine] {engine.stats()}")
     print("Alert Engine Module initialized")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""StreamIngestion benchmark - decode throughput and bounded, batched ingestion
+
+Usage:
+    python benchmark.py --messages 500000 --sink-delay-ms 2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import implementation
+from implementation import StreamIngestion
+
+
+def make_messages(count: int):
+    rng = random.Random(42)
+    return [json.dumps({"ts": 1_760_000_000_000 + i, "page": f"/p/{i % 100}", "user": rng.randrange(100_000),
+                        "latency": round(rng.expovariate(1 / 50), 3), "tags": {"region": "ap", "ok": True}})
+            for i in range(count)]
+
+
+def bench_decode(messages):
+    flags = {"orjson": "ORJSON_AVAILABLE", "msgspec": "MSGSPEC_AVAILABLE"}
+    available = {flag: getattr(implementation, flag) for flag in flags.values()}
+    for backend in ("json", "msgspec", "orjson"):
+        if backend in flags and not available[flags[backend]]:
+            continue
+        for name, flag in flags.items():
+            setattr(implementation, flag, name == backend)
+        start = time.perf_counter()
+        for message in messages:
+            implementation.decode_message(message)
+        elapsed = time.perf_counter() - start
+        print(f"  decode {backend:<8} {len(messages) / elapsed / 1e6:6.2f}M msg/s")
+    for flag, value in available.items():
+        setattr(implementation, flag, value)
+
+
+async def bench_pipeline(messages, buffer_size: int, batch_size: int, sink_delay: float):
+    async def sink(batch):
+        await asyncio.sleep(sink_delay)
+
+    ingestion = StreamIngestion({"buffer_size": buffer_size, "batch_size": batch_size, "linger_ms": 20}, sink=sink)
+    ingestion.start()
+    start = time.perf_counter()
+    for message in messages:
+        await ingestion.process_message(message)
+    await ingestion.stop()
+    elapsed = time.perf_counter() - start
+    m = ingestion.metrics()
+    print(f"  pipeline ({m['json_backend']}, sink {sink_delay * 1000:.1f}ms/batch)  "
+          f"{len(messages) / elapsed / 1e3:8.1f}k msg/s   max buffered {m['max_buffered']}/{buffer_size}   "
+          f"pauses {m['pauses']} ({m['paused_seconds']:.2f}s)   lag avg {m['avg_batch_lag_ms']:.1f}ms "
+          f"max {m['max_batch_lag_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StreamIngestion benchmark")
+    parser.add_argument("--messages", type=int, default=500_000)
+    parser.add_argument("--buffer-size", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--sink-delay-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    print(f"{args.messages} messages (~{sum(map(len, messages)) // args.messages} bytes each)")
+    bench_decode(messages)
+    for delay in (0.0, args.sink_delay_ms / 1000):
+        asyncio.run(bench_pipeline(messages, args.buffer_size, args.batch_size, delay))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,45 +2,336 @@
 """
 Stream Ingestion Module
 リアルタイムデータストリームの取り込み
+
+上流 (WebSocket やメッセージストリーム) から受け取ったレコードを有界バッファに積み、
+バッチサイズまたは滞留時間 (linger) に達した時点でまとめて下流へ流す。
+バッファが高水位に達すると上流の読み込みを止め、低水位まで捌けたら再開する。
 """
 
 import asyncio
-from typing import AsyncIterator, Dict, Any
-from datetime import datetime
 import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+    _MSGSPEC_DECODER = msgspec.json.Decoder()
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+DECODE_ERRORS = (ValueError, TypeError) + ((msgspec.DecodeError,) if MSGSPEC_AVAILABLE else ())
+
+BatchSink = Callable[[List[Any]], Awaitable[Any]]
+
+
+def decode_message(message) -> Any:
+    """JSON メッセージをデコード (orjson > msgspec > 標準 json の順に利用)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(message)
+    if MSGSPEC_AVAILABLE:
+        return _MSGSPEC_DECODER.decode(message)
+    if isinstance(message, (bytearray, memoryview)):
+        message = bytes(message)
+    return json.loads(message)
+
+
+def json_backend() -> str:
+    """使用中の JSON デコーダ名"""
+    if ORJSON_AVAILABLE:
+        return "orjson"
+    if MSGSPEC_AVAILABLE:
+        return "msgspec"
+    return "json"
+
+
+class IngestBuffer:
+    """高水位/低水位付きの有界バッファ
+
+    - put(): 件数が high_watermark に達すると以降の put() は low_watermark まで
+      捌けるのを待つ (上流の読み込みが止まる)
+    - get_batch(): batch_size 件たまるか、最古の要素が linger 秒滞留したら返す。
+      close() 後に空になったら None を返す
+    """
+
+    def __init__(self, high_watermark: int = 1000, low_watermark: Optional[int] = None,
+                 batch_size: int = 100, linger: float = 0.05):
+        low_watermark = high_watermark // 2 if low_watermark is None else low_watermark
+        if high_watermark < 1:
+            raise ValueError("high_watermark must be >= 1")
+        if not 0 <= low_watermark < high_watermark:
+            raise ValueError("low_watermark must be in [0, high_watermark)")
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        if linger < 0:
+            raise ValueError("linger must be >= 0")
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark
+        self.batch_size = batch_size
+        self.linger = linger
+
+        self._items: deque = deque()
+        self._arrivals: deque = deque()  # 各要素の受信時刻 (monotonic)
+        self._wakeup = asyncio.Event()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._paused_at: Optional[float] = None
+        self.closed = False
+        self.oldest_taken = 0.0  # 直近に取り出したバッチの最古の受信時刻
+
+        self.received = 0
+        self.taken = 0
+        self.pauses = 0
+        self.paused_seconds = 0.0
+        self.max_depth = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def paused(self) -> bool:
+        return self._paused_at is not None
+
+    async def put(self, item: Any):
+        """1 件追加 (一時停止中は再開まで待機)"""
+        while self._paused_at is not None and not self.closed:
+            await self._resumed.wait()
+        if self.closed:
+            raise RuntimeError("ingest buffer is closed")
+        items = self._items
+        items.append(item)
+        self._arrivals.append(time.monotonic())
+        self.received += 1
+        depth = len(items)
+        if depth == 1 or depth >= self.batch_size:
+            self._wakeup.set()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        if depth >= self.high_watermark:
+            self._paused_at = time.monotonic()
+            self._resumed.clear()
+            self.pauses += 1
+
+    async def get_batch(self) -> Optional[List[Any]]:
+        """バッチを 1 つ取り出す (close 済みで空なら None)"""
+        while True:
+            items = self._items
+            if len(items) >= self.batch_size or (self.closed and items):
+                break
+            if not items:
+                if self.closed:
+                    return None
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            remaining = self._arrivals[0] + self.linger - time.monotonic()
+            if remaining <= 0:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return self._take()
+
+    def _take(self) -> List[Any]:
+        items, arrivals = self._items, self._arrivals
+        n = min(len(items), self.batch_size)
+        batch = [items.popleft() for _ in range(n)]
+        self.oldest_taken = arrivals[0]
+        for _ in range(n):
+            arrivals.popleft()
+        self.taken += n
+        if self._paused_at is not None and len(items) <= self.low_watermark:
+            self.paused_seconds += time.monotonic() - self._paused_at
+            self._paused_at = None
+            self._resumed.set()
+        return batch
+
+    def oldest_age(self) -> float:
+        """最古の滞留要素の経過秒数"""
+        return time.monotonic() - self._arrivals[0] if self._arrivals else 0.0
+
+    def close(self):
+        """以降の put() を拒否し、待機中の取り出し・追加を起こす"""
+        self.closed = True
+        self._wakeup.set()
+        self._resumed.set()
 
 
 class StreamIngestion:
-    """ストリーミングデータ取り込みクラス"""
+    """ストリーミングデータ取り込みクラス
 
-    def __init__(self, config: Dict[str, Any] = None):
+    config:
+        buffer_size: バッファ上限件数 (高水位)
+        low_watermark: 読み込みを再開する件数 (既定: buffer_size の半分)
+        batch_size: 1 バッチの最大件数
+        linger_ms: バッチが埋まらなくても流すまでの最大滞留時間
+    """
+
+    def __init__(self, config: Dict[str, Any] = None, sink: Optional[BatchSink] = None):
         self.config = config or {}
         self.buffer_size = self.config.get('buffer_size', 1000)
-        self.buffer = []
+        self.buffer = IngestBuffer(
+            high_watermark=self.buffer_size,
+            low_watermark=self.config.get('low_watermark'),
+            batch_size=self.config.get('batch_size', 100),
+            linger=self.config.get('linger_ms', 50) / 1000,
+        )
+        self.sink = sink
+        self._flusher: Optional[asyncio.Task] = None
 
-    async def ingest_stream(self, source: str) -> AsyncIterator[Dict[str, Any]]:
-        """ストリームデータを取り込み"""
-        yield {
-            'timestamp': datetime.now().isoformat(),
-            'source': source,
-            'data': {}
-        }
+        self.decode_errors = 0
+        self.batches = 0
+        self.flushed = 0
+        self.sink_errors = 0
+        self.batch_errors = 0
+        self.last_batch_lag = 0.0
+        self.max_batch_lag = 0.0
+        self._lag_total = 0.0
+
+    async def ingest(self, record: Any):
+        """レコードを 1 件取り込む (バッファが高水位なら空くまで待機)"""
+        await self.buffer.put(record)
+
+    async def process_message(self, message) -> bool:
+        """生メッセージ (str/bytes) をデコードして取り込む。不正な JSON は数えて捨てる"""
+        if isinstance(message, (str, bytes, bytearray, memoryview)):
+            try:
+                message = decode_message(message)
+            except DECODE_ERRORS:
+                self.decode_errors += 1
+                return False
+        await self.buffer.put(message)
+        return True
 
     async def process_batch(self, batch: list) -> list:
         """バッチ処理"""
         return batch
 
+    async def _flush(self, batch: list) -> list:
+        lag = time.monotonic() - self.buffer.oldest_taken
+        processed = await self.process_batch(batch)
+        self.batches += 1
+        self.flushed += len(batch)
+        self.last_batch_lag = lag
+        self._lag_total += lag
+        if lag > self.max_batch_lag:
+            self.max_batch_lag = lag
+        return processed
+
+    async def _pump(self, source: AsyncIterable):
+        try:
+            async for message in source:
+                await self.process_message(message)
+        finally:
+            self.buffer.close()
+
+    async def ingest_stream(self, source: AsyncIterable) -> AsyncIterator[list]:
+        """非同期ソースを読み込み、処理済みバッチを順に返す
+
+        呼び出し側がバッチの消費に時間をかけるとバッファが高水位に達し、
+        ソースの読み込みが止まる。
+        """
+        producer = asyncio.create_task(self._pump(source))
+        try:
+            while (batch := await self.buffer.get_batch()) is not None:
+                yield await self._flush(batch)
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+
+    def start(self):
+        """バックグラウンドでバッファを sink へ流し始める (起動済みなら何もしない)"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def _run_flusher(self):
+        # process_batch / sink の失敗でタスクが止まるとバッファが空かず、取り込み側が永久に待つ
+        while (batch := await self.buffer.get_batch()) is not None:
+            try:
+                processed = await self._flush(batch)
+            except Exception as e:
+                self.batch_errors += 1
+                print(f"[StreamIngestion] process_batch error: {e}")
+                continue
+            if self.sink is None:
+                continue
+            try:
+                await self.sink(processed)
+            except Exception as e:
+                self.sink_errors += 1
+                print(f"[StreamIngestion] sink error: {e}")
+
+    async def stop(self):
+        """新規の取り込みを止め、残りのバッファを流し切る"""
+        self.buffer.close()
+        if self._flusher is not None:
+            await self._flusher
+
+    def metrics(self) -> Dict[str, Any]:
+        """取り込みメトリクス (ラグは受信から下流へ渡すまでの秒数)"""
+        buffer = self.buffer
+        return {
+            'received': buffer.received,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'buffered': len(buffer),
+            'max_buffered': buffer.max_depth,
+            'decode_errors': self.decode_errors,
+            'sink_errors': self.sink_errors,
+            'batch_errors': self.batch_errors,
+            'paused': buffer.paused,
+            'pauses': buffer.pauses,
+            'paused_seconds': round(buffer.paused_seconds, 6),
+            'current_lag_ms': round(buffer.oldest_age() * 1000, 3),
+            'last_batch_lag_ms': round(self.last_batch_lag * 1000, 3),
+            'max_batch_lag_ms': round(self.max_batch_lag * 1000, 3),
+            'avg_batch_lag_ms': round(self._lag_total / self.batches * 1000, 3) if self.batches else 0.0,
+            'avg_batch_size': round(self.flushed / self.batches, 2) if self.batches else 0.0,
+            'json_backend': json_backend(),
+            'timestamp': datetime.now().isoformat(),
+        }
+
 
 class WebsocketIngestion(StreamIngestion):
     """WebSocketからのデータ取り込み"""
 
     async def handle_websocket(self, websocket):
-        """WebSocket接続を処理"""
+        """WebSocket接続を処理
+
+        websockets の接続 (str/bytes を返す) と aiohttp の WebSocketResponse
+        (WSMessage を返す) のどちらも受け付ける。バッファが高水位の間は
+        受信を止めるため、送信側には TCP のフロー制御で背圧が伝わる。
+        """
+        self.start()
         async for message in websocket:
-            data = json.loads(message)
-            await self.process_message(data)
+            data = getattr(message, 'data', message)
+            if isinstance(data, (str, bytes)):
+                await self.process_message(data)
 
 
 if __name__ == '__main__':
-    ingestion = StreamIngestion()
+    async def main():
+        async def sink(batch):
+            await asyncio.sleep(0.01)
+
+        ingestion = StreamIngestion({'buffer_size': 500, 'batch_size': 200, 'linger_ms': 20}, sink=sink)
+        ingestion.start()
+        for i in range(5000):
+            await ingestion.process_message(json.dumps({'id': i, 'value': i * 0.5}))
+        await ingestion.stop()
+        print(f"[StreamIngestion] {ingestion.metrics()}")
+
     print("Stream Ingestion Module initialized")
+    asyncio.run(main())
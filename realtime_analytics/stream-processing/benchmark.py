@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""StreamProcessor benchmark - windowed aggregation over a synthetic 1M events/s stream
+
+Event time advances 1 ms per 1,000 events, so one second of input is 1M events.
+Input batches are generated up front; only processing is timed.
+
+Usage:
+    python benchmark.py --events 3000000 --batch-size 20000
+"""
+
+import argparse
+import asyncio
+import gc
+import random
+import time
+
+from implementation import NUMPY_AVAILABLE, StreamProcessor
+
+FULL = {"n": "count", "total": ("sum", "latency"), "worst": ("max", "latency"),
+        "users": ("distinct", "user"), "p50": ("p50", "latency"), "p99": ("p99", "latency")}
+SIMPLE = {"n": "count", "total": ("sum", "latency"), "worst": ("max", "latency")}
+
+
+def make_batches(events: int, batch_size: int, keys: int, users: int, disorder_ms: int):
+    rng = random.Random(42)
+    batches = []
+    for base in range(0, events, batch_size):
+        batch = []
+        for i in range(base, min(base + batch_size, events)):
+            ts = i // 1000 - rng.randint(0, disorder_ms)
+            batch.append({"ts": ts, "page": i % keys, "user": rng.randrange(users),
+                          "latency": rng.expovariate(1 / 50)})
+        batches.append(batch)
+    return batches
+
+
+def run(label, batches, events, **window):
+    processor = StreamProcessor()
+    processor.create_window("w", time_field="ts", max_out_of_orderness=50, allowed_lateness=1000, **window)
+
+    async def scenario():
+        emitted = 0
+        for batch in batches:
+            emitted += len(await processor.process_batch(batch))
+        return emitted + len(processor.flush())
+
+    start = time.perf_counter()
+    emitted = asyncio.run(scenario())
+    elapsed = time.perf_counter() - start
+    stats = processor.windows["w"].stats()
+    print(f"  {label:<46} {events / elapsed / 1e6:6.2f}M ev/s   {emitted:>7} results   "
+          f"late dropped {stats['late_dropped']}")
+
+
+def run_legacy(batches, sample):
+    """Previous path: await process_event() per event, copying the dict each time."""
+    async def identity(event):
+        return event
+
+    async def old_process_event(event):
+        result = event.copy()
+        for processor in (identity,):
+            result = await processor(result)
+        return result
+
+    events = [event for batch in batches for event in batch][:sample]
+
+    async def scenario():
+        for event in events:
+            await old_process_event(event)
+
+    start = time.perf_counter()
+    asyncio.run(scenario())
+    elapsed = time.perf_counter() - start
+    print(f"  {'per-event process_event + copy (no windows)':<46} {len(events) / elapsed / 1e6:6.2f}M ev/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="StreamProcessor windowing benchmark")
+    parser.add_argument("--events", type=int, default=3_000_000)
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument("--keys", type=int, default=100, help="distinct page keys")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--disorder-ms", type=int, default=20, help="max event-time disorder")
+    args = parser.parse_args()
+
+    batches = make_batches(args.events, args.batch_size, args.keys, args.users, args.disorder_ms)
+    gc.freeze()  # keep the pre-generated input out of GC scans
+    n = args.events
+    print(f"{n} events, {len(batches)} batches of {args.batch_size}, numpy={'on' if NUMPY_AVAILABLE else 'off'}")
+    run_legacy(batches, min(n, 500_000))
+    run("tumbling 1s, global, count/sum/max", batches, n, size=1000, aggregations=SIMPLE)
+    run("tumbling 1s, by page, count/sum/max", batches, n, size=1000, aggregations=SIMPLE, key_by="page")
+    run("tumbling 1s, by page, + distinct/p50/p99", batches, n, size=1000, aggregations=FULL, key_by="page")
+    run("sliding 10s/1s, by page, + distinct/p50/p99", batches, n, size=10_000, slide=1000,
+        aggregations=FULL, key_by="page")
+    run("session gap 100ms, by user, count/sum/max", batches, n, gap=100, aggregations=SIMPLE, key_by="user")
+
+
+if __name__ == "__main__":
+    main()
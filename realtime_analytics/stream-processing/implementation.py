@@ -2,12 +2,723 @@
 """
 Stream Processing Module
 ストリーム処理エンジン
+
+イベント時刻ベースのウィンドウ集計:
+
+- タンブリング / スライディング / セッションウィンドウ
+- ウォーターマーク (観測した最大イベント時刻 - max_out_of_orderness) を過ぎた
+  ウィンドウを確定し、allowed_lateness 以内の遅延イベントは更新結果として再出力
+- 集計はインクリメンタル (sum/count/min/max/avg, HyperLogLog による distinct,
+  t-digest による分位点) で、ウィンドウあたりの状態はイベント数に依存しません
+- スライディングウィンドウは gcd(size, slide) 幅のペインに 1 回だけ集計し、
+  発火時にペインをマージします
+- process_batch() はイベントをコピーせず、(キー, ペイン) ごとにまとめてから集計します
 """
 
-import asyncio
-from typing import Dict, Any, Callable, List
-from datetime import datetime
-import json
+import heapq
+import itertools
+import math
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Dict, Any, Callable, List, Optional, Tuple, AsyncIterator, Union
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+MASK64 = (1 << 64) - 1
+VECTOR_MIN = 64  # これより少ない件数は純 Python の方が速い
+
+
+# ============================================
+# インクリメンタル集計
+# ============================================
+
+class CountAggregator:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def add_many(self, values: List[Any]):
+        self.value += len(values)
+
+    def merge(self, other: "CountAggregator"):
+        self.value += other.value
+
+    def result(self) -> int:
+        return self.value
+
+
+class SumAggregator:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def add_many(self, values: List[float]):
+        self.value += sum(values)
+
+    def merge(self, other: "SumAggregator"):
+        self.value += other.value
+
+    def result(self) -> float:
+        return self.value
+
+
+class MinAggregator:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+    def add_many(self, values: List[float]):
+        low = min(values)
+        if self.value is None or low < self.value:
+            self.value = low
+
+    def merge(self, other: "MinAggregator"):
+        if other.value is not None:
+            self.add_many([other.value])
+
+    def result(self) -> Optional[float]:
+        return self.value
+
+
+class MaxAggregator:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+    def add_many(self, values: List[float]):
+        high = max(values)
+        if self.value is None or high > self.value:
+            self.value = high
+
+    def merge(self, other: "MaxAggregator"):
+        if other.value is not None:
+            self.add_many([other.value])
+
+    def result(self) -> Optional[float]:
+        return self.value
+
+
+class AvgAggregator:
+    __slots__ = ("total", "count")
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add_many(self, values: List[float]):
+        self.total += sum(values)
+        self.count += len(values)
+
+    def merge(self, other: "AvgAggregator"):
+        self.total += other.total
+        self.count += other.count
+
+    def result(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+def _mix64(x: int) -> int:
+    """splitmix64 の混合関数"""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+if NUMPY_AVAILABLE:
+    def _mix64_array(x: "np.ndarray") -> "np.ndarray":
+        x = x + np.uint64(0x9E3779B97F4A7C15)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+class HyperLogLog:
+    """
+    HyperLogLog による distinct 数の推定
+
+    状態は 2^precision バイト固定 (既定 4096 バイト, 標準誤差 約 1.6%)。
+    ハッシュは hash() を splitmix64 で混合したものなので、文字列を含む
+    スケッチのマージは同一プロセス内に限られます (PYTHONHASHSEED に依存)。
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int = 12):
+        if not 11 <= precision <= 18:
+            raise ValueError("precision must be between 11 and 18")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: Any):
+        self.add_many([value])
+
+    def add_many(self, values: List[Any]):
+        bits = 64 - self.precision
+        if NUMPY_AVAILABLE and len(values) >= VECTOR_MIN:
+            hashes = _mix64_array(np.fromiter(map(hash, values), np.int64, len(values)).view(np.uint64))
+            index = (hashes >> np.uint64(bits)).astype(np.intp)
+            rest = (hashes & np.uint64((1 << bits) - 1)).astype(np.float64)  # bits <= 53 なので正確
+            rank = (bits + 1 - np.frexp(rest)[1]).astype(np.uint8)
+            np.maximum.at(np.frombuffer(self.registers, dtype=np.uint8), index, rank)
+            return
+        registers = self.registers
+        mask = (1 << bits) - 1
+        for value in values:
+            h = _mix64(hash(value) & MASK64)
+            rank = bits + 1 - (h & mask).bit_length()
+            index = h >> bits
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        if NUMPY_AVAILABLE:
+            mine = np.frombuffer(self.registers, dtype=np.uint8)
+            np.maximum(mine, np.frombuffer(other.registers, dtype=np.uint8), out=mine)
+        else:
+            self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def cardinality(self) -> int:
+        m = len(self.registers)
+        if NUMPY_AVAILABLE:
+            z = float(np.ldexp(1.0, -np.frombuffer(self.registers, dtype=np.uint8).astype(np.int32)).sum())
+        else:
+            z = math.fsum(2.0 ** -r for r in self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / z
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # 少数域は linear counting
+        return int(round(estimate))
+
+    def result(self) -> int:
+        return self.cardinality()
+
+
+class TDigest:
+    """
+    t-digest による分位点推定 (マージ型, k1 スケール関数)
+
+    セントロイドは compression / 2 個程度に抑えられ、分布の両端ほど
+    細かく保持されます。追加された値は 5 * compression 件ずつまとめて圧縮します。
+    """
+
+    __slots__ = ("compression", "means", "weights", "buffer", "min", "max")
+
+    def __init__(self, compression: float = 100):
+        if compression < 10:
+            raise ValueError("compression must be >= 10")
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.buffer: List[float] = []
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self) -> float:
+        return sum(self.weights) + len(self.buffer)
+
+    def add(self, value: float):
+        self.add_many([value])
+
+    def add_many(self, values: List[float]):
+        self.buffer.extend(values)
+        if len(self.buffer) >= 5 * self.compression:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(other.means + other.buffer, other.weights + [1.0] * len(other.buffer))
+
+    def _compress(self, extra_means: List[float] = (), extra_weights: List[float] = ()):
+        """セントロイド・バッファ・追加分を 1 回のソートでまとめ直す"""
+        if not self.buffer and not extra_means:
+            return
+        means = self.means + self.buffer + list(extra_means)
+        weights = self.weights + [1.0] * len(self.buffer) + list(extra_weights)
+        self.buffer = []
+        scale = self.compression / (2 * math.pi)
+        offset = self.compression / 4  # k1(0) = -compression / 4
+
+        if NUMPY_AVAILABLE and len(means) >= VECTOR_MIN:
+            m = np.asarray(means, dtype=np.float64)
+            w = np.asarray(weights, dtype=np.float64)
+            order = np.argsort(m, kind="stable")
+            m, w = m[order], w[order]
+            self.min = min(self.min, float(m[0]))
+            self.max = max(self.max, float(m[-1]))
+            cumulative = np.cumsum(w)
+            mid = (cumulative - w / 2) / cumulative[-1]
+            group = np.floor(scale * np.arcsin(np.clip(2 * mid - 1, -1, 1)) + offset)
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(group)) + 1))
+            merged_w = np.add.reduceat(w, starts)
+            self.means = (np.add.reduceat(m * w, starts) / merged_w).tolist()
+            self.weights = merged_w.tolist()
+            return
+
+        pairs = sorted(zip(means, weights))
+        self.min = min(self.min, pairs[0][0])
+        self.max = max(self.max, pairs[-1][0])
+        total = math.fsum(weights)
+        out_means: List[float] = []
+        out_weights: List[float] = []
+        cumulative = 0.0
+        current = None
+        for mean, weight in pairs:
+            mid = (cumulative + weight / 2) / total
+            g = math.floor(scale * math.asin(max(-1.0, min(1.0, 2 * mid - 1))) + offset)
+            cumulative += weight
+            if g == current:
+                out_means[-1] += mean * weight
+                out_weights[-1] += weight
+            else:
+                current = g
+                out_means.append(mean * weight)
+                out_weights.append(weight)
+        self.means = [s / w for s, w in zip(out_means, out_weights)]
+        self.weights = out_weights
+
+    def quantile(self, q: float) -> float:
+        """q (0〜1) 分位点の推定値"""
+        self._compress()
+        means, weights = self.means, self.weights
+        if not means:
+            return math.nan
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        total = sum(weights)
+        target = q * total
+        if target < weights[0] / 2:
+            return self.min + (means[0] - self.min) * target / (weights[0] / 2)
+        cumulative = 0.0
+        for i in range(len(means) - 1):
+            left = cumulative + weights[i] / 2
+            right = cumulative + weights[i] + weights[i + 1] / 2
+            if target <= right:
+                return means[i] + (means[i + 1] - means[i]) * (target - left) / (right - left)
+            cumulative += weights[i]
+        last = total - weights[-1] / 2
+        return means[-1] + (self.max - means[-1]) * (target - last) / (total - last)
+
+    def result(self) -> "TDigest":
+        return self
+
+
+AGGREGATORS: Dict[str, Callable[[], Any]] = {
+    "count": CountAggregator,
+    "sum": SumAggregator,
+    "min": MinAggregator,
+    "max": MaxAggregator,
+    "avg": AvgAggregator,
+    "distinct": HyperLogLog,
+}
+
+AggregationSpec = Union[str, Tuple[str, Optional[str]]]
+
+
+def parse_aggregations(aggregations: Dict[str, AggregationSpec], compression: float = 100,
+                       hll_precision: int = 12):
+    """
+    {"出力名": (集計, フィールド)} を状態の定義と出力の対応に変換
+
+    集計は count / sum / min / max / avg / distinct / p50・p99.9 などの分位点。
+    同じフィールドの分位点は 1 つの t-digest を共有します。
+
+    Returns:
+        (states, outputs) — states は [(種類, フィールド, ファクトリ)]、
+        outputs は [(出力名, 状態のインデックス, 分位点 or None)]
+    """
+    states: List[Tuple[str, Optional[str], Callable[[], Any]]] = []
+    index: Dict[Tuple[str, Optional[str]], int] = {}
+    outputs: List[Tuple[str, int, Optional[float]]] = []
+    for name, spec in aggregations.items():
+        agg, field_name = (spec, None) if isinstance(spec, str) else spec
+        quantile = None
+        match = re.fullmatch(r"p(\d+(?:\.\d+)?)", agg)
+        if match and float(match.group(1)) <= 100:
+            kind, quantile = "tdigest", float(match.group(1)) / 100
+            factory = lambda: TDigest(compression)  # noqa: E731
+        elif agg == "distinct":
+            kind, factory = agg, lambda: HyperLogLog(hll_precision)  # noqa: E731
+        elif agg in AGGREGATORS:
+            kind, factory = agg, AGGREGATORS[agg]
+        else:
+            raise ValueError(f"Unknown aggregation: {agg!r}")
+        if field_name is None and kind != "count":
+            raise ValueError(f"Aggregation {name!r} ({agg}) needs a field")
+        key = (kind, field_name)
+        if key not in index:
+            index[key] = len(states)
+            states.append((kind, field_name, factory))
+        outputs.append((name, index[key], quantile))
+    return states, outputs
+
+
+# ============================================
+# ウィンドウ
+# ============================================
+
+@dataclass(frozen=True)
+class TumblingWindow:
+    """重ならない固定幅ウィンドウ [n*size, (n+1)*size)"""
+    size: float
+
+    def __post_init__(self):
+        if self.size <= 0:
+            raise ValueError("Window size must be positive")
+
+
+@dataclass(frozen=True)
+class SlidingWindow:
+    """slide ごとに始まる幅 size のウィンドウ"""
+    size: float
+    slide: float
+
+    def __post_init__(self):
+        if self.size <= 0 or self.slide <= 0 or self.slide > self.size:
+            raise ValueError("Sliding window needs 0 < slide <= size")
+
+    @property
+    def pane(self) -> float:
+        if isinstance(self.size, int) and isinstance(self.slide, int):
+            return math.gcd(self.size, self.slide)
+        if self.size % self.slide:
+            raise ValueError("Non-integer sliding windows need size to be a multiple of slide")
+        return self.slide
+
+
+@dataclass(frozen=True)
+class SessionWindow:
+    """キーごとに、gap 以上イベントが途切れるまでを 1 つのウィンドウにする"""
+    gap: float
+
+    def __post_init__(self):
+        if self.gap <= 0:
+            raise ValueError("Session gap must be positive")
+
+
+@dataclass
+class WindowResult:
+    """確定したウィンドウの集計結果"""
+    window_id: str
+    key: Any
+    start: float
+    end: float
+    values: Dict[str, Any]
+    is_update: bool = False  # ウォーターマーク通過後の遅延イベントによる再出力
+
+
+class WindowOperator:
+    """
+    1 つのウィンドウ定義に対する集計状態
+
+    タイムスタンプと size / slide / gap / lateness は同じ単位 (例: epoch ミリ秒) の数値です。
+    """
+
+    def __init__(self, window_id: str, window: Union[TumblingWindow, SlidingWindow, SessionWindow],
+                 aggregations: Optional[Dict[str, AggregationSpec]] = None,
+                 key_by: Union[str, Callable[[Dict[str, Any]], Any], None] = None,
+                 time_field: str = "timestamp", allowed_lateness: float = 0,
+                 max_out_of_orderness: float = 0, compression: float = 100, hll_precision: int = 12):
+        self.window_id = window_id
+        self.window = window
+        self.time_field = time_field
+        self.allowed_lateness = allowed_lateness
+        self.max_out_of_orderness = max_out_of_orderness
+        states, self._outputs = parse_aggregations(aggregations or {"count": "count"},
+                                                   compression, hll_precision)
+        self._fields = [field_name for _, field_name, _ in states]
+        self._factories = [factory for _, _, factory in states]
+        self._keyed = key_by is not None
+        if key_by is None:
+            self._key = lambda event: None
+        elif isinstance(key_by, str):
+            self._key = itemgetter(key_by)
+        else:
+            self._key = key_by
+
+        self.watermark = -math.inf
+        self.max_timestamp = -math.inf
+        self.events = 0
+        self.late_dropped = 0
+
+        if isinstance(window, SessionWindow):
+            self._session = True
+            self._sessions: Dict[Any, List[list]] = {}  # key -> [[start, end, states, emitted, dirty]]
+            self._fire_heap: List[tuple] = []  # (end, seq, key) — 古いエントリは取り出し時に無視
+            self._purge_heap: List[tuple] = []  # (end + allowed_lateness, seq, key)
+            self._seq = itertools.count()
+        else:
+            self._session = False
+            self._size = window.size
+            self._slide = window.slide if isinstance(window, SlidingWindow) else window.size
+            self._pane = window.pane if isinstance(window, SlidingWindow) else window.size
+            self._panes: Dict[float, Dict[Any, list]] = {}  # pane_start -> key -> states
+            self._unfired: List[float] = []  # 未発火ウィンドウ開始時刻のヒープ
+            self._scheduled: set = set()
+            self._dirty: set = set()  # 発火済みウィンドウへの遅延更新 (start, key)
+
+    # ---- 入力 ----------------------------------------------------------------
+
+    def process_batch(self, events: List[Dict[str, Any]]) -> List[WindowResult]:
+        """イベントのマイクロバッチを集計し、確定したウィンドウを返す"""
+        if events:
+            if self._session:
+                self._add_sessions(events)
+            else:
+                self._add_panes(events)
+            self._advance(self.max_timestamp - self.max_out_of_orderness)
+        return self._emit()
+
+    def advance_watermark(self, timestamp: float) -> List[WindowResult]:
+        """入力が途切れたときなどにウォーターマークを明示的に進める"""
+        self._advance(timestamp)
+        return self._emit()
+
+    def flush(self) -> List[WindowResult]:
+        """全ウィンドウを確定する (ストリーム終了時)"""
+        return self.advance_watermark(math.inf)
+
+    def _advance(self, watermark: float):
+        if watermark > self.watermark:
+            self.watermark = watermark
+
+    def _new_states(self) -> list:
+        return [factory() for factory in self._factories]
+
+    def _add_to_states(self, states: list, events: List[Dict[str, Any]]):
+        if len(events) == 1:
+            event = events[0]
+            for state, field_name in zip(states, self._fields):
+                state.add_many(events if field_name is None else [event[field_name]])
+            return
+        columns: Dict[Optional[str], List[Any]] = {None: events}  # 同じフィールドは 1 回だけ取り出す
+        for state, field_name in zip(states, self._fields):
+            values = columns.get(field_name)
+            if values is None:
+                values = columns[field_name] = list(map(itemgetter(field_name), events))
+            state.add_many(values)
+
+    def _windows_for_pane(self, pane: float) -> List[float]:
+        """ペインを含むウィンドウの開始時刻"""
+        first = pane - pane % self._slide
+        starts = []
+        while first > pane - self._size:
+            starts.append(first)
+            first -= self._slide
+        return starts
+
+    def _add_panes(self, events: List[Dict[str, Any]]):
+        time_field = self.time_field
+        get_key = self._key
+        pane_size, slide, size = self._pane, self._slide, self._size
+        # 含まれる最後のウィンドウ (終了 = slide 境界 + size) も破棄済みになる時刻の上限
+        drop_before = self.watermark - self.allowed_lateness - size
+        drop_ts = drop_before - drop_before % slide + slide if drop_before > -math.inf else -math.inf
+        max_ts = self.max_timestamp
+        groups: Dict[Tuple[Any, float], List[Dict[str, Any]]] = defaultdict(list)
+        late = 0
+        if self._keyed:
+            for event in events:
+                ts = event[time_field]
+                if ts < drop_ts:
+                    late += 1
+                    continue
+                if ts > max_ts:
+                    max_ts = ts
+                groups[(get_key(event), ts - ts % pane_size)].append(event)
+        else:
+            for event in events:
+                ts = event[time_field]
+                if ts < drop_ts:
+                    late += 1
+                    continue
+                if ts > max_ts:
+                    max_ts = ts
+                groups[(None, ts - ts % pane_size)].append(event)
+        self.max_timestamp = max_ts
+        self.events += len(events) - late
+        self.late_dropped += late
+
+        watermark = self.watermark
+        for (key, pane), group in groups.items():
+            keyed = self._panes.get(pane)
+            if keyed is None:
+                keyed = self._panes[pane] = {}
+                for start in self._windows_for_pane(pane):
+                    if start + size > watermark and start not in self._scheduled:
+                        self._scheduled.add(start)
+                        heapq.heappush(self._unfired, start)
+            states = keyed.get(key)
+            if states is None:
+                states = keyed[key] = self._new_states()
+            self._add_to_states(states, group)
+            if pane + pane_size <= watermark:
+                # ペインを含むウィンドウのうち発火済みで、まだ破棄されていないものだけ遅延更新として再出力
+                limit = watermark - self.allowed_lateness
+                for start in self._windows_for_pane(pane):
+                    if limit < start + size <= watermark:
+                        self._dirty.add((start, key))
+
+    def _add_sessions(self, events: List[Dict[str, Any]]):
+        time_field = self.time_field
+        get_key = self._key
+        gap = self.window.gap
+        max_ts = self.max_timestamp
+        by_key: Dict[Any, List[Dict[str, Any]]] = {}
+        for event in events:
+            ts = event[time_field]
+            if ts > max_ts:
+                max_ts = ts
+            key = get_key(event)
+            group = by_key.get(key)
+            if group is None:
+                by_key[key] = [event]
+            else:
+                group.append(event)
+        self.max_timestamp = max_ts
+
+        limit = self.watermark - self.allowed_lateness
+        by_time = itemgetter(time_field)
+        accepted = 0
+        for key, group in by_key.items():
+            group.sort(key=by_time)
+            sessions = self._sessions.setdefault(key, [])
+            # バッチ内で gap 未満の間隔で続くイベントを 1 つの run にまとめてから既存セッションへ
+            run_start = 0
+            for i in range(1, len(group) + 1):
+                if i < len(group) and group[i][time_field] - group[i - 1][time_field] < gap:
+                    continue
+                run = group[run_start:i]
+                run_start = i
+                start, end = run[0][time_field], run[-1][time_field] + gap
+                overlapping = [session for session in sessions if start < session[1] and session[0] < end]
+                if not overlapping:
+                    if end <= limit:
+                        self.late_dropped += len(run)
+                        continue
+                    target = [start, end, self._new_states(), False, True]
+                    sessions.append(target)
+                    heapq.heappush(self._fire_heap, (end, next(self._seq), key))
+                else:
+                    # 既存セッションに直接加算し、複数にまたがる場合だけマージする
+                    target = overlapping[0]
+                    for session in overlapping[1:]:
+                        for mine, theirs in zip(target[2], session[2]):
+                            mine.merge(theirs)
+                        target[0], target[1] = min(target[0], session[0]), max(target[1], session[1])
+                        target[3] = target[3] or session[3]
+                        sessions.remove(session)
+                    if end > target[1] or not target[4] or len(overlapping) > 1:
+                        target[1] = max(target[1], end)
+                        heapq.heappush(self._fire_heap, (target[1], next(self._seq), key))
+                    target[0], target[4] = min(target[0], start), True
+                accepted += len(run)
+                self._add_to_states(target[2], run)
+            if not sessions:
+                del self._sessions[key]
+        self.events += accepted
+
+    # ---- 出力 ----------------------------------------------------------------
+
+    def _values(self, states: list) -> Dict[str, Any]:
+        return {name: states[index].result() if quantile is None else states[index].quantile(quantile)
+                for name, index, quantile in self._outputs}
+
+    def _window_states(self, start: float, keys=None) -> Dict[Any, list]:
+        """[start, start + size) のペインをキーごとにマージ"""
+        panes = []
+        pane = start
+        while pane < start + self._size:
+            keyed = self._panes.get(pane)
+            if keyed:
+                panes.append(keyed)
+            pane += self._pane
+        if len(panes) == 1 and self._pane == self._size:
+            keyed = panes[0]  # タンブリング: マージ不要
+            return keyed if keys is None else {k: keyed[k] for k in keys if k in keyed}
+        merged: Dict[Any, list] = {}
+        for keyed in panes:
+            for key, states in keyed.items():
+                if keys is not None and key not in keys:
+                    continue
+                target = merged.get(key)
+                if target is None:
+                    target = merged[key] = self._new_states()
+                for mine, theirs in zip(target, states):
+                    mine.merge(theirs)
+        return merged
+
+    def _emit(self) -> List[WindowResult]:
+        results: List[WindowResult] = []
+        watermark = self.watermark
+        if self._session:
+            fire, purge = self._fire_heap, self._purge_heap
+            while fire and fire[0][0] <= watermark:
+                _, _, key = heapq.heappop(fire)
+                for session in self._sessions.get(key, ()):
+                    start, end, states, emitted, dirty = session
+                    if end <= watermark and dirty:
+                        results.append(WindowResult(self.window_id, key, start, end,
+                                                    self._values(states), is_update=emitted))
+                        session[3], session[4] = True, False
+                        heapq.heappush(purge, (end + self.allowed_lateness, next(self._seq), key))
+            limit = watermark - self.allowed_lateness
+            while purge and purge[0][0] <= watermark:
+                _, _, key = heapq.heappop(purge)
+                sessions = [s for s in self._sessions.get(key, ()) if s[1] > limit or s[4]]
+                if sessions:
+                    self._sessions[key] = sessions
+                else:
+                    self._sessions.pop(key, None)
+            results.sort(key=lambda r: r.end)
+            return results
+
+        size = self._size
+        while self._unfired and self._unfired[0] + size <= watermark:
+            start = heapq.heappop(self._unfired)
+            self._scheduled.discard(start)
+            for key, states in self._window_states(start).items():
+                results.append(WindowResult(self.window_id, key, start, start + size, self._values(states)))
+        if self._dirty:
+            by_start: Dict[float, set] = {}
+            for start, key in self._dirty:
+                by_start.setdefault(start, set()).add(key)
+            self._dirty = set()
+            for start in sorted(by_start):
+                for key, states in self._window_states(start, by_start[start]).items():
+                    results.append(WindowResult(self.window_id, key, start, start + size,
+                                                self._values(states), is_update=True))
+        limit = watermark - self.allowed_lateness
+        for pane in [p for p in self._panes if p - p % self._slide + size <= limit]:
+            del self._panes[pane]
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_id": self.window_id,
+            "watermark": self.watermark,
+            "events": self.events,
+            "late_dropped": self.late_dropped,
+            "open_state": (sum(len(s) for s in self._sessions.values()) if self._session
+                           else sum(len(k) for k in self._panes.values())),
+        }
 
 
 class StreamProcessor:
@@ -16,26 +727,96 @@ class StreamProcessor:
     def __init__(self, config: Dict[str, Any] = None):
         self.config = config or {}
         self.processors = []
-        self.windows = {}
+        self.windows: Dict[str, WindowOperator] = {}
 
     def add_processor(self, processor: Callable):
-        """プロセッサを追加"""
+        """プロセッサを追加 (None を返すとイベントを捨てる)"""
         self.processors.append(processor)
 
     async def process_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
-        """イベントを処理"""
-        result = event.copy()
+        """イベントを処理 (入力はコピーしません。変更が必要なプロセッサは新しい dict を返すこと)"""
+        result = event
         for processor in self.processors:
             result = await processor(result)
         return result
 
-    def create_window(self, window_id: str, size: int, slide: int):
-        """ウィンドウを作成"""
-        self.windows[window_id] = {
-            'size': size,
-            'slide': slide,
-            'events': []
-        }
+    def create_window(self, window_id: str, size: float = None, slide: float = None, *,
+                      gap: float = None, aggregations: Optional[Dict[str, AggregationSpec]] = None,
+                      key_by: Union[str, Callable, None] = None, time_field: str = "timestamp",
+                      allowed_lateness: float = 0, max_out_of_orderness: float = 0) -> WindowOperator:
+        """
+        ウィンドウを作成
+
+        gap を指定するとセッション、slide が size と異なればスライディング、
+        それ以外はタンブリングウィンドウになります。
+
+        Args:
+            aggregations: {"出力名": (集計, フィールド)} — 例 {"p99": ("p99", "latency")}
+            key_by: キーにするフィールド名または関数
+        """
+        if gap is not None:
+            window = SessionWindow(gap)
+        elif size is None:
+            raise ValueError("Window size or session gap is required")
+        elif slide is None or slide == size:
+            window = TumblingWindow(size)
+        else:
+            window = SlidingWindow(size, slide)
+        operator = WindowOperator(window_id, window, aggregations, key_by, time_field,
+                                  allowed_lateness, max_out_of_orderness)
+        self.windows[window_id] = operator
+        return operator
+
+    async def process_batch(self, events: List[Dict[str, Any]]) -> List[WindowResult]:
+        """マイクロバッチを処理 (イベントはコピーせず、各ウィンドウにそのまま渡す)"""
+        if self.processors:
+            processed = []
+            for event in events:
+                for processor in self.processors:
+                    event = await processor(event)
+                    if event is None:
+                        break
+                else:
+                    processed.append(event)
+            events = processed
+        results: List[WindowResult] = []
+        for operator in self.windows.values():
+            results.extend(operator.process_batch(events))
+        return results
+
+    async def process_stream(self, stream: AsyncIterator[Dict[str, Any]], batch_size: int = 10_000,
+                             max_delay: float = 0.1) -> AsyncIterator[List[WindowResult]]:
+        """非同期ストリームを batch_size 件 / max_delay 秒ごとのマイクロバッチで処理"""
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + max_delay
+        async for event in stream:
+            batch.append(event)
+            if len(batch) >= batch_size or time.monotonic() >= deadline:
+                results = await self.process_batch(batch)
+                batch = []
+                deadline = time.monotonic() + max_delay
+                if results:
+                    yield results
+        if batch:
+            results = await self.process_batch(batch)
+            if results:
+                yield results
+        results = self.flush()
+        if results:
+            yield results
+
+    def advance_watermark(self, timestamp: float) -> List[WindowResult]:
+        results: List[WindowResult] = []
+        for operator in self.windows.values():
+            results.extend(operator.advance_watermark(timestamp))
+        return results
+
+    def flush(self) -> List[WindowResult]:
+        """全ウィンドウを確定する"""
+        results: List[WindowResult] = []
+        for operator in self.windows.values():
+            results.extend(operator.flush())
+        return results
 
 
 if __name__ == '__main__':
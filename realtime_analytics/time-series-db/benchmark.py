@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""TimeSeriesDB benchmark - streaming ingest, range scans and rollup-backed aggregation
+
+Usage:
+    python benchmark.py --points 10000000 --series 100
+    python benchmark.py --mode query --days 30 --series 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from implementation import NUMPY_AVAILABLE, TimeSeriesDB
+
+T0 = 1_760_000_000_000  # epoch ms
+
+
+def generate(points: int, series: int, interval_ms: int):
+    """Time-ordered gauges: cpu/mem per host, 2-decimal random walks, small timestamp jitter."""
+    values = [50.0] * series
+    tags = [{"host": f"host-{i // 2:03d}", "region": f"r{i % 4}"} for i in range(series)]
+    metrics = ["cpu" if i % 2 == 0 else "mem" for i in range(series)]
+    for step in range(points // series):
+        base = T0 + step * interval_ms
+        for i in range(series):
+            values[i] = round(min(100.0, max(0.0, values[i] + random.uniform(-1, 1))), 2)
+            yield (base + random.choice((0, 0, 0, 1, 2)), metrics[i], values[i], tags[i])
+
+
+def legacy_ingest(path: str, sample):
+    """The previous insert(): one row per point, TEXT timestamp, JSON tags, commit per point."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE timeseries (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+                 "metric TEXT NOT NULL, value REAL NOT NULL, tags TEXT, created_at TEXT DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("CREATE INDEX idx_timestamp ON timeseries(timestamp)")
+    conn.execute("CREATE INDEX idx_metric ON timeseries(metric)")
+    start = time.perf_counter()
+    for ts, metric, value, tags in sample:
+        conn.execute("INSERT INTO timeseries (timestamp, metric, value, tags) VALUES (?, ?, ?, ?)",
+                     (str(ts), metric, value, json.dumps(tags)))
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return elapsed
+
+
+def timed_scan(db, label, metric, start, end, tags=None):
+    begin = time.perf_counter()
+    count = sum(len(ts) for _, ts, _ in db.scan(metric, start, end, tags))
+    elapsed = time.perf_counter() - begin
+    print(f"  {label:<34} {elapsed * 1000:9.1f}ms  {count:>10} points  "
+          f"{count / elapsed / 1e6 if elapsed else 0:6.2f}M pts/s")
+
+
+def timed_query(db, label, *args, **kwargs):
+    """Same query through rollups and through a raw scan; results must agree."""
+    timings = []
+    results = []
+    for use_rollups in (True, False):
+        begin = time.perf_counter()
+        results.append(db.query(*args, use_rollups=use_rollups, **kwargs))
+        timings.append(time.perf_counter() - begin)
+    fast, raw = results
+    assert [r["timestamps"] for r in fast] == [r["timestamps"] for r in raw]
+    assert all(abs(a - b) <= 1e-6 * max(1.0, abs(b))
+               for x, y in zip(fast, raw) for a, b in zip(x["values"], y["values"]))
+    buckets = sum(len(r["timestamps"]) for r in fast)
+    print(f"  {label:<38} rollup {timings[0] * 1000:8.1f}ms   raw {timings[1] * 1000:9.1f}ms   "
+          f"x{timings[1] / timings[0]:6.1f}   {len(fast)} groups / {buckets} buckets")
+
+
+def run_query(args):
+    points = args.days * 86_400_000 // args.interval_ms * args.series
+    with tempfile.TemporaryDirectory() as tmp:
+        db = TimeSeriesDB(os.path.join(tmp, "tsdb.db"))
+        start = time.perf_counter()
+        db.ingest(generate(points, args.series, args.interval_ms), batch_size=50_000)
+        db.flush()
+        print(f"ingested {points} points ({args.days} days) in {time.perf_counter() - start:.1f}s  {db.stats()}")
+
+        begin, end = T0 - T0 % 86_400_000, T0 + args.days * 86_400_000
+        print(f"{args.days}-day queries (numpy={'on' if NUMPY_AVAILABLE else 'off'}):")
+        timed_query(db, "cpu avg, step 1h", "cpu", begin, end, "1h", "avg")
+        timed_query(db, "cpu max by host, step 1d", "cpu", begin, end, "1d", "max", group_by=["host"])
+        timed_query(db, "mem avg by region, step 6h", "mem", begin, end, "6h", "avg", group_by=["region"])
+        timed_query(db, "cpu count, unaligned range", "cpu", T0 + 12_345, end - 54_321, None, "count")
+        timed_query(db, "cpu avg host-001, last day, step 5m", "cpu", end - 86_400_000, end, "5m", "avg",
+                    tags={"host": "host-001"})
+        begin_p = time.perf_counter()
+        db.query("cpu", begin, end, "1d", "p99")
+        print(f"  {'cpu p99, step 1d (raw only)':<38} {(time.perf_counter() - begin_p) * 1000:8.1f}ms")
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TimeSeriesDB ingest/query benchmark")
+    parser.add_argument("--mode", choices=["ingest", "query"], default="ingest")
+    parser.add_argument("--points", type=int, default=10_000_000)
+    parser.add_argument("--series", type=int, default=None, help="default: 100 (ingest), 20 (query)")
+    parser.add_argument("--days", type=int, default=30, help="query mode: days of data")
+    parser.add_argument("--interval-ms", type=int, default=10_000)
+    parser.add_argument("--legacy-sample", type=int, default=20_000)
+    args = parser.parse_args()
+    if args.mode == "query":
+        args.series = args.series or 20
+        run_query(args)
+        return
+    args.series = args.series or 100
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = list(generate(args.legacy_sample, args.series, args.interval_ms))
+        legacy = legacy_ingest(os.path.join(tmp, "legacy.db"), sample)
+        legacy_size = os.path.getsize(os.path.join(tmp, "legacy.db"))
+        print(f"legacy per-point insert: {len(sample) / legacy:10.0f} pts/s  "
+              f"{legacy_size / len(sample):6.1f} B/pt  ({len(sample)} point sample)")
+
+        path = os.path.join(tmp, "tsdb.db")
+        db = TimeSeriesDB(path)
+        start = time.perf_counter()
+        total = db.ingest(generate(args.points, args.series, args.interval_ms), batch_size=50_000)
+        db.flush()
+        elapsed = time.perf_counter() - start
+        stats = db.stats()
+        size = sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+        print(f"chunked ingest:          {total / elapsed:10.0f} pts/s  {size / total:6.2f} B/pt on disk "
+              f"({stats['bytes_per_point']} B/pt compressed)  {total} points in {elapsed:.1f}s")
+        print(f"  {stats}")
+
+        span = (args.points // args.series) * args.interval_ms
+        hour, day = 3_600_000, 86_400_000
+        mid = T0 + span // 2
+        print("range scans:")
+        timed_scan(db, "1 series, 1 hour", "cpu", mid, mid + hour, {"host": "host-010"})
+        timed_scan(db, "1 series, 1 day", "cpu", mid, mid + day, {"host": "host-010"})
+        timed_scan(db, "region r0 (cpu), 1 hour", "cpu", mid, mid + hour, {"region": "r0"})
+        timed_scan(db, "all cpu series, 1 hour", "cpu", mid, mid + hour)
+        timed_scan(db, "all cpu series, 1 day", "cpu", mid, mid + day)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
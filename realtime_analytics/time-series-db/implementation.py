@@ -2,40 +2,841 @@
 """
 Time Series Database Module
 時系列データベース
+
+ポイントは (メトリクス, 時間ブロック, シリーズ) ごとの圧縮チャンクに格納します。
+
+- タイムスタンプ: delta-of-delta 符号化 (Gorilla)
+- 値: 直前値との XOR 符号化 (Gorilla)
+- タグ: 辞書符号化 (tag_dict の ID 列でシリーズを識別)
+- chunks テーブルは (metric, block_start, series_id, seq) の複合主キーで
+  メトリクス + 時間範囲のクエリがそのままインデックス範囲スキャンになります
+- rollups テーブルに 1 分 / 1 時間 / 1 日の集計 (count, sum, min, max) を
+  チャンク書き込み時に継続的に維持し、長期間の集計クエリは生データを読みません
+  (パーセンタイルはロールアップから求められないため、常に生チャンクを読みます)
 """
 
+import atexit
+import math
+import re
 import sqlite3
-from typing import Dict, Any, List
+import struct
+import threading
+from bisect import bisect_left
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
 from datetime import datetime
 import json
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+BLOCK_MS = 2 * 60 * 60 * 1000  # 1 チャンクがカバーする時間 (2 時間)
+MASK64 = (1 << 64) - 1
+ROLLUP_RESOLUTIONS = (60_000, 3_600_000, 86_400_000)  # 1m / 1h / 1d
+AGGREGATIONS = ("avg", "min", "max", "sum", "count")
+DURATION_UNITS = {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+
+# ============================================
+# Gorilla 符号化
+# ============================================
+
+def encode_chunk(timestamps: List[int], values: List[float]) -> bytes:
+    """
+    昇順のタイムスタンプ (ms) と値をビット列に圧縮
+
+    ビット列は '0'/'1' の文字列として組み立て、最後に int(..., 2) で一括変換します
+    (2 の冪の基数変換は線形時間なので、ビット単位の演算より大幅に速い)。
+    """
+    n = len(timestamps)
+    if n == 0:
+        return b""
+    bits = [format(n, "032b"), format(timestamps[0] & MASK64, "064b")]
+    append = bits.append
+
+    # タイムスタンプ: delta-of-delta を可変長バケットで
+    prev_ts = timestamps[0]
+    prev_delta = 0
+    for ts in timestamps[1:]:
+        delta = ts - prev_ts
+        dod = delta - prev_delta
+        if dod == 0:
+            append("0")
+        elif -63 <= dod <= 64:
+            append("10" + format(dod + 63, "07b"))
+        elif -255 <= dod <= 256:
+            append("110" + format(dod + 255, "09b"))
+        elif -2047 <= dod <= 2048:
+            append("1110" + format(dod + 2047, "012b"))
+        else:
+            append("1111" + format(dod & MASK64, "064b"))
+        prev_ts = ts
+        prev_delta = delta
+
+    # 値: 直前値との XOR。意味のあるビットの窓が前回に収まれば窓を再利用
+    ints = struct.unpack(f">{n}Q", struct.pack(f">{n}d", *values))
+    prev = ints[0]
+    append(format(prev, "064b"))
+    prev_lead = prev_trail = 64
+    for v in ints[1:]:
+        x = v ^ prev
+        prev = v
+        if x == 0:
+            append("0")
+            continue
+        lead = 64 - x.bit_length()
+        if lead > 31:
+            lead = 31
+        trail = (x & -x).bit_length() - 1
+        if lead >= prev_lead and trail >= prev_trail:
+            append("10" + format(x >> prev_trail, f"0{64 - prev_lead - prev_trail}b"))
+        else:
+            sig = 64 - lead - trail
+            append("11" + format(lead, "05b") + format(sig & 63, "06b") + format(x >> trail, f"0{sig}b"))
+            prev_lead, prev_trail = lead, trail
+
+    bitstr = "".join(bits)
+    size = (len(bitstr) + 7) // 8
+    return int(bitstr + "0" * (size * 8 - len(bitstr)), 2).to_bytes(size, "big")
+
+
+def decode_chunk(data: bytes) -> Tuple[List[int], List[float]]:
+    """encode_chunk の逆変換"""
+    if not data:
+        return [], []
+    bits = format(int.from_bytes(data, "big"), f"0{len(data) * 8}b")
+    n = int(bits[:32], 2)
+    ts = int(bits[32:96], 2)
+    if ts >> 63:
+        ts -= 1 << 64
+    pos = 96
+
+    timestamps = [ts]
+    append = timestamps.append
+    delta = 0
+    for _ in range(n - 1):
+        if bits[pos] == "0":
+            pos += 1
+        elif bits[pos + 1] == "0":
+            delta += int(bits[pos + 2:pos + 9], 2) - 63
+            pos += 9
+        elif bits[pos + 2] == "0":
+            delta += int(bits[pos + 3:pos + 12], 2) - 255
+            pos += 12
+        elif bits[pos + 3] == "0":
+            delta += int(bits[pos + 4:pos + 16], 2) - 2047
+            pos += 16
+        else:
+            dod = int(bits[pos + 4:pos + 68], 2)
+            delta += dod - (1 << 64) if dod >> 63 else dod
+            pos += 68
+        ts += delta
+        append(ts)
+
+    v = int(bits[pos:pos + 64], 2)
+    pos += 64
+    ints = [v]
+    append = ints.append
+    sig = trail = 0
+    for _ in range(n - 1):
+        if bits[pos] == "0":
+            pos += 1
+        else:
+            if bits[pos + 1] == "1":
+                lead = int(bits[pos + 2:pos + 7], 2)
+                sig = int(bits[pos + 7:pos + 13], 2) or 64
+                trail = 64 - lead - sig
+                pos += 13
+            else:
+                pos += 2
+            v ^= int(bits[pos:pos + sig], 2) << trail
+            pos += sig
+        append(v)
+    return timestamps, list(struct.unpack(f">{n}d", struct.pack(f">{n}Q", *ints)))
+
+
+def to_epoch_ms(timestamp: Any) -> int:
+    """ISO 文字列 / datetime / epoch ミリ秒を epoch ミリ秒に変換"""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp)
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return int(timestamp.timestamp() * 1000)
+
+
+def parse_step(step: Any) -> Optional[int]:
+    """バケット幅を ms に変換 (整数 ms または "30s" / "5m" / "1h" / "1d")"""
+    if step is None:
+        return None
+    if isinstance(step, str):
+        match = re.fullmatch(r"(\d+)(ms|s|m|h|d)", step.strip())
+        if not match:
+            raise ValueError(f"Invalid step: {step!r}")
+        step = int(match.group(1)) * DURATION_UNITS[match.group(2)]
+    if int(step) <= 0:
+        raise ValueError(f"Invalid step: {step!r}")
+    return int(step)
+
+
+def parse_agg(agg: str) -> Tuple[str, Optional[float]]:
+    """集計関数名を検証 ("p95" / "p99.9" はパーセンタイル)"""
+    if agg in AGGREGATIONS:
+        return agg, None
+    match = re.fullmatch(r"p(\d+(?:\.\d+)?)", agg or "")
+    if match and 0 <= float(match.group(1)) <= 100:
+        return "percentile", float(match.group(1))
+    raise ValueError(f"Unknown aggregation: {agg!r}")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """線形補間のパーセンタイル (numpy.percentile の既定と同じ)"""
+    k = (len(sorted_values) - 1) * q / 100
+    f = math.floor(k)
+    c = min(f + 1, len(sorted_values) - 1)
+    return sorted_values[f] + (sorted_values[c] - sorted_values[f]) * (k - f)
+
+
+def bucket_stats(timestamps: List[int], values: List[float],
+                 step: Optional[int]) -> List[Tuple[Optional[int], int, float, float, float]]:
+    """
+    時刻昇順のポイントを step ごとに集計
+
+    Returns:
+        [(bucket, count, sum, min, max)] — step が None なら bucket=None の 1 件
+    """
+    if not timestamps:
+        return []
+    if step is None:
+        return [(None, len(values), math.fsum(values), min(values), max(values))]
+    if NUMPY_AVAILABLE and len(timestamps) > 32:
+        ts = np.asarray(timestamps, dtype=np.int64)
+        vals = np.asarray(values, dtype=np.float64)
+        buckets = ts - ts % step
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        counts = np.diff(np.append(starts, len(buckets)))
+        return list(zip(buckets[starts].tolist(), counts.tolist(),
+                        np.add.reduceat(vals, starts).tolist(),
+                        np.minimum.reduceat(vals, starts).tolist(),
+                        np.maximum.reduceat(vals, starts).tolist()))
+    rows = []
+    current = None
+    for ts, value in zip(timestamps, values):
+        bucket = ts - ts % step
+        if bucket != current:
+            current = bucket
+            acc = [bucket, 0, 0.0, value, value]
+            rows.append(acc)
+        acc[1] += 1
+        acc[2] += value
+        if value < acc[3]:
+            acc[3] = value
+        if value > acc[4]:
+            acc[4] = value
+    return [tuple(acc) for acc in rows]
+
+
+def bucket_values(timestamps: List[int], values: List[float],
+                  step: Optional[int]) -> List[Tuple[Optional[int], List[float]]]:
+    """時刻昇順のポイントを step ごとの値リストに分割 (パーセンタイル用)"""
+    if not timestamps:
+        return []
+    if step is None:
+        return [(None, list(values))]
+    if NUMPY_AVAILABLE and len(timestamps) > 32:
+        ts = np.asarray(timestamps, dtype=np.int64)
+        buckets = ts - ts % step
+        cuts = np.flatnonzero(np.diff(buckets)) + 1
+        starts = np.concatenate(([0], cuts))
+        return list(zip(buckets[starts].tolist(),
+                        [part.tolist() for part in np.split(np.asarray(values, dtype=np.float64), cuts)]))
+    out: List[Tuple[Optional[int], List[float]]] = []
+    current = None
+    for ts, value in zip(timestamps, values):
+        bucket = ts - ts % step
+        if bucket != current:
+            current = bucket
+            out.append((bucket, []))
+        out[-1][1].append(value)
+    return out
+
+
+def _merge_stats(acc: Dict[Any, list], key: Any, count: int, total: float, low: float, high: float):
+    current = acc.get(key)
+    if current is None:
+        acc[key] = [count, total, low, high]
+    else:
+        current[0] += count
+        current[1] += total
+        if low < current[2]:
+            current[2] = low
+        if high > current[3]:
+            current[3] = high
+
 
 class TimeSeriesDB:
-    """時系列データベース"""
+    """
+    時系列データベース
+
+    書き込みはシリーズ × 時間ブロックごとのヘッドバッファに溜め、ブロックを
+    またいだとき・chunk_points に達したとき・flush() 時に圧縮チャンクとして
+    まとめて書き込みます。読み出しは未書き込みのヘッドも含みます。
 
-    def __init__(self, db_path: str = "timeseries.db"):
+    ロールアップはチャンクと同じトランザクションで更新されるため、
+    集計クエリは「ロールアップ + 範囲端の生チャンク + ヘッド」で常に正確です。
+    """
+
+    def __init__(self, db_path: str = "timeseries.db", block_ms: int = BLOCK_MS,
+                 chunk_points: int = 4096, max_buffered_points: int = 500_000,
+                 rollup_resolutions: Iterable[int] = ROLLUP_RESOLUTIONS):
         self.db_path = db_path
+        self.block_ms = block_ms
+        self.chunk_points = chunk_points
+        self.max_buffered_points = max_buffered_points
+        self.rollup_resolutions = tuple(sorted(set(rollup_resolutions)))
+        if any(r <= 0 or r % self.rollup_resolutions[0] for r in self.rollup_resolutions):
+            raise ValueError("Rollup resolutions must be positive multiples of the finest one")
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.RLock()
+
+        # 辞書 (メモリ上にも保持)
+        self._tag_ids: Dict[Tuple[str, str], int] = {}
+        self._tag_names: Dict[int, Tuple[str, str]] = {}
+        self._series_ids: Dict[Tuple[str, Tuple[int, ...]], int] = {}
+        self._series_info: Dict[int, Tuple[str, Dict[str, str]]] = {}
+        self._series_by_metric: Dict[str, set] = {}
+        self._series_by_tag: Dict[int, set] = {}
+        self._lookup: Dict[Tuple[str, Any], int] = {}  # (metric, タグ) -> series_id の高速経路
+
+        # ヘッドバッファ: (series_id, block_start) -> ([ts], [value])
+        self._heads: Dict[Tuple[int, int], Tuple[List[int], List[float]]] = {}
+        self._latest_block: Dict[int, int] = {}
+        self._next_seq: Dict[Tuple[int, int], int] = {}
+        self._sealed: List[tuple] = []
+        self._pending_rollups: Dict[Tuple[str, int, int, int], list] = {}
+        self._buffered = 0
+
         self._init_db()
+        self._load_dictionaries()
+        self._sync_rollups()
+        self._migrate_legacy()
+        atexit.register(self.close)
 
     def _init_db(self):
         """データベースを初期化"""
-        cursor = self.conn.cursor()
-        sql1 = "CREATE TABLE IF NOT EXISTS timeseries (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, metric TEXT NOT NULL, value REAL NOT NULL, tags TEXT, created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
-        cursor.execute(sql1)
-        sql2 = "CREATE INDEX IF NOT EXISTS idx_timestamp ON timeseries(timestamp)"
-        cursor.execute(sql2)
-        sql3 = "CREATE INDEX IF NOT EXISTS idx_metric ON timeseries(metric)"
-        cursor.execute(sql3)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tag_dict (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                UNIQUE (key, value)
+            );
+            CREATE TABLE IF NOT EXISTS series (
+                id INTEGER PRIMARY KEY,
+                metric TEXT NOT NULL,
+                tag_ids TEXT NOT NULL,
+                UNIQUE (metric, tag_ids)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                metric TEXT NOT NULL,
+                block_start INTEGER NOT NULL,
+                series_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                min_ts INTEGER NOT NULL,
+                max_ts INTEGER NOT NULL,
+                min_value REAL,
+                max_value REAL,
+                sum_value REAL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (metric, block_start, series_id, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS rollups (
+                metric TEXT NOT NULL,
+                resolution INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                series_id INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                sum_value REAL,
+                min_value REAL,
+                max_value REAL,
+                PRIMARY KEY (metric, resolution, bucket, series_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def _load_dictionaries(self):
+        for tag_id, key, value in self.conn.execute("SELECT id, key, value FROM tag_dict"):
+            self._tag_ids[(key, value)] = tag_id
+            self._tag_names[tag_id] = (key, value)
+        for series_id, metric, tag_ids in self.conn.execute("SELECT id, metric, tag_ids FROM series"):
+            ids = tuple(int(t) for t in tag_ids.split(",") if t)
+            self._register_series(series_id, metric, ids)
+
+    def _register_series(self, series_id: int, metric: str, tag_ids: Tuple[int, ...]):
+        self._series_ids[(metric, tag_ids)] = series_id
+        self._series_info[series_id] = (metric, dict(self._tag_names[t] for t in tag_ids))
+        self._series_by_metric.setdefault(metric, set()).add(series_id)
+        for tag_id in tag_ids:
+            self._series_by_tag.setdefault(tag_id, set()).add(series_id)
+
+    def _sync_rollups(self):
+        """ロールアップ解像度が保存時と異なれば (旧 DB を含む) 作り直す"""
+        configured = ",".join(map(str, self.rollup_resolutions))
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'rollup_resolutions'").fetchone()
+        if row is not None and row[0] == configured:
+            return
+        if self.conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone():
+            self.rebuild_rollups()
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollup_resolutions', ?)",
+                          (configured,))
         self.conn.commit()
 
-    def insert(self, timestamp: str, metric: str, value: float, tags: Dict[str, str] = None):
-        """データを挿入"""
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO timeseries (timestamp, metric, value, tags) VALUES (?, ?, ?, ?)",
-                      (timestamp, metric, value, json.dumps(tags) if tags else None))
+    def rebuild_rollups(self):
+        """全チャンクからロールアップを再計算"""
+        with self._lock:
+            self._write_sealed()
+            self.conn.execute("DELETE FROM rollups")
+            cursor = self.conn.execute("SELECT metric, series_id, data FROM chunks")
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for metric, series_id, data in rows:
+                    self._add_rollups(metric, series_id, *decode_chunk(data))
+                self._write_sealed()
+            print(f"[TimeSeriesDB] Rebuilt rollups {self.rollup_resolutions}")
+
+    def _migrate_legacy(self):
+        """旧形式 (1 行 1 ポイント, TEXT タイムスタンプ, JSON タグ) のテーブルを取り込む"""
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'timeseries'").fetchone()
+        if not exists:
+            return
+        cursor = self.conn.execute("SELECT timestamp, metric, value, tags FROM timeseries ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(50_000)
+            if not rows:
+                break
+            self.insert_many((ts, metric, value, json.loads(tags) if tags else None)
+                             for ts, metric, value, tags in rows)
+        self.flush()
+        self.conn.execute("DROP TABLE timeseries")
+        self.conn.commit()
+
+    # ---- 辞書符号化 ----------------------------------------------------------
+
+    def _tag_id(self, key: str, value: str) -> int:
+        tag_id = self._tag_ids.get((key, value))
+        if tag_id is None:
+            tag_id = self.conn.execute("INSERT INTO tag_dict (key, value) VALUES (?, ?)",
+                                       (key, value)).lastrowid
+            self._tag_ids[(key, value)] = tag_id
+            self._tag_names[tag_id] = (key, value)
+        return tag_id
+
+    def _series_id(self, metric: str, tags: Optional[Dict[str, str]]) -> int:
+        tag_ids = tuple(sorted(self._tag_id(str(k), str(v)) for k, v in (tags or {}).items()))
+        series_id = self._series_ids.get((metric, tag_ids))
+        if series_id is None:
+            series_id = self.conn.execute(
+                "INSERT INTO series (metric, tag_ids) VALUES (?, ?)",
+                (metric, ",".join(map(str, tag_ids)))).lastrowid
+            self._register_series(series_id, metric, tag_ids)
+        return series_id
+
+    def series_for(self, metric: str, tags: Optional[Dict[str, str]] = None) -> List[int]:
+        """メトリクスのシリーズのうち、tags をすべて持つもの"""
+        candidates = self._series_by_metric.get(metric, set())
+        for item in (tags or {}).items():
+            tag_id = self._tag_ids.get((str(item[0]), str(item[1])))
+            if tag_id is None:
+                return []
+            candidates = candidates & self._series_by_tag.get(tag_id, set())
+        return sorted(candidates)
+
+    def series_tags(self, series_id: int) -> Dict[str, str]:
+        return dict(self._series_info[series_id][1])
+
+    # ---- 書き込み ------------------------------------------------------------
+
+    def insert(self, timestamp: Any, metric: str, value: float, tags: Dict[str, str] = None):
+        """データを挿入 (バッファリングされ、チャンク単位で書き込まれます)"""
+        self.insert_many([(timestamp, metric, value, tags)])
+
+    def insert_many(self, points: Iterable[Any]) -> int:
+        """
+        複数ポイントを挿入
+
+        Args:
+            points: (timestamp, metric, value[, tags]) のタプル、または
+                    timestamp / metric / value / tags キーを持つ辞書
+
+        Returns:
+            挿入したポイント数
+        """
+        count = 0
+        with self._lock:
+            heads = self._heads
+            latest = self._latest_block
+            lookup = self._lookup
+            block_ms = self.block_ms
+            chunk_points = self.chunk_points
+            for point in points:
+                if isinstance(point, dict):
+                    timestamp, metric, value = point["timestamp"], point["metric"], point["value"]
+                    tags = point.get("tags")
+                else:
+                    timestamp, metric, value = point[0], point[1], point[2]
+                    tags = point[3] if len(point) > 3 else None
+                ts = timestamp if type(timestamp) is int else to_epoch_ms(timestamp)
+
+                lookup_key = (metric, tuple(tags.items()) if tags else None)
+                series_id = lookup.get(lookup_key)
+                if series_id is None:
+                    series_id = lookup[lookup_key] = self._series_id(metric, tags)
+
+                block = ts - ts % block_ms
+                head = heads.get((series_id, block))
+                if head is None:
+                    head = heads[(series_id, block)] = ([], [])
+                    previous = latest.get(series_id)
+                    if previous is None or block > previous:
+                        latest[series_id] = block
+                        # 時刻順に流れてくる通常ケース: 前のブロックはもう閉じてよい
+                        if previous is not None and (series_id, previous) in heads:
+                            self._seal(series_id, previous)
+                head[0].append(ts)
+                head[1].append(float(value))
+                if len(head[0]) >= chunk_points:
+                    self._seal(series_id, block)
+                count += 1
+
+            self._buffered += count
+            if self._buffered >= self.max_buffered_points:
+                self.flush()
+            elif len(self._sealed) >= 256:
+                self._write_sealed()
+        return count
+
+    def ingest(self, stream: Iterable[Any], batch_size: int = 10_000) -> int:
+        """イテレータ/ジェネレータから batch_size ずつ取り込む"""
+        total = 0
+        batch = []
+        for point in stream:
+            batch.append(point)
+            if len(batch) >= batch_size:
+                total += self.insert_many(batch)
+                batch = []
+        if batch:
+            total += self.insert_many(batch)
+        return total
+
+    def _seal(self, series_id: int, block: int):
+        """ヘッドバッファを圧縮チャンクにする"""
+        timestamps, values = self._heads.pop((series_id, block))
+        self._buffered -= len(timestamps)
+        if any(a > b for a, b in zip(timestamps, timestamps[1:])):
+            pairs = sorted(zip(timestamps, values), key=lambda p: p[0])
+            timestamps = [p[0] for p in pairs]
+            values = [p[1] for p in pairs]
+
+        key = (series_id, block)
+        seq = self._next_seq.get(key)
+        if seq is None:
+            metric = self._series_info[series_id][0]
+            row = self.conn.execute(
+                "SELECT MAX(seq) FROM chunks WHERE metric = ? AND block_start = ? AND series_id = ?",
+                (metric, block, series_id)).fetchone()
+            seq = 0 if row[0] is None else row[0] + 1
+        self._next_seq[key] = seq + 1
+
+        metric = self._series_info[series_id][0]
+        self._sealed.append((
+            metric, block, series_id, seq, len(timestamps),
+            timestamps[0], timestamps[-1], min(values), max(values), sum(values),
+            encode_chunk(timestamps, values)
+        ))
+        self._add_rollups(metric, series_id, timestamps, values)
+
+    def _add_rollups(self, metric: str, series_id: int, timestamps: List[int], values: List[float]):
+        """最も細かい解像度で 1 回だけ集計し、粗い解像度はそこから畳み込む"""
+        if not self.rollup_resolutions:
+            return
+        pending = self._pending_rollups
+        finest = bucket_stats(timestamps, values, self.rollup_resolutions[0])
+        for resolution in self.rollup_resolutions:
+            for bucket, count, total, low, high in finest:
+                _merge_stats(pending, (metric, resolution, bucket - bucket % resolution, series_id),
+                             count, total, low, high)
+
+    def _write_sealed(self):
+        if self._sealed:
+            self.conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  self._sealed)
+            self._sealed = []
+        if self._pending_rollups:
+            self.conn.executemany("""
+                INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (metric, resolution, bucket, series_id) DO UPDATE SET
+                    count = count + excluded.count,
+                    sum_value = sum_value + excluded.sum_value,
+                    min_value = MIN(min_value, excluded.min_value),
+                    max_value = MAX(max_value, excluded.max_value)
+            """, (key + tuple(acc) for key, acc in self._pending_rollups.items()))
+            self._pending_rollups = {}
         self.conn.commit()
 
+    def flush(self):
+        """全てのヘッドバッファを書き込む"""
+        with self._lock:
+            for series_id, block in list(self._heads):
+                self._seal(series_id, block)
+            self._write_sealed()
+            self._buffered = 0
+
+    def close(self):
+        with self._lock:
+            try:
+                self.flush()
+                self.conn.close()
+            except sqlite3.ProgrammingError:
+                pass  # 既に閉じている
+        atexit.unregister(self.close)
+
+    # ---- 読み出し ------------------------------------------------------------
+
+    def scan(self, metric: str, start: Any = None, end: Any = None,
+             tags: Optional[Dict[str, str]] = None) -> Iterator[Tuple[int, List[int], List[float]]]:
+        """
+        [start, end) のポイントをチャンク単位で返す
+
+        Yields:
+            (series_id, timestamps, values) — チャンク内は時刻昇順
+        """
+        start_ms = None if start is None else to_epoch_ms(start)
+        end_ms = None if end is None else to_epoch_ms(end)
+        with self._lock:
+            series = set(self.series_for(metric, tags))
+            if not series:
+                return
+            self._write_sealed()
+            rows = self._chunk_rows(metric, start_ms, end_ms)
+            heads = self._head_copies(series)
+        yield from self._decode_chunks(rows, series, start_ms, end_ms)
+        yield from self._decode_heads(heads, start_ms, end_ms)
+
+    def _chunk_rows(self, metric: str, start_ms: Optional[int], end_ms: Optional[int]) -> List[tuple]:
+        query = "SELECT series_id, min_ts, max_ts, data FROM chunks WHERE metric = ?"
+        params: List[Any] = [metric]
+        if start_ms is not None:
+            query += " AND block_start >= ?"
+            params.append(start_ms - start_ms % self.block_ms)
+        if end_ms is not None:
+            query += " AND block_start < ?"
+            params.append(end_ms)
+        return self.conn.execute(query + " ORDER BY block_start, series_id, seq", params).fetchall()
+
+    def _head_copies(self, series: set) -> List[Tuple[int, List[int], List[float]]]:
+        return [(sid, list(ts), list(vals)) for (sid, _), (ts, vals) in self._heads.items() if sid in series]
+
+    def _decode_chunks(self, rows, series, start_ms, end_ms):
+        for series_id, min_ts, max_ts, data in rows:
+            if series_id not in series:
+                continue
+            if (start_ms is not None and max_ts < start_ms) or (end_ms is not None and min_ts >= end_ms):
+                continue
+            timestamps, values = decode_chunk(data)
+            yield self._clip(series_id, timestamps, values, start_ms, end_ms, min_ts, max_ts)
+
+    def _decode_heads(self, heads, start_ms, end_ms):
+        for series_id, timestamps, values in heads:
+            if any(a > b for a, b in zip(timestamps, timestamps[1:])):
+                pairs = sorted(zip(timestamps, values), key=lambda p: p[0])
+                timestamps, values = [p[0] for p in pairs], [p[1] for p in pairs]
+            if timestamps:
+                yield self._clip(series_id, timestamps, values, start_ms, end_ms,
+                                 timestamps[0], timestamps[-1])
+
+    @staticmethod
+    def _clip(series_id, timestamps, values, start_ms, end_ms, min_ts, max_ts):
+        if (start_ms is None or min_ts >= start_ms) and (end_ms is None or max_ts < end_ms):
+            return series_id, timestamps, values
+        lo = 0 if start_ms is None else bisect_left(timestamps, start_ms)
+        hi = len(timestamps) if end_ms is None else bisect_left(timestamps, end_ms)
+        return series_id, timestamps[lo:hi], values[lo:hi]
+
+    def read(self, metric: str, start: Any = None, end: Any = None,
+             tags: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """[start, end) の生ポイントを時刻順に返す"""
+        points = []
+        for series_id, timestamps, values in self.scan(metric, start, end, tags):
+            series_tags = self.series_tags(series_id)
+            points.extend({"timestamp": ts, "metric": metric, "value": value, "tags": series_tags}
+                          for ts, value in zip(timestamps, values))
+        points.sort(key=lambda p: p["timestamp"])
+        return points
+
+    # ---- 集計クエリ ----------------------------------------------------------
+
+    def query(self, metric: str, start: Any = None, end: Any = None, step: Any = None,
+              agg: str = "avg", tags: Optional[Dict[str, str]] = None,
+              group_by: Optional[List[str]] = None, use_rollups: bool = True) -> List[Dict[str, Any]]:
+        """
+        [start, end) をバケットごとに集計
+
+        Args:
+            step: バケット幅 (ms または "30s" / "5m" / "1h" / "1d")。None なら範囲全体で 1 バケット
+            agg: avg / min / max / sum / count、またはパーセンタイル ("p50", "p99.9" など)
+            tags: 絞り込むタグ (すべて一致するシリーズのみ)
+            group_by: グループ化するタグキー (省略時は全シリーズを 1 グループに)
+            use_rollups: False なら常に生ポイントを走査 (比較用)
+
+        Note:
+            パーセンタイルはロールアップ (count, sum, min, max) から求められないため
+            use_rollups に関わらず範囲全体の生チャンクをデコードします。
+            長期間の p95 / p99 は生データ走査と同じコストになります
+
+        Returns:
+            [{"group": {タグ: 値}, "timestamps": [...], "values": [...]}]
+            — バケット開始時刻は epoch ms の step 倍数 (step=None なら start)。
+            ポイントのないバケットは含まれません
+        """
+        func, q = parse_agg(agg)
+        step_ms = parse_step(step)
+        start_ms = None if start is None else to_epoch_ms(start)
+        end_ms = None if end is None else to_epoch_ms(end)
+        group_by = list(group_by or [])
+
+        with self._lock:
+            series = set(self.series_for(metric, tags))
+            if not series:
+                return []
+            self._write_sealed()  # ロールアップとチャンクの整合を取る
+            if use_rollups and func != "percentile":
+                levels = [r for r in reversed(self.rollup_resolutions) if step_ms is None or step_ms % r == 0]
+                segments, raw_ranges = self._plan(levels, start_ms, end_ms)
+            else:
+                segments, raw_ranges = [], [(start_ms, end_ms)]
+            subset = series if len(series) < len(self._series_by_metric.get(metric, ())) else None
+            rollup_rows = [row for resolution, lo, hi in segments
+                           for row in self._rollup_rows(metric, resolution, step_ms, lo, hi, subset)]
+            chunk_rows = [(a, b, self._chunk_rows(metric, a, b)) for a, b in raw_ranges]
+            heads = self._head_copies(series)
+
+        group_keys: Dict[int, tuple] = {}
+        for series_id in series:
+            series_tags = self._series_info[series_id][1]
+            group_keys[series_id] = tuple(series_tags.get(k) for k in group_by)
+        groups: Dict[tuple, Dict[Any, Any]] = {}
+
+        for series_id, bucket, count, total, low, high in rollup_rows:
+            if series_id in series:
+                _merge_stats(groups.setdefault(group_keys[series_id], {}), bucket, count, total, low, high)
+
+        def raw_points():
+            for a, b, rows in chunk_rows:
+                yield from self._decode_chunks(rows, series, a, b)
+            yield from self._decode_heads(heads, start_ms, end_ms)
+
+        for series_id, timestamps, values in raw_points():
+            buckets = groups.setdefault(group_keys[series_id], {})
+            if func == "percentile":
+                for bucket, part in bucket_values(timestamps, values, step_ms):
+                    buckets.setdefault(bucket, []).extend(part)
+            else:
+                for row in bucket_stats(timestamps, values, step_ms):
+                    _merge_stats(buckets, *row)
+
+        results = []
+        for key in sorted(groups, key=lambda k: tuple("" if v is None else str(v) for v in k)):
+            buckets = groups[key]
+            order = sorted(buckets) if step_ms is not None else list(buckets)
+            results.append({
+                "group": dict(zip(group_by, key)),
+                "timestamps": [start_ms if b is None else b for b in order],
+                "values": [self._finalize(func, q, buckets[b]) for b in order],
+            })
+        return results
+
+    def _plan(self, levels: List[int], start_ms: Optional[int], end_ms: Optional[int]):
+        """
+        [start, end) を粗い解像度から順に覆う
+
+        内側は最も粗いロールアップ、端の半端な部分は一段細かいロールアップ、
+        最も細かい解像度にも揃わない端だけを生チャンクから読みます。
+
+        Returns:
+            ([(resolution, lo, hi)], [(raw_start, raw_end)])
+        """
+        if start_ms is not None and end_ms is not None and start_ms >= end_ms:
+            return [], []
+        if not levels:
+            return [], [(start_ms, end_ms)]
+        resolution, rest = levels[0], levels[1:]
+        lo = None if start_ms is None else -(-start_ms // resolution) * resolution
+        hi = None if end_ms is None else end_ms - end_ms % resolution
+        if lo is not None and hi is not None and lo >= hi:
+            return self._plan(rest, start_ms, end_ms)
+        segments, raw = [(resolution, lo, hi)], []
+        for edge in ((start_ms, lo), (hi, end_ms)):
+            if edge[0] is not None and edge[1] is not None:
+                more_segments, more_raw = self._plan(rest, *edge)
+                segments += more_segments
+                raw += more_raw
+        return segments, raw
+
+    def _rollup_rows(self, metric: str, resolution: int, step_ms: Optional[int],
+                     lo: Optional[int], hi: Optional[int], series: Optional[set] = None) -> List[tuple]:
+        bucket = "NULL" if step_ms is None else "bucket - bucket % ?"
+        params: List[Any] = [] if step_ms is None else [step_ms]
+        query = (f"SELECT series_id, {bucket} AS b, SUM(count), SUM(sum_value), MIN(min_value), "
+                 f"MAX(max_value) FROM rollups WHERE metric = ? AND resolution = ?")
+        params += [metric, resolution]
+        if lo is not None:
+            query += " AND bucket >= ?"
+            params.append(lo)
+        if hi is not None:
+            query += " AND bucket < ?"
+            params.append(hi)
+        if series is not None:
+            query += f" AND series_id IN ({','.join('?' * len(series))})"
+            params.extend(sorted(series))
+        return self.conn.execute(query + " GROUP BY series_id, b", params).fetchall()
+
+    @staticmethod
+    def _finalize(func: str, q: Optional[float], acc: list) -> float:
+        if func == "percentile":
+            acc.sort()
+            return percentile(acc, q)
+        count, total, low, high = acc
+        if func == "avg":
+            return total / count
+        return {"count": count, "sum": total, "min": low, "max": high}[func]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._write_sealed()
+            chunks, points, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(count), 0), COALESCE(SUM(LENGTH(data)), 0) FROM chunks"
+            ).fetchone()
+            rollups = self.conn.execute("SELECT COUNT(*) FROM rollups").fetchone()[0]
+        return {
+            "series": len(self._series_info),
+            "tags": len(self._tag_ids),
+            "chunks": chunks,
+            "rollups": rollups,
+            "points": points + self._buffered,
+            "bytes_per_point": round(size / points, 3) if points else 0.0,
+        }
+
 
 if __name__ == '__main__':
     db = TimeSeriesDB()
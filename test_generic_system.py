@@ -18,6 +18,7 @@ def cleanup_test_files():
         'test_supervisor_config.json',
         'orchestrator_state.json',
         'supervisor_state.json',
+        'supervisor_state.db',
         'orchestrator_history.json',
         'supervisor_log.json',
         'supervisor_metrics.json'
@@ -197,7 +198,7 @@ def test_supervisor():
 
     try:
         # Clean up any existing state
-        for f in ['test_supervisor_config.json', 'supervisor_state.json']:
+        for f in ['test_supervisor_config.json', 'supervisor_state.json', 'supervisor_state.db']:
             if Path(f).exists():
                 Path(f).unlink()
 
@@ -302,7 +303,7 @@ def test_integration():
     try:
         # Clean up any existing state
         for f in ['test_orchestrator_config.json', 'test_supervisor_config.json',
-                  'orchestrator_state.json', 'supervisor_state.json']:
+                  'orchestrator_state.json', 'supervisor_state.json', 'supervisor_state.db']:
             if Path(f).exists():
                 Path(f).unlink()
 
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+test - agent-discovery - エージェント検出テスト
+
+Unit Test Suite
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "agent_discovery"))
+
+from agent_discovery import AgentDiscovery, AgentInfo  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path_factory, monkeypatch):
+    cache = tmp_path_factory.mktemp("cache")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(cache))
+    return cache
+
+
+def _write_agent(workspace, name, readme):
+    agent_dir = workspace / name
+    agent_dir.mkdir(exist_ok=True)
+    (agent_dir / "README.md").write_text(readme, encoding="utf-8")
+
+
+def _count_parses(monkeypatch):
+    parsed = []
+    original = AgentDiscovery._load_agent_info
+
+    def counting(self, agent_path, agent_name):
+        parsed.append(agent_name)
+        return original(self, agent_path, agent_name)
+
+    monkeypatch.setattr(AgentDiscovery, "_load_agent_info", counting)
+    return parsed
+
+
+class TestDiscoveryIndex:
+    """agent-discovery - 永続インデックス テストスイート"""
+
+    def test_only_changed_readmes_are_reparsed(self, tmp_path, monkeypatch, cache_home):
+        """変更された README のみ再解析するテスト"""
+        _write_agent(tmp_path, "a-agent", "# a\nデータを管理する\n")
+        _write_agent(tmp_path, "b-agent", "# b\n通知を送る\n")
+        parsed = _count_parses(monkeypatch)
+
+        discovery = AgentDiscovery(str(tmp_path))
+        assert sorted(parsed) == ["a-agent", "b-agent"]
+        assert discovery.get_agent("a-agent").metadata["description"] == "データを管理する"
+        # インデックスはエージェントツリーの外 (キャッシュディレクトリ) に書かれる
+        assert Path(discovery.index_path).parent.parent == cache_home
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["a-agent", "b-agent"]
+
+        parsed.clear()
+        reloaded = AgentDiscovery(str(tmp_path))
+        assert parsed == []
+        assert len(reloaded.agents) == 2
+
+        _write_agent(tmp_path, "b-agent", "# b\nサーバーを監視して通知する\n")
+        (tmp_path / "a-agent" / "README.md").unlink()
+        assert reloaded.refresh() == {"a-agent", "b-agent"}
+        assert parsed == ["b-agent"]
+        assert list(reloaded.agents) == ["b-agent"]
+
+    def test_type_and_capability_lookups(self, tmp_path):
+        """タイプ/機能による索引検索テスト"""
+        _write_agent(tmp_path, "log-agent", "# log\n作業を記録する\n")
+        _write_agent(tmp_path, "ops-agent", "# ops\n監視と通知\n")
+        discovery = AgentDiscovery(str(tmp_path))
+        assert [a.id for a in discovery.find_by_type("monitoring")] == ["ops-agent"]
+        assert [a.id for a in discovery.find_by_capability("recording")] == ["log-agent"]
+
+        discovery.update_status("ops-agent", "running")
+        _write_agent(tmp_path, "ops-agent", "# ops\n通知のみ\n")
+        discovery.refresh()
+        assert discovery.find_by_type("monitoring") == []
+        assert discovery.get_agent("ops-agent").status == "running"
+
+    def test_manual_registration_notifies_listeners(self, tmp_path):
+        """register_agent / unregister_agent でも version が上がり通知されるテスト"""
+        discovery = AgentDiscovery(str(tmp_path))
+        changes = []
+        discovery.listeners.append(changes.append)
+        version = discovery.version
+        discovery.register_agent(AgentInfo("remote", "remote", "general", "running", ["search"]))
+        assert discovery.version == version + 1
+        assert [a.id for a in discovery.find_by_capability("search")] == ["remote"]
+        discovery.unregister_agent("remote")
+        discovery.unregister_agent("remote")  # 未登録なら何もしない
+        assert discovery.version == version + 2 and changes == [{"remote"}, {"remote"}]
+
+    def test_watch_applies_live_updates(self, tmp_path):
+        """ファイル変更のライブ反映テスト (inotify またはポーリング)"""
+        _write_agent(tmp_path, "a-agent", "# a\n管理\n")
+        discovery = AgentDiscovery(str(tmp_path), poll_interval=0.05)
+        changes = []
+        discovery.listeners.append(changes.append)
+        assert discovery.watch() in ("inotify", "polling")
+        try:
+            _write_agent(tmp_path, "new-agent", "# new\n記録\n")
+            deadline = time.monotonic() + 5
+            while discovery.get_agent("new-agent") is None:
+                assert time.monotonic() < deadline
+                time.sleep(0.02)
+            assert {"new-agent"} in changes
+            assert os.path.exists(discovery.index_path)
+        finally:
+            discovery.stop_watching()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+test - agent-search - エージェント検索テスト
+
+Unit Test Suite
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "agent_search"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "agent_discovery"))
+
+from agent_discovery import AgentDiscovery  # noqa: E402
+from agent_search import AgentSearchIndex, tokenize  # noqa: E402
+
+
+def _write_agent(workspace, name, readme, discord_py=None):
+    agent_dir = workspace / name
+    agent_dir.mkdir(exist_ok=True)
+    (agent_dir / "README.md").write_text(readme, encoding="utf-8")
+    if discord_py is not None:
+        (agent_dir / "discord.py").write_text(discord_py, encoding="utf-8")
+
+
+class TestTokenize:
+    """agent-search - トークナイザ テストスイート"""
+
+    def test_japanese_bigrams_and_latin_words(self):
+        """日本語バイグラムと英単語の分割テスト"""
+        assert tokenize("Access 管理") == ["access", "管理"]
+        assert tokenize("アクセス") == ["アク", "クセ", "セス"]
+        assert tokenize("犬") == ["犬"]
+
+
+class TestAgentSearchIndex:
+    """agent-search - BM25 検索 テストスイート"""
+
+    def _index(self):
+        index = AgentSearchIndex()
+        index.add_document("access-control-agent", {"name": "access control agent",
+                                                    "readme": "アクセス権限を管理します"})
+        index.add_document("calendar-agent", {"name": "calendar agent",
+                                              "readme": "予定を管理し通知します"})
+        index.add_document("notify-agent", {"name": "notify agent",
+                                            "readme": "通知を送信します。通知の履歴も管理"})
+        return index
+
+    def test_bm25_ranking(self):
+        """BM25 スコア順位テスト"""
+        index = self._index()
+        assert index.search("アクセス")[0].agent_id == "access-control-agent"
+        hits = index.search("通知")
+        assert [h.agent_id for h in hits] == ["notify-agent", "calendar-agent"]
+        assert hits[0].score > hits[1].score
+        assert "通知" in hits[0].matched
+
+    def test_prefix_and_fuzzy(self):
+        """前方一致とタイポ許容検索テスト"""
+        index = self._index()
+        assert index.search("calen")[0].agent_id == "calendar-agent"
+        assert index.complete("acc") == ["access"]
+        assert index.search("acces contrl")[0].agent_id == "access-control-agent"
+        assert index.search("acces contrl", fuzzy=False, prefix=False) == []
+
+    def test_remove_document(self):
+        """文書削除テスト"""
+        index = self._index()
+        index.remove_document("calendar-agent")
+        assert index.search("calendar") == []
+        assert index.stats()["documents"] == 2
+
+    def test_intent_keywords_from_discord(self):
+        """Discord インテントキーワード抽出テスト"""
+        source = '''
+INTENTS = {"add": {"keywords": ["登録", "追加"]}}
+SEARCH_KEYWORDS = ('検索', "find")
+
+@commands.command(name="list_items")
+async def list_items(ctx):
+    pass
+'''
+        assert AgentSearchIndex.extract_intent_keywords(source) == \
+            ["登録", "追加", "検索", "find", "list items"]
+
+    def test_follows_discovery_changes(self, tmp_path):
+        """エージェント検出の変更追従テスト"""
+        _write_agent(tmp_path, "log-agent", "# log\n作業を記録する\n")
+        discovery = AgentDiscovery(str(tmp_path))
+        index = AgentSearchIndex().attach(discovery)
+        assert [h.agent_id for h in index.search("記録")] == ["log-agent"]
+
+        _write_agent(tmp_path, "book-agent", "# book\n読書メモ\n",
+                     discord_py='KEYWORDS = ["記録"]\n')
+        discovery.refresh()
+        assert {h.agent_id for h in index.search("記録")} == {"log-agent", "book-agent"}
+
+        (tmp_path / "log-agent" / "README.md").unlink()
+        discovery.refresh()
+        assert [h.agent_id for h in index.search("記録")] == ["book-agent"]
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+test - alert-engine - ルール索引アラートエンジンテスト
+
+Unit Test Suite
+"""
+
+import importlib.util
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _load(name, path):
+    # 各モジュールが implementation.py / db.py という汎用名のため、固有の名前で読み込む
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+implementation = _load("alert_engine", ROOT / "realtime_analytics" / "alert-engine" / "implementation.py")
+monitor_db = _load("monitor_agent_db", ROOT / "agents" / "monitor-agent" / "db.py")
+
+AlertEngine = implementation.AlertEngine
+AlertRule = implementation.AlertRule
+
+
+def _engine(*rules, **config):
+    engine = AlertEngine({"rate_limit": None, **config})
+    for rule in rules:
+        engine.add_rule(rule)
+    return engine
+
+
+class TestRules:
+    """alert-engine - 比較演算子と集計 テストスイート"""
+
+    def test_operators_and_legacy_snapshot(self):
+        """全比較演算子と、旧 add_alert / {metric: value} 形式のテスト"""
+        engine = _engine()
+        for i, op in enumerate([">", "<", ">=", "<=", "==", "!="]):
+            engine.add_alert(f"a{i}", op, {"metric": "cpu", "operator": op, "threshold": 50})
+        fired = engine.evaluate({"cpu": 50, "unrelated": 1}, now=0)
+        assert sorted(n.rule_name for n in fired) == ["<=", "==", ">="]
+        fired = engine.evaluate({"cpu": 70}, now=1)
+        assert sorted((n.rule_name, n.status) for n in fired) == [
+            ("!=", "firing"), ("<=", "resolved"), ("==", "resolved"), (">", "firing")]
+        assert engine.rules["a0"].triggered_count == 1
+
+    def test_windowed_aggregations(self):
+        """time_window 内の avg / p95 / count を全件計算と比較するテスト"""
+        rng = random.Random(4)
+        samples = [(t, rng.uniform(0, 100)) for t in range(0, 600, 7)]
+        rules = [AlertRule(agg, agg, "lat", ">=", 0, aggregation=agg, time_window=120)
+                 for agg in ("avg", "p95", "count", "max")]
+        engine = _engine(*rules)
+        for t, value in samples:
+            engine.evaluate([("lat", value, None, t)], now=t)
+        inside = sorted(v for t, v in samples if t > samples[-1][0] - 120)
+        values = {a["rule_id"]: a["value"] for a in engine.active_alerts()}
+        rank = (len(inside) - 1) * 0.95
+        low = int(rank)
+        assert values["avg"] == pytest.approx(sum(inside) / len(inside))
+        assert values["p95"] == pytest.approx(inside[low] + (inside[low + 1] - inside[low]) * (rank - low))
+        assert values["count"] == len(inside) and values["max"] == max(inside)
+
+    def test_for_duration_and_hysteresis(self):
+        """for による保留、tick での昇格、clear_threshold までの継続テスト"""
+        engine = _engine(AlertRule("cpu", "cpu high", "cpu", ">", 90, for_duration=60, clear_threshold=80))
+        assert engine.evaluate([("cpu", 95, None, 0)], now=0) == []
+        assert engine.stats()["pending"] == 1
+        assert engine.evaluate([("cpu", 85, None, 30)], now=30) == []  # 条件が途切れたら保留解除
+        engine.evaluate([("cpu", 95, None, 40)], now=40)
+        assert engine.tick(now=99) == []
+        (fired,) = engine.tick(now=100)
+        assert fired.status == "firing" and fired.alerts[0]["since"] == 40
+        assert engine.evaluate([("cpu", 85, None, 110)], now=110) == []  # 90 未満でも 80 までは firing
+        (resolved,) = engine.evaluate([("cpu", 80, None, 120)], now=120)
+        assert resolved.status == "resolved" and engine.stats()["firing"] == 0
+
+
+class TestNotifications:
+    """alert-engine - 重複排除・グループ化・レート制限 テストスイート"""
+
+    def test_grouping_dedup_and_repeat(self):
+        """グループ単位の通知、firing 中の重複排除、repeat_interval のテスト"""
+        engine = _engine(AlertRule("r", "disk", "disk", ">", 90, group_by=("cluster",), repeat_interval=300))
+        received = []
+        engine.add_notifier(received.append)
+        batch = [("disk", 95, {"host": f"h{i}", "cluster": f"c{i % 2}"}) for i in range(5)]
+        sent = engine.evaluate(batch, now=0)
+        assert sorted((n.group["cluster"], len(n.alerts)) for n in sent) == [("c0", 3), ("c1", 2)]
+        assert received == sent
+        assert engine.evaluate(batch, now=100) == []  # 発火中は再通知しない
+        assert sorted(len(n.alerts) for n in engine.evaluate(batch, now=300)) == [2, 3]
+
+    def test_cooldown_and_rate_limit(self):
+        """クールダウン中の再発火抑制と、全体レート制限テスト"""
+        engine = _engine(AlertRule("r", "err", "errors", ">", 0, cooldown=600))
+        assert len(engine.evaluate([("errors", 1, None, 0)], now=0)) == 1
+        assert engine.evaluate([("errors", 0, None, 10)], now=10)[0].status == "resolved"
+        assert engine.evaluate([("errors", 1, None, 20)], now=20) == []  # フラッピングは抑制
+        assert engine.stats()["suppressed"] == 1
+        (late,) = engine.evaluate([("errors", 2, None, 700)], now=700)  # クールダウン明けに通知
+        assert late.status == "firing" and late.alerts[0]["value"] == 2
+
+        limited = AlertEngine({"rate_limit": 1.0, "burst": 2})
+        for i in range(5):
+            limited.add_rule(AlertRule(i, f"r{i}", "m", ">", i))
+        assert len(limited.evaluate([("m", 10, None, 0)], now=0)) == 2
+        assert limited.stats()["rate_limited"] == 3
+        assert len(limited.evaluate([("m", 10, None, 1)], now=1)) == 1  # 見送り分はトークン回復後に送る
+
+    def test_rate_limited_notifications_flushed_by_tick(self):
+        """レート制限で見送った firing / resolved を新しいサンプル無しで tick から送るテスト"""
+        engine = AlertEngine({"rate_limit": 1.0, "burst": 1})
+        engine.add_rule(AlertRule("a", "a", "a", ">", 0))
+        engine.add_rule(AlertRule("b", "b", "b", ">", 0))
+        engine.add_rule(AlertRule("c", "c", "c", ">", 0))
+        sent = engine.evaluate([("a", 1, None, 0), ("b", 1, None, 0), ("c", 1, None, 0)], now=0)
+        assert [n.rule_id for n in sent] == ["a"] and engine.stats()["deferred"] == 2
+        # 見送り中に c は解消: 通知していない firing は送らない
+        assert engine.evaluate([("a", 0, None, 0.5), ("c", 0, None, 0.5)], now=0.5) == []
+        assert [(n.rule_id, n.status) for n in engine.tick(now=1.5)] == [("b", "firing")]
+        assert [(n.rule_id, n.status) for n in engine.tick(now=2.5)] == [("a", "resolved")]
+        assert engine.tick(now=10) == [] and engine.stats()["deferred"] == 0
+
+
+class TestIndex:
+    """alert-engine - ルール索引 テストスイート"""
+
+    def test_series_are_bounded(self):
+        """どのルールにも合わないラベルはシリーズを作らず、アイドルなシリーズとルールの無い索引を捨てるテスト"""
+        engine = _engine(AlertRule("r", "prod cpu", "cpu", ">", 90, labels={"env": "prod"}),
+                         series_idle_timeout=100)
+        engine.evaluate([("cpu", 50, {"env": "dev", "host": f"h{i}"}) for i in range(50)], now=0)
+        assert engine.stats()["series"] == 0
+        engine.evaluate([("cpu", 50, {"env": "prod", "host": "quiet"}),
+                         ("cpu", 95, {"env": "prod", "host": "hot"})], now=10)
+        assert engine.stats()["series"] == 2
+        engine.evaluate([("cpu", 60, {"env": "prod", "host": "other"})], now=200)
+        # quiet は期限切れで破棄、firing 中の hot は残る
+        assert {s["labels"]["host"] for s in engine.active_alerts()} == {"hot"}
+        assert engine.stats()["series"] == 2 and ("cpu", (("env", "prod"), ("host", "quiet"))) not in engine._series
+
+        assert engine.remove_rule("r")
+        assert engine.stats()["series"] == 0 and engine.stats()["metrics_indexed"] == 0
+        engine.evaluate([("cpu", 95, {"env": "prod"})], now=300)
+        assert engine.stats()["series"] == 0
+
+    def test_batch_touches_only_relevant_rules(self):
+        """10 万ルールのうちバッチのシリーズに関係するルールだけを評価するテスト"""
+        engine = _engine()
+        for i in range(100_000):
+            labels = {"host": f"h{i % 7}"} if i % 2 else {}
+            engine.add_rule(AlertRule(i, f"r{i}", f"m{i % 5000}", ">", 1e9, labels=labels))
+        engine.evaluate([("m1", 1.0, {"host": "h1"}), ("m2", 1.0, {"host": "h3"}), ("zzz", 1.0)], now=0)
+        expected = sum(1 for i in range(100_000) if i % 5000 in (1, 2) and
+                       (i % 2 == 0 or f"h{i % 7}" == {1: "h1", 2: "h3"}[i % 5000]))
+        assert engine.last_batch_evaluations == expected < 40
+        assert engine.remove_rule(1) and not engine.remove_rule(1)
+        engine.evaluate([("m1", 1.0, {"host": "h1"})], now=1)
+        assert engine.last_batch_evaluations == sum(1 for i in range(2, 100_000) if i % 5000 == 1 and
+                                                     (i % 2 == 0 or i % 7 == 1))
+
+    def test_invalid_rules(self):
+        """不正なルール定義のテスト"""
+        for kwargs in ({"operator": "=>"}, {"aggregation": "median", "time_window": 60},
+                       {"aggregation": "avg"}, {"clear_threshold": 95}, {"for_duration": -1}):
+            with pytest.raises(ValueError):
+                AlertRule("x", "x", "cpu", **{"operator": ">", "threshold": 90, **kwargs})
+
+
+class TestMonitorAgentAlerts:
+    """alert-engine - monitor-agent DB 連携 テストスイート"""
+
+    @pytest.fixture
+    def db(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(monitor_db, "DB_PATH", tmp_path / "monitor.db")
+        monkeypatch.setattr(monitor_db, "_engine", None)
+        monitor_db.init_db()
+        return monitor_db
+
+    def test_record_metric_triggers_and_resolves(self, db):
+        """record_metric による発火記録・解消とアラート削除テスト"""
+        alert_id = db.create_alert("low disk", "disk_free", 10, condition="<", aggregation_method="last",
+                                   time_window=0, severity="critical")
+        assert db.record_metric("disk_free", 50) == []
+        assert db.record_metric("disk_free", 5)[0].status == "firing"
+        db.record_metric("disk_free", 4)  # 発火中は重複記録しない
+        (trigger,) = db.get_alert_triggers(alert_id)
+        assert trigger["actual_value"] == 5 and trigger["severity"] == "critical"
+        assert db.record_metric("disk_free", 60)[0].status == "resolved"
+        conn = sqlite3.connect(db.DB_PATH)
+        assert conn.execute("SELECT resolved FROM alert_triggers").fetchone() == (1,)
+        assert conn.execute("SELECT condition, trigger_count FROM alerts").fetchone() == ("last(disk_free) < 10", 1)
+        conn.close()
+
+        assert db.delete_alert(alert_id)
+        assert db.record_metric("disk_free", 1) == [] and db.get_alerts() == []
+        with pytest.raises(ValueError):
+            db.create_alert("bad", "cpu", 90, condition="=>")
+
+    def test_resolution_closes_only_its_series(self, db):
+        """解消したラベルのトリガーだけを閉じ、他のホストのトリガーは残すテスト"""
+        alert_id = db.create_alert("cpu high", "cpu", 90, condition=">", aggregation_method="last",
+                                   time_window=0)
+        db.record_metrics([{"metric": "cpu", "value": 95, "labels": {"host": "a"}},
+                           {"metric": "cpu", "value": 97, "labels": {"host": "b"}}])
+        assert len(db.get_alert_triggers(alert_id)) == 2
+        (notification,) = db.record_metric("cpu", 10, labels={"host": "a"})
+        assert notification.status == "resolved"
+        conn = sqlite3.connect(db.DB_PATH)
+        rows = conn.execute("SELECT labels, resolved FROM alert_triggers ORDER BY labels").fetchall()
+        conn.close()
+        assert rows == [('{"host": "a"}', 1), ('{"host": "b"}', 0)]
+
+    def test_triggers_recorded_during_cooldown(self, db):
+        """クールダウンで通知されない発火・解消もトリガー履歴に残るテスト"""
+        alert_id = db.create_alert("cpu high", "cpu", 90, condition=">", aggregation_method="last",
+                                   time_window=0)  # 既定のクールダウン 10 分
+        assert db.record_metric("cpu", 95, labels={"host": "a"})[0].status == "firing"
+        assert db.record_metric("cpu", 97, labels={"host": "b"}) == []  # 通知は抑制
+        assert db.record_metric("cpu", 10, labels={"host": "b"}) == []  # 通知していない解消
+        conn = sqlite3.connect(db.DB_PATH)
+        rows = conn.execute("SELECT labels, resolved FROM alert_triggers WHERE alert_id = ? ORDER BY labels",
+                            (alert_id,)).fetchall()
+        conn.close()
+        assert rows == [('{"host": "a"}', 0), ('{"host": "b"}', 1)]
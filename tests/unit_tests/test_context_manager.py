@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+test - context-manager - 索引付き・メモリ上限付きコンテキスト管理テスト
+
+Unit Test Suite
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+MODULE_PATH = Path(__file__).resolve().parents[2] / "chatbot_interface" / "context-manager" / "implementation.py"
+
+# 各モジュールが implementation.py という同名ファイルのため、固有の名前で読み込む
+_spec = importlib.util.spec_from_file_location("context_manager_implementation", MODULE_PATH)
+implementation = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = implementation
+_spec.loader.exec_module(implementation)
+
+Context = implementation.Context
+ContextManager = implementation.ContextManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class TestUserIndex:
+    """context-manager - ユーザー索引 テストスイート"""
+
+    def test_latest_context_follows_updates(self, clock):
+        """最後に更新されたコンテキストが返り、他ユーザーと混ざらないテスト"""
+        manager = ContextManager(clock=clock)
+        first = manager.create_context("alice")
+        second = manager.create_context("alice")
+        bob = manager.create_context("bob")
+        assert manager.get_user_context("alice") is second
+        first.add_message("user", "こんにちは")
+        assert manager.get_user_context("alice") is first
+        assert manager.get_user_context("bob") is bob
+        assert manager.get_user_context("carol") is None
+        assert manager.get_context(second.context_id) is second
+        assert manager.get_user_context("alice") is first  # 読み取りでは最新は変わらない
+
+    def test_round_trip(self):
+        """to_dict / from_dict の往復テスト"""
+        context = Context("c1", "u1", max_messages=3)
+        for i in range(5):
+            context.add_message("user", f"m{i}", {"i": i})
+        context.set_variable("lang", "ja")
+        restored = Context.from_dict(context.to_dict())
+        assert restored.to_dict() == context.to_dict()
+        assert restored.size == context.size and restored.messages.maxlen == 3
+
+
+class TestEviction:
+    """context-manager - TTL・メモリ予算 テストスイート"""
+
+    def test_idle_contexts_expire_without_cleanup(self, clock):
+        """cleanup を呼ばなくても、アクセスの無いコンテキストは期限で消えるテスト"""
+        manager = ContextManager({"max_context_age": 60}, clock=clock)
+        old = manager.create_context("old")
+        kept = manager.create_context("kept")
+        clock.now += 50
+        kept.set_variable("step", 1)
+        clock.now += 20
+        assert manager.get_context(old.context_id) is None
+        assert manager.get_user_context("old") is None
+        assert manager.get_user_context("kept") is kept
+        assert manager.stats()["expired"] == 1 and manager.stats()["users"] == 1
+
+        clock.now += 61
+        assert manager.cleanup_old_contexts() == 1
+        assert manager.stats()["contexts"] == 0 and manager.memory_used == 0
+
+    def test_memory_budget_drops_least_recently_used(self, clock):
+        """予算超過で LRU の先頭から外し、使用量が予算内に収まるテスト"""
+        manager = ContextManager({"memory_budget_mb": 0.05}, clock=clock)  # 約 52KB
+        contexts = []
+        for i in range(40):
+            context = manager.create_context(f"u{i}")
+            context.add_message("user", "x" * 1000)
+            contexts.append(context)
+            manager.get_context(contexts[0].context_id)  # u0 は使い続ける
+        stats = manager.stats()
+        assert stats["evicted"] > 0 and manager.memory_used <= manager.memory_budget
+        assert manager.get_user_context("u0") is contexts[0]
+        assert manager.get_user_context("u1") is None
+        assert manager.get_user_context("u39") is contexts[-1]
+        assert manager.memory_used == sum(c.size for c in manager.contexts.values())
+
+
+class TestSpill:
+    """context-manager - SQLite 退避 テストスイート"""
+
+    def test_spilled_contexts_are_reloaded(self, clock, tmp_path):
+        """退避したコンテキストを読み戻し、再起動後もユーザーの最新が引けるテスト"""
+        config = {"memory_budget_mb": 0.02, "max_context_age": 600, "spill_path": str(tmp_path / "ctx.db")}
+        manager = ContextManager(config, clock=clock)
+        first = manager.create_context("alice")
+        first.add_message("user", "最初の会話")
+        first.set_variable("topic", "billing")
+        for i in range(30):
+            manager.create_context(f"u{i}").add_message("user", "y" * 1000)
+        assert first.context_id not in manager.contexts and manager.stats()["spilled_contexts"] > 0
+
+        reloaded = manager.get_user_context("alice")
+        assert reloaded.to_dict() == first.to_dict() and manager.stats()["loaded"] == 1
+        reloaded.add_message("assistant", "どうぞ")
+        clock.now += 601  # 全件が期限切れ → 退避
+        assert manager.get_context(reloaded.context_id).get_messages(1)[0]["content"] == "どうぞ"
+        newer = manager.create_context("alice")
+        manager.close()
+
+        restarted = ContextManager(config, clock=clock)
+        assert restarted.get_user_context("alice").context_id == newer.context_id
+        assert restarted.get_user_context("u5").get_messages()[0]["content"] == "y" * 1000
+
+        spilled = restarted.stats()["spilled_contexts"]
+        restarted.spill_max_age = -1  # 退避先の全件が期限切れ
+        assert restarted.cleanup_old_contexts() == spilled > 0
+        assert restarted.stats()["spilled_contexts"] == 0
+        assert restarted.get_user_context("u7") is None
+
+    def test_released_handle_stays_live(self, clock, tmp_path):
+        """退避後も呼び出し側の Context への書き込みが失われず、同じオブジェクトが返るテスト"""
+        config = {"max_context_age": 60, "spill_path": str(tmp_path / "ctx.db")}
+        manager = ContextManager(config, clock=clock)
+        handle = manager.create_context("alice")
+        handle.add_message("user", "最初")
+        clock.now += 61
+        manager.create_context("bob")  # alice は期限切れで退避
+        assert handle.context_id not in manager.contexts
+
+        handle.add_message("user", "退避後の書き込み")  # メモリに戻る
+        handle.set_variable("step", 2)
+        assert manager.contexts[handle.context_id] is handle and manager.stats()["spilled_contexts"] == 0
+        assert manager.memory_used == sum(c.size for c in manager.contexts.values())
+
+        clock.now += 61
+        manager.create_context("bob")
+        assert manager.get_user_context("alice") is handle  # 退避先の古い写しではない
+        assert [m["content"] for m in handle.get_messages()] == ["最初", "退避後の書き込み"]
+
+        clock.now += 61
+        manager.create_context("carol")
+        handle.set_variable("step", 3)
+        manager.close()
+        restarted = ContextManager(config, clock=clock)
+        assert restarted.get_user_context("alice").get_variable("step") == 3
+
+    def test_released_handle_without_spill(self, clock):
+        """退避先が無い場合も、書き込まれた Context は索引に戻るテスト"""
+        manager = ContextManager({"max_context_age": 60}, clock=clock)
+        handle = manager.create_context("alice")
+        clock.now += 61
+        assert manager.get_context(handle.context_id) is None
+        handle.add_message("user", "戻る")
+        assert manager.get_user_context("alice") is handle
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+test - durable-log - 永続ログテスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+for module_dir in ("durable_log", "message_bus", "event_bus"):
+    sys.path.insert(0, str(ROOT / module_dir))
+
+from durable_log import SegmentedLog  # noqa: E402
+from event_bus import Event, EventBus, EventType  # noqa: E402
+from message_bus import MessageBus  # noqa: E402
+
+
+class TestSegmentedLog:
+    """durable-log - セグメントログ テストスイート"""
+
+    def test_reopen_truncates_torn_tail(self, tmp_path):
+        """クラッシュ後の破損レコード切り詰めテスト"""
+        log = SegmentedLog(str(tmp_path))
+        for i in range(10):
+            log.append(f"record-{i}".encode())
+        log.close()
+        segment = next(tmp_path.glob("*.log"))
+        with open(segment, "ab") as f:
+            f.write(b"\x20\x00\x00\x00garbage")
+
+        reopened = SegmentedLog(str(tmp_path))
+        assert reopened.next_offset == 10
+        assert reopened.append(b"after-crash") == 10
+        records = [payload for _, payload in reopened.read_from(8)]
+        assert records == [b"record-8", b"record-9", b"after-crash"]
+        reopened.close()
+
+    def test_rotation_and_compaction(self, tmp_path):
+        """セグメントローテーションとコンパクションテスト"""
+        log = SegmentedLog(str(tmp_path), segment_bytes=100)
+        for i in range(50):
+            log.append(b"x" * 20)
+        assert len(log.segments) > 5
+        log.commit_offset("a", 40)
+        log.commit_offset("b", 25)
+        log.compact()
+        assert log.segments[0].base_offset <= 25 <= log.segments[0].last_offset
+        assert [o for o, _ in log.read_from(25)][0] == 25
+        log.close()
+
+    def test_cursor_commits_contiguous_watermark(self, tmp_path):
+        """順不同完了時のコミットオフセットテスト"""
+        log = SegmentedLog(str(tmp_path))
+        for i in range(5):
+            log.append(b"r")
+        cursor = log.consumer("c", commit_every=1)
+        for offset in (1, 2, 4):
+            cursor.done(offset)
+        assert log.committed("c") == 0
+        cursor.done(0)
+        assert log.committed("c") == 3
+        log.close()
+        assert SegmentedLog(str(tmp_path)).committed("c") == 3
+
+    def test_commit_compacts_below_every_registered_consumer(self, tmp_path):
+        """コミット時の自動コンパクションと、未コミットのコンシューマを待つテスト"""
+        log = SegmentedLog(str(tmp_path), segment_bytes=100)
+        for i in range(50):
+            log.append(b"x" * 20)
+        segments = len(log.segments)
+        fast = log.consumer("fast", commit_every=1)
+        slow = log.consumer("slow", commit_every=1)
+        for offset in range(50):
+            fast.done(offset)
+        assert len(log.segments) == segments  # slow は未コミットなので消さない
+        for offset in range(30):
+            slow.done(offset)
+        assert 1 < len(log.segments) < segments
+        assert log.segments[0].base_offset <= 30 <= log.segments[0].last_offset
+        log.close()
+
+    def test_drop_consumer_releases_segments(self, tmp_path):
+        """戻ってこないコンシューマを削除するとコンパクションが進むテスト"""
+        log = SegmentedLog(str(tmp_path), segment_bytes=100)
+        for i in range(50):
+            log.append(b"x" * 20)
+        log.commit_offset("gone", 0)
+        log.close()
+
+        log = SegmentedLog(str(tmp_path), segment_bytes=100)
+        segments = len(log.segments)
+        live = log.consumer("live", commit_every=1)
+        for offset in range(40):
+            live.done(offset)
+        assert len(log.segments) == segments  # 永続化された "gone" が止めている
+        assert log.drop_consumer("gone") > 0
+        assert log.segments[0].base_offset <= 40 <= log.segments[0].last_offset
+        log.close()
+        assert "gone" not in SegmentedLog(str(tmp_path)).offsets
+
+
+class TestDurableBuses:
+    """durable-log - バス再生 テストスイート"""
+
+    def test_message_bus_replays_unprocessed(self, tmp_path):
+        """未処理メッセージの再起動時再生テスト"""
+        async def crash():
+            bus = MessageBus(durable_log=SegmentedLog(str(tmp_path)))
+            bus.subscribe("jobs", lambda m: None)
+            for i in range(5):
+                await bus.publish("jobs", {"n": i})
+            # Never started: simulates a crash with a full queue.
+            bus.durable_log.close()
+
+        async def restart():
+            log = SegmentedLog(str(tmp_path))
+            bus = MessageBus(durable_log=log)
+            seen = []
+            bus.subscribe("jobs", lambda m: seen.append(m.payload["n"]))
+            await bus.start()
+            await bus.join()
+            await bus.stop()
+            log.close()
+            return seen
+
+        asyncio.run(crash())
+        assert sorted(asyncio.run(restart())) == [0, 1, 2, 3, 4]
+        assert asyncio.run(restart()) == []
+
+    def test_message_bus_holds_replay_until_subscribed(self, tmp_path):
+        """購読前に start() しても再生したメッセージを捨てず、購読後に配信するテスト"""
+        async def crash():
+            bus = MessageBus(durable_log=SegmentedLog(str(tmp_path)))
+            bus.subscribe("jobs", lambda m: None)
+            for i in range(3):
+                await bus.publish("jobs", {"n": i})
+            bus.durable_log.close()
+
+        async def restart():
+            log = SegmentedLog(str(tmp_path))
+            bus = MessageBus(durable_log=log)
+            await bus.start()  # まだ購読者がいない
+            assert log.committed("message_bus") == 0
+            seen = []
+            bus.subscribe("jobs", lambda m: seen.append(m.payload["n"]))
+            await bus.join()
+            await bus.stop()
+            log.close()
+            return seen
+
+        asyncio.run(crash())
+        assert sorted(asyncio.run(restart())) == [0, 1, 2]
+        assert SegmentedLog(str(tmp_path)).committed("message_bus") == 3
+
+    def test_message_bus_no_duplicates_before_start(self, tmp_path):
+        """start() 前に publish したメッセージが再生で二重配信されないテスト"""
+        async def run():
+            log = SegmentedLog(str(tmp_path))
+            bus = MessageBus(durable_log=log)
+            seen = []
+            bus.subscribe("jobs", lambda m: seen.append(m.payload["n"]))
+            for i in range(3):
+                await bus.publish("jobs", {"n": i})
+            await bus.start()
+            await bus.join()
+            await bus.stop()
+            log.close()
+            return seen
+
+        assert sorted(asyncio.run(run())) == [0, 1, 2]
+        assert SegmentedLog(str(tmp_path)).committed("message_bus") == 3
+
+    def test_message_bus_stop_keeps_in_flight_message(self, tmp_path):
+        """stop() で中断された処理中のメッセージはコミットされず再生されるテスト"""
+        async def interrupted():
+            log = SegmentedLog(str(tmp_path))
+            bus = MessageBus(durable_log=log)
+            started = asyncio.Event()
+
+            async def slow(message):
+                started.set()
+                await asyncio.sleep(10)
+
+            bus.subscribe("jobs", slow)
+            await bus.start()
+            await bus.publish("jobs", {"n": 0})
+            await started.wait()
+            await bus.stop()
+            log.close()
+
+        async def restart():
+            log = SegmentedLog(str(tmp_path))
+            bus = MessageBus(durable_log=log)
+            seen = []
+            bus.subscribe("jobs", lambda m: seen.append(m.payload["n"]))
+            await bus.start()
+            await bus.join()
+            await bus.stop()
+            log.close()
+            return seen
+
+        asyncio.run(interrupted())
+        assert SegmentedLog(str(tmp_path)).committed("message_bus") == 0
+        assert asyncio.run(restart()) == [0]
+
+    def test_event_bus_replay(self, tmp_path):
+        """イベントバスの再生テスト"""
+        log = SegmentedLog(str(tmp_path))
+        bus = EventBus(durable_log=log)
+        bus._cursor.done = lambda offset: None  # handlers "crash" before completing
+        asyncio.run(bus.publish(Event("1", EventType.AGENT_START, "test", datetime.now(), {})))
+        log.close()
+
+        log = SegmentedLog(str(tmp_path))
+        bus = EventBus(durable_log=log)
+        seen = []
+        bus.subscribe(EventType.AGENT_START, lambda e: seen.append(e.id))
+        assert asyncio.run(bus.replay()) == 1
+        bus.close()
+        assert seen == ["1"]
+        assert SegmentedLog(str(tmp_path)).committed("event_bus") == 1
+
+    def test_event_bus_replay_skips_this_session(self, tmp_path):
+        """replay() 前に publish したイベントが二重配信されないテスト"""
+        async def run():
+            log = SegmentedLog(str(tmp_path))
+            bus = EventBus(durable_log=log)
+            seen = []
+            bus.subscribe(EventType.AGENT_START, lambda e: seen.append(e.id))
+            for i in range(3):
+                await bus.publish(Event(str(i), EventType.AGENT_START, "test", datetime.now(), {}))
+            assert await bus.replay() == 0
+            bus.close()
+            return seen
+
+        assert asyncio.run(run()) == ["0", "1", "2"]
+        assert SegmentedLog(str(tmp_path)).committed("event_bus") == 3
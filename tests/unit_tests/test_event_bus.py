@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+test - event-bus - イベントバステスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "event_bus"))
+
+from event_bus import Event, EventBus, EventType  # noqa: E402
+
+
+def _event(event_type: EventType, idx: int = 0) -> Event:
+    return Event(id=str(idx), type=event_type, source="test",
+                 timestamp=datetime.now(), data={"idx": idx})
+
+
+class TestEventBusHighThroughput:
+    """event-bus - 高スループットモード テストスイート"""
+
+    def test_history_ring_is_bounded_per_type(self):
+        """タイプ別リングバッファの上限テスト"""
+        bus = EventBus(high_throughput=True, max_history=5)
+
+        async def run():
+            for i in range(20):
+                etype = EventType.AGENT_START if i % 2 == 0 else EventType.AGENT_STOP
+                await bus.publish(_event(etype, i))
+
+        asyncio.run(run())
+        assert len(bus.event_history) == 5
+        starts = bus.get_history(EventType.AGENT_START, limit=3)
+        assert [e.data["idx"] for e in starts] == [14, 16, 18]
+        assert [e.data["idx"] for e in bus.get_history(limit=2)] == [18, 19]
+        assert bus.get_history(EventType.USER_MESSAGE) == []
+
+    def test_handlers_run_concurrently(self):
+        """並行ファンアウトテスト"""
+        bus = EventBus(high_throughput=True)
+        calls = []
+
+        for _ in range(10):
+            async def handler(event):
+                await asyncio.sleep(0.05)
+                calls.append(event.id)
+            bus.subscribe(EventType.DATA_UPDATE, handler)
+
+        start = time.perf_counter()
+        asyncio.run(bus.publish(_event(EventType.DATA_UPDATE)))
+        assert len(calls) == 10
+        assert time.perf_counter() - start < 0.3
+
+    def test_sync_handler_offloaded_and_timeout(self):
+        """同期ハンドラのスレッド実行とタイムアウトテスト"""
+        bus = EventBus(high_throughput=True, handler_timeout=0.05)
+        seen = []
+
+        def sync_handler(event):
+            seen.append(event.id)
+
+        async def slow_handler(event):
+            await asyncio.sleep(1)
+            seen.append("slow")
+
+        bus.subscribe(EventType.SYSTEM_NOTIFY, sync_handler)
+        bus.subscribe(EventType.SYSTEM_NOTIFY, slow_handler)
+        asyncio.run(bus.publish(_event(EventType.SYSTEM_NOTIFY, 7)))
+        bus.close()
+        assert seen == ["7"]
+
+    @pytest.mark.parametrize("high_throughput", [False, True])
+    def test_handler_errors_are_isolated(self, high_throughput):
+        """ハンドラ例外の分離テスト"""
+        bus = EventBus(high_throughput=high_throughput)
+        seen = []
+
+        def broken(event):
+            raise RuntimeError("boom")
+
+        def ok(event):
+            seen.append(event.id)
+
+        bus.subscribe(EventType.CUSTOM, broken)
+        bus.subscribe(EventType.CUSTOM, ok)
+        asyncio.run(bus.publish(_event(EventType.CUSTOM, 1)))
+        bus.close()
+        assert seen == ["1"]
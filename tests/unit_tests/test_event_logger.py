@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+test - event-logger - イベントロガーテスト
+
+Unit Test Suite
+"""
+
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "event_logger"))
+
+from event_logger import EventLogger  # noqa: E402
+
+
+def _count(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COALESCE(SUM(row_count), 0) FROM event_partitions").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        conn.close()
+
+
+class TestBufferedWriter:
+    """event-logger - バッファ書き込み テストスイート"""
+
+    def test_batch_size_triggers_flush(self, tmp_path):
+        """バッチサイズ到達時のフラッシュテスト"""
+        db_path = str(tmp_path / "events.db")
+        logger = EventLogger(db_path, batch_size=10, flush_interval=60, background=False)
+        ids = [logger.log("tick", "test", {"n": i}) for i in range(9)]
+        assert ids == list(range(1, 10))
+        assert _count(db_path) == 0
+        logger.log("tick", "test", {"n": 9})
+        assert _count(db_path) == 10
+        logger.close()
+
+    def test_background_thread_flushes_on_interval(self, tmp_path):
+        """バックグラウンドスレッドの時間経過フラッシュテスト"""
+        db_path = str(tmp_path / "events.db")
+        logger = EventLogger(db_path, batch_size=1000, flush_interval=0.05)
+        logger.log("tick", "test", {})
+        deadline = time.monotonic() + 2
+        while _count(db_path) == 0:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        logger.close()
+
+    def test_failed_flush_keeps_rows_and_writer_retries(self, tmp_path, monkeypatch):
+        """書き込み失敗で行を失わず、書き込みスレッドが再試行を続けるテスト"""
+        db_path = str(tmp_path / "events.db")
+        logger = EventLogger(db_path, batch_size=1000, flush_interval=0.02)
+        original = EventLogger._insert
+        failures = []
+
+        def flaky(self, *args):
+            if len(failures) < 3:
+                failures.append(1)
+                raise sqlite3.OperationalError("database is locked")
+            return original(self, *args)
+
+        monkeypatch.setattr(EventLogger, "_insert", flaky)
+        for i in range(5):
+            logger.log("tick", "test", {"n": i})
+        deadline = time.monotonic() + 2
+        while _count(db_path) < 5:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert len(failures) == 3 and logger._writer.is_alive()
+        assert [e.data["n"] for e in logger.get_recent(10)] == [4, 3, 2, 1, 0]
+        logger.close()
+
+    def test_read_waits_for_in_progress_write(self, tmp_path, monkeypatch):
+        """書き込みスレッドが書き込み中でも、読み取りが log() 済みのイベントを見るテスト"""
+        db_path = str(tmp_path / "events.db")
+        logger = EventLogger(db_path, batch_size=1000, flush_interval=0.01)
+        original = EventLogger._write
+        writing = threading.Event()
+
+        def slow(self, rows):
+            writing.set()
+            time.sleep(0.2)  # DB ロックを取る前
+            return original(self, rows)
+
+        monkeypatch.setattr(EventLogger, "_write", slow)
+        logger.log("tick", "test", {})
+        assert writing.wait(2)  # 書き込みスレッドがバッファを取り出した後
+        assert logger.get_stats()["total_events"] == 1
+        logger.close()
+
+    def test_reads_see_buffered_events_and_close_flushes(self, tmp_path):
+        """読み取り時とクローズ時のフラッシュ保証テスト"""
+        db_path = str(tmp_path / "events.db")
+        logger = EventLogger(db_path, batch_size=1000, flush_interval=60)
+        logger.log("start", "a", {"x": "日本語"})
+        logger.log("stop", "a", {})
+        stats = logger.get_stats()
+        assert stats["total_events"] == 2
+        assert stats["by_type"] == {"start": 1, "stop": 1}
+        assert logger.get_recent(1)[0].event_type in ("start", "stop")
+        logger.log("start", "b", {})
+        logger.close()
+        assert _count(db_path) == 3
+
+        with EventLogger(db_path) as reopened:
+            assert reopened.log("next", "a", {}) == 4
+
+
+class TestPartitions:
+    """event-logger - 日次パーティションとロールアップ テストスイート"""
+
+    def _logger(self, tmp_path, **kwargs):
+        return EventLogger(str(tmp_path / "events.db"), background=False, **kwargs)
+
+    def test_events_split_by_day_and_range_query(self, tmp_path):
+        """日次パーティション分割と期間クエリテスト"""
+        logger = self._logger(tmp_path)
+        now = datetime.now()
+        for days_ago in (2, 1, 0):
+            logger.log("deploy", "ci", {"d": days_ago}, timestamp=now - timedelta(days=days_ago))
+            logger.log("alert", "monitor", {"d": days_ago}, timestamp=now - timedelta(days=days_ago))
+        logger.flush()
+        assert len(logger._partitions) == 3
+
+        recent = logger.get_recent(3)
+        assert [e.data["d"] for e in recent] == [0, 0, 1]
+        window = logger.get_range(start=now - timedelta(days=1, hours=1), end=now,
+                                  event_type="deploy")
+        assert [e.data["d"] for e in window] == [1]
+        logger.close()
+
+    def test_rollups_and_stats_are_incremental(self, tmp_path):
+        """ロールアップと統計の増分更新テスト"""
+        logger = self._logger(tmp_path)
+        base = datetime(2026, 1, 1, 10, 0, 30)
+        for i in range(5):
+            logger.log("tick", "a", {}, timestamp=base + timedelta(seconds=20 * i))
+        logger.log("tock", "b", {}, timestamp=base)
+        minutes = logger.get_rollup("minute", event_type="tick")
+        assert [m["count"] for m in minutes] == [2, 3]
+        hours = logger.get_rollup("hour")
+        assert sum(h["count"] for h in hours) == 6
+        assert logger.get_stats()["by_source"] == {"a": 5, "b": 1}
+        logger.close()
+
+    def test_retention_drops_partitions(self, tmp_path):
+        """保持期間超過パーティションの削除テスト"""
+        logger = self._logger(tmp_path, retention_days=7)
+        now = datetime.now()
+        logger.log("old", "x", {}, timestamp=now - timedelta(days=30))
+        logger.log("new", "x", {}, timestamp=now)
+        logger.flush()
+        assert len(logger._partitions) == 1
+        assert logger.get_stats()["by_type"] == {"new": 1}
+        assert logger.get_rollup("minute", event_type="old") == []
+        assert len(logger.get_rollup("day", event_type="old")) == 1
+        logger.close()
+
+    def test_legacy_table_is_migrated(self, tmp_path):
+        """旧 event_logs テーブルからの移行テスト"""
+        db_path = str(tmp_path / "events.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE event_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL,
+            event_type TEXT NOT NULL, source TEXT NOT NULL, target TEXT, data TEXT NOT NULL)
+        """)
+        conn.execute("INSERT INTO event_logs VALUES (7, ?, 'legacy', 'old', NULL, '{}')",
+                     (datetime.now().isoformat(),))
+        conn.commit()
+        conn.close()
+
+        logger = EventLogger(db_path, background=False)
+        assert logger.log("new", "x", {}) == 8
+        assert logger.get_stats()["total_events"] == 2
+        assert [e.id for e in logger.get_recent()] == [8, 7]
+        logger.close()
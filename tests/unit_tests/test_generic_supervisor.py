@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+test - generic-supervisor - 汎用スーパーバイザーテスト
+
+Unit Test Suite
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from generic_supervisor import GenericSupervisor, WorkerStatus  # noqa: E402
+
+
+def _supervisor(tmp_path, **config):
+    supervisor = GenericSupervisor(str(tmp_path / "supervisor_config.json"))
+    for key, value in config.items():
+        setattr(supervisor.config, key, value)
+    return supervisor
+
+
+class TestHeartbeatHeap:
+    """generic-supervisor - ハートビートヒープ テストスイート"""
+
+    def test_expired_workers_reported_once(self, tmp_path):
+        """タイムアウト検出と再ハートビート後の再追跡テスト"""
+        supervisor = _supervisor(tmp_path, heartbeat_timeout=10)
+        for worker_id in ("a", "b", "c"):
+            supervisor.register_worker(worker_id, worker_id, "test")
+        supervisor.update_heartbeat("a", current_task="t")
+        supervisor.update_worker_status("b", WorkerStatus.IDLE.value)
+        supervisor.stop_worker("c")
+
+        later = time.time() + 11
+        assert sorted(supervisor.expired_workers(later)) == ["a", "b"]
+        assert supervisor.expired_workers(later) == []
+
+        supervisor.update_heartbeat("a")
+        assert supervisor.expired_workers(time.time() + 11) == ["a"]
+        supervisor.close()
+
+    def test_superseded_heartbeats_are_ignored(self, tmp_path):
+        """古いヒープエントリを無視するテスト"""
+        supervisor = _supervisor(tmp_path, heartbeat_timeout=10)
+        supervisor.register_worker("w", "w", "test")
+        supervisor._track_heartbeat("w", None, at=time.time() - 100)
+        supervisor._track_heartbeat("w", None, at=time.time())
+        assert supervisor.expired_workers() == []
+        assert supervisor.check_heartbeat("w")
+        supervisor.close()
+
+
+class TestSqliteState:
+    """generic-supervisor - SQLite 永続化 テストスイート"""
+
+    def test_state_and_events_survive_restart(self, tmp_path):
+        """再起動後の状態とイベント復元テスト"""
+        supervisor = _supervisor(tmp_path, flush_interval=3600, flush_batch_size=10_000)
+        supervisor.register_worker("w1", "one", "test", metadata={"v": 1})
+        supervisor.update_worker_status("w1", WorkerStatus.ERROR.value, "disk full")
+        # Nothing written yet: changes wait for the batch
+        assert supervisor.conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0] == 0
+        supervisor.close()
+
+        reloaded = _supervisor(tmp_path)
+        worker = reloaded.get_worker_status("w1")
+        assert worker.status == WorkerStatus.ERROR.value
+        assert worker.metadata == {"v": 1}
+        assert reloaded._errored == {"w1"}
+        assert [e["event_type"] for e in reloaded.get_events()] == [
+            "worker_registered", "worker_error"
+        ]
+        reloaded.close()
+
+    def test_events_pruned_on_flush(self, tmp_path):
+        """書き込み時に件数上限と保持期間でイベントを削除するテスト"""
+        supervisor = _supervisor(tmp_path, max_log_entries=50, flush_batch_size=10, prune_interval=0)
+        with supervisor.conn:
+            supervisor.conn.execute(
+                "INSERT INTO events (timestamp, event_type, worker_id, data) VALUES ('2000-01-01T00:00:00', 'old', 'w', '{}')")
+        for i in range(200):
+            supervisor.log_event("tick", "w", {"i": i})
+        supervisor.flush()
+        count, oldest = supervisor.conn.execute("SELECT COUNT(*), MIN(timestamp) FROM events").fetchone()
+        assert count == 50 and oldest > "2000-01-01"
+        assert supervisor.get_events(limit=1)[0]["data"] == {"i": 199}
+        supervisor.close()
+
+    def test_prune_is_throttled(self, tmp_path):
+        """削除は prune_interval ごとに 1 回だけ行い、close() では必ず行うテスト"""
+        supervisor = _supervisor(tmp_path, max_log_entries=50, flush_batch_size=10, prune_interval=3600)
+        for i in range(200):
+            supervisor.log_event("tick", "w", {"i": i})
+        supervisor.flush()
+        assert supervisor.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] > 50
+        supervisor.close()
+
+        reopened = _supervisor(tmp_path)
+        assert reopened.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 50
+        reopened.close()
+
+    def test_legacy_json_state_is_migrated(self, tmp_path):
+        """旧 JSON 状態ファイルの移行テスト"""
+        legacy = _supervisor(tmp_path)
+        legacy.register_worker("old", "old", "test")
+        worker_data = dict(vars(legacy.workers["old"]))
+        legacy.close()
+        (tmp_path / "supervisor_state.db").unlink()
+        with open(tmp_path / "supervisor_state.json", "w") as f:
+            json.dump({"workers": [worker_data]}, f)
+
+        supervisor = _supervisor(tmp_path)
+        assert "old" in supervisor.workers
+        assert supervisor.conn.execute("SELECT COUNT(*) FROM workers").fetchone()[0] == 1
+        supervisor.close()
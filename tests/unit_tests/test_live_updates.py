@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+test - live-updates - ダッシュボードライブ更新テスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "dashboard"))
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "event_bus"))
+
+from generic_supervisor import GenericSupervisor, WorkerStatus  # noqa: E402
+from live_updates import LiveStatusHub  # noqa: E402
+
+
+class TestLiveStatusHub:
+    """live-updates - 差分配信 テストスイート"""
+
+    def test_updates_are_coalesced_per_frame(self):
+        """フレーム内の複数更新が 1 差分にまとまるテスト"""
+        async def scenario():
+            hub = LiveStatusHub(frame_interval=60)
+            hub.update("a", status="idle")
+            connection = hub.connect()
+            snapshot = (await connection.next_frames())[0]
+            assert json.loads(snapshot.text)["agents"] == {"a": {"status": "idle"}}
+
+            hub.update("a", status="busy")
+            hub.update("a", status="error", pid=42)
+            hub.update("b", status="idle")
+            hub.update("b", status="idle")  # 変化なし
+            hub.remove("b")
+            hub.flush()
+            assert hub.flush() is None
+            frames = await connection.next_frames()
+            delta = json.loads(frames[0].text)
+            assert len(frames) == 1
+            assert delta["agents"] == {"a": {"status": "error", "pid": 42}}
+            assert delta["removed"] == ["b"]
+            connection.close()
+            assert hub.connections == set()
+
+        asyncio.run(scenario())
+
+    def test_slow_client_queue_is_bounded(self):
+        """遅いクライアントのキュー上限とスナップショット再同期テスト"""
+        async def scenario():
+            hub = LiveStatusHub(frame_interval=60, max_queue=4)
+            connection = hub.connect()
+            await connection.next_frames()
+            for i in range(50):
+                hub.update("a", count=i)
+                hub.flush()
+                assert len(connection.queue) <= 4
+            frames = await connection.next_frames()
+            assert [f.kind for f in frames] == ["snapshot"]
+            assert json.loads(frames[0].text)["agents"]["a"]["count"] == 49
+            assert connection.dropped >= 1
+
+        asyncio.run(scenario())
+
+    def test_stalled_sender_is_dropped(self):
+        """送信が止まった接続の切断テスト"""
+        async def scenario():
+            hub = LiveStatusHub(frame_interval=0.01, send_timeout=0.05)
+            connection = hub.connect()
+            blocked = asyncio.Event()
+
+            async def send(frame):
+                await blocked.wait()
+
+            pump = asyncio.create_task(connection.pump(send))
+            hub.update("a", status="idle")
+            await asyncio.wait_for(pump, timeout=2)
+            assert connection.stalled and hub.connections == set()
+
+        asyncio.run(scenario())
+
+    def test_max_connections(self):
+        """接続数上限テスト"""
+        async def scenario():
+            hub = LiveStatusHub(max_connections=1)
+            hub.connect()
+            with pytest.raises(ValueError):
+                hub.connect()
+
+        asyncio.run(scenario())
+
+    def test_supervisor_and_event_bus_sources(self, tmp_path):
+        """スーパーバイザーと EventBus からの差分テスト"""
+        from datetime import datetime
+        from event_bus import Event, EventBus, EventType
+
+        supervisor = GenericSupervisor(str(tmp_path / "supervisor_config.json"))
+        supervisor.register_worker("w1", "Worker 1", "test")
+        bus = EventBus()
+        hub = LiveStatusHub().attach_supervisor(supervisor).attach_event_bus(bus)
+        assert hub.state["w1"]["process_status"] == WorkerStatus.INITIALIZING.value
+
+        supervisor.update_worker_status("w1", WorkerStatus.ERROR.value, "boom")
+        assert hub.state["w1"]["last_error"] == "boom"
+        asyncio.run(bus.publish(Event("1", EventType.AGENT_START, "w2", datetime.now(), {})))
+        delta = json.loads(hub.flush().text)
+        assert delta["agents"]["w1"]["process_status"] == "error"
+        assert delta["agents"]["w2"]["process_status"] == "running"
+        supervisor.close()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+test - message-bus - メッセージバステスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "message_bus"))
+
+from message_bus import MessageBus, MessagePriority, RequestError, TopicTrie  # noqa: E402
+
+
+class TestMessageBusScheduling:
+    """message-bus - 優先度スケジューリング テストスイート"""
+
+    def test_priority_order_with_backlog(self):
+        """バックログの優先度順ディスパッチテスト"""
+        async def run():
+            bus = MessageBus(consumers_per_topic=1)
+            seen = []
+            bus.subscribe("jobs", lambda m: seen.append(m.payload["n"]))
+            for n, priority in enumerate([MessagePriority.LOW, MessagePriority.NORMAL,
+                                          MessagePriority.CRITICAL, MessagePriority.HIGH]):
+                await bus.publish("jobs", {"n": n}, priority=priority)
+            await bus.start()
+            await bus.join()
+            await bus.stop()
+            return seen
+
+        assert asyncio.run(run()) == [2, 3, 1, 0]
+
+    def test_aging_prevents_starvation(self):
+        """エージングによる飢餓防止テスト"""
+        async def run():
+            bus = MessageBus(consumers_per_topic=1, aging_interval=0.01)
+            seen = []
+            bus.subscribe("jobs", lambda m: seen.append(m.priority))
+            await bus.publish("jobs", {}, priority=MessagePriority.LOW)
+            await asyncio.sleep(0.05)
+            await bus.publish("jobs", {}, priority=MessagePriority.CRITICAL)
+            await bus.start()
+            await bus.join()
+            await bus.stop()
+            return seen
+
+        assert asyncio.run(run()) == [MessagePriority.LOW, MessagePriority.CRITICAL]
+
+    def test_parallel_consumers_bounded(self):
+        """トピック毎の並列コンシューマ上限テスト"""
+        async def run():
+            bus = MessageBus(consumers_per_topic=3)
+            in_flight = peak = 0
+
+            async def handler(message):
+                nonlocal in_flight, peak
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.01)
+                in_flight -= 1
+
+            bus.subscribe("work", handler)
+            await bus.start()
+            for i in range(20):
+                await bus.publish("work", {"i": i})
+            await bus.join()
+            await bus.stop()
+            return peak
+
+        assert asyncio.run(run()) == 3
+
+    def test_publish_blocks_when_lane_full(self):
+        """キュー満杯時のバックプレッシャーテスト"""
+        async def run():
+            bus = MessageBus(max_pending=2)
+            bus.subscribe("full", lambda m: None)
+            await bus.publish("full", {})
+            await bus.publish("full", {})
+            try:
+                await asyncio.wait_for(bus.publish("full", {}), timeout=0.05)
+            except asyncio.TimeoutError:
+                return True
+            return False
+
+        assert asyncio.run(run()) is True
+
+    def test_lanes_only_for_subscribed_topics_and_retired_when_idle(self):
+        """購読者の無いトピックにはレーンを作らず、アイドルのレーンを回収するテスト"""
+        async def run():
+            bus = MessageBus(lane_idle_timeout=0.02)
+            seen = []
+            bus.subscribe("jobs.*", lambda m: seen.append(m.topic))
+            await bus.start()
+            for i in range(50):
+                await bus.publish(f"nobody.{i}", {})
+                await bus.publish(f"jobs.{i}", {})
+            assert len(bus.lanes) == 50 and not any(t.startswith("nobody") for t in bus.lanes)
+            await bus.join()
+            before = len(asyncio.all_tasks())
+            await asyncio.sleep(0.1)
+            retired = (len(bus.lanes), before - len(asyncio.all_tasks()))
+            await bus.publish("jobs.again", {})  # 回収後も新しいレーンで配信できる
+            await bus.join()
+            await bus.stop()
+            return seen, retired
+
+        seen, (lanes, freed_tasks) = asyncio.run(run())
+        assert lanes == 0 and freed_tasks == 50 * 4
+        assert sorted(seen) == sorted([f"jobs.{i}" for i in range(50)] + ["jobs.again"])
+
+
+class TestTopicRouting:
+    """message-bus - ワイルドカードルーティング テストスイート"""
+
+    def test_wildcard_matching(self):
+        """+ / * / # ワイルドカードのマッチテスト"""
+        trie = TopicTrie()
+        exact, single, star, multi, root = (object() for _ in range(5))
+        trie.insert("baseball.giants.stats", exact)
+        trie.insert("baseball.+.stats", single)
+        trie.insert("baseball.*.stats", star)
+        trie.insert("erotic.#", multi)
+        trie.insert("#", root)
+
+        assert set(trie.match("baseball.giants.stats")) == {exact, single, star, root}
+        assert set(trie.match("baseball.tigers.stats")) == {single, star, root}
+        assert set(trie.match("baseball.tigers.scores")) == {root}
+        assert set(trie.match("erotic")) == {multi, root}
+        assert set(trie.match("erotic.ai.chat.v2")) == {multi, root}
+
+    def test_cache_invalidated_on_unsubscribe(self):
+        """購読解除時のキャッシュ無効化テスト"""
+        trie = TopicTrie()
+        handler = object()
+        trie.insert("game.+.score", handler)
+        assert trie.match("game.chess.score") == [handler]
+        assert trie.remove("game.+.score", handler) is True
+        assert trie.match("game.chess.score") == []
+        assert trie.root == {}
+
+    def test_invalid_multi_level_pattern(self):
+        """# の位置検証テスト"""
+        with pytest.raises(ValueError):
+            TopicTrie().insert("a.#.b", object())
+
+    def test_bus_delivers_to_wildcard_subscribers(self):
+        """バス経由のワイルドカード配信テスト"""
+        async def run():
+            bus = MessageBus()
+            seen = []
+            bus.subscribe("baseball.*.stats", lambda m: seen.append(("single", m.topic)))
+            bus.subscribe("baseball.#", lambda m: seen.append(("multi", m.topic)))
+            await bus.start()
+            await bus.publish("baseball.giants.stats", {})
+            await bus.publish("baseball.news", {})
+            await bus.join()
+            await bus.stop()
+            return seen
+
+        assert sorted(asyncio.run(run())) == [
+            ("multi", "baseball.giants.stats"),
+            ("multi", "baseball.news"),
+            ("single", "baseball.giants.stats"),
+        ]
+
+
+class TestRequestReply:
+    """message-bus - リクエスト/リプライ テストスイート"""
+
+    def test_round_trip(self):
+        """相関IDによる往復テスト"""
+        async def run():
+            bus = MessageBus()
+            bus.serve("math.double", lambda m: {"value": m.payload["value"] * 2})
+            await bus.start()
+            replies = await asyncio.gather(*(
+                bus.request("math.double", {"value": i}) for i in range(50)
+            ))
+            await bus.stop()
+            return [r["value"] for r in replies], bus._pending_requests
+
+        values, pending = asyncio.run(run())
+        assert values == [i * 2 for i in range(50)]
+        assert pending == {}
+
+    def test_timeout_expires_pending_entry(self):
+        """タイムアウト時の保留エントリ削除テスト"""
+        async def run():
+            bus = MessageBus()
+            bus.subscribe("silent", lambda m: None)
+            await bus.start()
+            with pytest.raises(asyncio.TimeoutError):
+                await bus.request("silent", {}, timeout=0.05)
+            await bus.stop()
+            return bus._pending_requests
+
+        assert asyncio.run(run()) == {}
+
+    def test_responder_error_and_missing_topic(self):
+        """レスポンダ例外と購読者なしのエラーテスト"""
+        async def run():
+            bus = MessageBus()
+
+            def broken(message):
+                raise ValueError("bad input")
+
+            bus.serve("broken", broken)
+            await bus.start()
+            with pytest.raises(RequestError, match="bad input"):
+                await bus.request("broken", {})
+            with pytest.raises(RequestError):
+                await bus.request("nobody.home", {})
+            await bus.stop()
+
+        asyncio.run(run())
+
+    def test_inflight_requests_are_bounded(self):
+        """同時リクエスト数の上限テスト"""
+        async def run():
+            bus = MessageBus(max_inflight_requests=2)
+            peak = 0
+
+            async def slow(message):
+                nonlocal peak
+                peak = max(peak, len(bus._pending_requests))
+                await asyncio.sleep(0.01)
+                return {}
+
+            bus.serve("slow", slow)
+            await bus.start()
+            await asyncio.gather(*(bus.request("slow", {}) for _ in range(10)))
+            await bus.stop()
+            return peak
+
+        assert asyncio.run(run()) == 2
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+test - monitor-agent - メトリクス集計・分位点スケッチ精度テスト
+
+Unit Test Suite
+"""
+
+import importlib.util
+import math
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# db.py という汎用名のため、固有の名前で読み込む
+_spec = importlib.util.spec_from_file_location("monitor_agent_db", ROOT / "agents" / "monitor-agent" / "db.py")
+monitor_db = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = monitor_db
+_spec.loader.exec_module(monitor_db)
+
+DDSketch = monitor_db.DDSketch
+
+QUANTILES = (0.0, 0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999, 1.0)
+T0 = 1_760_000_000 - 1_760_000_000 % 60  # 分の境界
+
+
+def _exact(ordered, q):
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _assert_within_bound(sketch, values, alpha):
+    ordered = sorted(values)
+    for q in QUANTILES:
+        exact = _exact(ordered, q)
+        assert abs(sketch.quantile(q) - exact) <= alpha * abs(exact) * (1 + 1e-9), q
+
+
+def _distributions():
+    rng = random.Random(11)
+    return {
+        "uniform": [rng.uniform(0, 1000) for _ in range(20_000)],
+        "exponential": [rng.expovariate(1 / 50) for _ in range(20_000)],
+        "lognormal": [rng.lognormvariate(0, 3) for _ in range(20_000)],
+        "mixed-sign": [rng.gauss(0, 100) for _ in range(20_000)] + [0.0] * 500,
+        "latency-spikes": [rng.uniform(5, 15) for _ in range(19_800)] + [rng.uniform(2000, 5000) for _ in range(200)],
+    }
+
+
+class TestDDSketchAccuracy:
+    """monitor-agent - DDSketch 精度保証 テストスイート"""
+
+    @pytest.mark.parametrize("name", list(_distributions()))
+    @pytest.mark.parametrize("alpha", [0.01, 0.05])
+    def test_relative_error_bound(self, name, alpha):
+        """全分位点の推定誤差が相対精度以内に収まるテスト"""
+        values = _distributions()[name]
+        sketch = DDSketch(alpha).add_many(values)
+        _assert_within_bound(sketch, values, alpha)
+        assert sketch.count == len(values) and sketch.sum == pytest.approx(math.fsum(values))
+        assert len(sketch.positive) + len(sketch.negative) < 2048
+
+    def test_merge_is_exact(self):
+        """分割して作ったスケッチのマージが一括作成と一致するテスト"""
+        values = _distributions()["mixed-sign"]
+        whole = DDSketch().add_many(values)
+        merged = DDSketch()
+        for i in range(0, len(values), 977):
+            merged.merge(DDSketch().add_many(values[i:i + 977]))
+        assert (merged.positive, merged.negative, merged.zero_count, merged.count) == \
+            (whole.positive, whole.negative, whole.zero_count, whole.count)
+        assert [merged.quantile(q) for q in QUANTILES] == [whole.quantile(q) for q in QUANTILES]
+        _assert_within_bound(merged, values, 0.01)
+        with pytest.raises(ValueError):
+            merged.merge(DDSketch(0.05))
+
+    def test_serialization_and_collapse(self):
+        """JSON 往復と、ビン上限で縮約しても上位分位点は精度を保つテスト"""
+        values = [10.0 ** (i / 100) for i in range(-600, 900)]  # 15 桁にわたる値
+        sketch = DDSketch(0.01, max_bins=200).add_many(values)
+        assert len(sketch.positive) == 200
+        restored = DDSketch.from_json(sketch.to_json())
+        ordered = sorted(values)
+        for q in (0.9, 0.95, 0.99):
+            exact = _exact(ordered, q)
+            assert restored.quantile(q) == sketch.quantile(q)
+            assert abs(restored.quantile(q) - exact) <= 0.01 * exact * (1 + 1e-9)
+        assert DDSketch().quantile(0.5) is None
+        for bad in ({"relative_accuracy": 0}, {"relative_accuracy": 1}, {"max_bins": 1}):
+            with pytest.raises(ValueError):
+                DDSketch(**bad)
+
+
+class TestAggregateMetrics:
+    """monitor-agent - ロールアップによる窓集計 テストスイート"""
+
+    @pytest.fixture
+    def db(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(monitor_db, "DB_PATH", tmp_path / "monitor.db")
+        monkeypatch.setattr(monitor_db, "_engine", None)
+        monitor_db.init_db()
+        rng = random.Random(3)
+        samples = [{"metric": "latency_ms", "value": round(rng.lognormvariate(3, 1), 3), "timestamp": T0 + i * 7}
+                   for i in range(3000)]
+        samples += [{"metric": "other", "value": 1e6, "timestamp": T0 + i} for i in range(0, 3000, 30)]
+        monitor_db.record_metrics(samples, evaluate=False)
+        return monitor_db
+
+    @staticmethod
+    def _raw(db, start, end):
+        conn = sqlite3.connect(db.DB_PATH)
+        values = [v for (v,) in conn.execute(
+            "SELECT value FROM metrics WHERE metric_name = 'latency_ms' AND timestamp >= ? AND timestamp <= ?",
+            (db._sql_timestamp(start), db._sql_timestamp(end)))]
+        conn.close()
+        return values
+
+    def test_matches_raw_rows(self, db):
+        """揃っていない窓でも生データと一致 (分位点は精度以内) するテスト"""
+        for start, end in ((T0, T0 + 3600 - 1), (T0 + 17, T0 + 12_345), (T0 + 61, T0 + 100)):
+            values = self._raw(db, start, end)
+            assert db.aggregate_metrics("latency_ms", "count", start, end) == len(values)
+            assert db.aggregate_metrics("latency_ms", "sum", start, end) == pytest.approx(math.fsum(values))
+            assert db.aggregate_metrics("latency_ms", "avg", start, end) == pytest.approx(
+                math.fsum(values) / len(values))
+            assert db.aggregate_metrics("latency_ms", "min", start, end) == min(values)
+            assert db.aggregate_metrics("latency_ms", "max", start, end) == max(values)
+            ordered = sorted(values)
+            for p in (50, 75, 90, 95, 99):
+                exact = _exact(ordered, p / 100)
+                estimate = db.aggregate_metrics("latency_ms", f"p{p}", start, end)
+                assert abs(estimate - exact) <= monitor_db.SKETCH_RELATIVE_ACCURACY * exact * (1 + 1e-9)
+
+    def test_aligned_window_skips_raw_rows(self, db, monkeypatch):
+        """分に揃った窓では metrics テーブルを読まないテスト"""
+        statements = []
+        connect = sqlite3.connect
+
+        def traced(*args, **kwargs):
+            conn = connect(*args, **kwargs)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        monkeypatch.setattr(monitor_db.sqlite3, "connect", traced)
+        start = db._sql_timestamp(T0 + 600)
+        p99 = db.aggregate_metrics("latency_ms", "p99", start, db._sql_timestamp(T0 + 600 + 3599))
+        assert p99 > 0
+        assert not [s for s in statements if "FROM metrics " in s]
+
+    def test_rollups_incremental_and_rebuilt(self, db):
+        """record_metric の逐次更新、既存 DB の再構築、不正な集計種別のテスト"""
+        end = T0 + 3 * 3600
+        before = db.aggregate_metrics("latency_ms", "count", T0, end)
+        db.record_metric("latency_ms", 12.5, timestamp=T0 + 30, evaluate=False)
+        assert db.aggregate_metrics("latency_ms", "count", T0, end) == before + 1
+        p90 = db.aggregate_metrics("latency_ms", "p90", T0, end)
+
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute("DELETE FROM metric_sketches")
+        conn.commit()
+        conn.close()
+        db.init_db()  # ロールアップの無い DB は生データから作り直す
+        assert db.aggregate_metrics("latency_ms", "count", T0, end) == before + 1
+        assert db.aggregate_metrics("latency_ms", "p90", T0, end) == p90
+        assert db.aggregate_metrics("latency_ms", "p95", T0 + 30_000, T0 + 30_060) == 0
+        with pytest.raises(ValueError):
+            db.aggregate_metrics("latency_ms", "median", T0, end)
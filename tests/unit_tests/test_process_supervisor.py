@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+test - process-supervisor - プロセススーパーバイザーテスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from generic_supervisor import WorkerStatus  # noqa: E402
+from process_supervisor import BackoffPolicy, ProcessSpec, ProcessSupervisor  # noqa: E402
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+def _supervisor(tmp_path, **kwargs):
+    kwargs.setdefault("backoff", BackoffPolicy(base=0.05))
+    return ProcessSupervisor(str(tmp_path / "supervisor_config.json"), cgroup_root=None, **kwargs)
+
+
+async def _wait_for(predicate, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+class TestBackoffPolicy:
+    """process-supervisor - バックオフ テストスイート"""
+
+    def test_delay_grows_and_is_capped(self):
+        """指数増加・ジッター範囲・上限テスト"""
+        policy = BackoffPolicy(base=1.0, factor=2.0, max_delay=5.0, jitter=0.5)
+        for attempt, full in [(0, 1.0), (1, 2.0), (2, 4.0), (10, 5.0)]:
+            for _ in range(20):
+                assert full * 0.5 <= policy.delay(attempt) <= full
+
+
+class TestProcessSupervisor:
+    """process-supervisor - プロセス起動/再起動 テストスイート"""
+
+    def test_crashed_process_is_restarted(self, tmp_path):
+        """クラッシュ後の再起動と復旧時間記録テスト"""
+        async def run():
+            supervisor = _supervisor(tmp_path)
+            supervisor.add_process(ProcessSpec("w", SLEEPER))
+            assert await supervisor.start_all() == 1
+            first = supervisor.processes["w"]
+            first.kill()
+            await _wait_for(lambda: supervisor.is_running("w") and supervisor.processes["w"] is not first)
+            assert supervisor.exit_codes["w"] == -9
+            assert supervisor.workers["w"].restart_count == 1
+            assert supervisor.recovery_stats()["count"] == 1
+            await supervisor.shutdown()
+            return supervisor
+
+        supervisor = asyncio.run(run())
+        assert supervisor.workers["w"].status == WorkerStatus.STOPPED.value
+
+    def test_stop_does_not_restart(self, tmp_path):
+        """停止時に再起動しないことのテスト"""
+        async def run():
+            supervisor = _supervisor(tmp_path)
+            supervisor.add_process(ProcessSpec("w", SLEEPER))
+            await supervisor.start("w")
+            assert await supervisor.stop("w")
+            await asyncio.sleep(0.2)
+            running = supervisor.is_running("w")
+            await supervisor.shutdown()
+            return running
+
+        assert asyncio.run(run()) is False
+
+    def test_max_restarts_terminates(self, tmp_path):
+        """再起動上限到達時の終了テスト"""
+        async def run():
+            supervisor = _supervisor(tmp_path)
+            supervisor.config.max_restarts = 2
+            supervisor.add_process(ProcessSpec("w", [sys.executable, "-c", "raise SystemExit(3)"]))
+            await supervisor.start("w")
+            await _wait_for(lambda: supervisor.workers["w"].status == WorkerStatus.TERMINATED.value)
+            codes = supervisor.exit_codes["w"]
+            await supervisor.shutdown()
+            return codes
+
+        assert asyncio.run(run()) == 3
+
+    def test_memory_limit_enforced(self, tmp_path):
+        """メモリ上限 (RLIMIT_AS) の適用テスト"""
+        async def run():
+            supervisor = _supervisor(tmp_path)
+            supervisor.config.auto_restart = False
+            supervisor.add_process(ProcessSpec(
+                "hog", [sys.executable, "-c", "b = bytearray(1024 * 1024 * 1024)"],
+                max_memory_mb=256))
+            await supervisor.start("hog")
+            await _wait_for(lambda: "hog" in supervisor.exit_codes)
+            await supervisor.shutdown()
+            return supervisor.exit_codes["hog"]
+
+        assert asyncio.run(run()) != 0
+
+    def test_hung_process_is_killed_and_restarted(self, tmp_path):
+        """ハートビートを報告しないプロセスだけがタイムアウトで強制再起動されるテスト"""
+        reporter = [sys.executable, "-c",
+                    f"import sys, time; sys.path.insert(0, {str(Path(__file__).resolve().parents[2])!r})\n"
+                    "from process_supervisor import report_heartbeat\n"
+                    "while True:\n    report_heartbeat(); time.sleep(0.05)"]
+
+        async def run():
+            supervisor = _supervisor(tmp_path)
+            supervisor.config.heartbeat_timeout = 0.5
+            supervisor.config.monitor_interval = 0.05
+            supervisor.add_process(ProcessSpec("hung", SLEEPER, reports_heartbeat=True))
+            supervisor.add_process(ProcessSpec("alive", reporter, reports_heartbeat=True))
+            legacy = ProcessSpec.for_agent(str(tmp_path), worker_id="legacy")  # 既定はプロセス生存のみ
+            legacy.command = SLEEPER
+            supervisor.add_process(legacy)
+            await supervisor.start_all()
+            first = dict(supervisor.processes)
+            stop = asyncio.Event()
+            monitor = asyncio.create_task(supervisor.monitor(stop))
+            await _wait_for(lambda: supervisor.processes["hung"] is not first["hung"])
+            await asyncio.sleep(0.5)
+            stop.set()
+            await monitor
+            same = {wid: supervisor.processes[wid] is first[wid] for wid in ("alive", "legacy")}
+            events = [e["event_type"] for e in supervisor.get_events(worker_id="hung")]
+            await supervisor.shutdown()
+            return first["hung"].returncode, same, events
+
+        returncode, same, events = asyncio.run(run())
+        assert returncode == -15  # SIGTERM で停止
+        assert same == {"alive": True, "legacy": True}
+        assert "heartbeat_timeout" in events
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+test - response-cache - ダッシュボードレスポンスキャッシュテスト
+
+Unit Test Suite
+"""
+
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "dashboard"))
+
+from response_cache import (  # noqa: E402
+    ResponseCache, decode_cursor, encode_cursor, negotiate_encoding, query_items,
+)
+
+ROWS = [
+    {"name": f"agent-{i:02d}", "status": "active" if i % 3 else "error",
+     "description": "監視エージェント" if i % 2 else "通知エージェント"}
+    for i in range(25)
+]
+
+
+class TestQueryItems:
+    """response-cache - ページネーション/フィルタ テストスイート"""
+
+    def test_cursor_pages_cover_all_rows(self):
+        """カーソルで全行を重複なく辿るテスト"""
+        for sort in ("name", "-name", "status", "-description"):
+            seen, cursor = [], None
+            while True:
+                page, cursor, total = query_items(ROWS, sort=sort, cursor=cursor, limit=7)
+                seen.extend(row["name"] for row in page)
+                if cursor is None:
+                    break
+            assert total == 25
+            assert sorted(seen) == sorted(row["name"] for row in ROWS)
+            assert len(seen) == 25
+
+    def test_descending_order(self):
+        """降順ソートテスト"""
+        page, _, _ = query_items(ROWS, sort="-name", limit=3)
+        assert [row["name"] for row in page] == ["agent-24", "agent-23", "agent-22"]
+
+    def test_filter_search_and_projection(self):
+        """フィルタ・部分一致・フィールド射影テスト"""
+        page, cursor, total = query_items(ROWS, filters={"status": "error"}, text="監視",
+                                          fields=["name"])
+        assert cursor is None
+        assert page == [{"name": "agent-03"}, {"name": "agent-09"},
+                        {"name": "agent-15"}, {"name": "agent-21"}]
+        assert total == 4
+
+    def test_invalid_cursor(self):
+        """不正なカーソルのエラーテスト"""
+        with pytest.raises(ValueError):
+            decode_cursor("not-a-cursor!")
+        # 形は正しくても要素が文字列でないカーソルも ValueError
+        for values in ([1, 2], ["agent-01", None], ["a", "b", "c"]):
+            with pytest.raises(ValueError):
+                decode_cursor(encode_cursor(values))
+        with pytest.raises(ValueError):
+            query_items(ROWS, cursor=encode_cursor([1, 2]))
+
+
+class TestResponseCache:
+    """response-cache - キャッシュ/ETag/圧縮 テストスイート"""
+
+    def test_etag_and_compression(self):
+        """ETag による 304 と gzip 圧縮テスト"""
+        cache = ResponseCache()
+        cached = cache.put("/api/agents?", 1, ROWS, {"X-Total-Count": "25"})
+        status, headers, body = cached.render()
+        assert status == 200 and json.loads(body) == ROWS
+        assert headers["X-Total-Count"] == "25"
+
+        status, _, body = cached.render(if_none_match=f'W/{headers["ETag"]}')
+        assert status == 304 and body == b""
+
+        assert negotiate_encoding("gzip;q=0, identity") is None
+        status, headers, body = cached.render(accept_encoding="gzip")
+        assert headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(body)) == ROWS
+        assert cached.render(accept_encoding="gzip")[2] is body  # 圧縮は一度だけ
+
+    def test_version_ttl_and_discovery_invalidation(self):
+        """バージョン・TTL・ディスカバリ通知による無効化テスト"""
+        class FakeDiscovery:
+            listeners = []
+
+        cache = ResponseCache(ttl=60).attach(FakeDiscovery)
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {"n": len(builds)}, {}
+
+        cache.get_or_build("k", 1, build)
+        cache.get_or_build("k", 1, build)
+        assert len(builds) == 1
+        cache.get_or_build("k", 2, build)
+        assert len(builds) == 2
+
+        for listener in FakeDiscovery.listeners:
+            listener({"agent-01"})
+        assert cache.get("k", 2) is None
+
+        cache.ttl = -1
+        cache.get_or_build("k", 2, build)
+        cache.get_or_build("k", 2, build)
+        assert len(builds) == 4
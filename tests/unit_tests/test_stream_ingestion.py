@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+test - stream-ingestion - ストリーム取り込みバックプレッシャーテスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+try:
+    from aiohttp import ClientSession, web
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+MODULE_PATH = Path(__file__).resolve().parents[2] / "realtime_analytics" / "stream-ingestion" / "implementation.py"
+
+# 各モジュールが implementation.py という同名ファイルのため、固有の名前で読み込む
+_spec = importlib.util.spec_from_file_location("stream_ingestion_implementation", MODULE_PATH)
+implementation = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = implementation
+_spec.loader.exec_module(implementation)
+
+IngestBuffer = implementation.IngestBuffer
+StreamIngestion = implementation.StreamIngestion
+WebsocketIngestion = implementation.WebsocketIngestion
+
+requires_aiohttp = pytest.mark.skipif(not AIOHTTP_AVAILABLE, reason="aiohttp not installed")
+
+
+@pytest.fixture(params=["orjson", "msgspec", "json"])
+def backend(request, monkeypatch):
+    flags = {"orjson": "ORJSON_AVAILABLE", "msgspec": "MSGSPEC_AVAILABLE"}
+    if request.param in flags and not getattr(implementation, flags[request.param]):
+        pytest.skip(f"{request.param} not installed")
+    for name, flag in flags.items():
+        monkeypatch.setattr(implementation, flag, name == request.param)
+    return request.param
+
+
+class TestDecoding:
+    """stream-ingestion - JSON デコード テストスイート"""
+
+    def test_backends_decode_alike(self, backend):
+        """各デコーダで同じ結果になり、不正なメッセージを数えて捨てるテスト"""
+        payload = {"id": 1, "tags": ["a", "b"], "value": 1.5, "name": "温度"}
+        raw = json.dumps(payload, ensure_ascii=False)
+        assert implementation.json_backend() == backend
+        assert implementation.decode_message(raw) == payload
+        assert implementation.decode_message(raw.encode()) == payload
+
+        async def scenario():
+            ingestion = StreamIngestion()
+            assert await ingestion.process_message(raw)
+            assert not await ingestion.process_message("{broken")
+            assert await ingestion.process_message({"already": "decoded"})
+            return ingestion
+
+        ingestion = asyncio.run(scenario())
+        assert ingestion.decode_errors == 1 and len(ingestion.buffer) == 2
+
+
+class TestIngestBuffer:
+    """stream-ingestion - 有界バッファ テストスイート"""
+
+    def test_watermarks_pause_and_resume(self):
+        """高水位で停止し、低水位まで捌けたら再開するテスト"""
+        async def scenario():
+            buffer = IngestBuffer(high_watermark=10, low_watermark=4, batch_size=3, linger=60)
+            for i in range(10):
+                await buffer.put(i)
+            assert buffer.paused and buffer.pauses == 1
+            blocked = asyncio.create_task(buffer.put(10))
+            await asyncio.sleep(0.01)
+            assert not blocked.done() and len(buffer) == 10
+
+            assert await buffer.get_batch() == [0, 1, 2]
+            await asyncio.sleep(0.01)
+            assert not blocked.done()  # 7 件残っているので停止のまま
+            assert await buffer.get_batch() == [3, 4, 5]
+            await asyncio.wait_for(blocked, 1)
+            assert not buffer.paused and len(buffer) == 5 and buffer.max_depth == 10
+
+        asyncio.run(scenario())
+
+    def test_linger_and_close(self):
+        """滞留時間でのバッチ確定と、close 後の取り出しテスト"""
+        async def scenario():
+            buffer = IngestBuffer(high_watermark=100, batch_size=50, linger=0.02)
+            for i in range(5):
+                await buffer.put(i)
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            assert await buffer.get_batch() == [0, 1, 2, 3, 4]
+            assert 0.01 <= loop.time() - start < 0.5
+
+            await buffer.put(5)
+            buffer.close()
+            assert await buffer.get_batch() == [5]
+            assert await buffer.get_batch() is None
+            with pytest.raises(RuntimeError):
+                await buffer.put(6)
+
+        asyncio.run(scenario())
+
+    def test_invalid_arguments(self):
+        """不正な設定のテスト"""
+        for kwargs in ({"high_watermark": 0}, {"high_watermark": 10, "low_watermark": 10},
+                       {"batch_size": 0}, {"linger": -1}):
+            with pytest.raises(ValueError):
+                IngestBuffer(**kwargs)
+
+
+class TestStreamIngestion:
+    """stream-ingestion - 取り込みパイプライン テストスイート"""
+
+    def test_slow_consumer_backpressures_source(self):
+        """下流が遅いとソースの読み込みが止まり、バッファが上限を超えないテスト"""
+        read = []
+
+        async def source():
+            for i in range(1000):
+                read.append(i)
+                yield json.dumps({"id": i})
+
+        async def scenario():
+            ingestion = StreamIngestion({"buffer_size": 100, "low_watermark": 20, "batch_size": 40, "linger_ms": 5})
+            received = []
+            async for batch in ingestion.ingest_stream(source()):
+                assert len(read) - len(received) <= 100 + 40  # 読み込みは消費に追従する
+                received.extend(r["id"] for r in batch)
+                await asyncio.sleep(0.001)
+            return ingestion, received
+
+        ingestion, received = asyncio.run(scenario())
+        metrics = ingestion.metrics()
+        assert received == list(range(1000))
+        assert metrics["max_buffered"] <= 100 and metrics["pauses"] > 0
+        assert metrics["flushed"] == metrics["received"] == 1000 and metrics["buffered"] == 0
+        assert metrics["max_batch_lag_ms"] >= metrics["avg_batch_lag_ms"] > 0
+
+    def test_process_batch_error_does_not_stall(self):
+        """process_batch が例外を出してもフラッシャーが止まらず、取り込みが詰まらないテスト"""
+        class Failing(StreamIngestion):
+            async def process_batch(self, batch):
+                if any(r["id"] in (3, 50) for r in batch):
+                    raise ValueError("bad batch")
+                return batch
+
+        async def scenario():
+            received = []
+
+            async def sink(batch):
+                received.extend(r["id"] for r in batch)
+
+            ingestion = Failing({"buffer_size": 10, "batch_size": 5, "linger_ms": 1}, sink=sink)
+            ingestion.start()
+            for i in range(100):
+                await asyncio.wait_for(ingestion.ingest({"id": i}), timeout=2)
+            await ingestion.stop()
+            return ingestion, received
+
+        ingestion, received = asyncio.run(scenario())
+        assert received == sorted(received) and received[-1] == 99
+        assert 3 not in received and 50 not in received and len(received) >= 90
+        assert ingestion.metrics()["batch_errors"] == 2 and ingestion.metrics()["buffered"] == 0
+
+    @requires_aiohttp
+    def test_websocket_stand_in_server(self):
+        """ローカル WebSocket サーバーからの取り込みテスト (不正メッセージ・バイナリを含む)"""
+        async def feed(request):
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            for i in range(3000):
+                if i == 1500:
+                    await ws.send_str("not json")
+                await ws.send_str(json.dumps({"id": i}))
+            await ws.send_bytes(json.dumps({"id": 3000}).encode())
+            await ws.close()
+            return ws
+
+        async def scenario():
+            app = web.Application()
+            app.router.add_get("/feed", feed)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            host, port = runner.addresses[0][:2]
+
+            batches = []
+
+            async def sink(batch):
+                batches.append([r["id"] for r in batch])
+                await asyncio.sleep(0.002)
+
+            ingestion = WebsocketIngestion({"buffer_size": 200, "batch_size": 50, "linger_ms": 10}, sink=sink)
+            try:
+                async with ClientSession() as session:
+                    async with session.ws_connect(f"http://{host}:{port}/feed") as ws:
+                        await ingestion.handle_websocket(ws)
+                await ingestion.stop()
+            finally:
+                await runner.cleanup()
+            return ingestion, batches
+
+        ingestion, batches = asyncio.run(scenario())
+        metrics = ingestion.metrics()
+        assert [i for batch in batches for i in batch] == list(range(3001))
+        assert all(len(batch) <= 50 for batch in batches)
+        assert metrics["decode_errors"] == 1 and metrics["sink_errors"] == 0
+        assert metrics["max_buffered"] <= 200 and metrics["pauses"] > 0
+        assert not metrics["paused"] and metrics["current_lag_ms"] == 0
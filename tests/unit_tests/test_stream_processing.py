@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+test - stream-processing - ストリーム処理ウィンドウテスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import importlib.util
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+MODULE_PATH = Path(__file__).resolve().parents[2] / "realtime_analytics" / "stream-processing" / "implementation.py"
+
+# 各モジュールが implementation.py という同名ファイルのため、固有の名前で読み込む
+_spec = importlib.util.spec_from_file_location("stream_processing_implementation", MODULE_PATH)
+implementation = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = implementation
+_spec.loader.exec_module(implementation)
+
+HyperLogLog = implementation.HyperLogLog
+StreamProcessor = implementation.StreamProcessor
+TDigest = implementation.TDigest
+
+
+def _events(timestamps, key="a", value=1.0):
+    return [{"timestamp": ts, "key": key, "value": value} for ts in timestamps]
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "pure-python"])
+def vectorized(request, monkeypatch):
+    if request.param and not implementation.NUMPY_AVAILABLE:
+        pytest.skip("numpy not installed")
+    monkeypatch.setattr(implementation, "NUMPY_AVAILABLE", request.param)
+    return request.param
+
+
+class TestSketches:
+    """stream-processing - HyperLogLog / t-digest テストスイート"""
+
+    def test_hyperloglog_accuracy_and_merge(self, vectorized):
+        """distinct 推定の誤差とマージのテスト"""
+        left, right = HyperLogLog(), HyperLogLog()
+        left.add_many(list(range(60_000)))
+        right.add_many([f"user-{i}" for i in range(40_000)] + list(range(30_000)))
+        assert abs(left.cardinality() - 60_000) / 60_000 < 0.05
+        left.merge(right)
+        assert abs(left.cardinality() - 100_000) / 100_000 < 0.05
+        small = HyperLogLog()
+        small.add_many([1, 2, 3, 3, 3])
+        assert small.cardinality() == 3
+        assert len(left.registers) == 4096
+
+    def test_hyperloglog_paths_agree(self, monkeypatch):
+        """numpy 経路と純 Python 経路で同じレジスタになるテスト"""
+        if not implementation.NUMPY_AVAILABLE:
+            pytest.skip("numpy not installed")
+        values = [random.Random(1).random() for _ in range(500)] + list(range(-300, 300)) + ["x", "y"]
+        fast = HyperLogLog()
+        fast.add_many(values)
+        monkeypatch.setattr(implementation, "NUMPY_AVAILABLE", False)
+        slow = HyperLogLog()
+        slow.add_many(values)
+        assert fast.registers == slow.registers
+
+    def test_tdigest_quantiles(self, vectorized):
+        """分位点の誤差・状態サイズ・マージのテスト"""
+        rng = random.Random(5)
+        values = [rng.expovariate(1.0) for _ in range(50_000)]
+        halves = TDigest(), TDigest()
+        for i in range(0, len(values), 1000):
+            halves[(i // 1000) % 2].add_many(values[i:i + 1000])
+        digest = TDigest()
+        digest.merge(halves[0])
+        digest.merge(halves[1])
+        ordered = sorted(values)
+        for q in (0.01, 0.5, 0.9, 0.99, 0.999):
+            estimate = digest.quantile(q)
+            rank = sum(1 for v in ordered if v <= estimate) / len(ordered)
+            assert abs(rank - q) < 0.01
+        assert digest.quantile(0) == ordered[0] and digest.quantile(1) == ordered[-1]
+        assert len(digest.means) <= 100 and digest.count == 50_000
+
+
+class TestWindows:
+    """stream-processing - ウィンドウとウォーターマーク テストスイート"""
+
+    def test_tumbling_waits_for_watermark(self):
+        """順序の乱れを許容し、ウォーターマーク通過で確定するテスト"""
+        processor = StreamProcessor()
+        processor.create_window("t", 10, aggregations={"n": "count", "sum": ("sum", "value"),
+                                                      "lo": ("min", "value"), "avg": ("avg", "value")},
+                                key_by="key", max_out_of_orderness=5)
+        events = _events([1, 3, 12], value=2.0) + _events([8], key="b", value=4.0) + _events([14], value=6.0)
+        assert asyncio.run(processor.process_batch(events)) == []  # ウォーターマーク 9
+        assert asyncio.run(processor.process_batch(_events([9], value=1.0))) == []  # 遅れて到着しても間に合う
+        results = asyncio.run(processor.process_batch(_events([16])))  # ウォーターマーク 11
+        by_key = {r.key: r for r in results}
+        assert set(by_key) == {"a", "b"} and by_key["a"].start == 0 and by_key["a"].end == 10
+        assert by_key["a"].values == {"n": 3, "sum": 5.0, "lo": 1.0, "avg": 5.0 / 3}
+        assert by_key["b"].values["n"] == 1
+        final = processor.flush()
+        assert [(r.start, r.values["n"]) for r in final] == [(10, 3)]
+
+    def test_allowed_lateness(self):
+        """許容遅延内の更新再出力と、超過イベントの破棄テスト"""
+        processor = StreamProcessor()
+        window = processor.create_window("t", 10, allowed_lateness=20, aggregations={"n": "count"})
+        asyncio.run(processor.process_batch(_events([1, 2, 25])))
+        updated = asyncio.run(processor.process_batch(_events([5])))
+        assert [(r.start, r.values["n"], r.is_update) for r in updated] == [(0, 3, True)]
+        asyncio.run(processor.process_batch(_events([45])))  # [0, 10) の状態は破棄される
+        assert asyncio.run(processor.process_batch(_events([7]))) == []
+        assert window.late_dropped == 1 and window.stats()["open_state"] <= 3
+
+    def test_late_update_skips_discarded_sliding_windows(self):
+        """許容遅延を過ぎたスライディングウィンドウは部分状態で再出力しないテスト"""
+        processor = StreamProcessor()
+        processor.create_window("s", 10, 2, allowed_lateness=3, aggregations={"n": "count"})
+        asyncio.run(processor.process_batch(_events(range(10))))
+        asyncio.run(processor.process_batch(_events([20])))  # ウォーターマーク 20、[8, 18) まで保持
+        updated = asyncio.run(processor.process_batch(_events([9])))
+        assert [(r.start, r.values["n"], r.is_update) for r in updated] == [(8, 3, True)]
+
+    def test_sliding_matches_brute_force(self, vectorized):
+        """スライディングウィンドウの結果を全件走査と比較するテスト"""
+        rng = random.Random(9)
+        events = [{"timestamp": rng.randrange(0, 1000), "value": rng.random(), "user": rng.randrange(50)}
+                  for _ in range(5000)]
+        events.sort(key=lambda e: e["timestamp"])
+        processor = StreamProcessor()
+        processor.create_window("s", 100, 30, aggregations={
+            "n": "count", "sum": ("sum", "value"), "hi": ("max", "value"), "users": ("distinct", "user")})
+        results = []
+        for i in range(0, len(events), 700):
+            results.extend(asyncio.run(processor.process_batch(events[i:i + 700])))
+        results.extend(processor.flush())
+        assert len({r.start for r in results}) == len(results)
+        for result in results:
+            inside = [e for e in events if result.start <= e["timestamp"] < result.end]
+            assert result.end - result.start == 100 and result.start % 30 == 0
+            assert result.values["n"] == len(inside)
+            assert result.values["sum"] == pytest.approx(sum(e["value"] for e in inside))
+            assert result.values["hi"] == max(e["value"] for e in inside)
+            assert result.values["users"] == len({e["user"] for e in inside})
+
+    def test_session_windows_merge(self):
+        """セッションの分割と、遅延イベントによるセッション結合テスト"""
+        processor = StreamProcessor()
+        processor.create_window("s", gap=10, key_by="key", allowed_lateness=100,
+                                aggregations={"n": "count", "first": ("min", "timestamp")})
+        results = asyncio.run(processor.process_batch(
+            _events([0, 5, 30, 34]) + _events([1], key="b") + _events([100], key="c")))
+        assert [(r.key, r.start, r.end, r.values["n"]) for r in results] == \
+            [("b", 1, 11, 1), ("a", 0, 15, 2), ("a", 30, 44, 2)]  # 終了時刻順
+        bridged = asyncio.run(processor.process_batch(_events([14, 22])))  # 2 つのセッションをつなぐ
+        assert [(r.start, r.end, r.values["n"], r.is_update) for r in bridged] == [(0, 44, 6, True)]
+        assert [(r.key, r.values["n"]) for r in processor.flush()] == [("c", 1)]
+
+
+class TestStreamProcessor:
+    """stream-processing - マイクロバッチ処理 テストスイート"""
+
+    def test_batch_does_not_copy_events(self):
+        """イベントをコピーせず、None を返したイベントを捨てるテスト"""
+        seen = []
+
+        async def only_even(event):
+            seen.append(event)
+            return event if event["timestamp"] % 2 == 0 else None
+
+        processor = StreamProcessor()
+        processor.add_processor(only_even)
+        processor.create_window("t", 100, aggregations={"n": "count"})
+        events = _events(range(10))
+        asyncio.run(processor.process_batch(events))
+        assert all(a is b for a, b in zip(seen, events))
+        assert processor.flush()[0].values["n"] == 5
+        assert asyncio.run(processor.process_event(events[0])) is events[0]
+
+    def test_process_stream_micro_batches(self):
+        """非同期ストリームのマイクロバッチ処理と終了時フラッシュのテスト"""
+        async def source():
+            for ts in range(0, 1000, 7):
+                yield {"timestamp": ts, "value": 1.0}
+
+        async def scenario():
+            processor = StreamProcessor()
+            processor.create_window("t", 100, aggregations={"n": "count"})
+            emitted = []
+            async for results in processor.process_stream(source(), batch_size=16):
+                emitted.extend(results)
+            return emitted
+
+        results = asyncio.run(scenario())
+        assert [r.start for r in results] == list(range(0, 1000, 100))
+        assert sum(r.values["n"] for r in results) == len(range(0, 1000, 7))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+test - time-series-db - 時系列データベーステスト
+
+Unit Test Suite
+"""
+
+import importlib.util
+import math
+import random
+import sqlite3
+import statistics
+import sys
+from pathlib import Path
+
+import pytest
+
+MODULE_PATH = Path(__file__).resolve().parents[2] / "realtime_analytics" / "time-series-db" / "implementation.py"
+
+# 各モジュールが implementation.py という同名ファイルのため、固有の名前で読み込む
+_spec = importlib.util.spec_from_file_location("time_series_db_implementation", MODULE_PATH)
+implementation = importlib.util.module_from_spec(_spec)
+sys.modules[_spec.name] = implementation
+_spec.loader.exec_module(implementation)
+
+TimeSeriesDB = implementation.TimeSeriesDB
+decode_chunk = implementation.decode_chunk
+encode_chunk = implementation.encode_chunk
+parse_agg = implementation.parse_agg
+parse_step = implementation.parse_step
+
+HOUR = 3_600_000
+DAY = 86_400_000
+
+
+class TestGorillaCodec:
+    """time-series-db - チャンク符号化 テストスイート"""
+
+    def test_round_trip(self):
+        """等間隔・ジッター・大きな飛びを含む往復テスト"""
+        rng = random.Random(7)
+        timestamps, ts = [], 1_700_000_000_000
+        for i in range(2000):
+            ts += rng.choice([10_000, 10_000, 10_001, 9_998, 500, 10**9])
+            timestamps.append(ts)
+        values = [round(rng.uniform(0, 100), 2) if i % 3 else 42.0 for i in range(2000)]
+        data = encode_chunk(timestamps, values)
+        assert decode_chunk(data) == (timestamps, values)
+        assert len(data) < len(timestamps) * 16
+
+    def test_edge_values(self):
+        """1 点・負の時刻・特殊な浮動小数点値のテスト"""
+        assert decode_chunk(encode_chunk([5], [1.5])) == ([5], [1.5])
+        assert decode_chunk(b"") == ([], [])
+        values = [0.0, -0.0, float("inf"), float("-inf"), 1e-300, -1e300, float("nan")]
+        timestamps = [-10, 0, 1, 2**40, 2**40 + 1, 2**40 + 3, 2**40 + 3]
+        decoded_ts, decoded = decode_chunk(encode_chunk(timestamps, values))
+        assert decoded_ts == timestamps
+        assert [math.copysign(1, v) for v in decoded[:2]] == [1, -1]
+        assert decoded[2:6] == values[2:6] and math.isnan(decoded[6])
+
+
+class TestTimeSeriesDB:
+    """time-series-db - チャンク格納 テストスイート"""
+
+    def test_insert_many_and_range_read(self, tmp_path):
+        """ブロックをまたぐ一括挿入と範囲読み出しテスト"""
+        db = TimeSeriesDB(str(tmp_path / "ts.db"), chunk_points=100)
+        points = [(i * 60_000, "cpu", float(i), {"host": f"h{i % 2}"}) for i in range(600)]
+        assert db.insert_many(points) == 600
+        db.flush()
+        assert db.stats()["chunks"] >= 6
+
+        rows = db.read("cpu", HOUR, 3 * HOUR)
+        assert [r["timestamp"] for r in rows] == list(range(HOUR, 3 * HOUR, 60_000))
+        assert all(r["value"] == r["timestamp"] / 60_000 for r in rows)
+        only_h1 = db.read("cpu", tags={"host": "h1"})
+        assert len(only_h1) == 300 and {r["tags"]["host"] for r in only_h1} == {"h1"}
+        assert db.read("cpu", tags={"host": "nope"}) == []
+        assert db.read("mem") == []
+        db.close()
+
+    def test_out_of_order_and_unflushed(self, tmp_path):
+        """順不同の書き込みと未書き込みヘッドの読み出しテスト"""
+        db = TimeSeriesDB(str(tmp_path / "ts.db"))
+        db.insert_many([(3000, "m", 3.0), (1000, "m", 1.0), (2000, "m", 2.0)])
+        db.insert("1970-01-01T00:00:04+00:00", "m", 4.0)
+        assert [r["value"] for r in db.read("m")] == [1.0, 2.0, 3.0, 4.0]
+        db.flush()
+        db.insert_many([{"timestamp": 1500, "metric": "m", "value": 1.5}])  # 書き込み済みブロックへの遅延到着
+        db.flush()
+        assert [r["timestamp"] for r in db.read("m", 1000, 3000)] == [1000, 1500, 2000]
+        db.close()
+
+    def test_persistence_and_dictionary(self, tmp_path):
+        """再オープン後の復元とタグ辞書の共有テスト"""
+        path = str(tmp_path / "ts.db")
+        db = TimeSeriesDB(path)
+        db.ingest(((i, "cpu", i * 0.5, {"host": "a", "dc": "x"}) for i in range(1000)), batch_size=64)
+        db.ingest(((i, "mem", 1.0, {"host": "a"}) for i in range(10)))
+        db.close()
+
+        db = TimeSeriesDB(path)
+        assert db.stats()["series"] == 2 and db.stats()["tags"] == 2
+        assert len(db.read("cpu", tags={"dc": "x"})) == 1000
+        db.insert(1000, "cpu", 9.0, {"dc": "x", "host": "a"})  # タグ順が違っても同じシリーズ
+        assert db.stats()["series"] == 2
+        assert db.read("cpu", 999)[-1]["value"] == 9.0
+        db.close()
+
+    def test_legacy_table_is_migrated(self, tmp_path):
+        """旧形式テーブルの移行テスト"""
+        path = str(tmp_path / "ts.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE timeseries (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+                     "metric TEXT NOT NULL, value REAL NOT NULL, tags TEXT, created_at TEXT)")
+        conn.executemany("INSERT INTO timeseries (timestamp, metric, value, tags) VALUES (?, ?, ?, ?)", [
+            ("2024-01-01T00:00:00+00:00", "cpu", 1.0, '{"host": "a"}'),
+            ("2024-01-01T00:00:10+00:00", "cpu", 2.0, None),
+        ])
+        conn.commit()
+        conn.close()
+
+        db = TimeSeriesDB(path)
+        assert [r["value"] for r in db.read("cpu")] == [1.0, 2.0]
+        assert db.read("cpu", tags={"host": "a"})[0]["timestamp"] == 1704067200000
+        assert not db.conn.execute("SELECT name FROM sqlite_master WHERE name = 'timeseries'").fetchone()
+        db.close()
+
+
+class TestQuery:
+    """time-series-db - 集計クエリとロールアップ テストスイート"""
+
+    @pytest.fixture(params=[True, False], ids=["numpy", "pure-python"])
+    def db(self, request, tmp_path, monkeypatch):
+        if request.param and not implementation.NUMPY_AVAILABLE:
+            pytest.skip("numpy not installed")
+        monkeypatch.setattr(implementation, "NUMPY_AVAILABLE", request.param)
+        db = TimeSeriesDB(str(tmp_path / "ts.db"), chunk_points=300)
+        rng = random.Random(3)
+        db.insert_many((DAY + i * 28_000 + rng.randint(0, 99), "cpu", round(rng.uniform(0, 100), 2),
+                        {"host": f"h{i % 3}", "dc": f"d{i % 2}"}) for i in range(10_000))
+        yield db
+        db.close()
+
+    def test_rollups_match_raw_scan(self, db):
+        """ロールアップ経由と生データ走査の結果一致テスト (未揃いの範囲端・未書き込みヘッドを含む)"""
+        start, end = DAY + 12_345, DAY + 250_000_000
+        for step in (None, "5m", "1h", "1d", 45_000):
+            for agg in ("avg", "max", "sum", "count"):
+                fast = db.query("cpu", start, end, step, agg, group_by=["host"])
+                raw = db.query("cpu", start, end, step, agg, group_by=["host"], use_rollups=False)
+                assert [r["group"] for r in fast] == [{"host": "h0"}, {"host": "h1"}, {"host": "h2"}]
+                for x, y in zip(fast, raw):
+                    assert x["timestamps"] == y["timestamps"]
+                    assert x["values"] == pytest.approx(y["values"], rel=1e-9)
+
+    def test_rollups_skip_raw_points(self, db, monkeypatch):
+        """揃った範囲ではチャンクを展開しないテスト"""
+        db.flush()
+        decoded = []
+        monkeypatch.setattr(implementation, "decode_chunk",
+                            lambda data: decoded.append(1) or decode_chunk(data))
+        result = db.query("cpu", DAY, 5 * DAY, "1d", "count")
+        assert decoded == [] and sum(result[0]["values"]) == 10_000
+        assert result[0]["timestamps"] == [DAY, 2 * DAY, 3 * DAY, 4 * DAY]
+
+    def test_percentiles_and_filters(self, db):
+        """パーセンタイルとタグ絞り込みテスト"""
+        values = [r["value"] for r in db.read("cpu", tags={"dc": "d0", "host": "h1"})]
+        (only,) = db.query("cpu", step=None, agg="p50", tags={"dc": "d0", "host": "h1"})
+        assert only["values"] == [pytest.approx(statistics.median(values))]
+        (p90,) = db.query("cpu", step=None, agg="p90", tags={"dc": "d0", "host": "h1"})
+        assert p90["values"] == [pytest.approx(statistics.quantiles(values, n=10, method="inclusive")[-1])]
+        by_dc = db.query("cpu", agg="count", group_by=["dc"])
+        assert [r["group"]["dc"] for r in by_dc] == ["d0", "d1"]
+        assert sum(r["values"][0] for r in by_dc) == 10_000
+        assert db.query("cpu", tags={"host": "zzz"}) == []
+
+    def test_rollups_rebuilt_for_existing_data(self, tmp_path):
+        """ロールアップの無い既存 DB と解像度変更時の再構築テスト"""
+        path = str(tmp_path / "ts.db")
+        db = TimeSeriesDB(path)
+        db.insert_many((i * 1000, "m", 1.0) for i in range(7200))
+        db.close()
+        conn = sqlite3.connect(path)
+        conn.execute("DELETE FROM rollups")
+        conn.execute("DELETE FROM meta")
+        conn.commit()
+        conn.close()
+
+        db = TimeSeriesDB(path, rollup_resolutions=(60_000, 600_000))
+        assert db.query("m", 0, 2 * HOUR, "10m", "sum")[0]["values"] == [600.0] * 12
+        assert db.stats()["rollups"] == 120 + 12
+        db.close()
+
+    def test_invalid_arguments(self, tmp_path):
+        """不正な引数のテスト"""
+        assert parse_step("5m") == 300_000 and parse_step(1500) == 1500
+        assert parse_agg("p99.9") == ("percentile", 99.9)
+        for bad in ("5 minutes", 0, "-1s"):
+            with pytest.raises(ValueError):
+                parse_step(bad)
+        for bad in ("median", "p101"):
+            with pytest.raises(ValueError):
+                parse_agg(bad)
+        with pytest.raises(ValueError):
+            TimeSeriesDB(str(tmp_path / "ts.db"), rollup_resolutions=(60_000, 90_000))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+test - webhook-delivery - Webhook非同期配信テスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "integrations" / "webhook"))
+
+from client import (  # noqa: E402
+    AIOHTTP_AVAILABLE, AsyncWebhookDelivery, CircuitBreaker, RetryPolicy, WebhookManager,
+)
+
+requires_aiohttp = pytest.mark.skipif(not AIOHTTP_AVAILABLE, reason="aiohttp not installed")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    responses = {}  # path -> list of statuses (last one repeats)
+    hits = {}
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        if self.path == "/slow":
+            time.sleep(1.0)
+        statuses = self.responses.get(self.path, [200])
+        status = statuses[min(self.hits[self.path], len(statuses)) - 1]
+        body = json.dumps({"status": status}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    _Handler.responses, _Handler.hits = {}, {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def _manager(tmp_path, base, paths):
+    manager = WebhookManager(db_path=str(tmp_path / "webhooks.json"))
+    for path in paths:
+        manager.register_webhook(path.strip("/"), path, f"{base}{path}")
+    return manager
+
+
+class TestCircuitBreaker:
+    """webhook-delivery - サーキットブレーカー テストスイート"""
+
+    def test_open_half_open_closed(self):
+        """open -> half_open -> closed の遷移テスト"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        breaker.record_failure(now=0)
+        assert breaker.allow(now=1)
+        breaker.record_failure(now=1)
+        assert breaker.state == "open" and not breaker.allow(now=5)
+        assert breaker.allow(now=12) and breaker.state == "half_open"
+        assert not breaker.allow(now=12)  # 試行は 1 件だけ
+        breaker.record_success()
+        assert breaker.state == "closed" and breaker.allow(now=13)
+
+    def test_backoff_is_capped(self):
+        """バックオフ上限テスト"""
+        policy = RetryPolicy(base_delay=1, max_delay=8, jitter=False)
+        assert [policy.delay(n) for n in range(1, 6)] == [1, 2, 4, 8, 8]
+        assert 0 <= RetryPolicy(base_delay=1).delay(3) <= 4
+
+
+@requires_aiohttp
+class TestAsyncWebhookDelivery:
+    """webhook-delivery - 非同期配信 テストスイート"""
+
+    def test_slow_endpoint_does_not_block_others(self, tmp_path, stub_server):
+        """遅いエンドポイントが他を待たせないテスト"""
+        manager = _manager(tmp_path, stub_server, ["/slow", "/a", "/b"])
+        delivery = AsyncWebhookDelivery(manager)
+        finished = {}
+
+        async def scenario():
+            start = time.perf_counter()
+
+            async def timed(webhook):
+                await delivery.deliver(webhook, {"n": 1})
+                finished[webhook.id] = time.perf_counter() - start
+
+            await asyncio.gather(*(timed(w) for w in manager.list_webhooks()))
+            await delivery.close()
+
+        asyncio.run(scenario())
+        assert finished["a"] < 0.5 and finished["b"] < 0.5
+        assert finished["slow"] >= 1.0
+
+    def test_retry_then_success(self, tmp_path, stub_server):
+        """503 後のリトライ成功と 4xx の非リトライテスト"""
+        _Handler.responses = {"/flaky": [503, 503, 200], "/bad": [400]}
+        manager = _manager(tmp_path, stub_server, ["/flaky", "/bad"])
+        delivery = AsyncWebhookDelivery(manager, retry=RetryPolicy(max_attempts=3, base_delay=0.01))
+        results = delivery.run_sync(delivery.send_to_all({"event": "x"}))
+        by_id = {r["webhook_id"]: r["result"] for r in results}
+        assert by_id["flaky"]["success"] and _Handler.hits["/flaky"] == 3
+        assert by_id["bad"]["status_code"] == 400 and _Handler.hits["/bad"] == 1
+        assert delivery.outbox.count() == 0
+        delivery.close_sync()
+
+    def test_sync_send_keeps_session_and_drains_outbox(self, tmp_path, stub_server):
+        """同期 send_to_all が接続プールを使い回し、送信箱を自動で再送するテスト"""
+        _Handler.responses = {"/down": [503, 503, 200]}
+        manager = _manager(tmp_path, stub_server, ["/down"])
+        delivery = manager.delivery
+        delivery.retry = RetryPolicy(max_attempts=2, base_delay=0.01, max_delay=0.05)
+        result = manager.send_to_all({"event": 1})[0]["result"]
+        assert result["queued"] and delivery.outbox.count() == 1
+        session = delivery._session
+
+        deadline = time.monotonic() + 5
+        while delivery.outbox.count() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert delivery.outbox.count() == 0 and _Handler.hits["/down"] == 3
+        assert manager.send_to_all({"event": 2})[0]["result"]["success"]
+        assert delivery._session is session and not session.closed
+        manager.close()
+        assert session.closed
+
+    def test_outbox_persists_and_redelivers(self, tmp_path, stub_server):
+        """ブレーカー作動時の送信箱保存と再送テスト"""
+        _Handler.responses = {"/down": [503, 503, 503, 200]}
+        manager = _manager(tmp_path, stub_server, ["/down"])
+        delivery = AsyncWebhookDelivery(manager, retry=RetryPolicy(max_attempts=2, base_delay=0.01),
+                                        failure_threshold=2, reset_timeout=0.2)
+        webhook = manager.get_webhook("down")
+
+        async def first():
+            result = await delivery.deliver(webhook, {"event": 1})
+            assert result["queued"] and delivery.breaker("down").state == "open"
+            result = await delivery.deliver(webhook, {"event": 2})
+            assert result["error"] == "circuit open" and delivery.stats["short_circuited"] == 1
+            await delivery.close()
+
+        asyncio.run(first())
+        assert _Handler.hits["/down"] == 2
+        delivery.outbox.close()
+
+        # 再起動後も送信箱は残る
+        restarted = AsyncWebhookDelivery(manager, failure_threshold=2, reset_timeout=0.2)
+        assert restarted.outbox.count() == 2
+        assert sorted(e["data"]["event"] for e in restarted.outbox.due(now=time.time() + 60)) == [1, 2]
+
+        async def drain():
+            delivered = 0
+            deadline = time.monotonic() + 5
+            while restarted.outbox.count() and time.monotonic() < deadline:
+                delivered += await restarted.drain_outbox()
+                await asyncio.sleep(0.05)
+            await restarted.close()
+            return delivered
+
+        assert asyncio.run(drain()) == 2
+        assert restarted.outbox.count() == 0
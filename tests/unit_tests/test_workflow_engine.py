@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+test - workflow-engine - ワークフローエンジンテスト
+
+Unit Test Suite
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "workflow_engine"))
+
+from workflow_engine import (  # noqa: E402
+    Step, StepCache, StepStatus, WorkflowEngine, WorkflowStore
+)
+
+
+def _noop(context):
+    return True
+
+
+class TestDagScheduler:
+    """workflow-engine - DAGスケジューラ テストスイート"""
+
+    def test_cycle_detected_at_add_time(self):
+        """追加時の循環依存検出テスト"""
+        engine = WorkflowEngine()
+        wf_id = engine.create_workflow("cycle", "")
+        engine.add_step(wf_id, Step(id="b", name="b", action=_noop, depends_on=["a"]))
+        engine.add_step(wf_id, Step(id="c", name="c", action=_noop, depends_on=["b"]))
+        with pytest.raises(ValueError):
+            engine.add_step(wf_id, Step(id="a", name="a", action=_noop, depends_on=["c"]))
+        with pytest.raises(ValueError):
+            engine.add_step(wf_id, Step(id="self", name="self", action=_noop, depends_on=["self"]))
+        with pytest.raises(ValueError):  # 既に依存されているステップの自己依存
+            engine.add_step(wf_id, Step(id="a", name="a", action=_noop, depends_on=["a"]))
+        engine.add_step(wf_id, Step(id="a", name="a", action=_noop))
+        assert set(engine.workflows[wf_id].steps) == {"a", "b", "c"}
+
+    def test_step_starts_when_its_dependencies_finish(self):
+        """依存完了直後の起動テスト（ウェーブ待ちなし）"""
+        engine = WorkflowEngine()
+        wf_id = engine.create_workflow("eager", "")
+        order = []
+
+        def make(name, delay):
+            async def action(context):
+                await asyncio.sleep(delay)
+                order.append(name)
+            return action
+
+        engine.add_step(wf_id, Step(id="slow", name="slow", action=make("slow", 0.1)))
+        engine.add_step(wf_id, Step(id="fast", name="fast", action=make("fast", 0.01)))
+        engine.add_step(wf_id, Step(id="after_fast", name="after_fast",
+                                    action=make("after_fast", 0.01), depends_on=["fast"]))
+        result = asyncio.run(engine.execute_workflow(wf_id))
+        assert result["status"] == "completed"
+        assert order == ["fast", "after_fast", "slow"]
+
+    def test_critical_path_first_and_concurrency_limit(self):
+        """クリティカルパス優先と同時実行数上限テスト"""
+        engine = WorkflowEngine(max_concurrency=1)
+        wf_id = engine.create_workflow("priority", "")
+        order = []
+
+        def make(name):
+            def action(context):
+                order.append(name)
+            return action
+
+        engine.add_step(wf_id, Step(id="short", name="short", action=make("short")))
+        engine.add_step(wf_id, Step(id="long", name="long", action=make("long")))
+        engine.add_step(wf_id, Step(id="tail", name="tail", action=make("tail"),
+                                    depends_on=["long"], cost=5))
+        asyncio.run(engine.execute_workflow(wf_id))
+        assert order == ["long", "tail", "short"]
+
+    def test_failure_stops_downstream(self):
+        """失敗時の後続ステップ停止テスト"""
+        engine = WorkflowEngine()
+        wf_id = engine.create_workflow("failure", "")
+
+        def boom(context):
+            raise RuntimeError("boom")
+
+        engine.add_step(wf_id, Step(id="bad", name="bad", action=boom))
+        engine.add_step(wf_id, Step(id="next", name="next", action=_noop, depends_on=["bad"]))
+        result = asyncio.run(engine.execute_workflow(wf_id))
+        assert result["status"] == "failed"
+        assert result["error"] == "boom"
+        assert engine.workflows[wf_id].steps["next"].status == StepStatus.PENDING
+
+
+class TestStepCache:
+    """workflow-engine - ステップ結果キャッシュ テストスイート"""
+
+    def _build(self, engine, calls):
+        wf_id = engine.create_workflow("pipeline", "")
+
+        def scrape(context):
+            calls.append("scrape")
+            context["pages"] = [p.upper() for p in context["urls"]]
+            return len(context["pages"])
+
+        def summarize(context):
+            calls.append("summarize")
+            context["summary"] = ",".join(context["pages"])
+            return context["summary"]
+
+        engine.add_step(wf_id, Step(id="scrape", name="scrape", action=scrape,
+                                    reads=["urls"], writes=["pages"]))
+        engine.add_step(wf_id, Step(id="summarize", name="summarize", action=summarize,
+                                    depends_on=["scrape"], reads=["pages"], writes=["summary"]))
+        engine.workflows[wf_id].context["urls"] = ["a", "b"]
+        return wf_id
+
+    def test_rerun_reuses_unchanged_steps(self, tmp_path):
+        """入力不変時のキャッシュ再利用テスト"""
+        calls = []
+        engine = WorkflowEngine(cache=StepCache(str(tmp_path)))
+        wf_id = self._build(engine, calls)
+        asyncio.run(engine.execute_workflow(wf_id))
+        result = asyncio.run(engine.rerun(wf_id))
+        assert calls == ["scrape", "summarize"]
+        assert result["results"]["summarize"] == "A,B"
+
+        engine.workflows[wf_id].context["urls"] = ["c"]
+        result = asyncio.run(engine.rerun(wf_id))
+        assert calls == ["scrape", "summarize"] * 2
+        assert result["results"]["summarize"] == "C"
+
+    def test_rerun_from_step_recomputes_only_downstream(self, tmp_path):
+        """from_step 指定時の下流のみ再計算テスト"""
+        calls = []
+        engine = WorkflowEngine(cache=StepCache(str(tmp_path)))
+        wf_id = self._build(engine, calls)
+        asyncio.run(engine.execute_workflow(wf_id))
+        asyncio.run(engine.rerun(wf_id, from_step="summarize"))
+        assert calls == ["scrape", "summarize", "summarize"]
+
+    def test_factory_steps_with_different_captures_not_shared(self, tmp_path):
+        """同一ファクトリで捕捉値だけ異なるステップのキャッシュ分離テスト"""
+        def make_scale(factor):
+            def scale(context):
+                context["scaled"] = [x * factor for x in context["xs"]]
+                return context["scaled"]
+            return scale
+
+        engine = WorkflowEngine(cache=StepCache(str(tmp_path)))
+        results = []
+        for factor in (2, 10):
+            wf_id = engine.create_workflow("scale", "")
+            engine.add_step(wf_id, Step(id="scale", name="scale", action=make_scale(factor),
+                                        reads=["xs"], writes=["scaled"]))
+            engine.workflows[wf_id].context["xs"] = [1, 2]
+            results.append(asyncio.run(engine.execute_workflow(wf_id))["results"]["scale"])
+        assert results == [[2, 4], [10, 20]]
+
+    def test_lru_eviction_by_entries(self, tmp_path):
+        """LRU 件数上限による追い出しテスト"""
+        cache = StepCache(str(tmp_path), max_entries=2)
+        cache.put("a", {"result": 1, "writes": {}})
+        cache.put("b", {"result": 2, "writes": {}})
+        assert cache.get("a")["result"] == 1
+        cache.put("c", {"result": 3, "writes": {}})
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert StepCache(str(tmp_path)).stats()["entries"] == 2
+
+
+def _cpu_square_sum(context):
+    context["total"] = sum(i * i for i in range(context["n"]))
+    return context["total"]
+
+
+def _mutate_in_place(context):
+    context["items"].append(len(context["items"]))
+    context["config"]["done"] = True
+
+
+class TestStepExecutors:
+    """workflow-engine - スレッド/プロセス実行 テストスイート"""
+
+    def test_process_step_streams_writes_back(self):
+        """プロセス実行結果のコンテキスト反映テスト"""
+        engine = WorkflowEngine(process_workers=2)
+        wf_id = engine.create_workflow("cpu", "")
+        engine.workflows[wf_id].context.update({"n": 1000, "lock": threading.Lock()})
+        engine.add_step(wf_id, Step(id="cpu", name="cpu", action=_cpu_square_sum,
+                                    executor="process"))
+        result = asyncio.run(engine.execute_workflow(wf_id))
+        engine.shutdown()
+        assert result["results"]["cpu"] == sum(i * i for i in range(1000))
+        assert engine.workflows[wf_id].context["total"] == result["results"]["cpu"]
+        metrics = engine.executor_metrics()["process"]
+        assert metrics["completed"] == 1 and metrics["queue_depth"] == 0
+
+    def test_process_step_in_place_mutations_written_back(self):
+        """writes 未指定でもその場での変更がコンテキストに反映されるテスト"""
+        engine = WorkflowEngine(process_workers=1)
+        wf_id = engine.create_workflow("mutate", "")
+        engine.workflows[wf_id].context.update({"items": [0], "config": {}, "untouched": "x"})
+        engine.add_step(wf_id, Step(id="m", name="m", action=_mutate_in_place, executor="process"))
+        asyncio.run(engine.execute_workflow(wf_id))
+        engine.shutdown()
+        context = engine.workflows[wf_id].context
+        assert context["items"] == [0, 1] and context["config"] == {"done": True}
+
+    def test_thread_step_does_not_block_loop(self):
+        """スレッド実行がイベントループを塞がないことのテスト"""
+        engine = WorkflowEngine()
+        wf_id = engine.create_workflow("threads", "")
+        order = []
+
+        def blocking(context):
+            time.sleep(0.2)
+            order.append("blocking")
+
+        async def quick(context):
+            await asyncio.sleep(0.01)
+            order.append("quick")
+
+        engine.add_step(wf_id, Step(id="blocking", name="blocking", action=blocking,
+                                    executor="thread"))
+        engine.add_step(wf_id, Step(id="quick", name="quick", action=quick))
+        asyncio.run(engine.execute_workflow(wf_id))
+        engine.shutdown()
+        assert order == ["quick", "blocking"]
+        assert engine.executor_metrics()["thread"]["completed"] == 1
+
+    def test_unknown_executor_rejected(self):
+        """不正なエグゼキュータ指定のテスト"""
+        with pytest.raises(ValueError):
+            Step(id="x", name="x", action=_noop, executor="gpu")
+
+
+class TestCheckpointResume:
+    """workflow-engine - チェックポイント/再開 テストスイート"""
+
+    def _define(self, engine, calls, fail_at=None):
+        wf_id = engine.create_workflow("nightly", "", workflow_id="nightly-1")
+
+        def make(name):
+            def action(context):
+                if name == fail_at:
+                    raise RuntimeError(f"{name} crashed")
+                calls.append(name)
+                context[name] = "x" * 5000
+                return name.upper()
+            return action
+
+        engine.add_step(wf_id, Step(id="scrape", name="scrape", action=make("scrape")))
+        engine.add_step(wf_id, Step(id="summarize", name="summarize",
+                                    action=make("summarize"), depends_on=["scrape"]))
+        engine.add_step(wf_id, Step(id="report", name="report",
+                                    action=make("report"), depends_on=["summarize"]))
+        return wf_id
+
+    def test_resume_skips_completed_steps(self, tmp_path):
+        """完了済みステップをスキップして再開するテスト"""
+        db_path = str(tmp_path / "workflows.db")
+        calls = []
+        store = WorkflowStore(db_path)
+        engine = WorkflowEngine(store=store)
+        wf_id = self._define(engine, calls, fail_at="report")
+        assert asyncio.run(engine.execute_workflow(wf_id))["status"] == "failed"
+        store.close()
+
+        # "Restart": fresh engine, rebuilt definition, state from SQLite.
+        calls.clear()
+        engine = WorkflowEngine(store=WorkflowStore(db_path))
+        wf_id = self._define(engine, calls)
+        result = asyncio.run(engine.resume(wf_id))
+        assert calls == ["report"]
+        assert result["status"] == "completed"
+        assert result["results"]["scrape"] == "SCRAPE"
+        assert engine.workflows[wf_id].context["summarize"] == "x" * 5000
+
+    def test_large_values_are_compressed(self, tmp_path):
+        """大きな値の圧縮シリアライズテスト"""
+        store = WorkflowStore(str(tmp_path / "w.db"), compress_threshold=100)
+        blob = store.encode({"rows": ["same"] * 1000})
+        assert blob[:1] == WorkflowStore.COMPRESSED
+        assert len(blob) < 200
+        assert WorkflowStore.decode(blob) == {"rows": ["same"] * 1000}
+        assert WorkflowStore.decode(store.encode(3)) == 3
+        store.close()
@@ -3,9 +3,20 @@
 """Workflow Engine - Agent workflow management"""
 
 import asyncio
+import hashlib
+import heapq
+import os
+import pickle
+import sqlite3
+import time
+import types
+import zlib
 import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Callable, Any
+from pathlib import Path
+from typing import Dict, List, Optional, Callable, Any, Set
 from dataclasses import dataclass, field
 from enum import Enum
 
@@ -23,20 +34,189 @@ class WorkflowStatus(Enum):
     FAILED = "failed"
     CANCELLED = "cancelled"
 
+_MISSING = object()
+
+def _fingerprint_callable(action: Callable, _seen: Optional[Set[int]] = None) -> bytes:
+    """Code plus captured closure values and referenced module globals, so
+    steps built by one factory with different captured values differ."""
+    seen = set() if _seen is None else _seen
+    code = getattr(action, "__code__", None)
+    name = f"{getattr(action, '__module__', '')}.{getattr(action, '__qualname__', repr(action))}"
+    if code is None or id(action) in seen:
+        return name.encode()
+    seen.add(id(action))
+    parts = [name.encode(), _fingerprint_code(code)]
+    if isinstance(action, types.MethodType):
+        parts.append(_fingerprint_reference(action.__self__, seen))
+    for cell in getattr(action, "__closure__", None) or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:  # cell not assigned yet
+            value = _MISSING
+        parts.append(_fingerprint_reference(value, seen))
+    module_globals = getattr(action, "__globals__", None) or {}
+    for ref in sorted(_referenced_names(code)):
+        if ref in module_globals:
+            parts.append(ref.encode() + b"=" + _fingerprint_reference(module_globals[ref], seen))
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(hashlib.sha256(part).digest())
+    return digest.digest()
+
+def _fingerprint_code(code: types.CodeType) -> bytes:
+    # Nested code objects (lambdas, comprehensions) are hashed by content;
+    # their repr carries a memory address that changes between runs.
+    consts = [_fingerprint_code(c) if isinstance(c, types.CodeType) else repr(c).encode()
+              for c in code.co_consts]
+    return b"|".join([code.co_code] + consts)
+
+def _referenced_names(code: types.CodeType) -> Set[str]:
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _referenced_names(const)
+    return names
+
+def _fingerprint_reference(value: Any, seen: Set[int]) -> bytes:
+    if isinstance(value, types.ModuleType):
+        return value.__name__.encode()
+    if hasattr(value, "__code__"):
+        return _fingerprint_callable(value, seen)
+    try:
+        return pickle.dumps(value, protocol=4)
+    except Exception:
+        # Locks, connections and the like: identify by type rather than by
+        # an address-bearing repr that would never hit the cache again.
+        return f"<{type(value).__module__}.{type(value).__qualname__}>".encode()
+
+def _fingerprint_value(value: Any) -> bytes:
+    if value is _MISSING:
+        return b"<missing>"
+    try:
+        return pickle.dumps(value, protocol=4)
+    except Exception:
+        return repr(value).encode()
+
+EXECUTORS = ("inline", "thread", "process")
+
+def _call_action(action: Callable, context: Dict[str, Any]) -> Any:
+    if asyncio.iscoroutinefunction(action):
+        return asyncio.run(action(context))
+    return action(context)
+
+def _run_in_thread(action: Callable, context: Dict[str, Any]):
+    start = time.perf_counter()
+    result = _call_action(action, context)
+    return result, time.perf_counter() - start
+
+def _run_in_process(action: Callable, snapshot: bytes, writes: List[str]):
+    """Worker-side entry point: run on a private copy, return what changed."""
+    start = time.perf_counter()
+    context = pickle.loads(snapshot)
+    if writes:
+        result = _call_action(action, context)
+        delta = {k: context[k] for k in writes if k in context}
+    else:
+        # Compare serialized values so in-place mutations (list.append,
+        # dict updates) are sent back too, not just rebound keys.
+        before = {k: _dumps_or_none(v) for k, v in context.items()}
+        result = _call_action(action, context)
+        delta = {k: v for k, v in context.items()
+                 if k not in before or before[k] is None or _dumps_or_none(v) != before[k]}
+    return result, delta, time.perf_counter() - start
+
+def _dumps_or_none(value: Any) -> Optional[bytes]:
+    try:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+
+def _pickle_picklable(values: Dict[str, Any]) -> bytes:
+    try:
+        return pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        # Drop values that cannot leave the process (locks, clients...).
+        picklable = {}
+        for k, v in values.items():
+            try:
+                pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+                picklable[k] = v
+            except Exception:
+                pass
+        return pickle.dumps(picklable, protocol=pickle.HIGHEST_PROTOCOL)
+
+@dataclass
+class ExecutorStats:
+    workers: int
+    submitted: int = 0
+    in_flight: int = 0
+    completed: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "running": min(self.in_flight, self.workers),
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "utilisation": min(1.0, self.busy_seconds / (elapsed * self.workers))
+        }
+
 @dataclass
 class Step:
     id: str
     name: str
     action: Callable
     depends_on: List[str] = field(default_factory=list)
+    cost: float = 1.0
+    # Context keys the step reads/writes; ``reads=None`` disables caching.
+    reads: Optional[List[str]] = None
+    writes: List[str] = field(default_factory=list)
+    # "inline" runs on the event loop; "thread"/"process" use the engine's pools.
+    executor: str = "inline"
     status: StepStatus = StepStatus.PENDING
     result: Any = None
     error: Optional[str] = None
+    cached: bool = False
+
+    def __post_init__(self):
+        if self.executor not in EXECUTORS:
+            raise ValueError(f"Unknown executor {self.executor!r}, expected one of {EXECUTORS}")
+        # Captured values are fingerprinted as they are when the step is
+        # defined; state the action mutates while running does not count.
+        self._action_fingerprint = (self.action, _fingerprint_callable(self.action))
+
+    def cache_key(self, context: Dict[str, Any]) -> Optional[str]:
+        if self.reads is None:
+            return None
+        digest = hashlib.sha256(self.id.encode())
+        action, fingerprint = self._action_fingerprint
+        if action is not self.action:
+            fingerprint = _fingerprint_callable(self.action)
+            self._action_fingerprint = (self.action, fingerprint)
+        digest.update(fingerprint)
+        for key in sorted(self.reads):
+            digest.update(key.encode())
+            digest.update(hashlib.sha256(_fingerprint_value(context.get(key, _MISSING))).digest())
+        return digest.hexdigest()
 
-    async def execute(self, context: Dict[str, Any]):
+    def reset(self):
+        self.status = StepStatus.PENDING
+        self.result = None
+        self.error = None
+        self.cached = False
+
+    async def execute(self, context: Dict[str, Any], run: Optional[Callable] = None):
         self.status = StepStatus.RUNNING
         try:
-            if asyncio.iscoroutinefunction(self.action):
+            if run is not None:
+                self.result = await run(self, context)
+            elif asyncio.iscoroutinefunction(self.action):
                 self.result = await self.action(context)
             else:
                 self.result = self.action(context)
@@ -46,6 +226,197 @@ class Step:
             self.error = str(e)
             raise
 
+class StepCache:
+    """Content-addressed on-disk store of step results with LRU eviction."""
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024,
+                 max_entries: int = 10000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        for path in sorted(self.directory.glob("*.pkl"), key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._index[path.stem] = size
+            self._total_bytes += size
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if key not in self._index:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self._drop(key)
+            self.misses += 1
+            return None
+        self._index.move_to_end(key)
+        os.utime(self._path(key))
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: Dict[str, Any]) -> bool:
+        try:
+            data = pickle.dumps(entry, protocol=4)
+        except Exception as e:
+            print(f"[WorkflowEngine] Result not cacheable: {e}")
+            return False
+        tmp_path = self._path(key).with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        if key in self._index:
+            self._total_bytes -= self._index.pop(key)
+        self._index[key] = len(data)
+        self._total_bytes += len(data)
+        while self._index and (self._total_bytes > self.max_bytes
+                               or len(self._index) > self.max_entries):
+            self._drop(next(iter(self._index)))
+        return True
+
+    def _drop(self, key: str):
+        self._total_bytes -= self._index.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._index), "bytes": self._total_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+class WorkflowStore:
+    """SQLite (WAL) checkpoint store for workflow and step state.
+
+    Step checkpoints are buffered and written in one transaction once
+    ``batch_size`` are pending or ``flush_interval`` seconds have passed; a
+    crash loses at most that window, and those steps simply run again on
+    ``resume``. Values are pickled and zlib-compressed above
+    ``compress_threshold`` bytes, tagged with a one-byte header.
+    """
+
+    RAW = b"P"
+    COMPRESSED = b"Z"
+
+    def __init__(self, db_path: str, batch_size: int = 64, flush_interval: float = 0.5,
+                 compress_threshold: int = 1024):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compress_threshold = compress_threshold
+        self._pending: List[tuple] = []
+        self._dirty_contexts: Dict[str, Workflow] = {}
+        self._last_flush = time.monotonic()
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS workflows (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                description TEXT,
+                status TEXT NOT NULL,
+                context BLOB,
+                updated_at TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS workflow_steps (
+                workflow_id TEXT NOT NULL,
+                step_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result BLOB,
+                error TEXT,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (workflow_id, step_id)
+            ) WITHOUT ROWID;
+        ''')
+        self.conn.commit()
+
+    def encode(self, value: Any) -> bytes:
+        return self._pack(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _pack(self, data: bytes) -> bytes:
+        if len(data) > self.compress_threshold:
+            return self.COMPRESSED + zlib.compress(data, 1)
+        return self.RAW + data
+
+    @classmethod
+    def decode(cls, blob: Optional[bytes]) -> Any:
+        if not blob:
+            return None
+        data = blob[1:]
+        if blob[:1] == cls.COMPRESSED:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def save_workflow(self, workflow: "Workflow"):
+        self.conn.execute('''
+            INSERT INTO workflows (id, name, description, status, context, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET status=excluded.status,
+                context=excluded.context, updated_at=excluded.updated_at
+        ''', (workflow.id, workflow.name, workflow.description, workflow.status.value,
+              self._encode_context(workflow), datetime.now().isoformat()))
+        self._dirty_contexts.pop(workflow.id, None)
+        self.flush()
+
+    def record_step(self, workflow: "Workflow", step: Step):
+        try:
+            result = self.encode(step.result)
+        except Exception:
+            result = None
+        self._pending.append((workflow.id, step.id, step.status.value, result, step.error,
+                              datetime.now().isoformat()))
+        self._dirty_contexts[workflow.id] = workflow
+        if len(self._pending) >= self.batch_size or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self.conn:
+            if self._pending:
+                self.conn.executemany('''
+                    INSERT OR REPLACE INTO workflow_steps
+                        (workflow_id, step_id, status, result, error, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', self._pending)
+            # Context goes with the batch so resumed steps see their inputs.
+            for workflow in self._dirty_contexts.values():
+                self.conn.execute('''
+                    UPDATE workflows SET context = ?, updated_at = ? WHERE id = ?
+                ''', (self._encode_context(workflow), datetime.now().isoformat(), workflow.id))
+        self._pending = []
+        self._dirty_contexts = {}
+        self._last_flush = time.monotonic()
+
+    def _encode_context(self, workflow: "Workflow") -> bytes:
+        return self._pack(_pickle_picklable(workflow.context))
+
+    def load(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT status, context FROM workflows WHERE id = ?", (workflow_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        steps = {
+            step_id: {"status": status, "result": self.decode(result), "error": error}
+            for step_id, status, result, error in self.conn.execute(
+                "SELECT step_id, status, result, error FROM workflow_steps WHERE workflow_id = ?",
+                (workflow_id,))
+        }
+        return {"status": row[0], "context": self.decode(row[1]) or {}, "steps": steps}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
 @dataclass
 class Workflow:
     id: str
@@ -55,9 +426,59 @@ class Workflow:
     status: WorkflowStatus = WorkflowStatus.CREATED
     context: Dict[str, Any] = field(default_factory=dict)
     created_at: datetime = field(default_factory=datetime.now)
+    dependents: Dict[str, List[str]] = field(default_factory=dict)
 
     def add_step(self, step: Step):
+        if step.id in self.steps:
+            raise ValueError(f"Duplicate step id: {step.id}")
+        if step.id in step.depends_on:
+            raise ValueError(f"Step {step.id} cannot depend on itself")
+        # Only a step that something already depends on can close a cycle.
+        if step.id in self.dependents:
+            targets = set(step.depends_on)
+            stack = list(self.dependents[step.id])
+            seen = set()
+            while stack:
+                current = stack.pop()
+                if current in targets:
+                    raise ValueError(f"Adding step {step.id} would create a dependency cycle")
+                if current not in seen:
+                    seen.add(current)
+                    stack.extend(self.dependents.get(current, ()))
+
         self.steps[step.id] = step
+        for dep_id in step.depends_on:
+            self.dependents.setdefault(dep_id, []).append(step.id)
+
+    def critical_path_lengths(self) -> Dict[str, float]:
+        """Cost of the longest path from each step to the end of the DAG."""
+        indegree = {sid: 0 for sid in self.steps}
+        for step in self.steps.values():
+            for dep_id in step.depends_on:
+                if dep_id in self.steps:
+                    indegree[step.id] += 1
+        order = [sid for sid, deg in indegree.items() if deg == 0]
+        for sid in order:
+            for child in self.dependents.get(sid, ()):
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    order.append(child)
+
+        lengths: Dict[str, float] = {}
+        for sid in reversed(order):
+            downstream = [lengths[c] for c in self.dependents.get(sid, ()) if c in lengths]
+            lengths[sid] = self.steps[sid].cost + (max(downstream) if downstream else 0.0)
+        return lengths
+
+    def downstream_of(self, step_id: str) -> Set[str]:
+        found = {step_id}
+        stack = [step_id]
+        while stack:
+            for child in self.dependents.get(stack.pop(), ()):
+                if child not in found:
+                    found.add(child)
+                    stack.append(child)
+        return found
 
     def get_ready_steps(self) -> List[Step]:
         ready = []
@@ -73,11 +494,70 @@ class Workflow:
         return ready
 
 class WorkflowEngine:
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 32, cache: Optional[StepCache] = None,
+                 thread_workers: int = 8, process_workers: Optional[int] = None,
+                 store: Optional[WorkflowStore] = None):
         self.workflows: Dict[str, Workflow] = {}
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.store = store
+        self._pools: Dict[str, Executor] = {}
+        self.executor_stats: Dict[str, ExecutorStats] = {
+            "thread": ExecutorStats(workers=thread_workers),
+            "process": ExecutorStats(workers=process_workers or os.cpu_count() or 1),
+        }
+
+    def _pool(self, kind: str) -> Executor:
+        pool = self._pools.get(kind)
+        if pool is None:
+            workers = self.executor_stats[kind].workers
+            if kind == "process":
+                pool = ProcessPoolExecutor(max_workers=workers)
+            else:
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="workflow")
+            self._pools[kind] = pool
+        return pool
+
+    def executor_metrics(self) -> Dict[str, Dict[str, Any]]:
+        return {kind: stats.to_dict() for kind, stats in self.executor_stats.items()}
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
+        self._pools.clear()
+
+    @staticmethod
+    def _snapshot(step: Step, context: Dict[str, Any]) -> bytes:
+        keys = step.reads if step.reads is not None else list(context)
+        return _pickle_picklable({k: context[k] for k in keys if k in context})
+
+    async def _run_in_pool(self, step: Step, context: Dict[str, Any]) -> Any:
+        kind = step.executor
+        stats = self.executor_stats[kind]
+        loop = asyncio.get_running_loop()
+        stats.submitted += 1
+        stats.in_flight += 1
+        try:
+            if kind == "process":
+                result, delta, busy = await loop.run_in_executor(
+                    self._pool(kind), _run_in_process, step.action,
+                    self._snapshot(step, context), step.writes)
+                context.update(delta)
+            else:
+                result, busy = await loop.run_in_executor(
+                    self._pool(kind), _run_in_thread, step.action, context)
+        except Exception:
+            stats.failed += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+        stats.completed += 1
+        stats.busy_seconds += busy
+        return result
 
-    def create_workflow(self, name: str, description: str) -> str:
-        workflow_id = str(uuid.uuid4())
+    def create_workflow(self, name: str, description: str,
+                        workflow_id: Optional[str] = None) -> str:
+        workflow_id = workflow_id or str(uuid.uuid4())
         workflow = Workflow(
             id=workflow_id,
             name=name,
@@ -90,35 +570,76 @@ class WorkflowEngine:
         if workflow_id in self.workflows:
             self.workflows[workflow_id].add_step(step)
 
-    async def execute_workflow(self, workflow_id: str) -> Dict[str, Any]:
+    async def resume(self, workflow_id: str,
+                     max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Continue a checkpointed run, skipping steps that already completed.
+
+        Step definitions are code, so the workflow must have been rebuilt
+        (same ``workflow_id`` and step ids) before resuming.
+        """
         if workflow_id not in self.workflows:
             raise ValueError(f"Workflow not found: {workflow_id}")
+        if self.store is None:
+            raise ValueError("resume() requires a WorkflowStore")
 
         workflow = self.workflows[workflow_id]
-        workflow.status = WorkflowStatus.RUNNING
+        saved = self.store.load(workflow_id)
+        if saved is not None:
+            workflow.context.update(saved["context"])
+            for sid, state in saved["steps"].items():
+                step = workflow.steps.get(sid)
+                if step is not None and state["status"] == StepStatus.COMPLETED.value:
+                    step.status = StepStatus.COMPLETED
+                    step.result = state["result"]
+        return await self.execute_workflow(workflow_id, max_concurrency)
 
-        try:
-            while True:
-                ready_steps = workflow.get_ready_steps()
-                if not ready_steps:
-                    break
+    async def rerun(self, workflow_id: str, from_step: Optional[str] = None,
+                    max_concurrency: Optional[int] = None) -> Dict[str, Any]:
+        """Re-execute a workflow, reusing cached results where inputs are unchanged.
+
+        With ``from_step`` only that step and its downstream steps are reset;
+        ``from_step`` itself always recomputes, and downstream steps are
+        served from the cache if their inputs turn out unchanged.
+        """
+        if workflow_id not in self.workflows:
+            raise ValueError(f"Workflow not found: {workflow_id}")
+        workflow = self.workflows[workflow_id]
 
-                tasks = [step.execute(workflow.context) for step in ready_steps]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
+        if from_step is None:
+            to_reset, force = set(workflow.steps), set()
+        elif from_step not in workflow.steps:
+            raise ValueError(f"Step not found: {from_step}")
+        else:
+            to_reset, force = workflow.downstream_of(from_step), {from_step}
+        for sid in to_reset:
+            workflow.steps[sid].reset()
+        return await self.execute_workflow(workflow_id, max_concurrency, force=force)
 
-                for result in results:
-                    if isinstance(result, Exception):
-                        workflow.status = WorkflowStatus.FAILED
-                        raise result
+    async def execute_workflow(self, workflow_id: str,
+                               max_concurrency: Optional[int] = None,
+                               force: Optional[Set[str]] = None) -> Dict[str, Any]:
+        if workflow_id not in self.workflows:
+            raise ValueError(f"Workflow not found: {workflow_id}")
 
-                if all(s.status in [StepStatus.COMPLETED, StepStatus.FAILED, StepStatus.SKIPPED]
-                       for s in workflow.steps.values()):
-                    break
+        workflow = self.workflows[workflow_id]
+        workflow.status = WorkflowStatus.RUNNING
+        if self.store is not None:
+            self.store.save_workflow(workflow)
+
+        try:
+            try:
+                await self._run_dag(workflow, max_concurrency or self.max_concurrency,
+                                    force or set())
+            finally:
+                if self.store is not None:
+                    self.store.flush()
 
             if all(s.status == StepStatus.COMPLETED for s in workflow.steps.values()):
                 workflow.status = WorkflowStatus.COMPLETED
             else:
                 workflow.status = WorkflowStatus.FAILED
+            if self.store is not None:
+                self.store.save_workflow(workflow)
 
             return {
                 "workflow_id": workflow_id,
@@ -128,12 +649,84 @@ class WorkflowEngine:
 
         except Exception as e:
             workflow.status = WorkflowStatus.FAILED
+            if self.store is not None:
+                self.store.save_workflow(workflow)
             return {
                 "workflow_id": workflow_id,
                 "status": workflow.status.value,
                 "error": str(e)
             }
 
+    async def _execute_step(self, workflow: Workflow, step: Step, force: bool):
+        key = step.cache_key(workflow.context) if self.cache is not None else None
+        if key is not None and not force:
+            entry = self.cache.get(key)
+            if entry is not None:
+                workflow.context.update(entry["writes"])
+                step.result = entry["result"]
+                step.status = StepStatus.COMPLETED
+                step.cached = True
+                if self.store is not None:
+                    self.store.record_step(workflow, step)
+                return
+
+        run = self._run_in_pool if step.executor != "inline" else None
+        try:
+            await step.execute(workflow.context, run=run)
+        finally:
+            if self.store is not None:
+                self.store.record_step(workflow, step)
+        if key is not None:
+            writes = {k: workflow.context[k] for k in step.writes if k in workflow.context}
+            self.cache.put(key, {"result": step.result, "writes": writes})
+
+    async def _run_dag(self, workflow: Workflow, max_concurrency: int, force: Set[str]):
+        """Start each step as soon as its last dependency completes.
+
+        Ready steps are launched longest-remaining-path first, with at most
+        ``max_concurrency`` running at once. The first failure stops new
+        launches; steps already running are allowed to finish.
+        """
+        steps = workflow.steps
+        priority = workflow.critical_path_lengths()
+        remaining: Dict[str, int] = {}
+        ready: List[tuple] = []
+        for sid, step in steps.items():
+            if step.status == StepStatus.COMPLETED:
+                continue
+            remaining[sid] = sum(
+                1 for dep_id in step.depends_on
+                if dep_id in steps and steps[dep_id].status != StepStatus.COMPLETED
+            )
+            if remaining[sid] == 0:
+                heapq.heappush(ready, (-priority.get(sid, 0.0), sid))
+
+        running: Dict[asyncio.Task, str] = {}
+        failure: Optional[BaseException] = None
+        while ready or running:
+            while ready and len(running) < max_concurrency and failure is None:
+                _, sid = heapq.heappop(ready)
+                task = asyncio.create_task(
+                    self._execute_step(workflow, steps[sid], sid in force))
+                running[task] = sid
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                sid = running.pop(task)
+                if task.exception() is not None:
+                    failure = failure or task.exception()
+                    continue
+                for child in workflow.dependents.get(sid, ()):
+                    if child in remaining:
+                        remaining[child] -= 1
+                        if remaining[child] == 0:
+                            heapq.heappush(ready, (-priority.get(child, 0.0), child))
+
+        if failure is not None:
+            raise failure
+
 workflow_engine = WorkflowEngine()
 
 async def main():